@@ -20,7 +20,6 @@ import os
 import sys
 import numpy
 import scipy
-import pandas
 import configparser
 
 # disable OpenBLAS threads before the first numpy import
@@ -32,11 +31,26 @@ from openquake.baselib.general import git_suffix  # noqa: E402
 __version__ = '3.11.0'
 __version__ += git_suffix(__file__)
 
+
+def _pandas_version():
+    # read the version from the metadata, since importing pandas is slow
+    try:
+        from importlib.metadata import version, PackageNotFoundError
+    except ImportError:  # Python < 3.8
+        import pandas
+        return pandas.__version__
+    try:
+        return version('pandas')
+    except PackageNotFoundError:  # not installed as a distribution
+        import pandas
+        return pandas.__version__
+
+
 version = dict(engine=__version__,
                python='%d.%d' % sys.version_info[:2],
                numpy=numpy.__version__,
                scipy=scipy.__version__,
-               pandas=pandas.__version__)
+               pandas=_pandas_version())
 
 
 class InvalidFile(Exception):
@@ -25,12 +25,12 @@ import itertools
 import collections
 import numpy
 import h5py
-import pandas
 
 from openquake.baselib import hdf5, config, performance, python3compat, general
 
 
 CALC_REGEX = r'(calc|cache)_(\d+)\.hdf5'
+MINMAX_BLOCKSIZE = 65536  # number of rows summarized by the minmax metadata
 
 
 def get_datadir():
@@ -181,6 +181,7 @@ def dset2df(dset, indexfield, filterdict):
         else:
             idxs.append(range(len(values)))
         tags.append(values)
+    import pandas  # imported lazily since it is slow
     dic = general.AccumDict(accum=[])
     index = []
     for idx, vals in zip(itertools.product(*idxs), itertools.product(*tags)):
@@ -193,6 +194,62 @@ def dset2df(dset, indexfield, filterdict):
     return pandas.DataFrame(dic, index)
 
 
+def _match(values, pred):
+    # boolean mask of the values satisfying the predicate
+    if isinstance(pred, tuple):  # range lo <= value < hi
+        lo, hi = pred
+        ok = numpy.ones(len(values), bool)
+        if lo is not None:
+            ok &= values >= lo
+        if hi is not None:
+            ok &= values < hi
+        return ok
+    elif isinstance(pred, (list, set, numpy.ndarray)):
+        return numpy.isin(values, list(pred))
+    return values == pred
+
+
+def _overlap(minmax, pred):
+    # boolean mask of the blocks which may contain matching values
+    mins, maxs = minmax[:, 0], minmax[:, 1]
+    if isinstance(pred, tuple):
+        lo, hi = pred
+        ok = numpy.ones(len(minmax), bool)
+        if lo is not None:
+            ok &= maxs >= lo
+        if hi is not None:
+            ok &= mins < hi
+        return ok
+    elif isinstance(pred, (list, set, numpy.ndarray)):
+        vals = numpy.sort(list(pred))
+        return (numpy.searchsorted(vals, mins, 'left') <
+                numpy.searchsorted(vals, maxs, 'right'))
+    return (mins <= pred) & (pred <= maxs)
+
+
+def _candidate_slices(grp, sel, start, stop):
+    # slices of rows which may satisfy the predicates in sel, as determined
+    # by the minmax metadata of the columns (if any)
+    ok = None
+    for field, pred in sel.items():
+        name = field + '.minmax'
+        if name in grp:
+            blocksize = grp[name].attrs['blocksize']
+            overlap = _overlap(grp[name][()], pred)
+            ok = overlap if ok is None else ok & overlap
+    if ok is None:  # no metadata, read everything
+        return [slice(start, stop)]
+    blocks = ok.nonzero()[0]
+    slices = []
+    for run in numpy.split(blocks, numpy.where(numpy.diff(blocks) > 1)[0] + 1):
+        if len(run):
+            slc = slice(max(run[0] * blocksize, start),
+                        min((run[-1] + 1) * blocksize, stop))
+            if slc.start < slc.stop:
+                slices.append(slc)
+    return slices
+
+
 class DataStore(collections.abc.MutableMapping):
     """
     DataStore class to store the inputs/outputs of a calculation on the
@@ -472,37 +529,87 @@ class DataStore(collections.abc.MutableMapping):
         data = bytes(numpy.asarray(self[key][()]))
         return io.BytesIO(gzip.decompress(data))
 
-    def read_df(self, key, index=None, sel=(), slc=slice(None)):
+    def store_minmax(self, key, *fields, blocksize=MINMAX_BLOCKSIZE):
+        """
+        Store for each field of the dataframe `key` a dataset
+        `<key>/<field>.minmax` with the minimum and maximum value of each
+        block of rows, which is used by :meth:`read_df` to read only the
+        slices that may satisfy a selection.
+
+        :param key: name of a group with attribute __pdcolumns__
+        :param fields: names of columns of the dataframe
+        :param blocksize: number of rows in each block
+        """
+        grp = self.getitem(key)
+        for field in fields:
+            dset = grp[field]
+            size = len(dset)
+            minmax = numpy.zeros((-(-size // blocksize), 2), dset.dtype)
+            step = blocksize * 64  # read 64 blocks at the time
+            for slc in general.gen_slices(0, size, step):
+                arr = dset[slc]
+                idx = numpy.arange(0, len(arr), blocksize)
+                blk = slice(slc.start // blocksize,
+                            slc.start // blocksize + len(idx))
+                minmax[blk, 0] = numpy.minimum.reduceat(arr, idx)
+                minmax[blk, 1] = numpy.maximum.reduceat(arr, idx)
+            name = '%s/%s.minmax' % (key, field)
+            if name in self.hdf5:
+                del self.hdf5[name]
+            self.hdf5[name] = minmax
+            self.hdf5[name].attrs['blocksize'] = blocksize
+
+    def read_df(self, key, index=None, sel=(), slc=slice(None), columns=None):
         """
         :param key: name of the structured dataset
         :param index: if given, name of the "primary key" field
         :param sel: dictionary used to select subsets of the dataset
         :param slc: slice object to extract a slice of the dataset
+        :param columns: if given, list of the columns to read
         :returns: pandas DataFrame associated to the dataset
+
+        For datasets without shape_descr the values of `sel` are predicates:
+        a scalar means equality, a pair (lo, hi) the range lo <= x < hi
+        (None means unbounded) and a list, set or array means membership.
+        For dataframes only the slices compatible with the minmax metadata
+        stored by :meth:`store_minmax` are read.
         """
+        import pandas  # imported lazily since it is slow
         dset = self.getitem(key)
         if len(dset) == 0:
             raise self.EmptyDataset('Dataset %s is empty' % key)
         elif 'shape_descr' in dset.attrs:
             return dset2df(dset, index, sel)
-        elif '__pdcolumns__' in dset.attrs:
-            columns = dset.attrs['__pdcolumns__'].split()
-            dic = {col: dset[col][slc] for col in columns if col != index}
-            if index is not None:
-                index = dset[index][slc]
-            return pandas.DataFrame(dic, index=index)
-        dtlist = []
-        for name in dset.dtype.names:
-            dt = dset.dtype[name]
-            if dt.shape:  # vector field
-                templ = name + '_%d' * len(dt.shape)
-                for i, _ in numpy.ndenumerate(numpy.zeros(dt.shape)):
-                    dtlist.append((templ % i, dt.base))
-            else:  # scalar field
-                dtlist.append((name, dt))
-        data = numpy.zeros(len(dset), dtlist)
-        for name in dset.dtype.names:
-            arr = dset[name]
+        sel = dict(sel)
+        if '__pdcolumns__' in dset.attrs:
+            if columns is None:
+                columns = dset.attrs['__pdcolumns__'].split()
+            columns = [col for col in columns if col != index]
+            names = columns + [index] if index else columns
+            start, stop, _ = slc.indices(len(dset[names[0]]))
+            chunks = {name: [] for name in names}
+            for s in _candidate_slices(dset, sel, start, stop):
+                cache = {field: dset[field][s] for field in sel}
+                ok = numpy.ones(s.stop - s.start, bool)
+                for field, pred in sel.items():
+                    ok &= _match(cache[field], pred)
+                if ok.any():
+                    for name in names:
+                        arr = cache[name] if name in cache else dset[name][s]
+                        chunks[name].append(arr[ok])
+            data = {name: numpy.concatenate(chunks[name]) if chunks[name]
+                    else numpy.zeros(0, dset[name].dtype) for name in names}
+            return pandas.DataFrame({col: data[col] for col in columns},
+                                    index=data[index] if index else None)
+        # structured array: read only the needed fields
+        names = [name for name in dset.dtype.names
+                 if columns is None or name in columns or name == index]
+        ok = numpy.ones(len(dset), bool)
+        for field, pred in sel.items():
+            ok &= _match(dset[field], pred)
+        data = {}
+        for name in names:
+            arr = dset[name][ok] if sel else dset[name]
             dt = dset.dtype[name]
             if dt.shape:  # vector field
                 templ = name + '_%d' * len(dt.shape)
@@ -510,7 +617,8 @@ class DataStore(collections.abc.MutableMapping):
                     data[templ % i] = arr[(slice(None),) + i]
             else:  # scalar field
                 data[name] = arr
-        return pandas.DataFrame.from_records(data, index=index)
+        df = pandas.DataFrame(data)
+        return df.set_index(index) if index else df
 
     def read_unique(self, key, field):
         """
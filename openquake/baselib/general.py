@@ -20,6 +20,7 @@
 Utility functions of general interest.
 """
 import os
+import re
 import sys
 import zlib
 import copy
@@ -580,6 +581,98 @@ class CallableDict(dict):
         raise KeyError(key)
 
 
+CLASS_RE = re.compile(r'^class\s+(\w+)\s*[(:]', re.M)
+
+
+def _class_index(package):
+    # returns a dictionary class name -> module names, built by scanning
+    # the sources of the package without importing them
+    [pkg_path] = importlib.import_module(package).__path__
+    index = {}
+    n = len(pkg_path)
+    for cwd, dirs, files in os.walk(pkg_path):
+        if '__init__.py' not in files:  # not a subpackage
+            continue
+        prefix = package + cwd[n:].replace(os.sep, '.')
+        for f in files:
+            if f.endswith('.py'):
+                with open(os.path.join(cwd, f), encoding='utf-8') as src:
+                    names = CLASS_RE.findall(src.read())
+                for name in names:
+                    index.setdefault(name, []).append(prefix + '.' + f[:-3])
+    return index
+
+
+class LazyRegistry(dict):
+    """
+    A registry name -> object populated by the modules of a package when
+    they are imported. The modules are imported lazily: the first time a
+    name is looked up only the modules defining a class with that name
+    are imported; the whole package is imported only if the name is
+    still missing or when iterating on the registry.
+
+    >>> from openquake.hazardlib.gsim.base import registry  # a LazyRegistry
+    >>> registry['BooreAtkinson2008'].__name__
+    'BooreAtkinson2008'
+    """
+    def __init__(self, package):
+        super().__init__()
+        self.package = package
+        self.complete = False
+        self._index = None
+
+    def load(self, name=None):
+        """
+        Import the modules defining the given name, or the whole package
+        if the name is None or it is not defined by any class
+        """
+        if self.complete:
+            return
+        if name is not None:
+            if self._index is None:
+                self._index = _class_index(self.package)
+            for modname in self._index.get(name, ()):
+                importlib.import_module(modname)
+            if dict.__contains__(self, name):
+                return
+        import_all(self.package)
+        self.complete = True
+
+    def __missing__(self, name):
+        self.load(name)
+        if dict.__contains__(self, name):
+            return dict.__getitem__(self, name)
+        raise KeyError(name)
+
+    def __contains__(self, name):
+        if not dict.__contains__(self, name):
+            self.load(name)
+        return dict.__contains__(self, name)
+
+    def get(self, name, default=None):
+        return self[name] if name in self else default
+
+    def __iter__(self):
+        self.load()
+        return super().__iter__()
+
+    def __len__(self):
+        self.load()
+        return super().__len__()
+
+    def keys(self):
+        self.load()
+        return super().keys()
+
+    def values(self):
+        self.load()
+        return super().values()
+
+    def items(self):
+        self.load()
+        return super().items()
+
+
 class pack(dict):
     """
     Compact a dictionary of lists into a dictionary of arrays.
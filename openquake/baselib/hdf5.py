@@ -28,7 +28,6 @@ from urllib.parse import quote_plus, unquote_plus
 import collections
 import json
 import toml
-import pandas
 import numpy
 import h5py
 from openquake.baselib import InvalidFile
@@ -629,12 +628,17 @@ def build_dt(dtypedict, names):
 
 
 def _read_csv(fileobj, compositedt):
+    return _to_array(csv.reader(fileobj), compositedt)
+
+
+def _to_array(rows, compositedt, start=3):
+    # convert the rows into a composite array, checking the byte-fields
     itemsize = [0] * len(compositedt)
     for i, name in enumerate(compositedt.names):
         if compositedt[name].kind == 'S':  # limit of the length of byte-fields
             itemsize[i] = compositedt[name].itemsize
-    rows = []
-    for lineno, row in enumerate(csv.reader(fileobj), 3):
+    tuples = []
+    for lineno, row in enumerate(rows, start):
         cols = []
         for i, col in enumerate(row):
             if itemsize[i] and len(col) > itemsize[i]:
@@ -642,8 +646,26 @@ def _read_csv(fileobj, compositedt):
                     'line %d: %s=%r has length %d > %d' %
                     (lineno, compositedt.names[i], col, len(col), itemsize[i]))
             cols.append(col)
-        rows.append(tuple(cols))
-    return numpy.array(rows, compositedt)
+        tuples.append(tuple(cols))
+    return numpy.array(tuples, compositedt)
+
+
+def _read_header(fileobj, sep):
+    # skip the comment lines and the blank lines before the header
+    attrs = {}
+    for line in fileobj:
+        if line.startswith('#'):
+            attrs = dict(parse_comment(line.strip('#,\n ')))
+        elif line.strip():
+            return line.strip().split(sep), attrs
+    raise InvalidFile('%s: missing header' % fileobj.name)
+
+
+def _rename(arr, renamedict):
+    if renamedict:
+        arr.dtype.names = [renamedict.get(name, name)
+                           for name in arr.dtype.names]
+    return arr
 
 
 # NB: it would be nice to use numpy.loadtxt(
@@ -659,15 +681,8 @@ def read_csv(fname, dtypedict={None: float}, renamedict={}, sep=',',
     :param index: if not None, returns a pandas DataFrame
     :returns: an ArrayWrapper, unless there is an index
     """
-    attrs = {}
     with open(fname, encoding='utf-8-sig') as f:
-        while True:
-            first = next(f)
-            if first.startswith('#'):
-                attrs = dict(parse_comment(first.strip('#,\n ')))
-                continue
-            break
-        header = first.strip().split(sep)
+        header, attrs = _read_header(f, sep)
         if isinstance(dtypedict, dict):
             dt = build_dt(dtypedict, header)
         else:
@@ -678,19 +693,52 @@ def read_csv(fname, dtypedict={None: float}, renamedict={}, sep=',',
             raise KeyError('Missing None -> default in dtypedict')
         except Exception as exc:
             raise InvalidFile('%s: %s' % (fname, exc))
-    if renamedict:
-        newnames = []
-        for name in arr.dtype.names:
-            new = renamedict.get(name, name)
-            newnames.append(new)
-        arr.dtype.names = newnames
+    _rename(arr, renamedict)
     if index:
+        import pandas  # imported lazily since it is slow
         df = pandas.DataFrame.from_records(arr, index)
         vars(df).update(attrs)
         return df
     return ArrayWrapper(arr, attrs)
 
 
+def iter_csv(fname, dtypedict={None: float}, renamedict={}, sep=',',
+             chunksize=100_000):
+    """
+    Read a CSV file like :func:`read_csv`, but in chunks of rows, so that
+    only a chunk of the file is kept in memory as Python objects.
+
+    :param fname: a CSV file with an header and float fields
+    :param dtypedict: a dictionary fieldname -> dtype, None -> default
+    :param renamedict: aliases for the fields to rename
+    :param sep: separator (default comma)
+    :param chunksize: maximum number of rows per chunk
+    :yields: arrays with at most `chunksize` rows (at least one array)
+    """
+    with open(fname, encoding='utf-8-sig') as f:
+        header, _attrs = _read_header(f, sep)
+        if isinstance(dtypedict, dict):
+            dt = build_dt(dtypedict, header)
+        else:
+            dt = dtypedict
+        rows = csv.reader(f)
+        start = 3
+        while True:
+            chunk = list(itertools.islice(rows, chunksize))
+            if not chunk and start > 3:  # the file was already consumed
+                break
+            try:
+                arr = _to_array(chunk, dt, start)
+            except KeyError:
+                raise KeyError('Missing None -> default in dtypedict')
+            except Exception as exc:
+                raise InvalidFile('%s: %s' % (fname, exc))
+            yield _rename(arr, renamedict)
+            if len(chunk) < chunksize:
+                break
+            start += chunksize
+
+
 def _fix_array(arr, key):
     """
     :param arr: array or array-like object
@@ -190,7 +190,10 @@ import signal
 import pickle
 import inspect
 import logging
+import lzma
+import zlib
 import operator
+import threading
 import traceback
 import collections
 from unittest import mock
@@ -204,7 +207,7 @@ except ImportError:
         "Do nothing"
 
 from openquake.baselib import config, hdf5, workerpool, version
-from openquake.baselib.zeromq import zmq, Socket
+from openquake.baselib.zeromq import zmq, Socket, MIN_OOB_SIZE, _in_band
 from openquake.baselib.performance import (
     Monitor, memory_rss, init_performance)
 from openquake.baselib.general import (
@@ -221,6 +224,10 @@ try:
     CT = len(psutil.Process().cpu_affinity()) * 2
 except AttributeError:
     CT = psutil.cpu_count() * 2
+# fast codecs used to compress the data transferred in a cluster
+COMPRESS = {'zlib': lambda data: zlib.compress(data, 1),
+            'lzma': lambda data: lzma.compress(data, preset=0)}
+DECOMPRESS = {'zlib': zlib.decompress, 'lzma': lzma.decompress}
 
 
 @submit.add('no')
@@ -252,6 +259,8 @@ def zmq_submit(self, func, args, monitor):
         task_input_url = 'tcp://127.0.0.1:%d' % port
         self.sender = Socket(
             task_input_url, zmq.PUSH, 'connect').__enter__()
+    if monitor.heartbeat:  # keep the arguments to resubmit lost tasks
+        self.tracker.add(self.task_no, func, args, monitor)
     return self.sender.send((func, args, self.task_no, monitor))
 
 
@@ -279,15 +288,54 @@ class Pickled(object):
     have a nice string representation and length giving the size
     of the pickled bytestring.
 
+    With protocol 5 (Python 3.8+) the large buffers, like the ones
+    of numpy arrays, are stored out-of-band, so that they can be sent
+    by zmq as separate frames instead of being concatenated into a single
+    bytestring. The uncompressed buffers are copied once, to take a snapshot
+    of the arrays at pickling time, and copied again when unpickling, since
+    the arrays must be writeable. Frames larger than the compression
+    threshold are compressed with the given codec, unless they are
+    incompressible.
+
     :param obj: the object to pickle
+    :param compress: a codec in COMPRESS or the empty string
     """
-    def __init__(self, obj):
+    def __init__(self, obj, compress=''):
         self.clsname = obj.__class__.__name__
         self.calc_id = str(getattr(obj, 'calc_id', ''))  # for monitors
+        buffers = []
         try:
-            self.pik = pickle.dumps(obj, pickle.HIGHEST_PROTOCOL)
+            if pickle.HIGHEST_PROTOCOL < 5:  # Python < 3.8
+                pik = pickle.dumps(obj, pickle.HIGHEST_PROTOCOL)
+            else:
+                pik = pickle.dumps(obj, 5, buffer_callback=lambda buf: (
+                    _in_band(buf) or buffers.append(buf)))
         except TypeError as exc:  # can't pickle, show the obj in the message
             raise TypeError('%s: %s' % (exc, obj))
+        threshold = float(config.distribution.get(
+            'compression_threshold', 1E6)) if compress else 0
+        self.codecs = []
+        self.frames = []
+        self.raw_size = 0
+        for frame in [pik] + [buf.raw() for buf in buffers]:
+            codec, data = _compress(frame, compress, threshold)
+            self.codecs.append(codec)
+            self.frames.append(data)
+            self.raw_size += memoryview(frame).nbytes
+
+    @property
+    def pik(self):
+        """The pickled bytestring (possibly compressed)"""
+        return self.frames[0]
+
+    def __reduce_ex__(self, protocol):
+        # with protocol 5 the frames can be pickled out-of-band
+        state = vars(self).copy()
+        if protocol >= 5:
+            state['frames'] = [pickle.PickleBuffer(f) for f in self.frames]
+        else:  # frames received by zmq are memoryviews
+            state['frames'] = [bytes(f) for f in self.frames]
+        return object.__new__, (self.__class__,), state
 
     def __repr__(self):
         """String representation of the pickled object"""
@@ -295,12 +343,31 @@ class Pickled(object):
             self.clsname, self.calc_id, humansize(len(self)))
 
     def __len__(self):
-        """Length of the pickled bytestring"""
-        return len(self.pik)
+        """Length of the pickled bytestring, including the buffers"""
+        return sum(len(frame) for frame in self.frames)
 
     def unpickle(self):
         """Unpickle the underlying object"""
-        return pickle.loads(self.pik)
+        frames = [DECOMPRESS[codec](frame) if codec else frame
+                  for codec, frame in zip(self.codecs, self.frames)]
+        if len(frames) == 1:
+            return pickle.loads(frames[0])
+        # make writeable copies of the buffers, since the unpickled arrays
+        # are modified in place by the reduce functions
+        return pickle.loads(frames[0], buffers=map(bytearray, frames[1:]))
+
+
+def _compress(frame, codec, threshold):
+    # returns a pair (codec, data); incompressible frames, as detected by
+    # looking at their first chunk, and small frames are not compressed
+    if codec in COMPRESS and memoryview(frame).nbytes >= threshold:
+        compress = COMPRESS[codec]
+        chunk = memoryview(frame)[:MIN_OOB_SIZE]
+        if len(compress(chunk)) < .9 * len(chunk):
+            return codec, compress(frame)
+    if isinstance(frame, memoryview):
+        frame = frame.tobytes()  # take a snapshot of the buffer
+    return '', frame
 
 
 def get_pickled_sizes(obj):
@@ -325,7 +392,7 @@ def get_pickled_sizes(obj):
         sizes, key=lambda pair: pair[1], reverse=True)
 
 
-def pickle_sequence(objects):
+def pickle_sequence(objects, compress=''):
     """
     Convert an iterable of objects into a list of pickled objects.
     If the iterable contains copies, the pickling will be done only once.
@@ -333,6 +400,7 @@ def pickle_sequence(objects):
     pickled again.
 
     :param objects: a sequence of objects to pickle
+    :param compress: a codec in COMPRESS or the empty string
     """
     cache = {}
     out = []
@@ -342,14 +410,15 @@ def pickle_sequence(objects):
             if isinstance(obj, Pickled):  # already pickled
                 cache[obj_id] = obj
             else:  # pickle the object
-                cache[obj_id] = Pickled(obj)
+                cache[obj_id] = Pickled(obj, compress)
         out.append(cache[obj_id])
     return out
 
 
 class FakePickle:
-    def __init__(self, sentbytes):
+    def __init__(self, sentbytes, raw_size=0):
         self.sentbytes = sentbytes
+        self.raw_size = raw_size
 
     def unpickle(self):
         pass
@@ -368,19 +437,20 @@ class Result(object):
     func = None
 
     def __init__(self, val, mon, tb_str='', msg=''):
+        compress = getattr(mon, 'compression', '')
         if isinstance(val, dict):
-            self.pik = Pickled(val)
+            self.pik = Pickled(val, compress)
             self.nbytes = {k: len(Pickled(v)) for k, v in val.items()}
         elif isinstance(val, tuple) and callable(val[0]):
             self.func = val[0]
-            self.pik = pickle_sequence(val[1:])
+            self.pik = pickle_sequence(val[1:], compress)
             self.nbytes = {'args': sum(len(p) for p in self.pik)}
         elif msg == 'TASK_ENDED':
             self.pik = Pickled(None)
             self.nbytes = {}
         else:
-            self.pik = Pickled(val)
-            self.nbytes = {'tot': len(self.pik)}
+            self.pik = Pickled(val, compress)
+            self.nbytes = {'tot': self.pik.raw_size}
         self.mon = mon
         self.tb_str = tb_str
         self.msg = msg
@@ -403,8 +473,16 @@ class Result(object):
         nbytes = ['%s: %s' % (k, humansize(v)) for k, v in self.nbytes.items()]
         return '<%s %s>' % (self.__class__.__name__, ' '.join(nbytes))
 
+    def get_sizes(self):
+        """
+        :returns: the pair (bytes sent, bytes before the compression)
+        """
+        piks = self.pik if self.func else [self.pik]
+        return (sum(len(pik) for pik in piks),
+                sum(pik.raw_size for pik in piks))
+
     @classmethod
-    def new(cls, func, args, mon, sentbytes=0):
+    def new(cls, func, args, mon, sentbytes=0, rawbytes=0):
         """
         :returns: a new Result instance
         """
@@ -419,7 +497,7 @@ class Result(object):
         except StopIteration:
             mon.counts -= 1  # StopIteration does not count
             res = Result(None, mon, msg='TASK_ENDED')
-            res.pik = FakePickle(sentbytes)
+            res.pik = FakePickle(sentbytes, rawbytes)
         except Exception:
             _etype, exc, tb = sys.exc_info()
             res = Result(exc, mon, ''.join(traceback.format_tb(tb)))
@@ -449,6 +527,44 @@ dummy_mon.version = version
 dummy_mon.backurl = None
 
 
+class Heartbeat(threading.Thread):
+    """
+    Thread sending a HEARTBEAT message to the master every `mon.heartbeat`
+    seconds while a task is running in a zmq worker; the first message is
+    sent immediately and tells the master that the task has started.
+    Used as a context manager; it does nothing if `mon.heartbeat` is 0.
+
+    :param mon: the monitor of the task
+    """
+    def __init__(self, mon):
+        super().__init__(daemon=True)
+        # a light monitor, since the one of the task is being modified
+        self.mon = Monitor(mon.operation)
+        self.mon.calc_id = mon.calc_id
+        self.mon.task_no = mon.task_no
+        self.backurl = mon.backurl
+        self.interval = getattr(mon, 'heartbeat', 0)
+        self.stopped = threading.Event()
+
+    def __enter__(self):
+        if self.interval:
+            self.start()
+        return self
+
+    def __exit__(self, etype, exc, tb):
+        if self.interval:
+            self.stopped.set()
+            self.join()
+
+    def run(self):
+        info = (socket.gethostname(), os.getpid())
+        with Socket(self.backurl, zmq.PUSH, 'connect') as zsocket:
+            while True:
+                zsocket.send(Result(info, self.mon, msg='HEARTBEAT'))
+                if self.stopped.wait(self.interval):
+                    break
+
+
 def safely_call(func, args, task_no=0, mon=dummy_mon):
     """
     Call the given function with the given arguments safely, i.e.
@@ -469,13 +585,15 @@ def safely_call(func, args, task_no=0, mon=dummy_mon):
     if mon is dummy_mon:  # in the DbServer
         assert not isgenfunc, func
         return Result.new(func, args, mon)
-    mon = mon.new(operation='total ' + func.__name__, measuremem=True)
+    mon = mon.new(operation='total ' + func.__name__, measuremem=True,
+                  sampling_interval=mon.sampling_interval)
     mon.weight = getattr(args[0], 'weight', 1.)  # used in task_info
     mon.task_no = task_no
     if mon.inject:
         args += (mon,)
-    sentbytes = 0
-    with Socket(mon.backurl, zmq.PUSH, 'connect') as zsocket:
+    sentbytes = rawbytes = 0
+    with Socket(mon.backurl, zmq.PUSH, 'connect') as zsocket, \
+            Heartbeat(mon):
         msg = check_mem_usage()  # warn if too much memory is used
         if msg:
             zsocket.send(Result(None, mon, msg=msg))
@@ -487,14 +605,16 @@ def safely_call(func, args, task_no=0, mon=dummy_mon):
             it = gen(*args)
         while True:
             # StopIteration -> TASK_ENDED
-            res = Result.new(next, (it,), mon, sentbytes)
+            res = Result.new(next, (it,), mon, sentbytes, rawbytes)
             try:
                 zsocket.send(res)
             except Exception:  # like OverflowError
                 _etype, exc, tb = sys.exc_info()
                 err = Result(exc, mon, ''.join(traceback.format_tb(tb)))
                 zsocket.send(err)
-            sentbytes += len(res.pik)
+            sent, raw = res.get_sizes()
+            sentbytes += sent
+            rawbytes += raw
             if res.msg == 'TASK_ENDED':
                 break
 
@@ -547,6 +667,10 @@ class IterResult(object):
             elif isinstance(result, Result):
                 val = result.get()
                 self.nbytes += result.nbytes
+                if result.msg != 'TASK_ENDED':  # the sizes are in task_info
+                    sent, raw = result.get_sizes()
+                    self.received += sent
+                    self.uncompressed += raw
             else:  # this should never happen
                 raise ValueError(result)
             if sys.platform != 'darwin':
@@ -573,6 +697,7 @@ class IterResult(object):
             return ()
         t0 = time.time()
         self.nbytes = AccumDict()
+        self.received = self.uncompressed = 0
         try:
             yield from self._iter()
         finally:
@@ -581,6 +706,11 @@ class IterResult(object):
             msg = nb if len(nb) < 10 else {
                 'tot': humansize(sum(self.nbytes.values()))}
             logging.info('Received %s in %d seconds', msg, time.time() - t0)
+            if self.received < self.uncompressed:
+                logging.info('Transferred %s instead of %s, compression '
+                             'ratio %.2f', humansize(self.received),
+                             humansize(self.uncompressed),
+                             self.uncompressed / self.received)
 
     def reduce(self, agg=operator.add, acc=None):
         if acc is None:
@@ -606,6 +736,72 @@ class IterResult(object):
         return res
 
 
+class TaskTracker(object):
+    """
+    Keep track of the tasks submitted to the zmq workers and of the last
+    time a message was received from them, to detect the lost tasks, i.e.
+    the tasks which were running on a worker killed by the OOM killer or
+    on a node which disappeared.
+
+    :param heartbeat: interval in seconds between the heartbeats of a task
+    :param max_retries: how many times a lost task can be resubmitted
+    """
+    missed = 6  # a task is lost after missing 6 heartbeats
+
+    def __init__(self, heartbeat, max_retries):
+        self.timeout = heartbeat * self.missed
+        self.max_retries = max_retries
+        self.tasks = {}  # task_no -> task dictionary
+        self.last = time.time()  # time of the last message from any task
+
+    def add(self, task_no, func, args, monitor, retries=0):
+        """
+        Register a submitted task
+        """
+        self.tasks[task_no] = dict(
+            func=func, args=args, monitor=monitor, retries=retries,
+            seen=None, outputs=0, host='')
+        self.last = time.time()
+
+    def update(self, res):
+        """
+        Register a message received from a task.
+
+        :param res: a :class:`Result` instance
+        :returns: False if the task is unknown, i.e. it was declared lost
+        """
+        task = self.tasks.get(res.mon.task_no)
+        if task is None:
+            return False
+        self.last = task['seen'] = time.time()
+        if res.msg == 'HEARTBEAT':
+            task['host'] = '%s:%d' % res.get()
+        elif res.msg == 'TASK_ENDED':
+            del self.tasks[res.mon.task_no]
+        elif not res.msg:  # output or subtask
+            task['outputs'] += 1
+        return True
+
+    def get_lost(self, idle):
+        """
+        A started task is lost if it did not send messages for a while;
+        a task which never started is lost if no task sent messages for
+        a while and the workers are idle, i.e. if the task was queued on a
+        dead worker.
+
+        :param idle: a function returning True if the workers are idle
+        :returns: the numbers of the lost tasks
+        """
+        now = time.time()
+        lost = [task_no for task_no, task in self.tasks.items()
+                if task['seen'] and now - task['seen'] > self.timeout]
+        waiting = [task_no for task_no, task in self.tasks.items()
+                   if task['seen'] is None]
+        if waiting and now - self.last > self.timeout and idle():
+            lost.extend(waiting)
+        return lost
+
+
 def init_workers():
     """Waiting function, used to wake up the process pool"""
     setproctitle('oq-worker')
@@ -636,6 +832,8 @@ class Starmap(object):
     # use only the "visible" cores, not the total system cores
     # if the underlying OS supports it (macOS does not)
     num_cores = None
+    # interval in seconds for the sampling profiler (0 means no profiling)
+    sampling_interval = 0
 
     @classmethod
     def init(cls, poolsize=None, distribute=None):
@@ -740,13 +938,26 @@ class Starmap(object):
         self.receiver = 'tcp://%s:%s' % (
             config.dbserver.listen, config.dbserver.receiver_ports)
         self.monitor.backurl = None  # overridden later
+        self.monitor.sampling_interval = float(
+            os.environ.get('OQ_SAMPLING', self.sampling_interval))
+        if self.distribute in ('zmq', 'celery', 'dask'):
+            self.monitor.compression = config.distribution.get(
+                'compression', 'zlib')
+        else:  # on a single machine compressing is slower than copying
+            self.monitor.compression = ''
         self.tasks = []  # populated by .submit
         self.task_no = 0
         self.t0 = time.time()
+        self.monitor.heartbeat = 0
         if self.distribute == 'zmq':  # add a check
             err = workerpool.check_status()
             if err:
                 raise RuntimeError(err)
+            self.monitor.heartbeat = float(
+                config.zworkers.get('heartbeat', 0))
+            self.tracker = TaskTracker(
+                self.monitor.heartbeat,
+                int(config.zworkers.get('max_retries', 0)))
 
     def log_percent(self):
         """
@@ -787,7 +998,7 @@ class Starmap(object):
             pickled = isinstance(args[0], Pickled)
             if not pickled:
                 assert not isinstance(args[-1], Monitor)  # sanity check
-                args = pickle_sequence(args)
+                args = pickle_sequence(args, monitor.compression)
             if func is None:
                 fname = self.task_func.__name__
                 argnames = self.argnames[:-1]
@@ -836,6 +1047,50 @@ class Starmap(object):
                 self.submit(args, func=func)
                 self.todo += 1
 
+    def _receive(self):
+        # yield the results received from the tasks; with heartbeats
+        # the lost tasks are looked for every heartbeat seconds
+        interval = self.monitor.heartbeat
+        if not interval:
+            yield from self.socket
+            return
+        checked = time.time()
+        while True:
+            if self.socket.zsocket.poll(interval * 1000):
+                res = self.socket.recv()
+                if self.calc_id != res.mon.calc_id:
+                    yield res  # discarded by _loop
+                elif not self.tracker.update(res):
+                    logging.debug('Discarding a message from the lost task '
+                                  '#%d', res.mon.task_no)
+                elif res.msg != 'HEARTBEAT':
+                    yield res
+            if time.time() - checked > interval:
+                checked = time.time()
+                for task_no in self.tracker.get_lost(self._idle):
+                    self._resubmit(task_no)
+
+    def _idle(self):
+        # True if the zmq workers are not executing any task
+        health = workerpool.WorkerMaster(**config.zworkers).health()
+        return bool(health) and not any(row[4] for row in health)
+
+    def _resubmit(self, task_no):
+        # resubmit a lost task, if it did not send any output yet
+        task = self.tracker.tasks.pop(task_no)
+        host = task['host'] or 'a dead worker'
+        if task['outputs']:
+            raise RuntimeError(
+                'Task #%d was lost on %s after sending %d outputs, it cannot '
+                'be resubmitted' % (task_no, host, task['outputs']))
+        elif task['retries'] >= self.tracker.max_retries:
+            raise RuntimeError('Task #%d was lost on %s after %d retries' %
+                               (task_no, host, task['retries']))
+        logging.warning('Task #%d was lost on %s, resubmitting it as #%d',
+                        task_no, host, self.task_no)
+        self.submit(task['args'], task['func'], task['monitor'])
+        self.tracker.tasks[self.task_no - 1]['retries'] = task['retries'] + 1
+
     def _loop(self):
         num_cores = self.num_cores or CT // 2
         if self.task_queue:
@@ -851,7 +1106,7 @@ class Starmap(object):
             logging.info('Sent %d tasks, %s in %d seconds', len(self.tasks),
                          humansize(nbytes), time.time() - self.t0)
 
-        isocket = iter(self.socket)
+        isocket = self._receive()
         self.todo = len(self.tasks)
         while self.todo:
             self.log_percent()
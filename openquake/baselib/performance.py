@@ -17,8 +17,11 @@
 # along with OpenQuake.  If not, see <http://www.gnu.org/licenses/>.
 
 import os
+import sys
 import time
 import pickle
+import threading
+import collections
 import getpass
 import operator
 import itertools
@@ -39,7 +42,13 @@ perf_dt = numpy.dtype([('operation', '<S50'), ('time_sec', float),
 task_info_dt = numpy.dtype(
     [('taskname', '<S50'), ('task_no', numpy.uint32),
      ('weight', numpy.float32), ('duration', numpy.float32),
-     ('received', numpy.int64), ('mem_gb', numpy.float32)])
+     ('received', numpy.int64), ('uncompressed', numpy.int64),
+     ('mem_gb', numpy.float32)])
+# folded stacks longer than that are truncated on the side of the root
+MAX_STACK_LEN = 1000
+stack_dt = numpy.dtype([('stack', '<S%d' % MAX_STACK_LEN),
+                        ('samples', numpy.uint32),
+                        ('task_no', numpy.uint32)])
 
 
 def init_performance(hdf5file, swmr=False):
@@ -54,6 +63,8 @@ def init_performance(hdf5file, swmr=False):
         hdf5.create(h5, 'task_info', task_info_dt)
     if 'task_sent' not in h5:
         h5['task_sent'] = '{}'
+    if 'performance_stacks' not in h5:
+        hdf5.create(h5, 'performance_stacks', stack_dt, compression='gzip')
     if swmr:
         try:
             h5.swmr_mode = True
@@ -88,6 +99,87 @@ def performance_view(dstore):
     return numpy.array(out, dtlist)
 
 
+def stacks_view(dstore):
+    """
+    :returns: a Counter folded stack -> number of samples, over all tasks
+    """
+    stacks = collections.Counter()
+    if 'performance_stacks' not in dstore:  # old datastore
+        return stacks
+    dset = dstore['performance_stacks']
+    dset.refresh()
+    for rec in dset[()]:
+        stacks[rec['stack'].decode('utf8')] += int(rec['samples'])
+    return stacks
+
+
+def _frame_name(code, cache={}):
+    try:
+        return cache[code]
+    except KeyError:
+        name = cache[code] = '%s:%s' % (
+            os.path.splitext(os.path.basename(code.co_filename))[0],
+            code.co_name)
+        return name
+
+
+def _frames(frame):
+    # list of code objects from the root to the given frame
+    codes = []
+    while frame is not None:
+        codes.append(frame.f_code)
+        frame = frame.f_back
+    codes.reverse()
+    return codes
+
+
+class StackSampler(threading.Thread):
+    """
+    A thread sampling at regular intervals the stack of another thread
+    and counting the folded stacks, i.e. strings of the form
+    "root;module:function;...;module:function". The overhead is small,
+    since the sampled thread is never stopped or traced.
+
+    :param interval: sampling interval in seconds
+    :param thread_id: identifier of the thread to sample
+    :param root: name of the root frame of the folded stacks
+    :param skip: number of outer frames to discard
+    """
+    def __init__(self, interval, thread_id, root, skip=0):
+        super().__init__(daemon=True)
+        self.interval = interval
+        self.thread_id = thread_id
+        self.root = root
+        self.skip = skip
+        self.samples = collections.Counter()  # tuple of codes -> counts
+        self.done = threading.Event()
+
+    def run(self):
+        while not self.done.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is None:
+                continue
+            codes = tuple(_frames(frame)[self.skip:])
+            # discard the samples taken while entering/exiting the monitor
+            if codes and codes[0] not in (Monitor.__enter__.__code__,
+                                          Monitor.__exit__.__code__):
+                self.samples[codes] += 1
+
+    def stop(self):
+        """
+        Stop the sampling and return a Counter folded stack -> samples
+        """
+        self.done.set()
+        self.join()
+        stacks = collections.Counter()
+        for codes, n in self.samples.items():
+            stack = ';'.join([self.root] + [_frame_name(c) for c in codes])
+            if len(stack) > MAX_STACK_LEN:
+                stack = '...' + stack[3 - MAX_STACK_LEN:]
+            stacks[stack] += n
+        return stacks
+
+
 def _pairs(items):
     lst = []
     for name, value in items:
@@ -132,10 +224,16 @@ class Monitor(object):
     NB: if the .address attribute is set, it is possible for the monitor to
     send commands to that address, assuming there is a
     :class:`multiprocessing.connection.Listener` listening.
+
+    If the .sampling_interval attribute is positive, the stack of the
+    thread running the `with` block is sampled at that interval (in
+    seconds) and the folded stacks are accumulated in the .stacks
+    attribute, a Counter which is saved in `performance_stacks` by .flush.
     """
     address = None
     authkey = None
     calc_id = None
+    sampling_interval = 0
 
     def __init__(self, operation='', measuremem=False, inner_loop=False,
                  h5=None):
@@ -151,6 +249,7 @@ class Monitor(object):
         self.address = None
         self.username = getpass.getuser()
         self.task_no = -1  # overridden in parallel
+        self.stacks = collections.Counter()
 
     @property
     def dt(self):
@@ -192,10 +291,20 @@ class Monitor(object):
         self._start_time = time.time()
         if self.measuremem:
             self.start_mem = self.measure_mem()
+        if self.sampling_interval:
+            # discard the frames above the `with` block
+            skip = len(_frames(sys._getframe(1)))
+            self._sampler = StackSampler(
+                self.sampling_interval, threading.get_ident(),
+                self.operation.replace('total ', ''), skip)
+            self._sampler.start()
         return self
 
     def __exit__(self, etype, exc, tb):
         self.exc = exc
+        if self.sampling_interval:
+            self.stacks.update(self._sampler.stop())
+            del self._sampler  # threads cannot be pickled
         if self.measuremem:
             self.stop_mem = self.measure_mem()
             self.mem += self.stop_mem - self.start_mem
@@ -215,7 +324,7 @@ class Monitor(object):
         :param mem_gb: memory consumption at the saving time (optional)
         """
         t = (name, self.task_no, self.weight, self.duration, len(res.pik),
-             mem_gb)
+             res.pik.raw_size, mem_gb)
         data = numpy.array([t], task_info_dt)
         hdf5.extend(h5['task_info'], data)
         h5['task_info'].flush()  # notify the reader
@@ -240,6 +349,13 @@ class Monitor(object):
                 lst.append(child.get_data())
                 child.reset()
             data = numpy.concatenate(lst)
+        if self.stacks and 'performance_stacks' in h5:
+            stacks = numpy.array(
+                [(stack.encode('utf8'), n, max(self.task_no, 0))
+                 for stack, n in self.stacks.items()], stack_dt)
+            hdf5.extend(h5['performance_stacks'], stacks)
+            h5['performance_stacks'].flush()
+            self.stacks.clear()
         if len(data) == 0:  # no information
             return
         hdf5.extend(h5['performance_data'], data)
@@ -261,7 +377,9 @@ class Monitor(object):
         """
         new = object.__new__(self.__class__)
         vars(new).update(vars(self), operation=operation, children=[],
-                         counts=0, mem=0, duration=0)
+                         counts=0, mem=0, duration=0, sampling_interval=0,
+                         stacks=collections.Counter())
+        vars(new).pop('_sampler', None)  # the sampler of the parent
         vars(new).update(kw)
         return new
 
@@ -136,3 +136,27 @@ class DataStoreTestCase(unittest.TestCase):
         print(df)
         df = self.dstore.read_df('df', 'eid')
         print(df)
+
+    def test_read_df_sel(self):
+        sids = numpy.arange(1000) // 10  # sorted
+        eids = numpy.arange(1000) % 10
+        vals = numpy.arange(1000) * .1
+        self.dstore['df/sid'] = sids
+        self.dstore['df/eid'] = eids
+        self.dstore['df/val'] = vals
+        self.dstore.getitem('df').attrs['__pdcolumns__'] = 'sid eid val'
+        self.dstore.store_minmax('df', 'sid', 'eid', blocksize=100)
+        minmax = self.dstore['df/sid.minmax'][()]
+        self.assertEqual(minmax.shape, (10, 2))
+        self.assertEqual(list(minmax[3]), [30, 39])
+        for sel, ok in [({'sid': 42}, sids == 42),
+                        ({'sid': (35, 61), 'eid': 3},
+                         (sids >= 35) & (sids < 61) & (eids == 3)),
+                        ({'sid': [1, 99, 50]}, numpy.isin(sids, [1, 99, 50])),
+                        ({'sid': (None, 7), 'eid': {2, 4}},
+                         (sids < 7) & numpy.isin(eids, [2, 4])),
+                        ({'sid': 1000}, sids == 1000)]:
+            df = self.dstore.read_df('df', 'sid', sel=sel, columns=['val'])
+            self.assertEqual(list(df.columns), ['val'])
+            numpy.testing.assert_equal(df.index.to_numpy(), sids[ok])
+            numpy.testing.assert_equal(df.val.to_numpy(), vals[ok])
@@ -58,6 +58,10 @@ def supertask(text, monitor):
             yield get_length, k * v
 
 
+def double(array, monitor):
+    return array * 2
+
+
 def countletters(text1, text2, monitor):
     for block in general.block_splitter(text1 + text2, 5):
         yield get_length, ''.join(block)
@@ -143,6 +147,28 @@ class StarmapTestCase(unittest.TestCase):
             self.assertGreater(dic[b'supertask'], 0)
         shutil.rmtree(tmpdir)
 
+    def test_compression(self):
+        arrays = [numpy.zeros(1000000), numpy.ones(1000000)]  # 8 MB each
+        tmpdir = tempfile.mkdtemp()
+        tmp = os.path.join(tmpdir, 'calc_1.hdf5')
+        performance.init_performance(tmp, swmr=True)
+        smap = parallel.Starmap(double, [(arr,) for arr in arrays],
+                                h5=hdf5.File(tmp, 'a'))
+        smap.monitor.compression = 'zlib'
+        tot = 0
+        for res in smap:
+            res += 1  # the received arrays must be writeable
+            tot += res.sum()
+        smap.h5.close()
+        self.assertEqual(tot, 4000000)
+        with hdf5.File(tmp, 'r') as h5:
+            info = h5['task_info'][()]
+            self.assertEqual(len(info), 2)
+            # the results are compressed by more than 100 times
+            self.assertTrue((info['uncompressed'] >
+                             info['received'] * 100).all())
+        shutil.rmtree(tmpdir)
+
     def test_countletters(self):
         data = [('hello', 'world'), ('ciao', 'mondo')]
         smap = parallel.Starmap(countletters, data)
@@ -153,6 +179,27 @@ class StarmapTestCase(unittest.TestCase):
         parallel.Starmap.shutdown()
 
 
+class TaskTrackerTestCase(unittest.TestCase):
+    def test(self):
+        # a task is lost after 6 missing heartbeats, i.e. .06 seconds
+        tracker = parallel.TaskTracker(heartbeat=.01, max_retries=1)
+        mon = performance.Monitor('total get_length')
+        for task_no in (0, 1):
+            tracker.add(task_no, get_length, ('aa',), mon)
+        mon0 = mon.new(mon.operation, task_no=0)
+        tracker.update(parallel.Result(('host', 123), mon0, msg='HEARTBEAT'))
+        self.assertEqual(tracker.tasks[0]['host'], 'host:123')
+        time.sleep(.1)
+        # task 0 is silent and the task 1 never started
+        self.assertEqual(tracker.get_lost(idle=lambda: False), [0])
+        self.assertEqual(tracker.get_lost(idle=lambda: True), [0, 1])
+        tracker.update(parallel.Result(None, mon0, msg='TASK_ENDED'))
+        self.assertEqual(list(tracker.tasks), [1])
+        # messages from unknown tasks are discarded
+        mon5 = mon.new(mon.operation, task_no=5)
+        self.assertFalse(tracker.update(parallel.Result(None, mon5)))
+
+
 class ThreadPoolTestCase(unittest.TestCase):
     def test(self):
         with mock.patch.dict(os.environ, {'OQ_DISTRIBUTE': 'threadpool'}):
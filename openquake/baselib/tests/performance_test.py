@@ -60,3 +60,18 @@ class MonitorTestCase(unittest.TestCase):
 
     def test_pickleable(self):
         pickle.loads(pickle.dumps(self.mon))
+
+    def test_sampling(self):
+        def busy(secs):
+            t0 = time.time()
+            while time.time() - t0 < secs:
+                pass
+
+        mon = Monitor('total busy')
+        mon.sampling_interval = .005
+        with mon:
+            busy(.2)
+        pickle.loads(pickle.dumps(mon))  # the sampler is not stored
+        [(stack, samples)] = mon.stacks.most_common(1)
+        self.assertEqual(stack, 'busy;performance_test:busy')
+        self.assertGreater(samples, 10)
@@ -16,7 +16,10 @@
 # You should have received a copy of the GNU Affero General Public License
 # along with OpenQuake.  If not, see <http://www.gnu.org/licenses/>.
 
+import os
 import time
+import signal
+import tempfile
 import unittest
 from openquake.baselib import config
 from openquake.baselib.workerpool import WorkerMaster
@@ -28,6 +31,14 @@ def double(x):
     return 2 * x
 
 
+def die_once(fname):
+    # the worker is killed the first time, as if by the OOM killer
+    if not os.path.exists(fname):
+        open(fname, 'w').close()
+        os.kill(os.getpid(), signal.SIGKILL)
+    return 1
+
+
 class WorkerPoolTestCase(unittest.TestCase):
     @classmethod
     def setUpClass(cls):
@@ -38,6 +49,7 @@ class WorkerPoolTestCase(unittest.TestCase):
             raise unittest.SkipTest('The task streamer is off')
         cls.master = WorkerMaster(cls.z['ctrl_port'], host_cores)
         cls.master.start()
+        cls.master.wait()
 
     def test(self):
         iterargs = ((i,) for i in range(10))
@@ -48,6 +60,23 @@ class WorkerPoolTestCase(unittest.TestCase):
     def test_status(self):
         time.sleep(1)  # wait a bit for the workerpool to start
         self.assertEqual(self.master.status(), [('127.0.0.1', 'running')])
+        health = self.master.health()
+        self.assertEqual(len(health), 4)
+        self.assertEqual({row[2] for row in health}, {'running'})
+
+    def test_lost_tasks(self):
+        tmpdir = tempfile.mkdtemp()
+        fnames = [os.path.join(tmpdir, 'die%d' % i) for i in range(2)]
+        config.zworkers['heartbeat'] = '.5'  # lost after 3 seconds
+        try:
+            smap = Starmap(die_once, [(fname,) for fname in fnames],
+                           distribute='zmq')
+            self.assertEqual(sum(res for res in smap), 2)
+        finally:
+            config.zworkers['heartbeat'] = self.z['heartbeat']
+        # the killed workers have been restarted
+        restarts = sum(row[3] for row in self.master.health())
+        self.assertGreaterEqual(restarts, 2)
 
     @classmethod
     def tearDownClass(cls):
@@ -5,6 +5,7 @@ import signal
 import shutil
 import logging
 import tempfile
+import threading
 import subprocess
 import multiprocessing
 import psutil
@@ -56,8 +57,10 @@ class WorkerMaster(object):
     :param remote_python: path of the Python executable on the remote hosts
     """
     def __init__(self, ctrl_port=config.zworkers.ctrl_port, host_cores=None,
-                 remote_python=None, receiver_ports=None):
-        # NB: receiver_ports is not used but needed for compliance
+                 remote_python=None, receiver_ports=None, heartbeat=None,
+                 max_retries=None):
+        # NB: receiver_ports, heartbeat and max_retries are used by the
+        # Starmap, not here, but they are needed for compliance
         self.ctrl_port = int(ctrl_port)
         self.host_cores = ([hc.split() for hc in host_cores.split(',')]
                            if host_cores else [])
@@ -160,6 +163,22 @@ class WorkerMaster(object):
         self.popens = []
         return 'killed %s' % killed
 
+    def health(self):
+        """
+        :returns: a list of tuples (host, pid, status, restarts, task, mem_mb)
+                  with the health of each worker process
+        """
+        rows = []
+        for host, _ in self.host_cores:
+            if self.status(host)[0][1] == 'not-running':
+                rows.append((host, 0, 'not-running', 0, '', 0.))
+                continue
+            ctrl_url = 'tcp://%s:%s' % (host, self.ctrl_port)
+            with z.Socket(ctrl_url, z.zmq.REQ, 'connect') as sock:
+                for row in sock.send('get_health'):
+                    rows.append((host,) + row)
+        return rows
+
     def inspect(self):
         executing = []
         for host, _ in self.host_cores:
@@ -190,7 +209,8 @@ def worker(sock, executing):
     with sock:
         for cmd, args, taskno, mon in sock:
             fname = os.path.join(executing, '%s-%s' % (mon.calc_id, taskno))
-            open(fname, 'w').close()
+            with open(fname, 'w') as f:
+                f.write(str(os.getpid()))
             parallel.safely_call(cmd, args, taskno, mon)
             os.remove(fname)
 
@@ -198,7 +218,8 @@ def worker(sock, executing):
 class WorkerPool(object):
     """
     A pool of workers accepting the command 'stop' and 'kill' and reading
-    tasks to perform from the task_server_url.
+    tasks to perform from the task_server_url. The worker processes dying
+    unexpectedly (for instance killed by the OOM killer) are restarted.
 
     :param ctrl_url: zmq address of the control socket
     :param num_workers: the number of workers (or -1)
@@ -225,13 +246,12 @@ class WorkerPool(object):
         print('Starting ' + title, file=sys.stderr)
         setproctitle(title)
         # start workers
-        self.workers = []
-        for _ in range(self.num_workers):
-            sock = z.Socket(self.task_server_url, z.zmq.PULL, 'connect')
-            sock.proc = multiprocessing.Process(
-                target=worker, args=(sock, self.executing))
-            sock.proc.start()
-            self.workers.append(sock)
+        self.workers = [self.start_worker() for _ in range(self.num_workers)]
+        self.lock = threading.Lock()
+        self.stopping = threading.Event()
+        self.watchdog = threading.Thread(
+            target=self.check_workers, daemon=True)
+        self.watchdog.start()
 
         # start control loop accepting the commands stop and kill
         with z.Socket(self.ctrl_url, z.zmq.REP, 'bind') as ctrlsock:
@@ -246,12 +266,84 @@ class WorkerPool(object):
                     ctrlsock.send(self.num_workers)
                 elif cmd == 'get_executing':
                     ctrlsock.send(' '.join(sorted(os.listdir(self.executing))))
+                elif cmd == 'get_health':
+                    ctrlsock.send(self.get_health())
         shutil.rmtree(self.executing)
 
+    def start_worker(self, restarts=0):
+        """
+        Start a worker process reading from the task server
+
+        :param restarts: number of times the worker was restarted
+        :returns: a zeromq.Socket with attributes .proc and .restarts
+        """
+        sock = z.Socket(self.task_server_url, z.zmq.PULL, 'connect')
+        sock.proc = multiprocessing.Process(
+            target=worker, args=(sock, self.executing))
+        sock.proc.start()
+        sock.restarts = restarts
+        return sock
+
+    def get_executing(self):
+        """
+        :returns: a dictionary pid -> calc_id-task_no for the running tasks
+        """
+        executing = {}
+        for fname in os.listdir(self.executing):
+            try:
+                with open(os.path.join(self.executing, fname)) as f:
+                    pid = f.read()
+            except FileNotFoundError:  # the task just ended
+                continue
+            if pid:  # empty if the worker has not written it yet
+                executing[int(pid)] = fname
+        return executing
+
+    def check_workers(self, interval=1):
+        """
+        Restart the dead worker processes every `interval` seconds,
+        until the pool is stopped
+        """
+        while not self.stopping.wait(interval):
+            with self.lock:
+                executing = self.get_executing()
+                for i, sock in enumerate(self.workers):
+                    if sock.proc.is_alive():
+                        continue
+                    pid = sock.proc.pid
+                    task = executing.get(pid)
+                    if task:  # the task is lost, the master will notice
+                        os.remove(os.path.join(self.executing, task))
+                    logging.warning('Worker %d died with exit code %s while '
+                                    'running %s, restarting it', pid,
+                                    sock.proc.exitcode, task or 'nothing')
+                    self.workers[i] = self.start_worker(sock.restarts + 1)
+
+    def get_health(self):
+        """
+        :returns: a list of tuples (pid, status, restarts, task, mem_mb),
+                  one per worker process
+        """
+        rows = []
+        with self.lock:
+            executing = self.get_executing()
+            for sock in self.workers:
+                pid = sock.proc.pid
+                try:
+                    mem_mb = psutil.Process(pid).memory_info().rss / 1024**2
+                except psutil.Error:  # the process just died
+                    mem_mb = 0.
+                status = 'running' if sock.proc.is_alive() else 'dead'
+                rows.append((pid, status, sock.restarts,
+                             executing.get(pid, ''), mem_mb))
+        return rows
+
     def stop(self):
         """
         Send a SIGTERM to all worker processes
         """
+        self.stopping.set()
+        self.watchdog.join()
         for sock in self.workers:
             os.kill(sock.proc.pid, signal.SIGTERM)
         for sock in self.workers:
@@ -262,6 +354,8 @@ class WorkerPool(object):
         """
         Send a SIGKILL to all worker processes
         """
+        self.stopping.set()
+        self.watchdog.join()
         for sock in self.workers:
             os.kill(sock.proc.pid, signal.SIGKILL)
         for sock in self.workers:
@@ -18,9 +18,13 @@
 import re
 import zmq
 import time
+import pickle
 import logging
 
 context = zmq.Context()
+# buffers smaller than that are pickled in-band, the others are sent
+# out-of-band as separate frames, without copying them into the pickle
+MIN_OOB_SIZE = 65536
 
 # from integer socket_type to string
 SOCKTYPE = {zmq.REQ: 'REQ', zmq.REP: 'REP',
@@ -56,6 +60,35 @@ def connect(end_point, socket_type):
     return sock
 
 
+def _in_band(buf):
+    # buffer_callback returning True means "serialize the buffer in-band"
+    return buf.raw().nbytes < MIN_OOB_SIZE
+
+
+def dumps(obj):
+    """
+    Pickle an object into a list of frames: the first frame is the pickle
+    stream, the others are the large buffers (like the ones of numpy arrays
+    or of :class:`openquake.baselib.parallel.Pickled` objects) which are
+    serialized out-of-band with protocol 5, when available.
+    """
+    if pickle.HIGHEST_PROTOCOL < 5:  # Python < 3.8
+        return [pickle.dumps(obj, pickle.HIGHEST_PROTOCOL)]
+    buffers = []
+    pik = pickle.dumps(obj, 5, buffer_callback=lambda buf: _in_band(buf)
+                       or buffers.append(buf))
+    return [pik] + [buf.raw() for buf in buffers]
+
+
+def loads(frames):
+    """
+    Unpickle a list of frames generated by :func:`dumps`
+    """
+    if len(frames) == 1:
+        return pickle.loads(frames[0])
+    return pickle.loads(frames[0], buffers=frames[1:])
+
+
 class Socket(object):
     """
     A Socket class to be used with code like the following::
@@ -133,7 +166,7 @@ class Socket(object):
         while self.running:
             try:
                 if self.zsocket.poll(self.timeout):
-                    yield self.zsocket.recv_pyobj()
+                    yield self.recv()
                 elif self.socket_type == zmq.PULL:
                     logging.debug('Waiting on %s:%d', self, self.port)
             except zmq.ZMQError:
@@ -149,13 +182,21 @@ class Socket(object):
             the Python object to send
         """
         try:
-            self.zsocket.send_pyobj(obj)
+            self.zsocket.send_multipart(dumps(obj), copy=False)
         except Exception as exc:
             # usual for objects bigger than 4 GB
             raise exc.__class__('%s: %r' % (exc, obj))
         self.num_sent += 1
         if self.socket_type == zmq.REQ:
-            return self.zsocket.recv_pyobj()
+            return self.recv()
+
+    def recv(self):
+        """
+        Receive a multipart message and unpickle it; the out-of-band
+        buffers are not copied, so the received arrays are read-only
+        """
+        frames = self.zsocket.recv_multipart(copy=False)
+        return loads([frame.buffer for frame in frames])
 
     def __repr__(self):
         return '<%s %s %s>' % (self.__class__.__name__,
@@ -0,0 +1,146 @@
+# -*- coding: utf-8 -*-
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+#
+# Copyright (C) 2020 GEM Foundation
+#
+# OpenQuake is free software: you can redistribute it and/or modify it
+# under the terms of the GNU Affero General Public License as published
+# by the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# OpenQuake is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with OpenQuake. If not, see <http://www.gnu.org/licenses/>.
+"""
+The benchmark suite of the engine, used by `oq bench`. There are two
+kinds of benchmarks:
+
+- micro-benchmarks of the core kernels (:mod:`openquake.bench.micro`)
+- macro-benchmarks running full calculations over some demos and QA
+  tests (:mod:`openquake.bench.macro`), recording the time, the memory
+  and the counts of each phase of the calculation and the number of tasks
+
+The results of each run are appended to a history file in JSON lines
+format and they can be compared with a baseline, i.e. a previous run.
+"""
+import os
+import sys
+import json
+import socket
+from datetime import datetime
+
+import numpy
+from scipy import stats
+
+from openquake.baselib import __version__
+from openquake.baselib.performance import memory_rss
+
+try:
+    import resource
+except ImportError:  # on Windows
+    resource = None
+
+MB = 1024 * 1024
+
+
+def peak_rss_mb():
+    """
+    :returns: the peak resident memory of the current process and its
+              children in MB (or the current memory on Windows)
+    """
+    if resource is None:
+        return memory_rss(os.getpid()) / MB
+    peak = max(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+               resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss)
+    # ru_maxrss is in bytes on macOS and in kilobytes on Linux
+    return peak / MB if sys.platform == 'darwin' else peak / 1024
+
+
+def save_run(fname, micro=None, macro=None):
+    """
+    Append the results of a run to the history file
+
+    :param fname: path to a file in JSON lines format
+    :param micro: results of the micro-benchmarks (or None)
+    :param macro: results of the macro-benchmarks (or None)
+    :returns: the saved record
+    """
+    rec = dict(date=datetime.now().isoformat()[:19], version=__version__,
+               hostname=socket.gethostname(), micro=micro or {},
+               macro=macro or {})
+    with open(fname, 'a') as f:
+        f.write(json.dumps(rec) + '\n')
+    return rec
+
+
+def load_run(fname, index=-1):
+    """
+    :param fname: path to a history file in JSON lines format
+    :param index: the index of the run in the history (default the last)
+    :returns: the record of the given run
+    """
+    with open(fname) as f:
+        lines = [line for line in f if line.strip()]
+    if not lines:
+        raise ValueError('%s contains no runs' % fname)
+    return json.loads(lines[index])
+
+
+def get_timings(rec):
+    """
+    :param rec: a record returned by `save_run` or `load_run`
+    :returns: a dictionary key -> list of times in seconds, where the key
+              is the name of a micro-benchmark, the name of a
+              macro-benchmark or a string "<macro>|<operation>"
+    """
+    timings = {}
+    for name, res in rec['micro'].items():
+        timings[name] = res['times']
+    for name, res in rec['macro'].items():
+        timings[name] = res['times']
+        for operation, phase in res['phases'].items():
+            timings['%s|%s' % (name, operation)] = phase['time_sec']
+    return timings
+
+
+def compare(rec, baseline, tolerance=.1, alpha=.05, min_time=.01):
+    """
+    Compare the timings of a run with the timings of a baseline.
+    A benchmark is marked as slower (faster) if the ratio of the mean
+    times is above 1 + tolerance (below 1 - tolerance) and the difference
+    is statistically significant, i.e. the p-value of the Welch t-test is
+    below `alpha`; when there is a single timing for the run or for the
+    baseline the t-test is not possible and only the ratio is considered.
+    Timings below `min_time` seconds are too noisy and are ignored.
+
+    :param rec: a record returned by `save_run` or `load_run`
+    :param baseline: another record
+    :returns: a list of tuples (name, base_time, time, ratio, pvalue, status)
+    """
+    new = get_timings(rec)
+    old = get_timings(baseline)
+    rows = []
+    for name in sorted(set(new) & set(old)):
+        base_time = numpy.mean(old[name])
+        time = numpy.mean(new[name])
+        if max(base_time, time) < min_time:
+            continue
+        ratio = time / base_time if base_time else numpy.inf
+        if len(old[name]) > 1 and len(new[name]) > 1:
+            pvalue = stats.ttest_ind(
+                new[name], old[name], equal_var=False).pvalue
+        else:
+            pvalue = numpy.nan
+        significant = numpy.isnan(pvalue) or pvalue < alpha
+        if ratio > 1 + tolerance and significant:
+            status = 'slower'
+        elif ratio < 1 - tolerance and significant:
+            status = 'faster'
+        else:
+            status = 'ok'
+        rows.append((name, base_time, time, ratio, pvalue, status))
+    return rows
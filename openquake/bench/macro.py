@@ -0,0 +1,122 @@
+# -*- coding: utf-8 -*-
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+#
+# Copyright (C) 2020 GEM Foundation
+#
+# OpenQuake is free software: you can redistribute it and/or modify it
+# under the terms of the GNU Affero General Public License as published
+# by the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# OpenQuake is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with OpenQuake. If not, see <http://www.gnu.org/licenses/>.
+"""
+Macro-benchmarks running full calculations. For each phase of the
+calculation (i.e. each operation in `performance_data`) the time,
+the memory and the counts are recorded, together with the number of
+tasks of each kind and the peak memory of the process.
+"""
+import os
+import logging
+
+from openquake.baselib.general import group_array
+from openquake.baselib.performance import performance_view
+from openquake.commonlib import readinput, oqvalidation, logs
+from openquake.calculators import base
+from openquake.bench import peak_rss_mb
+from openquake import qa_tests_data
+
+QA = os.path.dirname(qa_tests_data.__file__)
+# the demos are not installed with the engine, only in the repository
+DEMOS = os.path.join(os.path.dirname(os.path.dirname(QA)), 'demos')
+
+MACRO = {
+    'classical_case_1': os.path.join(QA, 'classical', 'case_1', 'job.ini'),
+    'event_based_case_1': os.path.join(
+        QA, 'event_based', 'case_1', 'job.ini'),
+    'scenario_risk_case_1': os.path.join(
+        QA, 'scenario_risk', 'case_1', 'job_risk.ini'),
+    'event_based_risk_case_1': os.path.join(
+        QA, 'event_based_risk', 'case_1', 'job.ini'),
+    'AreaSourceClassicalPSHA': os.path.join(
+        DEMOS, 'hazard', 'AreaSourceClassicalPSHA', 'job.ini'),
+    'EventBasedPSHA': os.path.join(
+        DEMOS, 'hazard', 'EventBasedPSHA', 'job.ini'),
+    'ScenarioRisk': os.path.join(DEMOS, 'risk', 'ScenarioRisk', 'job.ini'),
+}
+
+
+def get_phases(dstore):
+    """
+    :param dstore: the datastore of a calculation
+    :returns:
+        a dictionary operation -> dict(time_sec, memory_mb, counts) and
+        a dictionary taskname -> number of tasks
+    """
+    phases = {rec[0].decode('utf8'): dict(time_sec=float(rec['time_sec']),
+                                          memory_mb=float(rec['memory_mb']),
+                                          counts=int(rec['counts']))
+              for rec in performance_view(dstore)}
+    tasks = {name.decode('utf8'): len(arr) for name, arr in
+             group_array(dstore['task_info'][()], 'taskname').items()}
+    return phases, tasks
+
+
+def run_calc(job_ini):
+    """
+    Run a calculation without exporting the outputs
+
+    :param job_ini: path to a job.ini file
+    :returns: the output of :func:`get_phases` for the calculation
+    """
+    oqvalidation.OqParam.calculation_mode.validator.choices = tuple(
+        base.calculators)
+    oq = readinput.get_oqparam(job_ini)
+    calc = base.calculators(oq, logs.init())
+    try:
+        calc.run()
+        return get_phases(calc.datastore)
+    finally:
+        calc.datastore.close()
+
+
+def run(names, repeat=1):
+    """
+    Run the given macro-benchmarks. The calculations are repeated
+    `repeat` times and the timings of all the repetitions are recorded.
+
+    :param names: names of the macro-benchmarks
+    :param repeat: number of runs of each calculation
+    :returns: a dictionary name -> {'times': [...], 'phases': {...}, ...}
+    """
+    results = {}
+    for name in names:
+        job_ini = MACRO[name]
+        if not os.path.exists(job_ini):
+            logging.warning('Skipping %s: %s does not exist', name, job_ini)
+            continue
+        times = []
+        phases = {}
+        for _ in range(repeat):
+            phs, tasks = run_calc(job_ini)
+            for operation, phase in phs.items():
+                if operation not in phases:
+                    phases[operation] = dict(
+                        time_sec=[], memory_mb=0, counts=phase['counts'])
+                ph = phases[operation]
+                ph['time_sec'].append(phase['time_sec'])
+                ph['memory_mb'] = max(ph['memory_mb'], phase['memory_mb'])
+            # the operation <Calculator>.run measures the total time; in
+            # presence of a pre-calculator the runs are nested, so the
+            # longest one is the total
+            times.append(max(phase['time_sec'] for op, phase in phs.items()
+                             if op.endswith('.run')))
+        results[name] = dict(
+            times=times, phases=phases, tasks=tasks,
+            peak_rss_mb=peak_rss_mb(), job_ini=job_ini)
+    return results
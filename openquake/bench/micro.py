@@ -0,0 +1,174 @@
+# -*- coding: utf-8 -*-
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+#
+# Copyright (C) 2020 GEM Foundation
+#
+# OpenQuake is free software: you can redistribute it and/or modify it
+# under the terms of the GNU Affero General Public License as published
+# by the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# OpenQuake is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with OpenQuake. If not, see <http://www.gnu.org/licenses/>.
+"""
+Micro-benchmarks for the core kernels of the engine. Each benchmark
+is a function registered in the `micro` dictionary, taking a `size`
+parameter (the number of sites, assets, ...) and returning a callable
+without arguments; only the calls to the callable are timed, the
+setup is not. The inputs are synthetic and fully determined by `size`,
+so that the timings are reproducible.
+"""
+import gc
+import inspect
+import numpy
+
+from openquake.baselib import hdf5, general, performance
+from openquake.hazardlib import const
+from openquake.hazardlib.geo import Point, PlanarSurface
+from openquake.hazardlib.site import SiteCollection
+from openquake.hazardlib.source.rupture import BaseRupture, EBRupture
+from openquake.hazardlib.contexts import ContextMaker
+from openquake.hazardlib.calc.gmf import GmfComputer
+from openquake.hazardlib.gsim.akkar_2014 import AkkarEtAlRjb2014
+from openquake.hazardlib.gsim.boore_atkinson_2008 import BooreAtkinson2008
+from openquake.risklib.scientific import LossesByAsset
+from openquake.bench import peak_rss_mb
+
+F32 = numpy.float32
+micro = general.CallableDict()
+IMTLS = {'PGA': numpy.logspace(-3, 0, 20),
+         'SA(0.3)': numpy.logspace(-3, 0, 20),
+         'SA(1.0)': numpy.logspace(-3, 0, 20)}
+
+
+def get_sitecol(num_sites):
+    """
+    :returns: a SiteCollection with num_sites sites on a regular grid
+    """
+    n = int(numpy.ceil(numpy.sqrt(num_sites)))
+    lons, lats = numpy.meshgrid(numpy.linspace(-1, 1, n),
+                                numpy.linspace(-1, 1, n))
+    sitemodel = numpy.zeros(num_sites, [('vs30', float),
+                                        ('vs30measured', bool),
+                                        ('z1pt0', float), ('z2pt5', float)])
+    sitemodel['vs30'] = numpy.linspace(200, 1000, num_sites)
+    sitemodel['z1pt0'] = 100.
+    sitemodel['z2pt5'] = 1.
+    return SiteCollection.from_points(
+        lons.flat[:num_sites], lats.flat[:num_sites], sitemodel=sitemodel)
+
+
+def get_rupture(mag=6.5):
+    """
+    :returns: a planar rupture at the center of the site grid
+    """
+    surface = PlanarSurface.from_corner_points(
+        Point(-.2, 0, 1), Point(.2, 0, 1), Point(.2, .1, 15),
+        Point(-.2, .1, 15))
+    rup = BaseRupture(mag, 90., const.TRT.ACTIVE_SHALLOW_CRUST,
+                      Point(0, .05, 8), surface)
+    rup.rup_id = 1
+    return rup
+
+
+def get_cmaker(gsims=(AkkarEtAlRjb2014(), BooreAtkinson2008())):
+    """
+    :returns: a ContextMaker for two GSIMs and three IMTs
+    """
+    return ContextMaker(const.TRT.ACTIVE_SHALLOW_CRUST, list(gsims),
+                        dict(imtls=IMTLS, truncation_level=3))
+
+
+@micro.add('make_contexts')
+def bench_make_contexts(size=10000):
+    """
+    Contexts (distances and site parameters) for a rupture and `size` sites
+    """
+    sitecol = get_sitecol(size)
+    rup = get_rupture()
+    cmaker = get_cmaker()
+    return lambda: cmaker.make_ctxs([rup], sitecol, False)
+
+
+@micro.add('get_poes')
+def bench_get_poes(size=10000):
+    """
+    ContextMaker.get_poes for a rupture and `size` sites
+    """
+    cmaker = get_cmaker()
+    [ctx] = cmaker.make_ctxs([get_rupture()], get_sitecol(size), False)
+    return lambda: cmaker.get_poes(ctx)
+
+
+@micro.add('compute_all')
+def bench_compute_all(size=100):
+    """
+    GmfComputer.compute_all for a rupture, `size` sites and 100 events
+    """
+    cmaker = get_cmaker()
+    ebr = EBRupture(get_rupture(), 'src', 0, n_occ=100, id=1)
+    computer = GmfComputer(ebr, get_sitecol(size), cmaker,
+                           truncation_level=3)
+    min_iml = numpy.array([1E-4] * len(IMTLS))
+    rlzs_by_gsim = {gsim: [g] for g, gsim in enumerate(cmaker.gsims)}
+    return lambda: computer.compute_all(min_iml, rlzs_by_gsim)
+
+
+@micro.add('aggregate_losses')
+def bench_aggregate_losses(size=1000):
+    """
+    LossesByAsset.aggregate for `size` assets, 100 events and 10 tags
+    """
+    E = 100
+    rng = numpy.random.RandomState(42)
+    assets = numpy.zeros(size, [('ordinal', numpy.uint32),
+                                ('value-structural', F32)])
+    assets['ordinal'] = numpy.arange(size)
+    assets['value-structural'] = rng.uniform(1E5, 1E6, size)
+    eids = numpy.arange(E, dtype=numpy.uint32)
+    out = hdf5.ArrayWrapper((), dict(
+        eids=eids, assets=assets, loss_types=['structural'],
+        structural=rng.uniform(0, .1, (size, E)).astype(F32)))
+    tagidxs = rng.randint(1, 11, (size, 1))
+    ws = numpy.ones(E) / E
+
+    def aggregate():
+        lba = LossesByAsset(assets, ['structural'])
+        lba.alt = general.AccumDict(
+            accum=general.AccumDict(accum=numpy.zeros(1, F32)))
+        lba.losses_by_E = general.AccumDict(accum=numpy.zeros(1, F32))
+        return lba.aggregate(out, eids, [1E3], tagidxs, ws)
+    return aggregate
+
+
+def run(names, size=None, repeat=5):
+    """
+    Run the given micro-benchmarks. Each benchmark is called once to
+    warm up the caches and then `repeat` times.
+
+    :param names: names of the micro-benchmarks
+    :param size: if given, overrides the default size of the benchmarks
+    :param repeat: number of timed calls
+    :returns: a dictionary name -> {'times': [...], 'mem_mb': ..., ...}
+    """
+    results = {}
+    for name in names:
+        size_ = size or inspect.signature(
+            micro[name]).parameters['size'].default
+        func = micro[name](size_)
+        func()  # warm up
+        gc.collect()
+        mon = performance.Monitor(name, measuremem=True)
+        times = []
+        for _ in range(repeat):
+            with mon:
+                func()
+            times.append(mon.dt)
+        results[name] = dict(times=times, mem_mb=mon.mem / 1024 / 1024,
+                             peak_rss_mb=peak_rss_mb(), size=size_)
+    return results
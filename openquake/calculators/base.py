@@ -116,11 +116,13 @@ def fix_ones(pmap):
     is a log(0) in
     :class:`openquake.risklib.scientific.annual_frequency_of_exceedence`).
     Here we solve the issue by replacing the unphysical probabilities 1
-    with .9999999999999999 (the float64 closest to 1).
+    with .9999999999999999 (the float64 closest to 1), or with the float32
+    closest to 1 if the curves are in single precision.
     """
     for sid in pmap:
         array = pmap[sid].array
-        array[array == 1.] = .9999999999999999
+        one = array.dtype.type(1)
+        array[array == one] = numpy.nextafter(one, array.dtype.type(0))
     return pmap
 
 
@@ -176,6 +178,7 @@ class BaseCalculator(metaclass=abc.ABCMeta):
         self.oqparam = oqparam
         if oqparam.num_cores:
             parallel.CT = oqparam.num_cores * 2
+        parallel.Starmap.sampling_interval = oqparam.sampling_interval
 
     def monitor(self, operation='', **kw):
         """
@@ -963,16 +966,16 @@ class RiskCalculator(HazardCalculator):
             imts, gmfs = to_gmfs(
                 shakemap, oq.spatial_correlation, oq.cross_correlation,
                 oq.site_effects, oq.truncation_level, E, oq.random_seed,
-                oq.imtls)
+                oq.imtls, oq.shakemap_tile_size)
             N, E, M = gmfs.shape
             events = numpy.zeros(E, rupture.events_dt)
             events['id'] = numpy.arange(E, dtype=U32)
             self.datastore['events'] = events
             # convert into an array of dtype gmv_data_dt
-            lst = [(sitecol.sids[s], ei, gmfs[s, ei])
-                   for s in numpy.arange(N, dtype=U32)
-                   for ei, event in enumerate(events)]
-            data = numpy.array(lst, oq.gmf_data_dt())
+            data = numpy.zeros(N * E, oq.gmf_data_dt())
+            data['sid'] = numpy.repeat(sitecol.sids, E)
+            data['eid'] = numpy.tile(events['id'], N)
+            data['gmv'] = gmfs.reshape((N * E, M))
             create_gmf_data(self.datastore, len(imts), data=data)
         return sitecol, assetcol
 
@@ -1168,6 +1171,8 @@ def create_gmf_data(dstore, M, secperils=(), data=None):
             dstore.create_dset(f'gmf_data/{out}', F32)
             cols.append(f'{out}')
     dstore.getitem('gmf_data').attrs['__pdcolumns__'] = ' '.join(cols)
+    if data is not None:
+        dstore.store_minmax('gmf_data', 'sid', 'eid')
 
 
 def save_exposed_values(dstore, assetcol, lossnames, tagnames):
@@ -23,12 +23,9 @@ import copy
 import pprint
 import logging
 import operator
+import importlib.util
 from datetime import datetime
 import numpy
-try:
-    from PIL import Image
-except ImportError:
-    Image = None
 from openquake.baselib import parallel, hdf5
 from openquake.baselib.python3compat import encode
 from openquake.baselib.general import (
@@ -50,13 +47,14 @@ grp_extreme_dt = numpy.dtype([('et_id', U16), ('grp_trt', hdf5.vstr),
                              ('extreme_poe', F32)])
 
 MAXMEMORY = '''Estimated upper memory limit per core:
-%d sites x %d levels x %d gsims x 8 bytes = %s'''
+%d sites x %d levels x %d gsims x %d bytes = %s'''
 
 TOOBIG = '''\
 The calculation is too big and will likely fail:
 num_sites = %d
 num_levels = %d
 num_gsims = %d
+bytes_per_float = %d
 The estimated memory per core is %s > 4 GB.
 You should reduce one or more of the listed parameters.'''
 
@@ -79,7 +77,7 @@ def classical1(srcs, gsims, params, slc, monitor=None):
     if monitor is None:  # fix mispassed parameters (for disagg_by_src)
         monitor = slc
         slc = slice(None)
-    srcfilter = monitor.read('srcfilter')[slc]
+    srcfilter = monitor.read('srcfilter')[params['tile']][slc]
     return classical(srcs, srcfilter, gsims, params, monitor)
 
 
@@ -89,7 +87,7 @@ def classical_split_filter(srcs, gsims, params, monitor):
     PoEs. Yield back subtasks if the split sources contain more than
     maxweight ruptures.
     """
-    srcfilter = monitor.read('srcfilter')
+    srcfilter = monitor.read('srcfilter')[params['tile']]
     sf_tiles = srcfilter.split_in_tiles(params['hint'])
     nt = len(sf_tiles)
     maxw = params['max_weight'] / 2
@@ -181,6 +179,7 @@ class ClassicalCalculator(base.HazardCalculator):
     """
     core_task = classical_split_filter
     accept_precalc = ['classical']
+    streaming = False  # set in .execute
 
     def agg_dicts(self, acc, dic):
         """
@@ -217,9 +216,13 @@ class ClassicalCalculator(base.HazardCalculator):
                 eff_rups += rec[0]
                 if rec[0]:
                     eff_sites += rec[1] / rec[0]
-            self.by_task[extra['task_no']] = (
+            self.by_task[extra['task_no'] + self.task_offset] = (
                 eff_rups, eff_sites, sorted(srcids))
-            if pmap and grp_id in acc:
+            if self.oqparam.pmap_dtype == 'float32':
+                # compose in log-space to keep the precision
+                acc.setdefault(grp_id, ProbabilityMap(
+                    pmap.shape_y, pmap.shape_z)).add_logpnes(pmap)
+            elif pmap and grp_id in acc:
                 acc[grp_id] |= pmap
             else:
                 acc[grp_id] = copy.copy(pmap)
@@ -268,6 +271,7 @@ class ClassicalCalculator(base.HazardCalculator):
                     self.datastore.create_dset(name + dparam, dt, (None,),
                                                compression='gzip')
         self.by_task = {}  # task_no => src_ids
+        self.task_offset = 0  # nonzero for the waves after the first
         self.totrups = 0  # total number of ruptures before collapsing
         self.maxradius = 0
         self.Ns = len(self.csm.source_info)
@@ -372,10 +376,12 @@ class ClassicalCalculator(base.HazardCalculator):
                 logging.info('pointsource_distance=\n%s', pprint.pformat(dic))
             if len(vars(aw)) > 1:  # more than _extra
                 self.datastore['effect_by_mag_dst'] = aw
+        tiles = self.get_tiles()
+        self.streaming = len(tiles) > 1
         smap = parallel.Starmap(classical, h5=self.datastore.hdf5,
                                 num_cores=oq.num_cores)
         smap.monitor.save('srcfilter', self.src_filter())
-        rlzs_by_gsim_list = self.submit_tasks(smap)
+        rlzs_by_gsim_list = self.submit_tasks(smap, tiles[0])
         rlzs_by_g = []
         for rlzs_by_gsim in rlzs_by_gsim_list:
             for rlzs in rlzs_by_gsim.values():
@@ -383,15 +389,21 @@ class ClassicalCalculator(base.HazardCalculator):
         self.datastore['rlzs_by_g'] = [U32(rlzs) for rlzs in rlzs_by_g]
         acc0 = self.acc0()  # create the rup/ datasets BEFORE swmr_on()
         poes_shape = (self.N, len(oq.imtls.array), len(rlzs_by_g))  # NLG
-        size = numpy.prod(poes_shape) * 8
+        pmap_dt = numpy.dtype(oq.pmap_dtype)
+        size = numpy.prod(poes_shape) * pmap_dt.itemsize
         logging.info('Requiring %s for ProbabilityMap of shape %s',
                      humansize(size), poes_shape)
-        self.datastore.create_dset('_poes', F64, poes_shape)
+        self.datastore.create_dset('_poes', pmap_dt, poes_shape)
+        if self.streaming:
+            self.create_hazard_dsets()
         self.datastore.swmr_on()
         smap.h5 = self.datastore.hdf5
         self.calc_times = AccumDict(accum=numpy.zeros(3, F32))
         try:
-            acc = smap.reduce(self.agg_dicts, acc0)
+            if self.streaming:
+                acc = self.stream_tiles(smap, acc0, tiles)
+            else:
+                acc = smap.reduce(self.agg_dicts, acc0)
             self.store_rlz_info(acc.eff_ruptures)
         finally:
             with self.monitor('store source_info'):
@@ -427,9 +439,78 @@ class ClassicalCalculator(base.HazardCalculator):
         self.calc_times.clear()  # save a bit of memory
         return acc
 
-    def submit_tasks(self, smap):
+    def get_tiles(self):
+        """
+        :returns:
+            a list of slices of site IDs; there is more than one slice
+            only if tile_streaming is set and there are more than
+            max_sites_per_tile sites
+        """
+        oq = self.oqparam
+        N = len(self.sitecol)
+        if (not oq.tile_streaming or oq.disagg_by_src or oq.is_ucerf() or
+                N <= oq.max_sites_per_tile):
+            return [slice(None)]
+        # the tiles contain the same number of sites of the (possibly
+        # filtered) site collection; they are slices of site IDs, since
+        # the sources are filtered with the complete site collection
+        sctiles = self.sitecol.split_in_tiles(
+            numpy.ceil(N / oq.max_sites_per_tile))
+        starts = [0] + [sc.sids[0] for sc in sctiles[1:]]
+        stops = starts[1:] + [self.N]
+        return [slice(start, stop) for start, stop in zip(starts, stops)]
+
+    def stream_tiles(self, smap, acc0, tiles):
+        """
+        Process the tiles in waves: the probability maps of each tile
+        are stored in _poes and freed before processing the next tile,
+        while the hazard statistics of the previous tile are computed.
+        Therefore the memory in the master is bounded by the tile size.
+
+        :param smap: a Starmap with the tasks for the first tile submitted
+        :param acc0: the initial accumulator
+        :param tiles: a list of slices of site IDs
+        :returns: an accumulator with the effective ruptures only
+        """
+        oq = self.oqparam
+        eff_ruptures = acc0.eff_ruptures
+        self.extreme = {}  # grp_id -> (trt, extreme_poe)
+        hazmap = None  # Starmap computing the statistics of a previous tile
+        for t, tile in enumerate(tiles):
+            if t > 0:  # the tasks for the first tile are already submitted
+                smap = parallel.Starmap(
+                    classical, h5=self.datastore.hdf5, num_cores=oq.num_cores)
+                self.submit_tasks(smap, tile)
+            if hazmap:  # collect the statistics of the previous tile
+                hazmap.reduce(self.save_hazard)
+            logging.info('Processing tile #%d of %d [sites %d-%d]',
+                         t + 1, len(tiles), tile.start, tile.stop - 1)
+            acc = AccumDict()
+            acc.eff_ruptures = eff_ruptures
+            acc = smap.reduce(self.agg_dicts, acc)
+            self.task_offset = max(self.by_task, default=-1) + 1
+            with self.monitor('saving probability maps'):
+                self.save_poes(acc, tile)
+            del acc  # free the memory before processing the next tile
+            self.datastore.flush()
+            sids = self.sitecol.sids
+            sids = sids[(sids >= tile.start) & (sids < tile.stop)]
+            hazmap = parallel.Starmap(build_hazard, h5=self.datastore.hdf5)
+            # no more tasks than sites, to avoid empty chunks of sites
+            ct = min(max(oq.concurrent_tasks // len(tiles), 1), len(sids))
+            for args in self.get_hazard_args(numpy.array_split(sids, ct)):
+                hazmap.submit(args)
+        hazmap.reduce(self.save_hazard)
+        acc = AccumDict()
+        acc.eff_ruptures = eff_ruptures
+        return acc
+
+    def submit_tasks(self, smap, tile=slice(None)):
         """
         Submit tasks to the passed Starmap
+
+        :param smap: a Starmap instance
+        :param tile: a slice of site IDs, used in tile streaming mode
         """
         oq = self.oqparam
         src_groups = self.csm.src_groups
@@ -447,9 +528,11 @@ class ClassicalCalculator(base.HazardCalculator):
                     logging.info(msg.format(src, src.num_ruptures, spc))
         assert oq.max_sites_per_tile > oq.max_sites_disagg, (
             oq.max_sites_per_tile, oq.max_sites_disagg)
-        hint = 1 if self.N <= oq.max_sites_disagg else numpy.ceil(
-            self.N / oq.max_sites_per_tile)
-        sf = self.src_filter()
+        hint = 1 if self.N <= oq.max_sites_disagg or self.streaming else (
+            numpy.ceil(self.N / oq.max_sites_per_tile))
+        # the source filter contains the complete site collection, so
+        # slicing it by position is the same as slicing it by site ID
+        sf = self.src_filter()[tile]
         srcfilters = sf.split_in_tiles(hint)
         ntiles = len(srcfilters)
         T = len(srcfilters[0].sitecol)
@@ -459,10 +542,13 @@ class ClassicalCalculator(base.HazardCalculator):
         # estimate max memory per core
         max_num_gsims = max(len(gsims) for gsims in rlzs_by_gsim_list)
         L = len(oq.imtls.array)
-        pmapbytes = T * L * max_num_gsims * 8
+        nbytes = numpy.dtype(oq.pmap_dtype).itemsize
+        pmapbytes = T * L * max_num_gsims * nbytes
         if pmapbytes > TWO32:
-            logging.warning(TOOBIG, T, L, max_num_gsims, humansize(pmapbytes))
-        logging.info(MAXMEMORY, T, L, max_num_gsims, humansize(pmapbytes))
+            logging.warning(TOOBIG, T, L, max_num_gsims, nbytes,
+                            humansize(pmapbytes))
+        logging.info(MAXMEMORY, T, L, max_num_gsims, nbytes,
+                     humansize(pmapbytes))
 
         C = oq.concurrent_tasks or 1
         if oq.disagg_by_src or oq.is_ucerf():
@@ -479,7 +565,8 @@ class ClassicalCalculator(base.HazardCalculator):
             pointsource_distance=getattr(oq.pointsource_distance, 'ddic', {}),
             point_rupture_bins=oq.point_rupture_bins,
             shift_hypo=oq.shift_hypo, max_weight=max_weight,
-            collapse_level=oq.collapse_level, hint=hint,
+            collapse_level=oq.collapse_level, hint=hint, tile=tile,
+            pmap_dtype=oq.pmap_dtype,
             max_sites_disagg=oq.max_sites_disagg,
             split_sources=oq.split_sources, af=self.af)
         for rlzs_by_gsim, sg in zip(rlzs_by_gsim_list, src_groups):
@@ -545,41 +632,80 @@ class ClassicalCalculator(base.HazardCalculator):
         if nr:  # few sites, log the number of ruptures per magnitude
             logging.info('%s', nr)
         oq = self.oqparam
+        if self.streaming:
+            # the _poes and the statistics have been already stored
+            self.store_disagg_by_grp()
+            self.plot_hmaps()
+            return
+        self.extreme = {}  # grp_id -> (trt, extreme_poe)
+        logging.info('Saving _poes')
+        with self.monitor('saving probability maps'):
+            self.save_poes(pmap_by_key)
+        if oq.hazard_calculation_id is None and '_poes' in self.datastore:
+            self.store_disagg_by_grp()
+            self.datastore.swmr_on()  # needed
+            self.calc_stats()
+
+    def save_poes(self, pmap_by_key, tile=slice(None)):
+        """
+        Save the probability maps in _poes and disagg_by_src
+
+        :param pmap_by_key: a dictionary grp_id|source_id -> ProbabilityMap
+        :param tile: a slice of site IDs, used in tile streaming mode
+        """
+        oq = self.oqparam
         et_ids = self.datastore['et_ids'][:]
         rlzs_by_gsim_list = self.full_lt.get_rlzs_by_gsim_list(et_ids)
         slice_by_g = getters.get_slice_by_g(rlzs_by_gsim_list)
-        data = []
         weights = [rlz.weight for rlz in self.realizations]
         pgetter = getters.PmapGetter(
             self.datastore, weights, self.sitecol.sids, oq.imtls)
-        logging.info('Saving _poes')
-        with self.monitor('saving probability maps'):
-            for key, pmap in pmap_by_key.items():
-                if isinstance(key, str):  # disagg_by_src
-                    serial = self.csm.source_info[key][readinput.SERIAL]
-                    rlzs_by_gsim = rlzs_by_gsim_list[pmap.grp_id]
-                    self.datastore['disagg_by_src'][..., serial] = (
-                        pgetter.get_hcurves(pmap, rlzs_by_gsim))
-                elif pmap:  # pmap can be missing if the group is filtered away
-                    # key is the group ID
-                    trt = self.full_lt.trt_by_et[et_ids[key][0]]
-                    # avoid saving PoEs == 1
-                    arr = base.fix_ones(pmap).array(self.N)
-                    self.datastore['_poes'][:, :, slice_by_g[key]] = arr
-                    extreme = max(
-                        get_extreme_poe(pmap[sid].array, oq.imtls)
-                        for sid in pmap)
-                    data.append((key, trt, extreme))
-        if oq.hazard_calculation_id is None and '_poes' in self.datastore:
-            self.datastore['disagg_by_grp'] = numpy.array(
-                sorted(data), grp_extreme_dt)
-            self.datastore.swmr_on()  # needed
-            self.calc_stats()
+        start = tile.start or 0
+        stop = tile.stop or self.N
+        for key, pmap in pmap_by_key.items():
+            if oq.pmap_dtype == 'float32' and not isinstance(key, str):
+                pmap = pmap.logpnes2poes()  # from log-space
+            if isinstance(key, str):  # disagg_by_src
+                serial = self.csm.source_info[key][readinput.SERIAL]
+                rlzs_by_gsim = rlzs_by_gsim_list[pmap.grp_id]
+                self.datastore['disagg_by_src'][..., serial] = (
+                    pgetter.get_hcurves(pmap, rlzs_by_gsim))
+            elif pmap:  # pmap can be missing if the group is filtered away
+                # key is the group ID
+                trt = self.full_lt.trt_by_et[et_ids[key][0]]
+                # avoid saving PoEs == 1
+                base.fix_ones(pmap)
+                if start:  # shift the site IDs to the beginning of the tile
+                    pmap = {sid - start: pc for sid, pc in pmap.items()}
+                arr = numpy.zeros(
+                    (stop - start, len(oq.imtls.array),
+                     len(rlzs_by_gsim_list[key])), oq.pmap_dtype)
+                for sid, pc in pmap.items():
+                    arr[sid] = pc.array
+                self.datastore['_poes'][start:stop, :, slice_by_g[key]] = arr
+                extreme = max(
+                    get_extreme_poe(pmap[sid].array, oq.imtls)
+                    for sid in pmap)
+                if key in self.extreme:
+                    extreme = max(extreme, self.extreme[key][1])
+                self.extreme[key] = (trt, extreme)
+
+    def store_disagg_by_grp(self):
+        """
+        Store the extreme PoEs by source group
+        """
+        data = [(key, trt, extreme)
+                for key, (trt, extreme) in self.extreme.items()]
+        self.datastore['disagg_by_grp'] = numpy.array(
+            sorted(data), grp_extreme_dt)
 
-    def calc_stats(self):
+    def create_hazard_dsets(self):
+        """
+        Create the datasets hcurves-rlzs, hmaps-rlzs, hcurves-stats,
+        hmaps-stats, depending on the parameters
+        """
         oq = self.oqparam
         hstats = oq.hazard_stats()
-        # initialize datasets
         imls = oq.imtls.array
         N = len(self.sitecol.complete)
         P = len(oq.poes)
@@ -611,17 +737,32 @@ class ClassicalCalculator(base.HazardCalculator):
                 self.datastore.set_shape_attrs(
                     'hmaps-stats', site_id=N, stat=list(hstats),
                     imt=list(oq.imtls), poe=oq.poes)
-        ct = oq.concurrent_tasks or 1
-        logging.info('Building hazard statistics')
+
+    def get_hazard_args(self, sids_list):
+        """
+        :param sids_list: a list of arrays of site IDs
+        :returns: a list of arguments for build_hazard
+        """
+        oq = self.oqparam
+        N = len(self.sitecol.complete)
+        hstats = oq.hazard_stats()
         self.weights = [rlz.weight for rlz in self.realizations]
         dstore = (self.datastore.parent if oq.hazard_calculation_id
                   else self.datastore)
-        allargs = [  # this list is very fast to generate
+        return [  # this list is very fast to generate
             (getters.PmapGetter(
-                dstore, self.weights, t.sids, oq.imtls, oq.poes),
+                dstore, self.weights, sids, oq.imtls, oq.poes),
              N, hstats, oq.individual_curves, oq.max_sites_disagg,
              self.amplifier)
-            for t in self.sitecol.split_in_tiles(ct)]
+            for sids in sids_list]
+
+    def calc_stats(self):
+        oq = self.oqparam
+        self.create_hazard_dsets()
+        ct = oq.concurrent_tasks or 1
+        logging.info('Building hazard statistics')
+        allargs = self.get_hazard_args(
+            [t.sids for t in self.sitecol.split_in_tiles(ct)])
         if self.few_sites:
             dist = 'no'
         else:
@@ -629,12 +770,21 @@ class ClassicalCalculator(base.HazardCalculator):
         parallel.Starmap(
             build_hazard, allargs, distribute=dist, h5=self.datastore.hdf5
         ).reduce(self.save_hazard)
+        self.plot_hmaps()
+
+    def plot_hmaps(self):
+        """
+        Log the maximum hazard map values and save the mean hazard maps
+        as PNG images, if PIL is installed
+        """
+        oq = self.oqparam
         if 'hmaps-stats' in self.datastore:
             hmaps = self.datastore.sel('hmaps-stats', stat='mean')  # NSMP
             maxhaz = hmaps.max(axis=(0, 1, 3))
             mh = dict(zip(self.oqparam.imtls, maxhaz))
             logging.info('The maximum hazard map values are %s', mh)
-            if Image is None or not self.from_engine:  # missing PIL
+            if (importlib.util.find_spec('PIL') is None or
+                    not self.from_engine):  # missing PIL
                 return
             M, P = hmaps.shape[2:]
             logging.info('Saving %dx%d mean hazard maps', M, P)
@@ -660,6 +810,7 @@ def make_hmap_png(hmap, lons, lats):
     :returns: an Image object containing the hazard map
     """
     import matplotlib.pyplot as plt
+    from PIL import Image
     fig = plt.figure()
     ax = fig.add_subplot(111)
     ax.grid(True)
@@ -716,12 +867,19 @@ def build_hazard(pgetter, N, hstats, individual_curves,
                 ProbabilityMap(M, P) for r in range(S)]
     combine_mon = monitor('combine pmaps', measuremem=False)
     compute_mon = monitor('compute stats', measuremem=False)
+    if amplifier:
+        # amplify the curves of all the sites with the same code together
+        with combine_mon:
+            amplified = amplifier.amplify_pcurves(
+                ampcode, {sid: pgetter.get_pcurves(sid)
+                          for sid in pgetter.sids})
     for sid in pgetter.sids:
         with combine_mon:
-            pcurves = pgetter.get_pcurves(sid)
             if amplifier:
-                pcurves = amplifier.amplify(ampcode[sid], pcurves)
+                pcurves = amplified[sid]
                 # NB: the pcurves have soil levels != IMT levels
+            else:
+                pcurves = pgetter.get_pcurves(sid)
         if sum(pc.array.sum() for pc in pcurves) == 0:  # no data
             continue
         with compute_mon:
@@ -729,6 +887,7 @@ def build_hazard(pgetter, N, hstats, individual_curves,
                 arr = numpy.array([pc.array for pc in pcurves])
                 for s, (statname, stat) in enumerate(hstats.items()):
                     pc = getters.build_stat_curve(arr, imtls, stat, weights)
+                    pc.array = pc.array.astype(pgetter.dtype, copy=False)
                     pmap_by_kind['hcurves-stats'][s][sid] = pc
                     if poes:
                         hmap = calc.make_hmap(pc, imtls, poes, sid)
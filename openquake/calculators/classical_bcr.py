@@ -18,7 +18,6 @@
 
 import numpy
 
-from openquake.baselib.general import AccumDict
 from openquake.hazardlib import stats
 from openquake.calculators import base, classical_risk
 
@@ -39,16 +38,18 @@ def classical_bcr(riskinputs, param, monitor):
     :param monitor:
         :class:`openquake.baselib.performance.Monitor` instance
     """
-    R = riskinputs[0].hazard_getter.num_rlzs
-    result = AccumDict(accum=numpy.zeros((R, 3), F32))
     crmodel = monitor.read('crmodel')
+    result = []
     for ri in riskinputs:
+        R = ri.hazard_getter.num_rlzs
+        aval = ri.assets['value-structural']
+        data = numpy.zeros((len(ri.assets), R, 3), F32)
         for out in ri.gen_outputs(crmodel, monitor):
-            for asset, (eal_orig, eal_retro, bcr) in zip(
-                    ri.assets, out['structural']):
-                aval = asset['value-structural']
-                result[asset['ordinal']][out.rlzi] = numpy.array([
-                    eal_orig * aval, eal_retro * aval, bcr])
+            eal_orig, eal_retro, bcr = out['structural'].T
+            data[:, out.rlzi, 0] = eal_orig * aval
+            data[:, out.rlzi, 1] = eal_retro * aval
+            data[:, out.rlzi, 2] = bcr
+        result.append((ri.assets['ordinal'], data))
     return {'bcr_data': result}
 
 
@@ -71,9 +72,9 @@ class ClassicalBCRCalculator(classical_risk.ClassicalRiskCalculator):
     def post_execute(self, result):
         # NB: defined only for loss_type = 'structural'
         bcr_data = numpy.zeros((self.A, self.R), bcr_dt)
-        for aid, data in result['bcr_data'].items():
-            bcr_data[aid]['annual_loss_orig'] = data[:, 0]
-            bcr_data[aid]['annual_loss_retro'] = data[:, 1]
-            bcr_data[aid]['bcr'] = data[:, 2]
+        for aids, data in result['bcr_data']:
+            bcr_data['annual_loss_orig'][aids] = data[:, :, 0]
+            bcr_data['annual_loss_retro'][aids] = data[:, :, 1]
+            bcr_data['bcr'][aids] = data[:, :, 2]
         self.datastore['bcr-rlzs'] = bcr_data
         stats.set_rlzs_stats(self.datastore, 'bcr', assets=self.assetcol['id'])
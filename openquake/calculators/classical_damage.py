@@ -18,7 +18,6 @@
 
 import logging
 import numpy
-from openquake.baselib.general import AccumDict
 from openquake.hazardlib import stats
 from openquake.calculators import base, classical_risk, views
 
@@ -36,20 +35,18 @@ def classical_damage(riskinputs, param, monitor):
     :param monitor:
         :class:`openquake.baselib.performance.Monitor` instance
     :yields:
-        dictionaries asset_ordinal -> damage(R, L, D)
+        dictionaries with a list of pairs (aids, damages(A, R, L, D))
     """
     crmodel = monitor.read('crmodel')
     for ri in riskinputs:
         R = ri.hazard_getter.num_rlzs
         L = len(crmodel.lti)
         D = len(crmodel.damage_states)
-        result = AccumDict(accum=numpy.zeros((R, L, D), F32))
+        damages = numpy.zeros((len(ri.assets), R, L, D), F32)
         for out in ri.gen_outputs(crmodel, monitor):
-            r = out.rlzi
             for l, loss_type in enumerate(crmodel.loss_types):
-                for a, frac in zip(ri.assets['ordinal'], out[loss_type]):
-                    result[a][r, l] = frac
-        yield result
+                damages[:, out.rlzi, l] = out[loss_type]
+        yield dict(damages=[(ri.assets['ordinal'], damages)])
 
 
 @base.calculators.add('classical_damage')
@@ -65,12 +62,12 @@ class ClassicalDamageCalculator(classical_risk.ClassicalRiskCalculator):
         Export the result in CSV format.
 
         :param result:
-            a dictionary asset_ordinal -> array(R, L, D)
+            a dictionary with a list of pairs (aids, array(A, R, L, D))
         """
         D = len(self.crmodel.damage_states)
         damages = numpy.zeros((self.A, self.R, self.L, D), numpy.float32)
-        for a in result:
-            damages[a] = result[a]
+        for aids, dmg in result.get('damages', []):
+            damages[aids] = dmg
         self.datastore['damages-rlzs'] = damages
         stats.set_rlzs_stats(self.datastore, 'damages',
                              assets=self.assetcol['id'],
@@ -25,6 +25,17 @@ from openquake.calculators import base
 F32 = numpy.float32
 
 
+def set_arrays(longarrays, aids, idx, shortarrays):
+    """
+    Vectorized version of :func:`openquake.calculators.base.set_array`
+    for the arrays of shape (A, C) in the rows `aids` and column `idx`
+    of an array of shape (A, N, C') with C' >= C.
+    """
+    C = shortarrays.shape[-1]
+    longarrays[aids, idx, :C] = shortarrays
+    longarrays[aids, idx, C:] = numpy.nan
+
+
 def classical_risk(riskinputs, param, monitor):
     """
     Compute and return the average losses for each asset.
@@ -40,34 +51,29 @@ def classical_risk(riskinputs, param, monitor):
     result = dict(loss_curves=[], stat_curves=[])
     weights = [w['default'] for w in param['weights']]
     statnames, stats = zip(*param['stats'])
+    L = len(crmodel.lti)
     for ri in riskinputs:
-        A = len(ri.assets)
-        L = len(crmodel.lti)
+        aids = ri.assets['ordinal']
         R = ri.hazard_getter.num_rlzs
-        loss_curves = numpy.zeros((R, L, A), object)
-        avg_losses = numpy.zeros((R, L, A))
+        # loss curves of shape (A, C) for each loss type and realization
+        losses = [[None] * R for _ in range(L)]
+        poes = [[None] * R for _ in range(L)]
+        avg_losses = numpy.zeros((L, R, len(aids)))
         for out in ri.gen_outputs(crmodel, monitor):
             r = out.rlzi
             for l, loss_type in enumerate(crmodel.loss_types):
-                # loss_curves has shape (A, C)
-                for i, asset in enumerate(ri.assets):
-                    loss_curves[out.rlzi, l, i] = lc = out[loss_type][i]
-                    aid = asset['ordinal']
-                    avg = scientific.average_loss(lc)
-                    avg_losses[r, l, i] = avg
-                    lcurve = (lc['loss'], lc['poe'], avg)
-                    result['loss_curves'].append((l, r, aid, lcurve))
+                lc = out[loss_type]
+                losses[l][r], poes[l][r] = lc['loss'], lc['poe']
+                avg_losses[l, r] = scientific.average_loss(lc)
+                result['loss_curves'].append(
+                    (l, r, aids, lc['loss'], lc['poe'], avg_losses[l, r]))
 
-        # compute statistics
-        for l, loss_type in enumerate(crmodel.loss_types):
-            for i, asset in enumerate(ri.assets):
-                avg_stats = compute_stats(avg_losses[:, l, i], stats, weights)
-                losses = loss_curves[0, l, i]['loss']
-                all_poes = numpy.array(
-                    [loss_curves[r, l, i]['poe'] for r in range(R)])
-                poes_stats = compute_stats(all_poes, stats, weights)
-                result['stat_curves'].append(
-                    (l, asset['ordinal'], losses, poes_stats, avg_stats))
+        # compute the statistics for all the assets at once
+        for l in range(L):
+            avg_stats = compute_stats(avg_losses[l], stats, weights)
+            poes_stats = compute_stats(numpy.array(poes[l]), stats, weights)
+            result['stat_curves'].append(
+                (l, aids, losses[l][0], poes_stats, avg_stats))
     if R == 1:  # the realization is the same as the mean
         del result['loss_curves']
     return result
@@ -117,12 +123,12 @@ class ClassicalRiskCalculator(base.RiskCalculator):
         stats = encode(list(self.oqparam.hazard_stats()))
         stat_curves = numpy.zeros((self.A, self.S), self.loss_curve_dt)
         avg_losses = numpy.zeros((self.A, self.S, self.L), F32)
-        for l, a, losses, statpoes, statloss in result['stat_curves']:
+        for l, aids, losses, statpoes, statloss in result['stat_curves']:
             stat_curves_lt = stat_curves[ltypes[l]]
             for s in range(self.S):
-                avg_losses[a, s, l] = statloss[s]
-                base.set_array(stat_curves_lt['poes'][a, s], statpoes[s])
-                base.set_array(stat_curves_lt['losses'][a, s], losses)
+                avg_losses[aids, s, l] = statloss[s]
+                set_arrays(stat_curves_lt['poes'], aids, s, statpoes[s])
+                set_arrays(stat_curves_lt['losses'], aids, s, losses)
         self.datastore['avg_losses-stats'] = avg_losses
         self.datastore.set_attrs('avg_losses-stats', stat=stats)
         self.datastore['loss_curves-stats'] = stat_curves
@@ -131,10 +137,10 @@ class ClassicalRiskCalculator(base.RiskCalculator):
         if self.R > 1:  # individual realizations saved only if many
             loss_curves = numpy.zeros((self.A, self.R), self.loss_curve_dt)
             avg_losses = numpy.zeros((self.A, self.R, self.L), F32)
-            for l, r, a, (losses, poes, avg) in result['loss_curves']:
-                lc = loss_curves[a, r][ltypes[l]]
-                avg_losses[a, r, l] = avg
-                base.set_array(lc['losses'], losses)
-                base.set_array(lc['poes'], poes)
+            for l, r, aids, losses, poes, avg in result['loss_curves']:
+                lc = loss_curves[ltypes[l]]
+                avg_losses[aids, r, l] = avg
+                set_arrays(lc['losses'], aids, r, losses)
+                set_arrays(lc['poes'], aids, r, poes)
             self.datastore['avg_losses-rlzs'] = avg_losses
             self.datastore['loss_curves-rlzs'] = loss_curves
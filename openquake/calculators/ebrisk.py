@@ -15,13 +15,17 @@
 #
 # You should have received a copy of the GNU Affero General Public License
 # along with OpenQuake. If not, see <http://www.gnu.org/licenses/>.
+import os
+import shutil
+import getpass
 import logging
+import tempfile
 import operator
 import itertools
 from datetime import datetime
 import numpy
 
-from openquake.baselib import datastore, hdf5, parallel, general
+from openquake.baselib import config, datastore, hdf5, parallel, general
 from openquake.baselib.python3compat import zip
 from openquake.hazardlib.calc.filters import getdefault
 from openquake.risklib.scientific import LossesByAsset
@@ -118,6 +122,7 @@ def start_ebrisk(rgetter, param, monitor):
     """
     srcfilter = monitor.read('srcfilter')
     rgetters = list(rgetter.split(srcfilter, param['maxweight']))
+    task = ebrisk_gmfs if param['site_buckets'] else ebrisk
     for rg in rgetters[:-1]:
         msg = 'produced subtask'
         try:
@@ -125,17 +130,19 @@ def start_ebrisk(rgetter, param, monitor):
                        'ebrisk#%d' % monitor.task_no, msg)
         except Exception:  # for `oq run`
             print(msg)
-        yield ebrisk, rg, param
-    if rgetters:
+        yield task, rg, param
+    if rgetters and task is ebrisk:
         yield ebrisk(rgetters[-1], param, monitor)
+    elif rgetters:
+        yield from ebrisk_gmfs(rgetters[-1], param, monitor)
 
 
-def ebrisk(rupgetter, param, monitor):
+def compute_gmfs(rupgetter, param, monitor):
     """
     :param rupgetter: RuptureGetter with multiple ruptures
     :param param: dictionary of parameters coming from oqparam
     :param monitor: a Monitor instance
-    :returns: a dictionary with keys elt, alt, ...
+    :returns: a pair (GMF array, gmf_info array)
     """
     mon_rup = monitor('getting ruptures', measuremem=False)
     mon_haz = monitor('getting hazard', measuremem=True)
@@ -154,13 +161,78 @@ def ebrisk(rupgetter, param, monitor):
                 gmf_info.append((c.ebrupture.id, mon_haz.task_no, len(c.sids),
                                  data.nbytes, mon_haz.dt))
     if not gmfs:
+        return (), ()
+    return numpy.concatenate(gmfs), numpy.array(gmf_info, gmf_info_dt)
+
+
+def ebrisk(rupgetter, param, monitor):
+    """
+    :param rupgetter: RuptureGetter with multiple ruptures
+    :param param: dictionary of parameters coming from oqparam
+    :param monitor: a Monitor instance
+    :returns: a dictionary with keys elt, alt, ...
+    """
+    gmfs, gmf_info = compute_gmfs(rupgetter, param, monitor)
+    if len(gmfs) == 0:
         return {}
-    res = calc_risk(numpy.concatenate(gmfs), param, monitor)
-    if gmf_info:
-        res['gmf_info'] = numpy.array(gmf_info, gmf_info_dt)
+    res = calc_risk(gmfs, param, monitor)
+    res['gmf_info'] = gmf_info
     return res
 
 
+def ebrisk_gmfs(rupgetter, param, monitor):
+    """
+    Producer task used when ebrisk_site_buckets is set: compute the GMFs,
+    store them in scratch files by site bucket and yield a risk subtask
+    per bucket, so that the risk is computed while other GMFs are still
+    being generated. When there are already max_buckets scratch files
+    waiting to be processed the losses of the bucket are computed here.
+    This is a soft limit, since concurrent tasks can check the number of
+    files at the same time and exceed it, by at most one bucket per running
+    task.
+
+    :param rupgetter: RuptureGetter with multiple ruptures
+    :param param: dictionary of parameters coming from oqparam
+    :param monitor: a Monitor instance
+    :yields: a dictionary with key gmf_info, ebrisk_risk subtasks and
+        dictionaries with keys elt, alt, ...
+    """
+    gmfs, gmf_info = compute_gmfs(rupgetter, param, monitor)
+    if len(gmfs) == 0:
+        return
+    yield {'gmf_info': gmf_info}
+    sids = gmfs['sid'].astype(numpy.int64)
+    buckets = sids * param['site_buckets'] // param['num_sites']
+    for bucket in numpy.unique(buckets):
+        data = gmfs[buckets == bucket]
+        if len(os.listdir(param['scratch_dir'])) >= param['max_buckets']:
+            yield calc_risk(data, param, monitor)
+            continue
+        with monitor('saving gmfs by site bucket'):
+            fname = os.path.join(param['scratch_dir'], 'gmfs-%d-%d.hdf5' % (
+                monitor.task_no, bucket))
+            with hdf5.File(fname, 'w') as f:
+                f['gmfs'] = data
+        yield ebrisk_risk, fname, param
+
+
+def ebrisk_risk(fname, param, monitor):
+    """
+    Consumer task used when ebrisk_site_buckets is set: read the GMFs of
+    a site bucket from a scratch file, remove it and compute the losses.
+
+    :param fname: path to a scratch file with a dataset `gmfs`
+    :param param: dictionary of parameters coming from oqparam
+    :param monitor: a Monitor instance
+    :returns: a dictionary with keys elt, alt, ...
+    """
+    with monitor('reading gmfs'):
+        with hdf5.File(fname, 'r') as f:
+            gmfs = f['gmfs'][()]
+        os.remove(fname)
+    return calc_risk(gmfs, param, monitor)
+
+
 def gen_indices(tagcol, aggby):
     alltags = [getattr(tagcol, tagname) for tagname in aggby]
     ranges = [range(1, len(tags)) for tags in alltags]
@@ -190,6 +262,14 @@ class EbriskCalculator(event_based.EventBasedCalculator):
         self.param['aggregate_by'] = oq.aggregate_by
         ct = oq.concurrent_tasks or 1
         self.param['maxweight'] = int(oq.ebrisk_maxsize / ct)
+        self.param['site_buckets'] = oq.ebrisk_site_buckets
+        self.param['num_sites'] = self.N
+        self.param['max_buckets'] = oq.concurrent_tasks or 1
+        if (oq.ebrisk_site_buckets and parallel.oq_distribute() == 'zmq' and
+                not config.directory.shared_dir):
+            raise ValueError('ebrisk_site_buckets requires a shared_dir in '
+                             'openquake.cfg, since the scratch files must be '
+                             'readable by the workers on all hosts')
         self.A = A = len(self.assetcol)
         self.L = L = len(lba.loss_names)
         self.check_number_loss_curves()
@@ -249,10 +329,20 @@ class EbriskCalculator(event_based.EventBasedCalculator):
         smap = parallel.Starmap(start_ebrisk, h5=self.datastore.hdf5)
         smap.monitor.save('srcfilter', srcfilter)
         smap.monitor.save('crmodel', self.crmodel)
-        for rg in getters.gen_rupture_getters(
-                self.datastore, oq.concurrent_tasks):
-            smap.submit((rg, self.param))
-        smap.reduce(self.agg_dicts)
+        if oq.ebrisk_site_buckets:  # pipeline mode
+            logging.info('Computing GMFs and losses in %d site buckets',
+                         oq.ebrisk_site_buckets)
+            self.param['scratch_dir'] = self.scratch_dir()
+        try:
+            for rg in getters.gen_rupture_getters(
+                    self.datastore, oq.concurrent_tasks):
+                smap.submit((rg, self.param))
+            smap.reduce(self.agg_dicts)
+        finally:  # do not leave the bucket files on the shared_dir
+            if oq.ebrisk_site_buckets:
+                shutil.rmtree(self.param['scratch_dir'], ignore_errors=True)
+        if oq.ebrisk_site_buckets:
+            self.compact_losses_by_event()
         if self.indices:
             self.datastore['event_loss_table/indices'] = self.indices
         gmf_bytes = self.datastore['gmf_info']['gmfbytes'].sum()
@@ -261,6 +351,43 @@ class EbriskCalculator(event_based.EventBasedCalculator):
         logging.info('Considered {:_d} / {:_d} losses'.format(*self.numlosses))
         return 1
 
+    def scratch_dir(self):
+        """
+        :returns:
+            a new directory for the GMFs split by site bucket, inside the
+            shared_dir if set (i.e. on a cluster) or inside the custom_tmp
+            or system temporary directory on a single machine
+        """
+        shared_dir = config.directory.shared_dir
+        if shared_dir:
+            tmp = os.path.join(shared_dir, getpass.getuser())
+            os.makedirs(tmp, exist_ok=True)
+        else:
+            tmp = None
+        return tempfile.mkdtemp(
+            prefix='calc_%d_gmfs_' % self.datastore.calc_id, dir=tmp)
+
+    def compact_losses_by_event(self):
+        """
+        In pipeline mode the losses of an event are split across site
+        buckets: sum them, so that there is a single row per event in
+        losses_by_event and in the event_loss_table datasets
+        """
+        names = ['losses_by_event'] + [
+            'event_loss_table/' + idx
+            for idx in self.datastore['event_loss_table']]
+        with self.monitor('compacting losses by event'):
+            for name in names:
+                dset = self.datastore[name]
+                elt = dset[()]
+                eids, inv = numpy.unique(
+                    elt['event_id'], return_inverse=True)
+                out = numpy.zeros(len(eids), elt.dtype)
+                out['event_id'] = eids
+                numpy.add.at(out['loss'], inv, elt['loss'])
+                dset[:len(out)] = out
+                dset.resize((len(out),))
+
     def agg_dicts(self, dummy, dic):
         """
         :param dummy: unused parameter
@@ -32,7 +32,6 @@ from openquake.hazardlib.calc.stochastic import get_rup_array, rupture_dt
 from openquake.hazardlib.source.rupture import EBRupture
 from openquake.hazardlib.geo.mesh import surface_to_array
 from openquake.commonlib import calc, util, logs, readinput, logictree
-from openquake.risklib.riskinput import str2rsi
 from openquake.calculators import base, views
 from openquake.calculators.getters import (
     GmfGetter, gen_rupture_getters, sig_eps_dt, time_dt)
@@ -98,11 +97,15 @@ class EventBasedCalculator(base.HazardCalculator):
 
     def acc0(self):
         """
-        Initial accumulator, a dictionary (et_id, gsim) -> curves
+        Initial accumulator, a dictionary with the exceedance counts of
+        shape (N, R, L), or None if hazard_curves_from_gmfs is not set
         """
-        self.L = len(self.oqparam.imtls.array)
-        zd = {r: ProbabilityMap(self.L) for r in range(self.R)}
-        return zd
+        oq = self.oqparam
+        self.L = len(oq.imtls.array)
+        if oq.hazard_curves_from_gmfs:
+            N = len(self.sitecol.complete)
+            return {'counts': numpy.zeros((N, self.R, self.L), U32)}
+        return {'counts': None}
 
     def build_events_from_sources(self):
         """
@@ -193,12 +196,10 @@ class EventBasedCalculator(base.HazardCalculator):
         if self.offset >= TWO32:
             raise RuntimeError(
                 'The gmf_data table has more than %d rows' % TWO32)
-        imtls = self.oqparam.imtls
-        with agg_mon:
-            for key, poes in result.get('hcurves', {}).items():
-                r, sid, imt = str2rsi(key)
-                array = acc[r].setdefault(sid, 0).array[imtls(imt), 0]
-                array[:] = 1. - (1. - array) * (1. - poes)
+        if 'hcurves' in result:
+            with agg_mon:
+                sids, rlzs, counts = result['hcurves']
+                acc['counts'][numpy.ix_(sids, rlzs)] += counts
         self.datastore.flush()
         return acc
 
@@ -320,6 +321,7 @@ class EventBasedCalculator(base.HazardCalculator):
         if 'gmf_data' not in self.datastore:
             return acc
         if oq.ground_motion_fields:
+            self.datastore.store_minmax('gmf_data', 'sid', 'eid')
             eids = self.datastore['gmf_data/eid'][:]
             rel_events = numpy.unique(eids)
             e = len(rel_events)
@@ -358,13 +360,12 @@ class EventBasedCalculator(base.HazardCalculator):
             # save the statistical curves only
             hstats = oq.hazard_stats()
             S = len(hstats)
-            pmaps = list(result.values())
             R = len(weights)
-            if len(pmaps) != R:
-                # this should never happen, unless I break the
-                # logic tree reduction mechanism during refactoring
-                raise AssertionError('Expected %d pmaps, got %d' %
-                                     (len(weights), len(pmaps)))
+            poes = calc.counts_to_poes(
+                result['counts'], oq.ses_per_logic_tree_path)  # (N, R, L)
+            sids, = result['counts'].any(axis=(1, 2)).nonzero()
+            pmaps = [ProbabilityMap.from_array(poes[sids, r], sids)
+                     for r in range(R)]
             if oq.individual_curves:
                 logging.info('Saving individual hazard curves')
                 self.datastore.create_dset('hcurves-rlzs', F32, (N, R, M, L1))
@@ -380,10 +381,8 @@ class EventBasedCalculator(base.HazardCalculator):
                         'hmaps-rlzs', site_id=N, rlz_id=R,
                         imt=list(oq.imtls), poe=oq.poes)
                 for r, pmap in enumerate(pmaps):
-                    arr = numpy.zeros((N, M, L1), F32)
-                    for sid in pmap:
-                        arr[sid] = pmap[sid].array.reshape(M, L1)
-                    self.datastore['hcurves-rlzs'][:, r] = arr
+                    self.datastore['hcurves-rlzs'][:, r] = poes[:, r].reshape(
+                        N, M, L1)
                     if oq.poes:
                         hmap = calc.make_hmap(pmap, oq.imtls, oq.poes)
                         for sid in hmap:
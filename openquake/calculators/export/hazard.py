@@ -19,13 +19,15 @@
 import re
 import os
 import sys
+import tempfile
 import itertools
 import collections
 import numpy
 
 from openquake.baselib.general import (
-    group_array, deprecated, AccumDict, DictArray)
+    group_array, deprecated, AccumDict, DictArray, gen_slices)
 from openquake.baselib.python3compat import decode
+from openquake.baselib import config
 from openquake.hazardlib.imt import from_string
 from openquake.calculators.views import view
 from openquake.calculators.extract import extract, get_mesh, get_info
@@ -38,6 +40,7 @@ F64 = numpy.float64
 U8 = numpy.uint8
 U16 = numpy.uint16
 U32 = numpy.uint32
+GMF_CHUNK = 1_000_000  # max number of GMF rows read in memory at once
 
 # with compression you can save 60% of space by losing only 10% of saving time
 savez = numpy.savez_compressed
@@ -391,6 +394,66 @@ def export_hazard_npz(ekey, dstore):
     return [fname]
 
 
+def _gen_gmf_buckets(dstore, chunksize=GMF_CHUNK):
+    # yields arrays of GMFs sorted by (eid, sid), each one containing
+    # the rows of a range of consecutive events; the gmf_data are read
+    # in slices and distributed in temporary files, so that the memory
+    # occupation is bounded by 2 * chunksize rows plus the largest event
+    grp = dstore['gmf_data']
+    M = len(dstore['oqparam'].imtls)
+    names = ['eid', 'sid'] + ['gmv_%d' % m for m in range(M)]
+    dt = numpy.dtype([(name, grp[name].dtype) for name in names])
+    N = len(grp['eid'])
+    E = len(dstore['events'])
+
+    def read(slc):
+        arr = numpy.zeros(slc.stop - slc.start, dt)
+        for name in names:
+            arr[name] = grp[name][slc]
+        return arr
+
+    counts = numpy.zeros(E, int)
+    for slc in gen_slices(0, N, chunksize):
+        counts += numpy.bincount(grp['eid'][slc], minlength=E)
+    bucket = numpy.maximum(counts.cumsum() - 1, 0) // chunksize
+    if N == 0:
+        yield numpy.zeros(0, dt)
+    elif bucket[-1] == 0:  # fast lane, everything fits in memory
+        arr = read(slice(0, N))
+        arr.sort(order=['eid', 'sid'])
+        yield arr
+    else:
+        tmp = config.directory.custom_tmp or os.path.dirname(dstore.filename)
+        with tempfile.TemporaryDirectory(dir=tmp) as tmpdir:
+            fnames = [os.path.join(tmpdir, '%d.bin' % b)
+                      for b in range(bucket[-1] + 1)]
+            for slc in gen_slices(0, N, chunksize):
+                arr = read(slc)
+                bs = bucket[arr['eid']]
+                idx = bs.argsort(kind='stable')
+                uniq, start = numpy.unique(bs[idx], return_index=True)
+                for b, rows in zip(uniq, numpy.split(arr[idx], start[1:])):
+                    with open(fnames[b], 'ab') as f:
+                        rows.tofile(f)
+            for fname in fnames:
+                if os.path.exists(fname):
+                    arr = numpy.fromfile(fname, dt)
+                    os.remove(fname)
+                    arr.sort(order=['eid', 'sid'])
+                    yield arr
+
+
+def _gen_gmfa(dstore, dtype, event_id):
+    # yields composite arrays of GMFs sorted by (event_id, site_id)
+    for arr in _gen_gmf_buckets(dstore):
+        gmfa = numpy.zeros(len(arr), dtype)
+        gmfa['eid'] = event_id[arr['eid']]
+        gmfa['sid'] = arr['sid']
+        for m in range(dtype['gmv'].shape[0]):
+            gmfa['gmv'][:, m] = arr['gmv_%d' % m]
+        yield gmfa
+
+
 @export.add(('gmf_data', 'csv'))
 def export_gmf_data_csv(ekey, dstore):
     oq = dstore['oqparam']
@@ -399,22 +462,15 @@ def export_gmf_data_csv(ekey, dstore):
     sc = dstore['sitecol'].array
     arr = sc[['lon', 'lat']]
     eid = int(ekey[0].split('/')[1]) if '/' in ekey[0] else None
-    gmfa = numpy.zeros(len(dstore['gmf_data/eid']), oq.gmf_data_dt())
-    df = dstore.read_df('gmf_data', 'sid')
-    gmfa['eid'] = df.eid.to_numpy()
-    gmfa['sid'] = df.index.to_numpy()
-    for m in range(len(imts)):
-        gmfa['gmv'][:, m] = df[f'gmv_{m}'].to_numpy()
     event_id = dstore['events']['id']
-    gmfa['eid'] = event_id[gmfa['eid']]
     if eid is None:  # we cannot use extract here
         f = dstore.build_fname('sitemesh', '', 'csv')
         sids = numpy.arange(len(arr), dtype=U32)
         sites = util.compose_arrays(sids, arr, 'site_id')
         writers.write_csv(f, sites)
         fname = dstore.build_fname('gmf', 'data', 'csv')
-        gmfa.sort(order=['eid', 'sid'])
-        writers.write_csv(fname, _expand_gmv(gmfa, imts),
+        gmfas = _gen_gmfa(dstore, oq.gmf_data_dt(), event_id)
+        writers.write_csv(fname, (_expand_gmv(a, imts) for a in gmfas),
                           renamedict={'sid': 'site_id', 'eid': 'event_id'})
         if 'sigma_epsilon' in dstore['gmf_data']:
             sig_eps_csv = dstore.build_fname('sigma_epsilon', '', 'csv')
@@ -429,15 +485,21 @@ def export_gmf_data_csv(ekey, dstore):
             return [fname, f]
     # old format for single eid
     # TODO: is this still used?
-    gmfa = gmfa[gmfa['eid'] == eid]
-    eid2rlz = dict(dstore['events'])
-    rlzi = eid2rlz[eid]
+    idx = numpy.searchsorted(event_id, eid)  # the event IDs are sorted
+    rlzi = dstore['events']['rlz_id'][idx]
+    # read only the rows of the event
+    df = dstore.read_df('gmf_data', 'sid', sel={'eid': idx}).sort_index()
+    gmfa = numpy.zeros(len(df), oq.gmf_data_dt())
+    gmfa['eid'] = eid
+    gmfa['sid'] = df.index.to_numpy()
+    for m in range(len(imts)):
+        gmfa['gmv'][:, m] = df['gmv_%d' % m].to_numpy()
     rlz = rlzs[rlzi]
     data, comment = _build_csv_data(
         gmfa, rlz, dstore['sitecol'], imts, oq.investigation_time)
     fname = dstore.build_fname(
         'gmf', '%d-rlz-%03d' % (eid, rlzi), 'csv')
-    return writers.write_csv(fname, data, comment=comment)
+    return [writers.write_csv(fname, data, comment=comment)]
 
 
 def _expand_gmv(array, imts):
@@ -466,12 +528,13 @@ def _build_csv_data(array, rlz, sitecol, imts, investigation_time):
     # lon, lat, gmv_imt1, ..., gmv_imtN
     smlt_path = '_'.join(rlz.sm_lt_path)
     gsimlt_path = rlz.gsim_rlz.pid
-    comment = ('smlt_path=%s, gsimlt_path=%s, investigation_time=%s' %
-               (smlt_path, gsimlt_path, investigation_time))
+    comment = dict(smlt_path=smlt_path, gsimlt_path=gsimlt_path,
+                   investigation_time=investigation_time)
     rows = [['lon', 'lat'] + imts]
-    for sid, data in group_array(array, 'sid').items():
+    for rec in array:  # there is a single record per site
+        sid = rec['sid']
         row = ['%.5f' % sitecol.lons[sid], '%.5f' % sitecol.lats[sid]] + list(
-            data['gmv'])
+            rec['gmv'])
         rows.append(row)
     return rows, comment
 
@@ -23,6 +23,7 @@ import json
 import gzip
 import ast
 import io
+import os
 
 import requests
 from h5py._hl.dataset import Dataset
@@ -51,6 +52,8 @@ SOURCE_ID = stochastic.rupture_dt['source_id']
 memoized = lru_cache()
 FLOAT = (float, numpy.float32, numpy.float64)
 INT = (int, numpy.int32, numpy.uint32, numpy.int64, numpy.uint64)
+MAX_ASSETCOLS = 8  # number of asset collections kept in memory
+ASSETCOLS = collections.OrderedDict()  # (fname, mtime) -> assetcol
 
 
 class NotFound(Exception):
@@ -589,44 +592,64 @@ def extract_task_info(dstore, what):
         yield decode(name), dic[name]
 
 
-def _agg(losses, idxs):
+def get_assetcol(dstore):
+    """
+    :returns:
+        the AssetCollection of the datastore, cached together with its tag
+        matrices as long as the datastore file is not modified
+    """
+    key = dstore.filename, os.path.getmtime(dstore.filename)
+    try:
+        ASSETCOLS.move_to_end(key)
+    except KeyError:
+        ASSETCOLS[key] = dstore['assetcol']
+        if len(ASSETCOLS) > MAX_ASSETCOLS:
+            ASSETCOLS.popitem(last=False)
+    return ASSETCOLS[key]
+
+
+def _agg(losses, ok):
     shp = losses.shape[1:]
-    if not idxs:
+    if not ok.any():
         # no intersection, return a 0-dim matrix
         return numpy.zeros((0,) + shp, losses.dtype)
-    # numpy.array wants lists, not sets, hence the sorted below
-    return losses[numpy.array(sorted(idxs))].sum(axis=0)
+    return losses[ok].sum(axis=0)
 
 
 def _filter_agg(assetcol, losses, selected, stats=''):
     # losses is an array of shape (A, ..., R) with A=#assets, R=#realizations
-    aids_by_tag = assetcol.get_aids_by_tag()
-    idxs = set(range(len(assetcol)))
+    ok = numpy.ones(len(assetcol), bool)  # selected assets
     tagnames = []
     for tag in selected:
         tagname, tagvalue = tag.split('=', 1)
         if tagvalue == '*':
             tagnames.append(tagname)
+        elif tagname not in assetcol.tagnames:
+            ok[:] = False
         else:
-            idxs &= aids_by_tag[tag]
+            values = [decode(v) for v in getattr(assetcol.tagcol, tagname)]
+            mask = numpy.zeros_like(ok)
+            if tagvalue in values:
+                row = assetcol.get_tag_matrix(tagname)[values.index(tagvalue)]
+                mask[row.indices] = True
+            ok &= mask
     if len(tagnames) > 1:
         raise ValueError('Too many * as tag values in %s' % tagnames)
     elif not tagnames:  # return an array of shape (..., R)
         return ArrayWrapper(
-            _agg(losses, idxs), dict(selected=encode(selected), stats=stats))
+            _agg(losses, ok), dict(selected=encode(selected), stats=stats))
     else:  # return an array of shape (T, ..., R)
         [tagname] = tagnames
         _tags = list(assetcol.tagcol.gen_tags(tagname))
-        all_idxs = [idxs & aids_by_tag[t] for t in _tags]
-        # NB: using a generator expression for all_idxs caused issues (?)
-        data, tags = [], []
-        for idxs, tag in zip(all_idxs, _tags):
-            agglosses = _agg(losses, idxs)
-            if len(agglosses):
-                data.append(agglosses)
-                tags.append(tag)
+        # sparse matrix (T, A') times the losses of the A' selected assets
+        mat = assetcol.get_tag_matrix(tagname)[:, ok]
+        nonzero = numpy.diff(mat.indptr) > 0
+        agglosses = mat[nonzero] @ losses[ok].reshape(ok.sum(), -1)
+        data = agglosses.astype(losses.dtype).reshape(
+            (-1,) + losses.shape[1:]) if nonzero.any() else numpy.array([])
+        tags = [tag for tag, nz in zip(_tags, nonzero) if nz]
         return ArrayWrapper(
-            numpy.array(data),
+            data,
             dict(selected=encode(selected), tags=encode(tags), stats=stats))
 
 
@@ -769,7 +792,7 @@ def extract_agg_losses(dstore, what):
         losses = dstore['avg_losses-rlzs'][:, :, L]
     else:
         raise KeyError('No losses found in %s' % dstore)
-    return _filter_agg(dstore['assetcol'], losses, tags, stats)
+    return _filter_agg(get_assetcol(dstore), losses, tags, stats)
 
 
 @extract.add('agg_damages')
@@ -789,7 +812,7 @@ def extract_agg_damages(dstore, what):
         losses = dstore['damages-rlzs'][:, :, lti]
     else:
         raise KeyError('No damages found in %s' % dstore)
-    return _filter_agg(dstore['assetcol'], losses, tags)
+    return _filter_agg(get_assetcol(dstore), losses, tags)
 
 
 @extract.add('aggregate')
@@ -803,7 +826,7 @@ def extract_aggregate(dstore, what):
     qdic = parse(qstring, info)
     suffix = '-rlzs' if qdic['rlzs'] else '-stats'
     tagnames = qdic.get('tag', [])
-    assetcol = dstore['assetcol']
+    assetcol = get_assetcol(dstore)
     loss_types = info['loss_types']
     ltypes = qdic.get('loss_type', [])  # list of indices
     if ltypes:
@@ -871,10 +894,8 @@ def extract_gmf_npz(dstore, what):
     rlzi = dstore['events'][eid]['rlz_id']
     mesh = get_mesh(dstore['sitecol'])
     n = len(mesh)
-    try:
-        df = dstore.read_df('gmf_data', 'eid').loc[eid]
-    except KeyError:
-        # zero GMF
+    df = dstore.read_df('gmf_data', 'eid', sel={'eid': eid})
+    if len(df) == 0:  # zero GMF
         yield 'rlz-%03d' % rlzi, []
     else:
         gmfa = _gmf(df, n, oq.imtls)
@@ -24,8 +24,7 @@ from openquake.hazardlib.gsim.base import ContextMaker, FarAwayRupture
 from openquake.hazardlib import calc, probability_map, stats
 from openquake.hazardlib.source.rupture import (
     EBRupture, BaseRupture, events_dt, RuptureProxy)
-from openquake.risklib.riskinput import rsi2str
-from openquake.commonlib.calc import gmvs_to_poes
+from openquake.commonlib.calc import update_counts
 
 U16 = numpy.uint16
 U32 = numpy.uint32
@@ -133,6 +132,7 @@ class PmapGetter(object):
         # populate _pmap
         dset = dstore['_poes']  # NLG_
         L, G = dset.shape[1:]
+        self.dtype = dset.dtype  # float32 or float64
         self._pmap = probability_map.ProbabilityMap.build(L, G, self.sids)
         for sid, array in zip(self.sids, dset[list(self.sids)]):
             self._pmap[sid].array = array
@@ -153,12 +153,22 @@ class PmapGetter(object):
         :returns: a list of R probability curves with shape L
         """
         pmap = self.init()
-        pcurves = [probability_map.ProbabilityCurve(numpy.zeros((self.L, 1)))
+        pcurves = [probability_map.ProbabilityCurve(
+            numpy.zeros((self.L, 1), self.dtype))
                    for _ in range(self.num_rlzs)]
         try:
             pc = pmap[sid]
         except KeyError:  # no hazard for sid
             return pcurves
+        if self.dtype == F32:  # compose in log-space to keep the precision
+            with numpy.errstate(divide='ignore'):
+                logpnes = numpy.log1p(-pc.array)
+            for g, rlzis in enumerate(self.rlzs_by_g):
+                for rlzi in rlzis:
+                    pcurves[rlzi].array += logpnes[:, [g]]
+            for pcurve in pcurves:
+                pcurve.array = -numpy.expm1(pcurve.array)
+            return pcurves
         for g, rlzis in enumerate(self.rlzs_by_g):
             c = probability_map.ProbabilityCurve(pc.array[:, [g]])
             for rlzi in rlzis:
@@ -317,18 +327,23 @@ class GmfGetter(object):
     def imts(self):
         return list(self.oqparam.imtls)
 
-    def get_gmfdata(self, mon=performance.Monitor()):
+    def gen_gmfdata(self, mon=performance.Monitor()):
         """
-        :returns: an array of the dtype (sid, eid, gmv)
+        :yields: arrays of the dtype (sid, eid, gmv), one per rupture
         """
-        alldata = []
         self.sig_eps = []
         self.times = []  # rup_id, nsites, dt
         for computer in self.gen_computers(mon):
             data, dt = computer.compute_all(
                 self.min_iml, self.rlzs_by_gsim, self.sig_eps)
             self.times.append((computer.ebrupture.id, len(computer.sids), dt))
-            alldata.append(data)
+            yield data
+
+    def get_gmfdata(self, mon=performance.Monitor()):
+        """
+        :returns: an array of the dtype (sid, eid, gmv)
+        """
+        alldata = list(self.gen_gmfdata(mon))
         if not alldata:
             return []
         return numpy.concatenate(alldata)
@@ -359,22 +374,29 @@ class GmfGetter(object):
         """
         oq = self.oqparam
         mon = monitor('getting ruptures', measuremem=True)
-        hcurves = {}  # key -> poes
+        res = {}
         if oq.hazard_curves_from_gmfs:
+            # the exceedance counts are updated rupture by rupture, so
+            # that the GMFs are kept only if ground_motion_fields is set
             hc_mon = monitor('building hazard curves', measuremem=False)
-            gmfdata = self.get_gmfdata(mon)  # returned later
-            hazard = self.get_hazard_by_sid(data=gmfdata)
-            for sid, hazardr in hazard.items():
-                dic = general.group_array(hazardr, 'rlz')
-                for rlzi, array in dic.items():
-                    with hc_mon:
-                        poes = gmvs_to_poes(
-                            array['gmv'].T, oq.imtls,
-                            oq.ses_per_logic_tree_path)
-                        for m, imt in enumerate(oq.imtls):
-                            hcurves[rsi2str(rlzi, sid, imt)] = poes[m]
+            rlzs = numpy.unique(numpy.concatenate(
+                [rlzs for rlzs in self.rlzs_by_gsim.values()]))
+            counts = numpy.zeros((self.N, len(rlzs), len(oq.imtls.array)),
+                                 U32)
+            alldata = []
+            for data in self.gen_gmfdata(mon):
+                with hc_mon:
+                    update_counts(counts, data['sid'],
+                                  numpy.searchsorted(rlzs, data['rlz']),
+                                  data['gmv'], oq.imtls)
+                if oq.ground_motion_fields:
+                    alldata.append(data)
+            sids, = counts.any(axis=(1, 2)).nonzero()
+            res['hcurves'] = sids, rlzs, counts[sids]
+            gmfdata = numpy.concatenate(alldata) if alldata else []
         if not oq.ground_motion_fields:
-            return dict(gmfdata=(), hcurves=hcurves)
+            res['gmfdata'] = ()
+            return res
         if not oq.hazard_curves_from_gmfs:
             gmfdata = self.get_gmfdata(mon)
         if len(gmfdata) == 0:
@@ -382,7 +404,7 @@ class GmfGetter(object):
         times = numpy.array([tup + (monitor.task_no,) for tup in self.times],
                             time_dt)
         times.sort(order='rup_id')
-        res = dict(gmfdata=gmfdata, hcurves=hcurves, times=times,
+        res.update(gmfdata=gmfdata, times=times,
                    sig_eps=numpy.array(self.sig_eps, self.sig_eps_dt))
         return res
 
@@ -167,6 +167,12 @@ class ClassicalTestCase(CalculatorTestCase):
             'hmaps-rlzs', imt="PGA", site_id=0).squeeze()
         aac(iml, [0.167078, 0.134646], atol=.0001)  # for the two realizations
 
+        # compare with the float32 mode, where the pnes are in log-space
+        hc64 = self.calc.datastore['hcurves-rlzs'][()]
+        self.run_calc(case_7.__file__, 'job.ini', pmap_dtype='float32')
+        self.assertEqual(self.calc.datastore['_poes'].dtype, numpy.float32)
+        aac(self.calc.datastore['hcurves-rlzs'][()], hc64, rtol=1E-5)
+
         # exercise the warning for no output when mean_hazard_curves='false'
         self.run_calc(
             case_7.__file__, 'job.ini', mean_hazard_curves='false',
@@ -239,6 +245,29 @@ class ClassicalTestCase(CalculatorTestCase):
         # test disagg_by_src in a complex case with duplicated sources
         check_disagg_by_src(self.calc.datastore)
 
+        # test tile streaming with 3 tiles
+        hc = self.calc.datastore['hcurves-stats'][()]
+        self.run_calc(case_13.__file__, 'job.ini', tile_streaming='true',
+                      disagg_by_src='false', max_sites_disagg='2',
+                      max_sites_per_tile='8', concurrent_tasks='64')
+        self.assertTrue(self.calc.streaming)
+        aac(self.calc.datastore['hcurves-stats'][()], hc, rtol=1E-6)
+        # there are no build_hazard tasks with zero sites
+        ti = self.calc.datastore['task_info'][()]
+        ntasks = (ti['taskname'] == b'build_hazard').sum()
+        self.assertEqual(ntasks, len(self.calc.sitecol))
+
+        # test tile streaming with a filtered site collection
+        calc = self.get_calc(case_13.__file__, 'job.ini',
+                             tile_streaming='true', disagg_by_src='false',
+                             max_sites_disagg='2', max_sites_per_tile='8')
+        calc.pre_execute()
+        sids = calc.sitecol.sids[calc.sitecol.sids % 3 > 0]
+        calc.sitecol = calc.sitecol.filtered(sids)
+        calc.run(pre_execute=False)
+        self.assertTrue(calc.streaming)
+        aac(calc.datastore['hcurves-stats'][sids], hc[sids], rtol=1E-6)
+
     def test_case_14(self):
         # test classical with 2 gsims and 1 sample
         self.assert_curves_ok(['hazard_curve-rlz-000_PGA.csv'],
@@ -327,6 +327,34 @@ class EventBasedRiskTestCase(CalculatorTestCase):
         fname = export(('losses_by_event', 'csv'), self.calc.datastore)[0]
         self.assertEqualFiles('expected/elt.csv', fname, delta=1E-4)
 
+        # same results in pipeline mode, with GMFs and losses in separate tasks
+        self.run_calc(case_master.__file__, 'job.ini',
+                      calculation_mode='ebrisk', exports='',
+                      concurrent_tasks='4', ebrisk_site_buckets='3')
+        fname = export(('tot_losses-stats', 'csv'), self.calc.datastore)[0]
+        self.assertEqualFiles('expected/agglosses.csv', fname, delta=1E-5)
+
+        fname = export(('avg_losses-stats', 'csv'), self.calc.datastore)[0]
+        self.assertEqualFiles('expected/avg_losses-mean.csv',
+                              fname, delta=1E-4)
+        fname = export(('losses_by_event', 'csv'), self.calc.datastore)[0]
+        self.assertEqualFiles('expected/elt.csv', fname, delta=1E-4)
+
+        # the losses split across site buckets are summed by event
+        for idx in self.calc.datastore['event_loss_table']:
+            eids = self.calc.datastore['event_loss_table/' + idx]['event_id']
+            self.assertEqual(len(eids), len(numpy.unique(eids)))
+        self.assertFalse(os.path.exists(self.calc.param['scratch_dir']))
+
+        # the bucket files are removed also if the calculation fails
+        with mock.patch('openquake.calculators.ebrisk.calc_risk',
+                        side_effect=RuntimeError('boom')):
+            with self.assertRaises(RuntimeError):
+                self.run_calc(case_master.__file__, 'job.ini',
+                              calculation_mode='ebrisk', exports='',
+                              concurrent_tasks='4', ebrisk_site_buckets='3')
+        self.assertFalse(os.path.exists(self.calc.param['scratch_dir']))
+
     def check_multi_tag(self, dstore):
         # multi-tag aggregations
         arr = extract(dstore, 'aggregate/avg_losses?'
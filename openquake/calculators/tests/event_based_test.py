@@ -217,6 +217,13 @@ class EventBasedTestCase(CalculatorTestCase):
         [f, _, _] = export(('gmf_data', 'csv'), self.calc.datastore)
         self.assertEqualFiles('expected/gmf-data.csv', f)
 
+        # export a single event, reading only its rows
+        df = self.calc.datastore.read_df('gmf_data', 'sid')
+        [f] = export(('gmf_data/1', 'csv'), self.calc.datastore)
+        with open(f) as csv:
+            lines = csv.read().splitlines()
+        self.assertEqual(len(lines), 2 + (df.eid == 1).sum())
+
         # check the rupture multiplicity
         [f] = export(('ruptures', 'xml'), self.calc.datastore)
         self.assertEqualFiles('expected/ses.xml', f)
@@ -478,6 +485,9 @@ class EventBasedTestCase(CalculatorTestCase):
         nd_mean = df[df.newmark_disp > 0].newmark_disp.mean()
         self.assertGreater(pd_mean, 0)
         self.assertGreater(nd_mean, 0)
+        # the PGAs below the minimum_intensity are discarded and not
+        # stored as 1E-5 by the NewmarkDisplacement peril
+        self.assertGreaterEqual(df.gmv_0.min(), .04)
 
     def test_case_26_liq(self):
         # cali liquefaction simplified
@@ -169,6 +169,8 @@ class ScenarioRiskTestCase(CalculatorTestCase):
         if sys.platform != 'darwin':
             self.assertEqualFiles('expected/agglosses_taxo.txt',
                                   gettemp(str(agglosses)))
+        tot = extract(self.calc.datastore, 'agg_losses/structural').array
+        aac(agglosses.sum(axis=0), tot, rtol=1E-6)
 
         # extract agglosses with a * and a selection
         obj = extract(self.calc.datastore, 'agg_losses/structural?'
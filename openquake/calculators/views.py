@@ -29,7 +29,8 @@ import pandas
 from openquake.baselib.general import (
     humansize, countby, AccumDict, CallableDict,
     get_array, group_array, fast_agg, fast_agg3)
-from openquake.baselib.performance import performance_view
+from openquake.baselib.performance import (
+    performance_view, stacks_view)
 from openquake.baselib.python3compat import encode, decode
 from openquake.hazardlib.gsim.base import ContextMaker
 from openquake.commonlib import util
@@ -450,9 +451,68 @@ def view_fullreport(token, dstore):
 @view.add('performance')
 def view_performance(token, dstore):
     """
-    Display performance information
+    Display performance information and the bytes received from the
+    tasks, with the compression ratio
     """
-    return rst_table(performance_view(dstore))
+    tbl = rst_table(performance_view(dstore))
+    if 'task_info' not in dstore:
+        return tbl
+    task_info = dstore['task_info'][()]
+    if 'uncompressed' not in task_info.dtype.names:  # old datastore
+        return tbl
+    data = [['task', 'received', 'uncompressed', 'ratio']]
+    for task, arr in group_array(task_info, 'taskname').items():
+        recv = arr['received'].sum()
+        raw = arr['uncompressed'].sum()
+        data.append((decode(task), humansize(recv), humansize(raw),
+                     '%.2f' % (raw / recv if recv else 1)))
+    return tbl + '\n\n' + rst_table(data)
+
+
+@view.add('profile')
+def view_profile(token, dstore):
+    """
+    Display the functions where the tasks spent most of their time,
+    according to the sampling profiler (enabled by setting
+    `sampling_interval` in the job.ini or the environment variable
+    OQ_SAMPLING). By default the top 20 functions are shown; to see
+    the top 50 use::
+
+      $ oq show profile:50
+    """
+    n = int(token.split(':')[1]) if ':' in token else 20
+    stacks = stacks_view(dstore)
+    if not stacks:
+        return 'Not available'
+    own = collections.Counter()  # samples in the function itself
+    tot = collections.Counter()  # samples in the function and its callees
+    for stack, samples in stacks.items():
+        frames = stack.split(';')
+        own[frames[-1]] += samples
+        for frame in set(frames[1:]):
+            tot[frame] += samples
+    num_samples = sum(stacks.values())
+    data = [(frame, samples, '%.1f%%' % (samples / num_samples * 100),
+             tot[frame], '%.1f%%' % (tot[frame] / num_samples * 100))
+            for frame, samples in own.most_common(n)]
+    return rst_table(
+        data, ['function', 'own_samples', 'own', 'tot_samples', 'tot'])
+
+
+@view.add('flamegraph')
+def view_flamegraph(token, dstore):
+    """
+    Display the folded stacks collected by the sampling profiler, one per
+    line, in the format accepted by flamegraph.pl and speedscope. It is
+    possible to restrict the output to a given task::
+
+      $ oq show flamegraph:classical > classical.folded
+    """
+    task = token.split(':')[1] if ':' in token else None
+    stacks = stacks_view(dstore)
+    return '\n'.join('%s %d' % (stack, samples)
+                     for stack, samples in sorted(stacks.items())
+                     if task is None or stack.split(';', 1)[0] == task)
 
 
 def stats(name, array, *extras):
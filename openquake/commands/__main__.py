@@ -38,16 +38,33 @@ if os.environ['OQ_DISTRIBUTE'] == 'celery' and 'run' in sys.argv:
           'Use oq engine --run instead!')
 
 
+# commands defined in a module with a different name
+CMD2MOD = {'plot_ac': 'plot_agg_curve'}
+
+
+def get_modnames(cmd=None):
+    """
+    :param cmd: the name of an oq command or None
+    :returns: the names of the modules to import to define the command(s)
+    """
+    mods = [mod[:-3] for mod in os.listdir(commands.__path__[0])
+            if mod.endswith('.py') and not mod.startswith('_')]
+    mod = CMD2MOD.get(cmd, cmd)
+    if mod in mods:  # import only the module defining the command
+        mods = [mod]
+    return ['openquake.commands.%s' % mod for mod in mods]
+
+
 def oq():
     args = set(sys.argv[1:])
     if 'engine' not in args and 'dbserver' not in args:
         # oq engine and oq dbserver define their own log levels
         level = logging.DEBUG if 'debug' in args else logging.INFO
         logging.basicConfig(level=level)
-    modnames = ['openquake.commands.%s' % mod[:-3]
-                for mod in os.listdir(commands.__path__[0])
-                if mod.endswith('.py') and not mod.startswith('_')]
-    for modname in modnames:
+    # the commands are registered lazily: `oq help` and `oq --help` import
+    # all of them, while `oq show` imports only openquake.commands.show
+    cmd = sys.argv[1] if len(sys.argv) > 1 else None
+    for modname in get_modnames(cmd):
         importlib.import_module(modname)
     parser = sap.compose(sap.registry.values(),
                          prog='oq', version=__version__)
@@ -0,0 +1,95 @@
+# -*- coding: utf-8 -*-
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+#
+# Copyright (C) 2020 GEM Foundation
+#
+# OpenQuake is free software: you can redistribute it and/or modify it
+# under the terms of the GNU Affero General Public License as published
+# by the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# OpenQuake is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with OpenQuake. If not, see <http://www.gnu.org/licenses/>.
+import os
+import sys
+import numpy
+from openquake.baselib import sap, datastore, parallel
+from openquake.bench import save_run, load_run, compare
+from openquake.bench.micro import micro as MICRO, run as run_micro
+from openquake.bench.macro import MACRO, run as run_macro
+from openquake.calculators.views import rst_table
+
+
+def _stats(results):
+    rows = []
+    for name, res in results.items():
+        times = numpy.array(res['times'])
+        rows.append((name, len(times), times.mean(), times.std(),
+                     times.min(), res['peak_rss_mb']))
+    return rst_table(
+        rows, ['benchmark', 'repeat', 'mean', 'stddev', 'min', 'peak_rss_mb'])
+
+
+@sap.script
+def bench(names, macro=False, repeat=None, size=None, history=None,
+          baseline=None, tolerance=.1, available=False):
+    """
+    Run the micro-benchmarks (and the macro-benchmarks with --macro),
+    store the results in the history and compare them with a baseline
+    """
+    if available:
+        for name in sorted(MICRO):
+            print('micro', name)
+        for name in sorted(MACRO):
+            print('macro', name)
+        return
+    unknown = set(names) - set(MICRO) - set(MACRO)
+    if unknown:
+        sys.exit('Unknown benchmarks %s, see oq bench --available' %
+                 ' '.join(sorted(unknown)))
+    if names:
+        micro_names = [name for name in names if name in MICRO]
+        macro_names = [name for name in names if name in MACRO]
+    else:
+        micro_names = sorted(MICRO)
+        macro_names = sorted(MACRO) if macro else []
+    try:
+        mic = run_micro(micro_names, size, repeat or 5)
+        mac = run_macro(macro_names, repeat or 1)
+    finally:
+        parallel.Starmap.shutdown()
+    if mic:
+        print(_stats(mic))
+    if mac:
+        print(_stats(mac))
+    if not history:
+        datadir = datastore.get_datadir()
+        os.makedirs(datadir, exist_ok=True)
+        history = os.path.join(datadir, 'bench.json')
+    base = load_run(baseline) if baseline else None
+    rec = save_run(history, mic, mac)
+    print('Saved the results in %s' % history)
+    if base:
+        rows = compare(rec, base, tolerance)
+        print(rst_table(rows, ['benchmark', 'base_time', 'time', 'ratio',
+                               'pvalue', 'status']))
+        slower = [row[0] for row in rows if row[-1] == 'slower']
+        if slower:
+            sys.exit('Regressions with respect to the baseline of %s: %s' %
+                     (base['date'], ' '.join(slower)))
+
+
+bench.arg('names', 'names of the benchmarks (default all)', nargs='*')
+bench.flg('macro', 'run also the macro-benchmarks')
+bench.opt('repeat', 'number of repetitions (default 5 micro, 1 macro)',
+          type=int)
+bench.opt('size', 'override the size of the micro-benchmarks', type=int)
+bench.opt('history', 'JSON file where to append the results')
+bench.opt('baseline', 'JSON file containing the baseline as last run')
+bench.opt('tolerance', 'relative tolerance on the times', type=float)
+bench.flg('available', 'list the available benchmarks')
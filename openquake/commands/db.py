@@ -21,7 +21,6 @@ import inspect
 import getpass
 from decorator import getfullargspec
 from openquake.baselib import sap, config
-from openquake.calculators.views import rst_table
 from openquake.commonlib import logs
 from openquake.server import dbserver
 from openquake.server.db import actions
@@ -59,6 +58,7 @@ def db(cmd, args=()):
     dbserver.ensure_on()
     res = logs.dbcmd(cmd, *convert(args))
     if hasattr(res, '_fields') and res.__class__.__name__ != 'Row':
+        from openquake.calculators.views import rst_table
         print(rst_table(res))
     else:
         print(res)
@@ -24,8 +24,6 @@ from openquake.baselib import sap
 from openquake.baselib import datastore, hdf5
 from openquake.commonlib.writers import write_csv
 from openquake.commonlib import util
-from openquake.calculators.views import view, rst_table
-from openquake.calculators.extract import extract
 
 
 def str_or_int(calc_id):
@@ -36,6 +34,7 @@ def str_or_int(calc_id):
 
 
 def print_(aw):
+    from openquake.calculators.views import rst_table
     if hasattr(aw, 'json'):
         print(json.dumps(json.loads(aw.json), indent=2))
     elif hasattr(aw, 'shape_descr'):
@@ -73,6 +72,9 @@ def show(what='contents', calc_id=-1, extra=()):
             print('#%d %s: %s' % row)
         return
 
+    # the calculators are imported here since `oq show all` does not need them
+    from openquake.calculators.views import view
+    from openquake.calculators.extract import extract
     ds = util.read(calc_id)
 
     # this part is experimental
@@ -17,6 +17,7 @@
 # along with OpenQuake. If not, see <http://www.gnu.org/licenses/>.
 import os
 import sys
+import subprocess
 import unittest.mock as mock
 import shutil
 import zipfile
@@ -34,9 +35,11 @@ from openquake import commonlib
 from openquake.engine.engine import run_jobs
 from openquake.commands.info import info
 from openquake.commands.tidy import tidy
+from openquake.commands.bench import bench
 from openquake.commands.show import show
 from openquake.commands.show_attrs import show_attrs
 from openquake.commands.export import export
+from openquake.calculators.export import export as export_
 from openquake.commands.extract import extract
 from openquake.commands.sample import sample
 from openquake.commands.reduce_sm import reduce_sm
@@ -51,6 +54,7 @@ from openquake.commands import run
 from openquake.commands.upgrade_nrml import upgrade_nrml
 from openquake.commands.tests.data import to_reduce
 from openquake.calculators.views import view
+from openquake.bench import compare
 from openquake.qa_tests_data.classical import case_1, case_9, case_18
 from openquake.qa_tests_data.classical_risk import case_3
 from openquake.qa_tests_data.scenario import case_4
@@ -471,6 +475,40 @@ class DbTestCase(unittest.TestCase):
             except dbapi.NotFound:  # happens on an empty db
                 pass
 
+    def test_display_names(self):
+        # all display name keys must be exportable
+        from openquake.server.db.actions import DISPLAY_NAME
+        exportable = {key for key, fmt in export_}
+        for key in DISPLAY_NAME:
+            self.assertIn(key, exportable)
+
+
+class ImportTimeTestCase(unittest.TestCase):
+    # the light commands must not import the calculators
+    def check(self, cmd, *heavy_modules):
+        code = '''import sys, importlib
+from openquake.commands.__main__ import get_modnames
+for modname in get_modnames(%r):
+    importlib.import_module(modname)
+print(' '.join(sys.modules))''' % cmd
+        out = subprocess.run(
+            [sys.executable, '-c', code], stdout=subprocess.PIPE,
+            check=True, universal_newlines=True).stdout
+        modules = set(out.splitlines()[-1].split())
+        for mod in heavy_modules:
+            self.assertNotIn(mod, modules)
+
+    def test_purge(self):
+        self.check('purge', 'pandas', 'openquake.hazardlib',
+                   'openquake.calculators')
+
+    def test_db(self):
+        self.check('db', 'pandas', 'openquake.hazardlib',
+                   'openquake.calculators')
+
+    def test_show(self):
+        self.check('show', 'matplotlib', 'openquake.calculators')
+
 
 class EngineRunJobTestCase(unittest.TestCase):
     def test_multi_run(self):
@@ -610,5 +648,33 @@ class NRML2CSVTestCase(unittest.TestCase):
         shutil.rmtree(temp_dir)
 
 
+class BenchTestCase(unittest.TestCase):
+    def test_run_and_compare(self):
+        history = gettemp(suffix='.json')
+        with Print.patch() as p:
+            bench(['get_poes', 'classical_case_1'], size=10, repeat=2,
+                  history=history)
+        self.assertIn('get_poes', str(p))
+        self.assertIn('classical_case_1', str(p))
+        with Print.patch() as p:
+            bench(['get_poes'], size=10, repeat=2, history=history,
+                  baseline=history, tolerance=10)
+        self.assertIn('pvalue', str(p))
+
+    def test_compare(self):
+        base = dict(micro={'a': dict(times=[1., 1.1, .9]),
+                           'b': dict(times=[1., 1.1, .9])},
+                    macro={'c': dict(times=[2.], phases={
+                        'total x': dict(time_sec=[1.])})})
+        new = dict(micro={'a': dict(times=[2., 2.1, 1.9]),
+                          'b': dict(times=[1., 1.2, .9])},
+                   macro={'c': dict(times=[1.], phases={
+                       'total x': dict(time_sec=[.001])})})
+        status = {row[0]: row[-1] for row in compare(new, base)}
+        self.assertEqual(
+            status, {'a': 'slower', 'b': 'ok', 'c': 'faster',
+                     'c|total x': 'faster'})
+
+
 def teardown_module():
     parallel.Starmap.shutdown()
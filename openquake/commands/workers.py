@@ -20,6 +20,7 @@ import getpass
 from pprint import pprint
 from openquake.baselib import sap, config
 from openquake.commonlib import logs
+from openquake.calculators.views import rst_table
 
 ro_commands = ('status', 'inspect')
 
@@ -32,7 +33,15 @@ def workers(cmd):
     if (cmd not in ro_commands and config.dbserver.multi_user and
             getpass.getuser() not in 'openquake michele'):
         sys.exit('oq workers only works in single user mode')
-    pprint(logs.dbcmd('zmq_' + cmd))
+    if cmd == 'status':  # display also the health of the workers
+        pprint(logs.dbcmd('zmq_status'))
+        rows = logs.dbcmd('zmq_health')
+        if rows:
+            header = ['host', 'pid', 'status', 'restarts', 'task', 'mem_mb']
+            print(rst_table([(row[0], str(row[1])) + tuple(row[2:])
+                             for row in rows], header))
+    else:
+        pprint(logs.dbcmd('zmq_' + cmd))
 
 
 workers.arg('cmd', 'command',
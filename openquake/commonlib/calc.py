@@ -204,6 +204,30 @@ def gmvs_to_poes(gmvs, imtls, ses_per_logic_tree_path):
     return arr
 
 
+def update_counts(counts, sidx, ridx, gmvs, imtls):
+    """
+    Update the exceedance counts with a block of ground motion values.
+
+    :param counts: an array of exceedance counts of shape (N, R, L)
+    :param sidx: an array of E site indices
+    :param ridx: an array of E realization indices
+    :param gmvs: an array of GMVs of shape (E, M)
+    :param imtls: a dictionary imt -> imls with M IMTs and L levels
+    """
+    for m, imt in enumerate(imtls):
+        exceeding = gmvs[:, m, None] >= imtls[imt]  # shape (E, L1)
+        numpy.add.at(counts[:, :, imtls(imt)], (sidx, ridx), exceeding)
+
+
+def counts_to_poes(counts, ses_per_logic_tree_path):
+    """
+    :param counts: an array of exceedance counts
+    :param ses_per_logic_tree_path: a positive integer
+    :returns: an array of PoEs with the same shape of the counts
+    """
+    return 1. - numpy.exp(- (counts / ses_per_logic_tree_path))
+
+
 # ################## utilities for classical calculators ################ #
 
 def make_hmap(pmap, imtls, poes, sid=None):
@@ -48,7 +48,7 @@ from openquake.hazardlib.imt import from_string
 from openquake.hazardlib import valid, nrml, InvalidFile, pmf
 from openquake.hazardlib.sourceconverter import SourceGroup
 from openquake.hazardlib.lt import (
-    Branch, BranchSet, LogicTreeError, parse_uncertainty, sample, random)
+    Branch, BranchSet, LogicTreeError, parse_uncertainty, random, sample_idxs)
 
 TRT_REGEX = re.compile(r'tectonicRegion="([^"]+?)"')
 ID_REGEX = re.compile(r'id="([^"]+?)"')
@@ -58,6 +58,7 @@ U16 = numpy.uint16
 U32 = numpy.uint32
 I32 = numpy.int32
 F32 = numpy.float32
+F64 = numpy.float64
 
 rlz_dt = numpy.dtype([
     ('ordinal', U32),
@@ -728,6 +729,16 @@ class ImtWeight(object):
                 raise InvalidLogicTree(
                     'There are duplicated IMTs in the weights')
 
+    @classmethod
+    def new(cls, dic):
+        """
+        :param dic: a dictionary imt -> weight
+        :returns: a new ImtWeight instance
+        """
+        self = object.__new__(cls)
+        self.dic = dic
+        return self
+
     def __mul__(self, other):
         new = object.__new__(self.__class__)
         if isinstance(other, self.__class__):
@@ -1056,6 +1067,69 @@ class GsimLogicTree(object):
             [trt] = self.values
         return sorted(self.values[trt])
 
+    def get_branch_groups(self):
+        """
+        :returns: a list of T lists of branches, one per tectonic region type
+        """
+        # NB: branches are already sorted
+        return [[b for b in self.branches if b.trt == trt]
+                for trt in self.values]
+
+    def get_paths(self, n=0, seed=0, sampling_method='early_weights'):
+        """
+        :param n: number of samples (0 means full enumeration)
+        :param seed: random seed
+        :param sampling_method: by default 'early_weights'
+        :returns:
+            an array of shape (P, T) with the index of the branch chosen
+            for each tectonic region type, being P the number of paths
+            (or the number of samples)
+        """
+        groups = self.get_branch_groups()
+        T = len(groups)
+        if n == 0:  # full enumeration, in the order of itertools.product
+            shape = [len(branches) for branches in groups]
+            P = int(numpy.prod(shape))
+            return numpy.indices(shape, U16).reshape(T, P).T
+        probs = random((n, T), seed, sampling_method)
+        paths = numpy.zeros((n, T), U16)
+        for t, branches in enumerate(groups):
+            cdf = numpy.cumsum([b.weight['weight'] for b in branches])
+            paths[:, t] = sample_idxs(cdf, probs[:, t], sampling_method)
+        return paths
+
+    def get_weights(self, paths):
+        """
+        :param paths: an array of shape (P, T) as returned by .get_paths
+        :returns: a list of K weight keys and an array of shape (P, K)
+        """
+        keys = set()
+        for branch in self.branches:
+            keys.update(branch.weight.dic)
+        keys = ['weight'] + sorted(keys - {'weight'})
+        weights = numpy.ones((len(paths), len(keys)))
+        for t, branches in enumerate(self.get_branch_groups()):
+            ws = numpy.array([[b.weight[k] for k in keys] for b in branches])
+            weights *= ws[paths[:, t]]
+        return keys, weights
+
+    def get_realizations(self, paths):
+        """
+        :param paths: an array of shape (P, T) as returned by .get_paths
+        :returns: a list of P Realization objects
+        """
+        groups = self.get_branch_groups()
+        keys, weights = self.get_weights(paths)
+        rlzs = []
+        for i, (path, ws) in enumerate(zip(paths, weights.tolist())):
+            branches = [brs[b] for brs, b in zip(groups, path)]
+            value = tuple(branch.gsim for branch in branches)
+            lt_uid = tuple(branch.id if branch.effective else '@'
+                           for branch in branches)
+            weight = ImtWeight.new(dict(zip(keys, ws)))
+            rlzs.append(Realization(value, weight, i, lt_uid))
+        return rlzs
+
     def sample(self, n, seed, sampling_method):
         """
         :param n: number of samples
@@ -1063,47 +1137,13 @@ class GsimLogicTree(object):
         :param sampling_method: by default 'early_weights'
         :returns: n Realization objects
         """
-        m = len(self.values)  # number of TRTs
-        probs = random((n, m), seed, sampling_method)
-        brlists = [sample([b for b in self.branches if b.trt == trt],
-                          probs[:, i], sampling_method)
-                   for i, trt in enumerate(self.values)]
-        rlzs = []
-        for i in range(n):
-            weight = 1
-            lt_path = []
-            lt_uid = []
-            value = []
-            for brlist in brlists:  # there is branch list for each TRT
-                branch = brlist[i]
-                lt_path.append(branch.id)
-                lt_uid.append(branch.id if branch.effective else '@')
-                weight *= branch.weight
-                value.append(branch.gsim)
-            rlz = Realization(tuple(value), weight, i, tuple(lt_uid))
-            rlzs.append(rlz)
-        return rlzs
+        return self.get_realizations(self.get_paths(n, seed, sampling_method))
 
     def __iter__(self):
         """
         Yield :class:`openquake.commonlib.logictree.Realization` instances
         """
-        groups = []
-        # NB: branches are already sorted
-        for trt in self.values:
-            groups.append([b for b in self.branches if b.trt == trt])
-        # with T tectonic region types there are T groups and T branches
-        for i, branches in enumerate(itertools.product(*groups)):
-            weight = 1
-            lt_path = []
-            lt_uid = []
-            value = []
-            for trt, branch in zip(self.values, branches):
-                lt_path.append(branch.id)
-                lt_uid.append(branch.id if branch.effective else '@')
-                weight *= branch.weight
-                value.append(branch.gsim)
-            yield Realization(tuple(value), weight, i, tuple(lt_uid))
+        yield from self.get_realizations(self.get_paths())
 
     def __repr__(self):
         lines = ['%s,%s,%s,w=%s' %
@@ -1188,6 +1228,9 @@ class LtRealization(object):
         return hash(repr(self))
 
 
+RlzArrays = namedtuple('RlzArrays', 'eri gidx paths keys weights')
+
+
 class FullLogicTree(object):
     """
     The full logic tree as composition of
@@ -1301,80 +1344,92 @@ class FullLogicTree(object):
         """
         return dict(zip(self.gsim_lt.values, rlz.gsim_rlz.value))
 
-    def get_realizations(self):
+    def get_rlz_arrays(self):
         """
-        :returns: the complete list of LtRealizations
-        """
-        rlzs = []
-        self._gsims_by_trt = AccumDict(accum=set())  # trt -> gsims
+        Build the realization space as compact arrays; the result is
+        cached and recomputed only if the gsim logic tree changes.
+
+        :returns:
+            a RlzArrays namedtuple with fields `eri` (the effective source
+            model realization index of each realization), `gidx` (the gsim
+            path of each realization), `paths` (an array of shape (P, T)
+            with the branch index of each gsim path for each TRT), `keys`
+            (the K weight keys) and `weights` (an array of shape (R, K)
+            with the normalized weights of each realization)
+        """
+        if getattr(self, '_arrays_gsim_lt', None) is self.gsim_lt:
+            return self._arrays
+        num_sms = len(self.sm_rlzs)
         if self.num_samples:  # sampling
-            sm_rlzs = []
-            for sm_rlz in self.sm_rlzs:
-                sm_rlzs.extend([sm_rlz] * sm_rlz.samples)
-            gsim_rlzs = self.gsim_lt.sample(self.num_samples, self.seed + 1,
-                                            self.sampling_method)
-            for t, trt in enumerate(self.gsim_lt.values):
-                self._gsims_by_trt[trt].update(g.value[t] for g in gsim_rlzs)
-            for i, gsim_rlz in enumerate(gsim_rlzs):
-                rlz = LtRealization(i, sm_rlzs[i].lt_path, gsim_rlz,
-                                    sm_rlzs[i].weight * gsim_rlz.weight)
-                rlzs.append(rlz)
+            paths = self.gsim_lt.get_paths(
+                self.num_samples, self.seed + 1, self.sampling_method)
+            eri = numpy.repeat(numpy.arange(num_sms, dtype=U32),
+                               [sm.samples for sm in self.sm_rlzs])
+            gidx = numpy.arange(len(eri), dtype=U32)
         else:  # full enumeration
-            gsim_rlzs = list(self.gsim_lt)
-            self._gsims_by_trt = self.gsim_lt.values
-            i = 0
-            for sm_rlz in self.sm_rlzs:
-                for gsim_rlz in gsim_rlzs:
-                    rlz = LtRealization(i, sm_rlz.lt_path, gsim_rlz,
-                                        sm_rlz.weight * gsim_rlz.weight)
-                    rlzs.append(rlz)
-                    i += 1
-        assert rlzs, 'No realizations found??'
+            paths = self.gsim_lt.get_paths()
+            eri = numpy.repeat(numpy.arange(num_sms, dtype=U32), len(paths))
+            gidx = numpy.tile(numpy.arange(len(paths), dtype=U32), num_sms)
+        assert len(eri), 'No realizations found??'
+        keys, weights = self.gsim_lt.get_weights(paths)
+        sm_weights = numpy.array([sm.weight for sm in self.sm_rlzs], F64)
+        weights = weights[gidx] * sm_weights[eri, None]
         if self.num_samples and self.sampling_method.startswith('early_'):
-            assert len(rlzs) == self.num_samples, (len(rlzs), self.num_samples)
-            for rlz in rlzs:
-                for k in rlz.weight.dic:
-                    rlz.weight.dic[k] = 1. / self.num_samples
+            assert len(eri) == self.num_samples, (len(eri), self.num_samples)
+            weights[:] = 1. / self.num_samples
         else:  # keep the weights
-            tot_weight = sum(rlz.weight for rlz in rlzs)
-            if not tot_weight.is_one():
+            # NB: cumsum sums sequentially, as the engine always did
+            tot = weights.cumsum(axis=0)[-1]
+            if not all(abs(tot[tot != 0] - 1.) < pmf.PRECISION):
                 # this may happen for rounding errors; we ensure the sum of
                 # the weights is 1
-                for rlz in rlzs:
-                    rlz.weight = rlz.weight / tot_weight
+                weights /= tot
+        self._arrays = RlzArrays(eri, gidx, paths, keys, weights)
+        self._arrays_gsim_lt = self.gsim_lt
+        self._rlzs_by_grp = {}
+        return self._arrays
+
+    def get_realizations(self):
+        """
+        :returns: the complete list of LtRealizations
+        """
+        arr = self.get_rlz_arrays()
+        gsim_rlzs = self.gsim_lt.get_realizations(arr.paths)
+        rlzs = []
+        for i, (eri, g, ws) in enumerate(
+                zip(arr.eri, arr.gidx, arr.weights.tolist())):
+            weight = ImtWeight.new(dict(zip(arr.keys, ws)))
+            rlzs.append(LtRealization(
+                i, self.sm_rlzs[eri].lt_path, gsim_rlzs[g], weight))
         return rlzs
 
     def get_rlzs_by_eri(self):
         """
         :returns: a dict eri -> rlzs
         """
-        smltpath = operator.attrgetter('sm_lt_path')
-        eri_by_ltp = self.get_eri_by_ltp()
         rlzs = self.get_realizations()
-        dic = {eri_by_ltp['~'.join(ltp)]: rlzs for ltp, rlzs in groupby(
-            rlzs, smltpath).items()}
-        return dic
+        eri = self.get_rlz_arrays().eri
+        bounds = numpy.searchsorted(eri, numpy.arange(len(self.sm_rlzs) + 1))
+        return {i: rlzs[start:stop] for i, (start, stop) in enumerate(
+            zip(bounds[:-1], bounds[1:])) if stop > start}
 
     def get_rlzs_by_gsim(self, et_id):
         """
         :returns: a dictionary gsim -> array of rlz indices
         """
-        if not hasattr(self, '_rlzs_by_grp'):
-            eri_by_ltp = self.get_eri_by_ltp()
-            rlzs = self.get_realizations()
-            acc = AccumDict(accum=AccumDict(accum=[]))  # et_id->gsim->rlzs
-            for sm in self.sm_rlzs:
-                for gid in self.et_ids(sm.ordinal):
-                    trti, eri = divmod(gid, len(self.sm_rlzs))
-                    for rlz in rlzs:
-                        idx = eri_by_ltp['~'.join(rlz.sm_lt_path)]
-                        if idx == eri:
-                            acc[gid][rlz.gsim_rlz.value[trti]].append(
-                                rlz.ordinal)
-            self._rlzs_by_grp = {}
-            for gid, dic in acc.items():
-                self._rlzs_by_grp[gid] = {
-                    gsim: U32(rlzs) for gsim, rlzs in sorted(dic.items())}
+        arr = self.get_rlz_arrays()
+        try:
+            return self._rlzs_by_grp[et_id]
+        except KeyError:
+            pass
+        trti, eri = divmod(et_id, len(self.sm_rlzs))
+        # the realizations are ordered by eri
+        start, stop = numpy.searchsorted(arr.eri, [eri, eri + 1])
+        rlzs = numpy.arange(start, stop, dtype=U32)
+        bidx = arr.paths[arr.gidx[start:stop], trti]
+        branches = self.gsim_lt.get_branch_groups()[trti]
+        dic = {branches[b].gsim: rlzs[bidx == b] for b in numpy.unique(bidx)}
+        self._rlzs_by_grp[et_id] = {gsim: dic[gsim] for gsim in sorted(dic)}
         return self._rlzs_by_grp[et_id]
 
     def get_rlzs_by_gsim_grp(self):
@@ -1453,22 +1508,35 @@ class FullLogicTree(object):
         """
         :returns: an array of realizations
         """
+        arr = self.get_rlz_arrays()
         sh1 = self.source_model_lt.shortener
         sh2 = self.gsim_lt.shortener
-        tups = []
-        for r in self.get_realizations():
-            path = '%s~%s' % (shorten(r.sm_lt_path, sh1),
-                              shorten(r.gsim_rlz.lt_path, sh2))
-            tups.append((r.ordinal, path, r.weight['weight']))
-        return numpy.array(tups, rlz_dt)
+        sm_paths = numpy.array([shorten(sm.lt_path, sh1) + '~'
+                                for sm in self.sm_rlzs])
+        gsim_paths = numpy.array([''] * len(arr.paths))
+        for t, branches in enumerate(self.gsim_lt.get_branch_groups()):
+            codes = numpy.array([sh2.get(b.id, b.id) if b.effective
+                                 else sh2.get('@', '@') for b in branches])
+            gsim_paths = numpy.char.add(gsim_paths, codes[arr.paths[:, t]])
+        rlzs = numpy.zeros(len(arr.eri), rlz_dt)
+        rlzs['ordinal'] = numpy.arange(len(rlzs))
+        rlzs['branch_path'] = numpy.char.add(
+            sm_paths[arr.eri], gsim_paths[arr.gidx])
+        rlzs['weight'] = arr.weights[:, 0]  # the first key is 'weight'
+        return rlzs
 
     def get_gsims_by_trt(self):
         """
         :returns: a dictionary trt -> sorted gsims
         """
-        if not hasattr(self, '_gsims_by_trt'):
-            self.get_realizations()
-        return {trt: sorted(gs) for trt, gs in self._gsims_by_trt.items()}
+        if not self.num_samples:
+            return {trt: sorted(gs) for trt, gs in self.gsim_lt.values.items()}
+        # only the gsims in the sampled paths
+        paths = self.get_rlz_arrays().paths
+        groups = self.gsim_lt.get_branch_groups()
+        return {trt: sorted(groups[t][b].gsim
+                            for b in numpy.unique(paths[:, t]))
+                for t, trt in enumerate(self.gsim_lt.values)}
 
     def get_sm_by_grp(self):
         """
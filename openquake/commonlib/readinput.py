@@ -822,8 +822,7 @@ def get_crmodel(oqparam):
 
 def get_exposure(oqparam):
     """
-    Read the full exposure in memory and build a list of
-    :class:`openquake.risklib.asset.Asset` instances.
+    Read the full exposure in memory and build an array of assets.
 
     :param oqparam:
         an :class:`openquake.commonlib.oqvalidation.OqParam` instance
@@ -841,8 +840,8 @@ def get_exposure(oqparam):
     exposure = asset.Exposure.read(
         oqparam.inputs['exposure'], oqparam.calculation_mode,
         oqparam.region, oqparam.ignore_missing_costs,
-        by_country='country' in oqparam.aggregate_by)
-    exposure.mesh, exposure.assets_by_site = exposure.get_mesh_assets_by_site()
+        by_country='country' in oqparam.aggregate_by, parallel=True)
+    exposure.mesh, exposure.array = exposure.get_mesh_assets()
     if oqparam.cachedir:
         logging.info('Saving %s', fname)
         with open(fname, 'wb') as f:
@@ -874,24 +873,21 @@ def get_sitecol_assetcol(oqparam, haz_sitecol=None, cost_types=()):
 
     if haz_sitecol.mesh != exposure.mesh:
         # associate the assets to the hazard sites
-        sitecol, assets_by, discarded = geo.utils.assoc(
-            exposure.assets_by_site, haz_sitecol, haz_distance, 'filter')
-        assets_by_site = [[] for _ in sitecol.complete.sids]
-        num_assets = 0
-        for sid, assets in zip(sitecol.sids, assets_by):
-            assets_by_site[sid] = assets
-            num_assets += len(assets)
+        sitecol, assets, discarded = geo.utils.assoc_assets(
+            exposure.array, haz_sitecol, haz_distance, 'filter')
+        tot_sites = len(sitecol.complete)
         logging.info(
-            'Associated %d assets to %d sites', num_assets, len(sitecol))
+            'Associated %d assets to %d sites', len(assets), len(sitecol))
     else:
         # asset sites and hazard sites are the same
         sitecol = haz_sitecol
-        assets_by_site = exposure.assets_by_site
+        assets = exposure.array
+        tot_sites = len(exposure.mesh)
         discarded = []
         logging.info('Read %d sites and %d assets from the exposure',
-                     len(sitecol), sum(len(a) for a in assets_by_site))
+                     len(sitecol), len(assets))
     assetcol = asset.AssetCollection(
-        exposure, assets_by_site, oqparam.time_event)
+        exposure, assets, tot_sites, oqparam.time_event)
     if assetcol.occupancy_periods:
         missing = set(cost_types) - set(exposure.cost_types['name']) - set(
             ['occupants'])
@@ -64,3 +64,24 @@ class HazardMapsTestCase(unittest.TestCase):
         ]
         actual = calc.compute_hazard_maps(numpy.array(curves), imls, poes)
         aaae(expected, actual.T)
+
+
+class GmvsToPoesTestCase(unittest.TestCase):
+
+    def test_counts(self):
+        imtls = general.DictArray(
+            {'PGA': [.01, .1, .2], 'SA(1.0)': [.05, .1, .3]})
+        rng = numpy.random.RandomState(42)
+        gmvs = rng.lognormal(-2, 1, (20, 2))  # shape (E, M)
+        sids = rng.randint(0, 3, 20)
+        rlzs = rng.randint(0, 2, 20)
+        counts = numpy.zeros((3, 2, 6), numpy.uint32)
+        # update the counts in two blocks, as the tasks do
+        calc.update_counts(counts, sids[:7], rlzs[:7], gmvs[:7], imtls)
+        calc.update_counts(counts, sids[7:], rlzs[7:], gmvs[7:], imtls)
+        poes = calc.counts_to_poes(counts, 10)
+        for sid in range(3):
+            for rlz in range(2):
+                ok = (sids == sid) & (rlzs == rlz)
+                expected = calc.gmvs_to_poes(gmvs[ok].T, imtls, 10)
+                aaae(poes[sid, rlz], expected.flatten())
@@ -18,6 +18,7 @@
 import os
 import codecs
 import unittest
+import itertools
 import collections
 from xml.parsers.expat import ExpatError
 from copy import deepcopy
@@ -2030,6 +2031,34 @@ class GsimLogicTreeTestCase(unittest.TestCase):
         effective_rlzs = set(rlz.pid for rlz in fs_bg_model_lt)
         self.assertEqual(len(effective_rlzs), 5 * 4)
 
+    def test_paths(self):
+        xml = codecs.open(
+            os.path.join(DATADIR, 'gmpe_logic_tree_share_reduced.xml'),
+            encoding='utf8').read().encode('utf8')
+        gsim_lt = self.parse_valid(xml, ['Active Shallow Crust', 'Shield',
+                                         'Stable Shallow Crust', 'Volcanic'])
+        groups = gsim_lt.get_branch_groups()
+        paths = gsim_lt.get_paths()
+        self.assertEqual(paths.shape, (40, 4))
+        # the full enumeration follows the order of itertools.product
+        expected = list(itertools.product(*[range(len(g)) for g in groups]))
+        self.assertEqual([tuple(p) for p in paths], expected)
+        keys, weights = gsim_lt.get_weights(paths)
+        self.assertEqual(keys, ['weight'])
+        for path, weight in zip(paths, weights[:, 0]):
+            ws = [groups[t][b].weight['weight'] for t, b in enumerate(path)]
+            self.assertAlmostEqual(weight, numpy.prod(ws))
+        self.assertAlmostEqual(weights.sum(), 1)
+
+        # sampling draws branch indices directly
+        paths = gsim_lt.get_paths(100, 42, 'early_weights')
+        self.assertEqual(paths.shape, (100, 4))
+        self.assertEqual(paths.max(axis=0).tolist(), [3, 1, 4, 0])
+        rlzs = gsim_lt.sample(100, 42, 'early_weights')
+        self.assertEqual([r.value for r in rlzs],
+                         [tuple(groups[t][b].gsim for t, b in enumerate(p))
+                          for p in paths])
+
     def test_sampling(self):
         xml = _make_nrml("""\
         <logicTree logicTreeID="lt1">
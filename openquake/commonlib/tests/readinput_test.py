@@ -21,6 +21,7 @@ import tempfile
 import unittest.mock as mock
 import unittest
 from io import BytesIO
+import numpy
 
 from openquake.baselib import general, datastore
 from openquake.hazardlib import InvalidFile, site_amplification
@@ -31,6 +32,7 @@ from openquake.qa_tests_data.classical import case_2, case_21
 from openquake.qa_tests_data.event_based import case_16
 from openquake.qa_tests_data.event_based_risk import (
     case_2 as ebr2, case_caracas)
+from openquake.qa_tests_data.scenario_damage import case_10 as sd10
 
 
 TMP = tempfile.gettempdir()
@@ -463,6 +465,50 @@ Found case-duplicated fields [['ID', 'id']] in ''', str(ctx.exception))
             ass.location[1]
             ass.tags.get('geometry')
 
+    def test_chunks(self):
+        # reading the assets in chunks from two CSV files, sequentially
+        # and in parallel, must give the same assets as a single file
+        dirname = os.path.dirname(sd10.__file__)
+        fname = os.path.join(dirname, 'exposure_model.xml')
+        exp = asset.Exposure.read([fname])
+        tmp = tempfile.mkdtemp()
+        with open(os.path.join(dirname, 'Exposicion_Res_Tijuana.csv')) as f:
+            header, *lines = f.readlines()
+        # the first file starts with a comment line and has two full
+        # chunks, the second file starts with a blank line
+        for name, rows in [('a.csv', lines[:6]), ('b.csv', lines[6:])]:
+            with open(os.path.join(tmp, name), 'w') as f:
+                if name == 'a.csv':
+                    f.write('#,,"generated_by=\'test\'"\n')
+                else:
+                    f.write('\n')
+                f.write(header + ''.join(rows))
+        with open(fname) as f:
+            xml = f.read().replace('Exposicion_Res_Tijuana.csv', 'a.csv b.csv')
+        xmlname = os.path.join(tmp, 'exposure_model.xml')
+        with open(xmlname, 'w') as f:
+            f.write(xml)
+        with mock.patch.object(asset, 'CHUNKSIZE', 3):
+            for parallel in (False, True):
+                exp2 = asset.Exposure.read([xmlname], parallel=parallel)
+                self.assertEqual(exp2.array.tolist(), exp.array.tolist())
+                self.assertEqual(list(exp2.tagcol), list(exp.tagcol))
+
+    def test_ignore_missing_costs(self):
+        # a missing cost type in ignore_missing_costs becomes a NaN column
+        fname = os.path.join(os.path.dirname(sd10.__file__),
+                             'exposure_model.xml')
+        exp = asset.Exposure.read([fname])
+        param = dict(relevant_cost_types={'structural', 'contents'},
+                     ignore_missing_costs={'contents'}, fname=fname,
+                     calculation_mode='scenario_risk')
+        exp._check(param, check_dupl=False)
+        self.assertTrue(numpy.isnan(exp.array['value-contents']).all())
+        param['ignore_missing_costs'] = set()
+        exp = asset.Exposure.read([fname])
+        with self.assertRaises(ValueError):
+            exp._check(param, check_dupl=False)
+
 
 class GetCompositeSourceModelTestCase(unittest.TestCase):
 
@@ -17,10 +17,13 @@
 # along with OpenQuake. If not, see <http://www.gnu.org/licenses/>.
 
 import os
+import gzip
 import unittest
+from unittest import mock
 import tempfile
 from io import BytesIO
 import psutil
+from openquake.commonlib import writers
 from openquake.commonlib.writers import write_csv
 from openquake.baselib.performance import memory_rss
 from openquake.baselib.node import Node, tostring, StreamingXMLWriter
@@ -128,3 +131,27 @@ class WriteCsvTestCase(unittest.TestCase):
         self.assert_export(
             a, 'A~PGA:3,A~PGV:4,B~PGA:3,B~PGV:4,'
             'idx\n1 2 3,4 5 6 7,1 2 4,3 5 6 7,8\n')
+
+    def test_strings_and_zeros(self):
+        dt = numpy.dtype([('name', 'S5'), ('ok', bool),
+                          ('val', numpy.float32)])
+        a = numpy.array([(b'a,b', True, -0.), (b'c"d', False, -1E-9)], dt)
+        self.assert_export(a, 'name,ok,val\n"a,b",1,0.000000E+00\n'
+                           '"c""d",0,-1.000000E-09\n')
+
+    def test_chunks_and_gz(self):
+        dt = numpy.dtype([('eid', numpy.uint32), ('gmv', numpy.float32)])
+        a = numpy.zeros(10, dt)
+        a['eid'] = numpy.arange(10)
+        a['gmv'] = numpy.arange(10) / 3
+        fname = tempfile.NamedTemporaryFile(suffix='.csv').name
+        with open(write_csv(fname, a)) as f:
+            expected = f.read()
+        with mock.patch.object(writers, 'CHUNKSIZE', 3):
+            # writing the array in chunks and an iterator over arrays
+            gzname = write_csv(fname + '.gz', a)
+            with gzip.open(gzname, 'rt') as f:
+                self.assertEqual(f.read(), expected)
+            write_csv(fname, iter([a[:4], a[4:]]))
+        with open(fname) as f:
+            self.assertEqual(f.read(), expected)
@@ -18,11 +18,15 @@
 
 import os
 import csv
+import gzip
+import itertools
 import tempfile
 import numpy  # this is needed by the doctests, don't remove it
-from openquake.baselib.node import scientificformat
+from openquake.baselib.node import scientificformat, zeroset
 
 FIVEDIGITS = '%.5E'
+CHUNKSIZE = 100_000  # number of records formatted together
+BUFSIZE = 1024 ** 2  # buffer size in bytes of the output file
 
 
 # recursive function used internally by build_header
@@ -97,18 +101,112 @@ def _header(fields, renamedict):
     return fields
 
 
+def _fix_negative_zeros(col, fmt):
+    # '-0.0000000E+00' must become '0.0000000E+00', as in scientificformat
+    col = col + 0.  # convert -0. into 0.
+    if fmt[-1] not in 'eEgG':  # small negative numbers can become -0.000
+        for val in numpy.unique(col[(col < 0) & (col > -1)]):
+            if set(fmt % val) <= zeroset:
+                col[col == val] = 0.
+    return col
+
+
+def _quote(col, sep):
+    # quote the strings as the csv module does
+    special = numpy.zeros(col.shape, bool)
+    for char in (sep, '"', '\n', '\r'):
+        special |= numpy.char.find(col, char) >= 0
+    if special.any():
+        col = col.astype(object)
+        for idx in zip(*special.nonzero()):
+            col[idx] = '"%s"' % col[idx].replace('"', '""')
+    return col
+
+
+def _format_columns(block, all_fields, fmt, sep, renamedict):
+    # returns a row format string and a list of columns of scalar values,
+    # or None if the block contains values which cannot be vectorized
+    pieces = []
+    subcols = []
+    for fields in all_fields:
+        col = extract_from(block, fields)
+        kind = col.dtype.kind
+        if fields[0] in ('lon', 'lat', 'depth') and col.ndim == 1:
+            valfmt = '%.5f'
+        elif kind == 'f' and col.dtype.itemsize >= 4:
+            valfmt = fmt
+            col = _fix_negative_zeros(col, fmt)
+        elif kind in 'iu':
+            valfmt = '%d'
+        elif kind == 'b':
+            valfmt = '%d'
+            col = col.astype(int)
+        elif kind in 'SU':
+            valfmt = '%s'
+            if kind == 'S':
+                col = numpy.char.decode(col, 'utf8')
+            if renamedict and col.ndim == 1:
+                col = numpy.array([renamedict.get(v, v) for v in col], str)
+            col = _quote(col, sep)
+            if len(all_fields) == 1 and col.ndim == 1:
+                col = numpy.where(col == '', '""', col)  # as in csv.writer
+        else:
+            return None
+        if col.ndim == 1:
+            pieces.append(valfmt)
+            subcols.append(col.tolist())
+        else:  # array field, a vector or a matrix
+            shp = col.shape[1:]
+            inner = ':'.join([valfmt] * int(numpy.prod(shp[1:])))
+            pieces.append(' '.join([inner] * shp[0]))
+            col2d = col.reshape(len(col), -1)
+            subcols.extend(col2d[:, j].tolist() for j in range(col2d.shape[1]))
+    return sep.join(pieces) + '\r\n', subcols
+
+
+def _open(dest):
+    # returns a file object; the .gz files are compressed
+    if dest.endswith('.gz'):
+        return gzip.open(dest, 'wt', newline='')
+    return open(dest, 'w', buffering=BUFSIZE)
+
+
+def _gen_blocks(data):
+    # yield slices of a composite array or dataset, or the arrays in
+    # an iterator of composite arrays; only a slice is read at the time
+    if hasattr(data, '__next__'):
+        yield from data
+    else:
+        for start in range(0, len(data), CHUNKSIZE):
+            yield data[start:start + CHUNKSIZE]
+
+
 def write_csv(dest, data, sep=',', fmt='%.6E', header=None, comment=None,
               renamedict=None):
     """
     :param dest: None, file, filename or io.StringIO instance
-    :param data: array to save
+    :param data:
+       array to save; it can also be a composite HDF5 dataset or an iterator
+       over composite arrays with the same dtype: then the data are written
+       in chunks and they are never read in memory all together
     :param sep: separator to use (default comma)
     :param fmt: formatting string (default '%12.8E')
     :param header:
        optional list with the names of the columns to display
     :param comment:
        optional comment dictionary
+
+    If dest is a filename ending with .gz the file is compressed.
     """
+    if hasattr(data, '__next__'):  # iterator over composite arrays
+        try:
+            first = next(data)
+        except StopIteration:
+            raise ValueError('There is no data to write in %s' % dest)
+        data = itertools.chain([first], data)
+        dtype = first.dtype
+    else:
+        dtype = getattr(data, 'dtype', None)
     if comment is not None:
         comment = ', '.join('%s=%r' % item for item in comment.items())
     close = True
@@ -121,16 +219,12 @@ def write_csv(dest, data, sep=',', fmt='%.6E', header=None, comment=None,
         close = False
     elif not hasattr(dest, 'getvalue'):
         # assume dest is a filename
-        dest = open(dest, 'w')
+        dest = _open(dest)
     w = csv.writer(dest, delimiter=sep)
-    try:
-        # see if data is a composite numpy array
-        data.dtype.fields
-    except AttributeError:
-        # not a composite array
-        autoheader = []
+    if dtype is not None and dtype.fields:  # composite array
+        autoheader = build_header(dtype)
     else:
-        autoheader = build_header(data.dtype)
+        autoheader = []
 
     nfields = len(autoheader) or len(data[0])
     if comment:
@@ -146,15 +240,24 @@ def write_csv(dest, data, sep=',', fmt='%.6E', header=None, comment=None,
     if autoheader:
         all_fields = [col.split(':', 1)[0].split('~')
                       for col in autoheader]
-        for record in data:
-            row = []
-            for fields in all_fields:
-                val = extract_from(record, fields)
-                if fields[0] in ('lon', 'lat', 'depth'):
-                    row.append('%.5f' % val)
-                else:
-                    row.append(format(val))
-            w.writerow(_header(row, renamedict))
+        for block in _gen_blocks(data):
+            if len(block) == 0:
+                continue
+            fmtcols = _format_columns(
+                block, all_fields, fmt, sep, renamedict)
+            if fmtcols:  # fast lane
+                rowfmt, subcols = fmtcols
+                dest.write(''.join(map(rowfmt.__mod__, zip(*subcols))))
+                continue
+            for record in block:
+                row = []
+                for fields in all_fields:
+                    val = extract_from(record, fields)
+                    if fields[0] in ('lon', 'lat', 'depth'):
+                        row.append('%.5f' % val)
+                    else:
+                        row.append(format(val))
+                w.writerow(_header(row, renamedict))
     else:
         for row in data:
             w.writerow([format(col) for col in row])
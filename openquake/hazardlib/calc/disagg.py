@@ -35,9 +35,11 @@ from openquake.hazardlib.geo.utils import get_longitudinal_extent
 from openquake.hazardlib.geo.utils import (angular_distance, KM_TO_DEGREES,
                                            cross_idl)
 from openquake.hazardlib.site import SiteCollection
+from openquake.hazardlib.tom import PoissonTOM
 from openquake.hazardlib.gsim.base import (
     ContextMaker, to_distribution_values)
 
+F32 = numpy.float32
 BIN_NAMES = 'mag', 'dist', 'lon', 'lat', 'eps', 'trt'
 BinData = collections.namedtuple('BinData', 'dists, lons, lats, pnes')
 
@@ -112,25 +114,51 @@ def _eps3(truncation_level, n_epsilons):
 
 
 DEBUG = AccumDict(accum=[])  # sid -> pnes.mean(), useful for debugging
+MAX_BYTES = 100 * 1024 ** 2  # memory used by the temporary arrays of a chunk
+
+
+def _get_pnes(ctxs, poes):
+    # compute the probabilities of no exceedance for all the ruptures,
+    # vectorized for the parametric ruptures with a Poissonian model
+    pnes = numpy.ones_like(poes)
+    rates = numpy.array([ctx.occurrence_rate for ctx in ctxs])
+    toms = [ctx.temporal_occurrence_model for ctx in ctxs]
+    poisson = numpy.array([type(tom) is PoissonTOM for tom in toms])
+    poisson &= ~numpy.isnan(rates)
+    if poisson.any():
+        spans = numpy.array([tom.time_span for tom, ok in zip(toms, poisson)
+                             if ok])
+        # same formula as in PoissonTOM.get_probability_no_exceedance
+        rts = - rates[poisson] * spans
+        pnes[poisson] = numpy.exp(
+            rts.reshape((-1,) + (1,) * (poes.ndim - 1)) * poes[poisson])
+    for u in numpy.where(~poisson)[0]:
+        pnes[u] = ctxs[u].get_probability_no_exceedance(poes[u])
+    return pnes
 
 
 # this is inside an inner loop
-def disaggregate(ctxs, g_by_z, iml2dict, eps3, sid=0, bin_edges=()):
+def disaggregate(ctxs, g_by_z, iml2dict, eps3, sid=0, bin_edges=(),
+                 max_bytes=None):
     """
     :param ctxs: a list of U fat RuptureContexts
-    :param imts: a list of Intensity Measure Type objects
     :param g_by_z: an array of gsim indices
-    :param imt: an Intensity Measure Type
     :param iml2dict: a dictionary of arrays imt -> (P, Z)
     :param eps3: a triplet (truncnorm, epsilons, eps_bands)
+    :param sid: the site index
+    :param bin_edges: if given, a quartet (dist, lon, lat, eps) of bin edges
+    :param max_bytes: the ruptures are managed in chunks of this size
+                      (default MAX_BYTES)
     """
     # disaggregate (separate) PoE in different contributions
     U, E, M = len(ctxs), len(eps3[2]), len(iml2dict)
     iml2 = next(iter(iml2dict.values()))
     P, Z = iml2.shape
-    dists = numpy.zeros(U)
-    lons = numpy.zeros(U)
-    lats = numpy.zeros(U)
+    idxs = [ctx.idx[sid] if hasattr(ctx, 'idx') else 0  # single site
+            for ctx in ctxs]
+    dists = numpy.array([ctx.rrup[i] for ctx, i in zip(ctxs, idxs)])
+    lons = numpy.array([ctx.clon[i] for ctx, i in zip(ctxs, idxs)])
+    lats = numpy.array([ctx.clat[i] for ctx, i in zip(ctxs, idxs)])
 
     # switch to logarithmic intensities
     iml3 = numpy.zeros((M, P, Z))
@@ -138,58 +166,76 @@ def disaggregate(ctxs, g_by_z, iml2dict, eps3, sid=0, bin_edges=()):
         # 0 values are converted into -inf
         iml3[m] = to_distribution_values(iml2, imt)
 
-    truncnorm, epsilons, eps_bands = eps3
-    cum_bands = numpy.array([eps_bands[e:].sum() for e in range(E)] + [0])
-    G = len(ctxs[0].mean_std)
-    mean_std = numpy.zeros((2, U, M, G), numpy.float32)
-    for u, ctx in enumerate(ctxs):
-        if not hasattr(ctx, 'idx'):  # assume single site
-            idx = 0
-        else:
-            idx = ctx.idx[sid]
-        dists[u] = ctx.rrup[idx]  # distance to the site
-        lons[u] = ctx.clon[idx]  # closest point of the rupture lon
-        lats[u] = ctx.clat[idx]  # closest point of the rupture lat
-        for g in range(G):
-            mean_std[:, u, :, g] = ctx.mean_std[g][:, idx]  # (2, M)
-    poes = numpy.zeros((U, E, M, P, Z))
-    pnes = numpy.ones((U, E, M, P, Z))
-    for (m, p, z), iml in numpy.ndenumerate(iml3):
-        if iml == -numpy.inf:  # zero hazard
-            continue
-        # discard the z contributions coming from wrong realizations: see
-        # the test disagg/case_2
+    # discard the z contributions coming from wrong realizations: see
+    # the test disagg/case_2
+    zs, gs = [], []
+    for z in range(Z):
         try:
-            g = g_by_z[z]
+            gs.append(g_by_z[z])
         except KeyError:
             continue
-        lvls = (iml - mean_std[0, :, m, g]) / mean_std[1, :, m, g]
-        idxs = numpy.searchsorted(epsilons, lvls)
-        poes[:, :, m, p, z] = _disagg_eps(
-            truncnorm.sf(lvls), idxs, eps_bands, cum_bands)
-    for u, ctx in enumerate(ctxs):
-        pnes[u] *= ctx.get_probability_no_exceedance(poes[u])  # this is slow
+        zs.append(z)
+    poes = numpy.zeros((U, E, M, P, Z))
+    if U and zs:
+        # mean and stddev of shape (U, M, Z') for the relevant gsims
+        mean_std = numpy.array([[ms[:, i] for ms in ctx.mean_std]
+                                for ctx, i in zip(ctxs, idxs)], F32)
+        mean = mean_std[:, gs, 0].transpose(0, 2, 1)
+        std = mean_std[:, gs, 1].transpose(0, 2, 1)
+        # the levels are computed in single precision, as the mean_std
+        iml = iml3[:, :, zs].astype(F32)  # shape (M, P, Z')
+        zero_hazard = iml == -numpy.inf
+        # ~4 arrays of size E * M * P * Z' are needed for each rupture
+        chunk = max(int((max_bytes or MAX_BYTES) / (32 * E * iml.size)), 1)
+        for slc in _chunks(U, chunk):
+            lvls = (iml - mean[slc, :, None]) / std[slc, :, None]
+            poes_ = _disagg_eps(
+                truncnorm_sf(eps3[0], lvls),
+                numpy.searchsorted(eps3[1], lvls), eps3[2])
+            poes_[:, :, zero_hazard] = 0
+            poes[slc, ..., zs] = poes_
+    pnes = _get_pnes(ctxs, poes)
     bindata = BinData(dists, lons, lats, pnes)
-    DEBUG[idx].append(pnes.mean())
+    if U:
+        DEBUG[idxs[-1]].append(pnes.mean())
     if not bin_edges:
         return bindata
     return _build_disagg_matrix(bindata, bin_edges)
 
 
+def _chunks(n, size):
+    # yield slices of the given size covering range(n)
+    for start in range(0, n, size):
+        yield slice(start, min(start + size, n))
+
+
+def truncnorm_sf(truncnorm, lvls):
+    """
+    :param truncnorm: a frozen truncated normal distribution
+    :param lvls: an array of levels of any shape
+    :returns: the survival function computed on the levels
+    """
+    return truncnorm.sf(lvls.ravel()).reshape(lvls.shape)
+
+
 def set_mean_std(ctxs, imts, gsims):
     for u, ctx in enumerate(ctxs):
         ctx.mean_std = [gsim.get_mean_std(ctx, imts) for gsim in gsims]
 
 
-def _disagg_eps(survival, bins, eps_bands, cum_bands):
+def _disagg_eps(survival, bins, eps_bands):
     # disaggregate PoE of `iml` in different contributions,
-    # each coming from ``epsilons`` distribution bins
-    res = numpy.zeros((len(bins), len(eps_bands)))
+    # each coming from ``epsilons`` distribution bins;
+    # survival and bins have shape (U, ...), the result (U, E, ...)
+    E = len(eps_bands)
+    cum_bands = numpy.array([eps_bands[e:].sum() for e in range(E)] + [0])
+    res = numpy.zeros((len(bins), E) + bins.shape[1:])
     for e, eps_band in enumerate(eps_bands):
-        res[bins <= e, e] = eps_band  # left bins
+        res_e = res[:, e]  # a view
+        res_e[bins <= e] = eps_band  # left bins
         inside = bins == e + 1  # inside bins
-        res[inside, e] = survival[inside] - cum_bands[bins[inside]]
-    return res  # shape (U, E)
+        res_e[inside] = survival[inside] - cum_bands[bins[inside]]
+    return res
 
 
 # used in calculators/disaggregation
@@ -246,9 +292,8 @@ def _build_disagg_matrix(bdata, bins):
     lats_idx[lats_idx == dim3] = dim3 - 1
     U, E, M, P, Z = bdata.pnes.shape
     mat7D = numpy.ones(shape + [M, P, Z])
-    for i_dist, i_lon, i_lat, pne in zip(
-            dists_idx, lons_idx, lats_idx, bdata.pnes):
-        mat7D[i_dist, i_lon, i_lat] *= pne  # shape E, M, P, Z
+    # the products are performed in the order of the ruptures
+    numpy.multiply.at(mat7D, (dists_idx, lons_idx, lats_idx), bdata.pnes)
     return 1. - mat7D
 
 
@@ -144,8 +144,10 @@ class GmfComputer(object):
         sids = self.sids
         eids_by_rlz = self.ebrupture.get_eids_by_rlz(rlzs_by_gsim)
         mag = self.ebrupture.rupture.mag
+        dt = F32, (len(min_iml),)
+        dtlist = [('sid', U32), ('eid', U32), ('rlz', U32), ('gmv', dt)] + [
+            (out, F32) for sp in self.sec_perils for out in sp.outputs]
         data = []
-        No = sum(len(sp.outputs) for sp in self.sec_perils)
         for gs, rlzs in rlzs_by_gsim.items():
             num_events = sum(len(eids_by_rlz[rlz]) for rlz in rlzs)
             if num_events == 0:  # it may happen
@@ -154,43 +156,36 @@ class GmfComputer(object):
             # compute.compute outside of the loop over the realizations
             # it is better to have few calls producing big arrays
             array, sig, eps = self.compute(gs, num_events)
-            array = array.transpose(1, 0, 2)  # from M, N, E to N, M, E
+            array = array.transpose(1, 2, 0)  # from M, N, E to N, E, M
             for i, miniml in enumerate(min_iml):  # gmv < minimum
-                arr = array[:, i, :]
+                arr = array[:, :, i]
                 arr[arr < miniml] = 0
+            # the secondary perils are computed for all events at once
+            sp_out = [out for sp in self.sec_perils for out in
+                      sp.compute_all(mag, self.imts, array, self.sctx)]
+            # gmv can be zero due to the minimum_intensity, coming
+            # from the job.ini or from the vulnerability functions
+            ok = array.sum(axis=2) > 0  # shape (N, E)
             n = 0
             for rlz in rlzs:
                 eids = eids_by_rlz[rlz]
-                for ei, eid in enumerate(eids):
-                    gmfa = array[:, :, n + ei]  # shape (N, M)
-                    tot = gmfa.sum(axis=0)  # shape (M,)
-                    if not tot.sum():
-                        continue
-                    if sig_eps is not None:
-                        tup = tuple([eid, rlz] + list(sig[:, n + ei]) +
+                e = len(eids)
+                evs, sis = ok[:, n:n + e].T.nonzero()  # ordered by event
+                if sig_eps is not None:
+                    for ei in numpy.unique(evs):
+                        tup = tuple([eids[ei], rlz] + list(sig[:, n + ei]) +
                                     list(eps[:, n + ei]))
                         sig_eps.append(tup)
-                    sp_out = numpy.zeros((No, len(gmfa)))  # No, N
-                    o = 0
-                    for sp in self.sec_perils:
-                        o1 = o + len(sp.outputs)
-                        sp_out[o:o1] = sp.compute(
-                            mag, zip(self.imts, gmfa.T), self.sctx)
-                        o = o1
-                    for i, gmv in enumerate(gmfa):
-                        if gmv.sum():
-                            if No:
-                                data.append((sids[i], eid, rlz, gmv) +
-                                            tuple(sp_out[:, i]))
-                            else:
-                                data.append((sids[i], eid, rlz, gmv))
-                        # gmv can be zero due to the minimum_intensity, coming
-                        # from the job.ini or from the vulnerability functions
-                n += len(eids)
-        dt = F32, (len(min_iml),)
-        dtlist = [('sid', U32), ('eid', U32), ('rlz', U32), ('gmv', dt)] + [
-            (out, F32) for sp in self.sec_perils for out in sp.outputs]
-        d = numpy.array(data, dtlist)
+                d = numpy.zeros(len(evs), dtlist)
+                d['sid'] = sids[sis]
+                d['eid'] = eids[evs]
+                d['rlz'] = rlz
+                d['gmv'] = array[sis, n + evs]
+                for out, vals in zip(dtlist[4:], sp_out):
+                    d[out[0]] = vals[sis, n + evs]
+                data.append(d)
+                n += e
+        d = numpy.concatenate(data) if data else numpy.zeros(0, dtlist)
         return d, time.time() - t0
 
     def compute(self, gsim, num_events):
@@ -177,6 +177,7 @@ class ContextMaker(object):
             param.get('maximum_distance') or MagDepDistance({}))
         self.trunclevel = param.get('truncation_level')
         self.effect = param.get('effect')
+        self.pmap_dtype = numpy.dtype(param.get('pmap_dtype', 'float64'))
         for req in self.REQUIRES:
             reqset = set()
             for gsim in gsims:
@@ -285,6 +286,28 @@ class ContextMaker(object):
             raise FarAwayRupture('%d: %d km' % (rup.rup_id, distances.min()))
         return DistancesContext([(self.filter_distance, distances)])
 
+    def _shared_filter(self, sites, rup, grid):
+        # same as .filter, but the distances depending only on the rupture
+        # surface are reduced from the cell distances of the whole fault
+        if self.filter_distance in grid.PARAMS:
+            distances = grid.get_distances(
+                rup.surface, sites, self.filter_distance)
+        else:
+            distances = get_distances(rup, sites, self.filter_distance)
+        mdist = self.maximum_distance(self.trt, rup.mag)
+        mask = distances <= mdist
+        if not mask.any():
+            raise FarAwayRupture('%d: %d km' % (rup.rup_id, distances.min()))
+        r_sites = sites.filter(mask)
+        dctx = DistancesContext([(self.filter_distance, distances[mask])])
+        for param in self.REQUIRES_DISTANCES - set([self.filter_distance]):
+            if param in grid.PARAMS:
+                dists = grid.get_distances(rup.surface, sites, param, mask)
+            else:
+                dists = get_distances(rup, r_sites, param)
+            setattr(dctx, param, dists)
+        return r_sites, dctx
+
     def make_rctx(self, rupture):
         """
         Add .REQUIRES_RUPTURE_PARAMETERS to the rupture
@@ -335,10 +358,16 @@ class ContextMaker(object):
             If any of declared required parameters (site, rupture and
             distance parameters) is unknown.
         """
-        sites, dctx = self.filter(sites, rupture)
-        for param in self.REQUIRES_DISTANCES - set([self.filter_distance]):
-            distances = get_distances(rupture, sites, param)
-            setattr(dctx, param, distances)
+        grid = getattr(rupture.surface, 'grid', None)
+        if grid is not None and grid.shares(sites):
+            # floating rupture: the distances are shared with the other
+            # ruptures on the same fault
+            sites, dctx = self._shared_filter(sites, rupture, grid)
+        else:
+            sites, dctx = self.filter(sites, rupture)
+            for param in self.REQUIRES_DISTANCES - set([self.filter_distance]):
+                distances = get_distances(rupture, sites, param)
+                setattr(dctx, param, distances)
         reqv_obj = (self.reqv.get(self.trt) if self.reqv else None)
         if reqv_obj and isinstance(rupture.surface, PlanarSurface):
             reqv = reqv_obj.get(dctx.repi, rupture.mag)
@@ -509,6 +538,8 @@ class PmapMaker(object):
         self.src_mutex = getattr(group, 'src_interdep', None) == 'mutex'
         self.rup_indep = getattr(group, 'rup_interdep', None) != 'mutex'
         self.fewsites = self.N <= cmaker.max_sites_disagg
+        # in float32 mode the pnes are composed in log-space
+        self.logspace = self.pmap_dtype == numpy.float32 and self.rup_indep
         self.pne_mon = cmaker.mon('composing pnes', measuremem=False)
         self.gss_mon = cmaker.mon('get_sources_sites', measuremem=False)
 
@@ -522,8 +553,15 @@ class PmapMaker(object):
             with self.pne_mon:
                 # pnes and poes of shape (N, L, G)
                 pnes = ctx.get_probability_no_exceedance(poes)
+                if self.logspace:  # sum log(pne) instead of multiplying
+                    with numpy.errstate(divide='ignore'):
+                        logpnes = numpy.log(pnes).astype(numpy.float32)
+                    for sid, logpne in zip(ctx.sids, logpnes):
+                        pmap.setdefault(sid, 0., numpy.float32).array += logpne
+                    continue
                 for sid, pne in zip(ctx.sids, pnes):
-                    probs = pmap.setdefault(sid, rup_indep).array
+                    probs = pmap.setdefault(
+                        sid, rup_indep, self.pmap_dtype).array
                     if rup_indep:
                         probs *= pne
                     else:  # rup_mutex
@@ -562,7 +600,15 @@ class PmapMaker(object):
             self._update_pmap(ctxs)
             self.calc_times[src_id] += numpy.array(
                 [self.numrups, self.numsites, time.time() - t0])
-        return ~self.pmap if self.rup_indep else self.pmap
+        return self._poes(self.pmap)
+
+    def _poes(self, pmap):
+        # convert the composed pnes into PoEs
+        if self.logspace:
+            return pmap.logpnes2poes()
+        elif self.rup_indep:
+            return ~pmap
+        return pmap
 
     def _make_src_mutex(self):
         for src, indices in self.srcfilter.filter(self.group):
@@ -576,9 +622,7 @@ class PmapMaker(object):
             pmap = ProbabilityMap(L, G)
             ctxs = self._make_ctxs(rups, sites)
             self._update_pmap(ctxs, pmap)
-            p = pmap
-            if self.rup_indep:
-                p = ~p
+            p = self._poes(pmap)
             p *= src.mutex_weight
             self.pmap += p
             self.calc_times[src.source_id] += numpy.array(
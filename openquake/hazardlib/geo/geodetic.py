@@ -174,6 +174,47 @@ def min_distance_to_segment(seglons, seglats, lons, lats):
     return dists
 
 
+def min_distances_to_segments(seglons, seglats, lons, lats):
+    """
+    Array version of :func:`min_distance_to_segment`, computing the
+    distances from S segments to N points in a single pass.
+
+    :param seglons: an array of shape (S, 2) with the longitudes of the
+                    vertexes of the segments
+    :param seglats: an array of shape (S, 2) with the latitudes of the
+                    vertexes of the segments
+    :param lons: a 1D array of N longitudes
+    :param lats: a 1D array of N latitudes
+    :returns: an array of shape (S, N) with the same conventions of
+              :func:`min_distance_to_segment`
+    """
+    lons1, lats1 = seglons[:, 0:1], seglats[:, 0:1]
+    lons2, lats2 = seglons[:, 1:2], seglats[:, 1:2]
+    seg_azim = azimuth(lons1, lats1, lons2, lats2)
+    azimuth1 = azimuth(lons1, lats1, lons, lats)
+    azimuth2 = azimuth(lons2, lats2, lons, lats)
+    cos1 = numpy.cos(numpy.radians(seg_azim - azimuth1))
+    cos2 = numpy.cos(numpy.radians(seg_azim - azimuth2))
+    idx_in = (cos1 >= 0.0) & (cos2 <= 0.0)
+    idx_out = (cos1 < 0.0) | (cos2 > 0.0)
+    idx_neg = numpy.sin(numpy.radians(azimuth1 - seg_azim)) < 0.0
+    xyz = spherical_to_cartesian(lons, lats)
+    dmin = numpy.minimum(
+        cdist(spherical_to_cartesian(lons1[:, 0], lats1[:, 0]), xyz),
+        cdist(spherical_to_cartesian(lons2[:, 0], lats2[:, 0]), xyz))
+    # distance from the arc, as in distance_to_arc, reusing azimuth1
+    t_angle = (azimuth1 - seg_azim + 360) % 360
+    angle = numpy.arccos(
+        (numpy.sin(numpy.radians(t_angle))
+         * numpy.sin(geodetic_distance(lons1, lats1, lons, lats)
+                     / EARTH_RADIUS)))
+    darc = (numpy.pi / 2 - angle) * EARTH_RADIUS
+    dists = numpy.abs(numpy.where(
+        idx_out, dmin, numpy.where(idx_in, darc, 0.)))
+    dists[idx_neg] = - dists[idx_neg]
+    return dists
+
+
 def _reshape(array, orig_shape):
     if orig_shape:
         return array.reshape(orig_shape)
@@ -486,6 +527,35 @@ def distance_to_semi_arc(alon, alat, aazimuth, plons, plats):
     return distance
 
 
+def distances_to_semi_arcs(alons, alats, aazimuths, plons, plats):
+    """
+    Array version of :func:`distance_to_semi_arc`, computing the
+    distances from S semi-arcs to N points in a single pass.
+
+    :param alons: a 1D array of S longitudes of the origins of the semi-arcs
+    :param alats: a 1D array of S latitudes of the origins of the semi-arcs
+    :param aazimuths: a 1D array of S azimuths of the semi-arcs
+    :param plons: a 1D array of N longitudes
+    :param plats: a 1D array of N latitudes
+    :returns: an array of shape (S, N)
+    """
+    alons, alats = alons[:, None], alats[:, None]
+    aazimuths = aazimuths[:, None]
+    azimuth_to_target = azimuth(alons, alats, plons, plats)
+    delta = numpy.radians(aazimuths - azimuth_to_target)
+    cos = numpy.cos(delta)
+    distance_to_target = geodetic_distance(alons, alats, plons, plats)
+    t_angle = (azimuth_to_target - aazimuths + 360) % 360
+    angle = numpy.arccos((numpy.sin(numpy.radians(t_angle)) *
+                          numpy.sin(distance_to_target / EARTH_RADIUS)))
+    distance = numpy.where(
+        cos > 0.0, (numpy.pi / 2 - angle) * EARTH_RADIUS,
+        numpy.where(cos <= 0.0, distance_to_target, 0.))
+    idx_ll_quadr = (cos <= 0.0) & (numpy.sin(delta) > 0.0)
+    distance[idx_ll_quadr] = -1 * distance[idx_ll_quadr]
+    return distance
+
+
 def distance_to_arc(alon, alat, aazimuth, plons, plats):
     """
     Calculate a closest distance between a great circle arc and a point
@@ -314,7 +314,7 @@ class Mesh(object):
         # create a 2d polygon from a convex hull around that multipoint
         return proj, multipoint.convex_hull
 
-    def get_joyner_boore_distance(self, mesh):
+    def get_joyner_boore_distance(self, mesh, distances=None):
         """
         Compute and return Joyner-Boore distance to each point of ``mesh``.
         Point's depth is ignored.
@@ -323,6 +323,12 @@ class Mesh(object):
         :meth:`openquake.hazardlib.geo.surface.base.BaseSurface.get_joyner_boore_distance`
         for definition of this distance.
 
+        :param mesh:
+            the target mesh
+        :param distances:
+            if given, the minimum geodetic distances between the points
+            of this mesh and the target mesh, already computed (they are
+            modified in place)
         :returns:
             numpy array of distances in km of the same shape as ``mesh``.
             Distance value is considered to be zero if a point
@@ -337,8 +343,9 @@ class Mesh(object):
         # depends on mesh spacing. but the difference can be neglected
         # if calculated geodetic distance is over some threshold.
         # get the highest slice from the 3D mesh
-        distances = geodetic.min_geodetic_distance(
-            (self.lons, self.lats), (mesh.lons, mesh.lats))
+        if distances is None:
+            distances = geodetic.min_geodetic_distance(
+                (self.lons, self.lats), (mesh.lons, mesh.lats))
         # here we find the points for which calculated mesh-to-mesh
         # distance is below a threshold. this threshold is arbitrary:
         # lower values increase the maximum possible error, higher
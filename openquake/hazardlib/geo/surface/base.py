@@ -22,8 +22,12 @@ Module :mod:`openquake.hazardlib.geo.surface.base` implements
 """
 import numpy
 import math
+from scipy.spatial.distance import cdist
 from openquake.hazardlib.geo import geodetic, utils, Point, Line,\
-    RectangularMesh
+    RectangularMesh, Mesh
+
+# maximum size of the arrays (segments, points) used to compute Rx and GC2
+MAX_ARRAY_SIZE = 100_000
 
 
 def _find_turning_points(mesh, tol=1.0):
@@ -97,6 +101,48 @@ def downsample_trace(mesh, tol=1.0):
         return numpy.column_stack([mesh.lons[0, idx], mesh.lats[0, idx]])
 
 
+def _get_rx(lons, lats, plons, plats):
+    # distances from the segments of the trace, with the first segment
+    # replaced by the backward semiarc and the last by the forward semiarc
+    dists = numpy.zeros((len(lons) - 1, len(plons)))
+    azims = geodetic.azimuth(lons[[1, -2]], lats[[1, -2]],
+                             lons[[0, -1]], lats[[0, -1]])
+    dists[[0, -1]] = geodetic.distances_to_semi_arcs(
+        lons[[1, -2]], lats[[1, -2]], azims, plons, plats)
+    dists[0] *= -1
+    if len(lons) > 3:
+        seglons = numpy.column_stack([lons[1:-2], lons[2:-1]])
+        seglats = numpy.column_stack([lats[1:-2], lats[2:-1]])
+        dists[1:-1] = geodetic.min_distances_to_segments(
+            seglons, seglats, plons, plats)
+    iii = abs(dists).argmin(axis=0)
+    return dists[iii, numpy.arange(len(plons))]
+
+
+def get_rx(lons, lats, plons, plats):
+    """
+    Compute the Rx distances from a trace with all of its segments at once,
+    processing the points in chunks of MAX_ARRAY_SIZE // num_segments.
+
+    :param lons: longitudes of the points of the trace
+    :param lats: latitudes of the points of the trace
+    :param plons: longitudes of the points where to compute the distance
+    :param plats: latitudes of the points where to compute the distance
+    :returns: an array of distances with the shape of plons
+    """
+    if len(lons) < 3:
+        azim = geodetic.azimuth(lons[0], lats[0], lons[1], lats[1])
+        return geodetic.distance_to_arc(lons[0], lats[0], azim, plons, plats)
+    shape = plons.shape
+    plons, plats = plons.flatten(), plats.flatten()
+    dists = numpy.zeros(len(plons))
+    chunksize = max(MAX_ARRAY_SIZE // (len(lons) - 1), 1)
+    for start in range(0, len(plons), chunksize):
+        slc = slice(start, start + chunksize)
+        dists[slc] = _get_rx(lons, lats, plons[slc], plats[slc])
+    return dists.reshape(shape)
+
+
 class BaseSurface:
     """
     Base class for a surface in 3D-space.
@@ -200,70 +246,8 @@ class BaseSurface:
             Numpy array of distances in km.
         """
         top_edge = self.mesh[0:1]
-
-        dists = []
-        if top_edge.lons.shape[1] < 3:
-
-            i = 0
-            p1 = Point(
-                top_edge.lons[0, i],
-                top_edge.lats[0, i],
-                top_edge.depths[0, i]
-            )
-            p2 = Point(
-                top_edge.lons[0, i + 1], top_edge.lats[0, i + 1],
-                top_edge.depths[0, i + 1]
-            )
-            azimuth = p1.azimuth(p2)
-            dists.append(
-                geodetic.distance_to_arc(
-                    p1.longitude, p1.latitude, azimuth,
-                    mesh.lons, mesh.lats
-                )
-            )
-
-        else:
-
-            for i in range(top_edge.lons.shape[1] - 1):
-                p1 = Point(
-                    top_edge.lons[0, i],
-                    top_edge.lats[0, i],
-                    top_edge.depths[0, i]
-                )
-                p2 = Point(
-                    top_edge.lons[0, i + 1],
-                    top_edge.lats[0, i + 1],
-                    top_edge.depths[0, i + 1]
-                )
-                # Swapping
-                if i == 0:
-                    pt = p1
-                    p1 = p2
-                    p2 = pt
-
-                # Computing azimuth and distance
-                if i == 0 or i == top_edge.lons.shape[1] - 2:
-                    azimuth = p1.azimuth(p2)
-                    tmp = geodetic.distance_to_semi_arc(p1.longitude,
-                                                        p1.latitude,
-                                                        azimuth,
-                                                        mesh.lons, mesh.lats)
-                else:
-                    tmp = geodetic.min_distance_to_segment(
-                        numpy.array([p1.longitude, p2.longitude]),
-                        numpy.array([p1.latitude, p2.latitude]),
-                        mesh.lons, mesh.lats)
-                # Correcting the sign of the distance
-                if i == 0:
-                    tmp *= -1
-                dists.append(tmp)
-
-        # Computing distances
-        dists = numpy.array(dists)
-        iii = abs(dists).argmin(axis=0)
-        dst = dists[iii, list(range(dists.shape[1]))]
-
-        return dst
+        return get_rx(top_edge.lons[0], top_edge.lats[0],
+                      mesh.lons, mesh.lats)
 
     def get_top_edge_depth(self):
         """
@@ -454,3 +438,179 @@ class BaseSurface:
         mesh_closest = self.get_closest_points(mesh)
         return geodetic.azimuth(mesh.lons, mesh.lats, mesh_closest.lons,
                                 mesh_closest.lats)
+
+
+def _sliding_min(array, rows, cols):
+    # minimum over all the windows of shape (rows, cols) of an array of
+    # shape (R, C, N), computed as two 1D reductions; returns an array of
+    # shape (R - rows + 1, C - cols + 1, N)
+    R, C = array.shape[:2]
+    out = array[:, :C - cols + 1].copy()
+    for c in range(1, cols):
+        numpy.minimum(out, array[:, c:C - cols + 1 + c], out)
+    res = out[:R - rows + 1].copy()
+    for r in range(1, rows):
+        numpy.minimum(res, out[r:R - rows + 1 + r], res)
+    return res
+
+
+class FaultGrid(object):
+    """
+    The mesh of a whole fault, shared by the floating ruptures on it.
+    The distances between the cells of the mesh and the sites are
+    computed only once and then the distances of each rupture are
+    reduced from the window of cells covered by the rupture; in the
+    same way the Rx distance is built from the distances to the
+    segments of the rows of the mesh.
+
+    :param mesh:
+        the :class:`openquake.hazardlib.geo.mesh.RectangularMesh` of the fault
+    :param regular:
+        True if the ruptures of each magnitude float on all the positions
+        of the mesh, so that the reductions can be done for all the
+        windows at once
+    """
+    # distances depending only on the rupture surface
+    PARAMS = frozenset(['rrup', 'rjb', 'rx', 'ry0'])
+    # maximum number of (cell, site) pairs for which the distances are kept
+    max_size = 10_000_000
+
+    def __init__(self, mesh, regular=False):
+        self.mesh = mesh
+        self.regular = regular
+        self.sites = None
+
+    def __getstate__(self):
+        # the cached distances are not pickled
+        return dict(mesh=self.mesh, regular=self.regular, sites=None)
+
+    def shares(self, sites):
+        """
+        :param sites: a SiteCollection or a Mesh
+        :returns: True if the distances to the sites can be shared
+        """
+        return self.mesh.lons.size * len(sites) <= self.max_size
+
+    def _reset(self, sites):
+        self.sites = sites
+        self.cell_dists = {}  # param -> array of shape (R, C, N)
+        self.window_dists = {}  # param -> (shape, array)
+        self.row_dists = {}  # row -> array of shape (4, C - 1, N)
+        self.last = (None, {})  # (window, (param, mask) -> distances)
+
+    def get_cell_distances(self, sites, param):
+        """
+        :param sites: a SiteCollection or a Mesh
+        :param param: 'rrup' or 'rjb'
+        :returns: an array of shape (R, C, N) with the cell distances
+        """
+        if sites is not self.sites:
+            self._reset(sites)
+        try:
+            return self.cell_dists[param]
+        except KeyError:
+            pass
+        if param == 'rrup':
+            xyz = self.mesh.xyz
+            sxyz = sites.xyz
+        else:  # rjb, on the earth surface
+            xyz = geodetic.spherical_to_cartesian(
+                self.mesh.lons.flatten(), self.mesh.lats.flatten())
+            sxyz = geodetic.spherical_to_cartesian(sites.lons, sites.lats)
+        dists = cdist(xyz, sxyz).reshape(
+            self.mesh.lons.shape + (len(sxyz),))
+        self.cell_dists[param] = dists
+        return dists
+
+    def _reduce(self, sites, param, window):
+        # minimum of the cell distances over the window of the rupture
+        dists = self.get_cell_distances(sites, param)
+        r0, r1, c0, c1 = window
+        if not self.regular:
+            return dists[r0:r1, c0:c1].min(axis=(0, 1))
+        shape = (r1 - r0, c1 - c0)
+        shp, mins = self.window_dists.get(param, (None, None))
+        if shp != shape:  # the ruptures are ordered by magnitude
+            mins = _sliding_min(dists, *shape)
+            self.window_dists[param] = shape, mins
+        return mins[r0, c0].copy()
+
+    def _get_row_dists(self, sites, row):
+        # distances from the segments of the given row of the mesh, with
+        # the same conventions of BaseSurface.get_rx_distance: distance
+        # from the arc, from the semiarc backward (with negative sign),
+        # from the semiarc forward and from the segment
+        try:
+            return self.row_dists[row]
+        except KeyError:
+            pass
+        lons, lats = self.mesh.lons[row], self.mesh.lats[row]
+        lons1, lats1, lons2, lats2 = lons[:-1], lats[:-1], lons[1:], lats[1:]
+        azim = geodetic.azimuth(lons1, lats1, lons2, lats2)
+        back = geodetic.azimuth(lons2, lats2, lons1, lats1)
+        dists = numpy.zeros((4, len(lons) - 1, len(sites)))
+        dists[0] = geodetic.distance_to_arc(
+            lons1[:, None], lats1[:, None], azim[:, None],
+            sites.lons, sites.lats)
+        dists[1] = -geodetic.distances_to_semi_arcs(
+            lons2, lats2, back, sites.lons, sites.lats)
+        dists[2] = geodetic.distances_to_semi_arcs(
+            lons1, lats1, azim, sites.lons, sites.lats)
+        dists[3] = geodetic.min_distances_to_segments(
+            numpy.column_stack([lons1, lons2]),
+            numpy.column_stack([lats1, lats2]), sites.lons, sites.lats)
+        self.row_dists[row] = dists
+        return dists
+
+    def _get_rx(self, sites, window, mask):
+        r0, r1, c0, c1 = window
+        n = c1 - c0  # number of points of the top edge
+        dists = self._get_row_dists(sites, r0)[:, :, mask]
+        if n < 3:
+            return dists[0, c0]
+        dists = numpy.concatenate([dists[1, c0:c0 + 1],
+                                   dists[3, c0 + 1:c1 - 2],
+                                   dists[2, c1 - 2:c1 - 1]])
+        iii = abs(dists).argmin(axis=0)
+        return dists[iii, numpy.arange(dists.shape[1])]
+
+    def get_distances(self, surface, sites, param, mask=None):
+        """
+        :param surface: a surface with attributes .grid and .window
+        :param sites: a SiteCollection or a Mesh
+        :param param: a distance in FaultGrid.PARAMS
+        :param mask: if given, return only the distances for the sites in it
+        :returns: an array of distances
+        """
+        if sites is not self.sites:
+            self._reset(sites)
+        window, dic = self.last
+        if window != surface.window:
+            # new rupture surface; the ruptures with different hypocenters
+            # and slip directions share the distances
+            window, dic = surface.window, {}
+            self.last = window, dic
+        if mask is None:
+            mask = numpy.ones(len(sites), bool)
+        key = param, mask.tobytes()
+        try:
+            return dic[key]
+        except KeyError:
+            pass
+        if param == 'rrup':
+            dists = self._reduce(sites, param, window)[mask]
+        elif param == 'rjb':
+            dists = surface.mesh.get_joyner_boore_distance(
+                Mesh(sites.lons[mask], sites.lats[mask]),
+                self._reduce(sites, param, window)[mask])
+        elif param == 'rx' and window[3] - window[2] > 1:
+            dists = self._get_rx(sites, window, mask)
+        elif param == 'rx':
+            dists = surface.get_rx_distance(
+                Mesh(sites.lons[mask], sites.lats[mask]))
+        elif param == 'ry0':
+            dists = surface.get_ry0_distance(
+                Mesh(sites.lons[mask], sites.lats[mask]))
+        dists.flags.writeable = False
+        dic[key] = dists
+        return dists
@@ -23,7 +23,8 @@ Module :mod:`openquake.hazardlib.geo.surface.multi` defines
 import numpy
 from copy import deepcopy
 from scipy.spatial.distance import pdist, squareform
-from openquake.hazardlib.geo.surface.base import BaseSurface, downsample_trace
+from openquake.hazardlib.geo.surface.base import (
+    BaseSurface, downsample_trace, MAX_ARRAY_SIZE)
 from openquake.hazardlib.geo.mesh import Mesh
 from openquake.hazardlib.geo import utils
 from openquake.hazardlib.geo.surface import (
@@ -474,36 +475,87 @@ class MultiSurface(BaseSurface):
         # GC2 length should be the largest positive GC2 value of the edges
         self.gc_length = numpy.max(rup_gc2u)
 
-    def _get_ut_i(self, seg, sx, sy):
+    def _get_gc2_segments(self):
         """
-        Returns the U and T coordinate for a specific trace segment
-
-        :param seg:
-            End points of the segment edge
-
-        :param sx:
-            Sites longitudes rendered into coordinate system
+        Returns the parameters of all the segments of all the traces, i.e.
+        the start points, the unit vectors along and normal to the strike,
+        the lengths and the cumulative lengths s_ij, as arrays of S elements
+        """
+        p0s, u_hats, t_hats, lengths, s_ijs = [], [], [], [], []
+        for j, edges in enumerate(self.cartesian_edges):
+            for i in range(edges.shape[0] - 1):
+                p0x, p0y = edges[i, 0], edges[i, 1]
+                p1x, p1y = edges[i + 1, 0], edges[i + 1, 1]
+                # Unit vector normal to strike
+                t_i_vec = [p1y - p0y, -(p1x - p0x), 0.0]
+                t_hats.append(t_i_vec / numpy.linalg.norm(t_i_vec))
+                # Unit vector along strike
+                u_i_vec = [p1x - p0x, p1y - p0y, 0.0]
+                u_hats.append(u_i_vec / numpy.linalg.norm(u_i_vec))
+                p0s.append((p0x, p0y))
+                lengths.append(self.length_set[j][i])
+                # equation 12 of Spudich and Chiou
+                s_ijs.append(self.cum_length_set[j][i] + numpy.dot(
+                    (edges[0, :2] - self.p0), self.gc2_config["b_hat"]))
+        p0s = numpy.array(p0s)
+        return (p0s[:, 0], p0s[:, 1], numpy.array(u_hats),
+                numpy.array(t_hats), numpy.array(lengths), numpy.array(s_ijs))
 
-        :param sy:
-            Sites latitudes rendered into coordinate system
+    def _get_gc2_chunk(self, segments, sx, sy):
+        """
+        Returns the GC2 coordinates (T, U) for a chunk of sites, computed
+        for all the segments at once with arrays of shape (S, N)
         """
-        p0x, p0y, p1x, p1y = seg[0, 0], seg[0, 1], seg[1, 0], seg[1, 1]
-        # Unit vector normal to strike
-        t_i_vec = [p1y - p0y, -(p1x - p0x), 0.0]
-        t_i_hat = t_i_vec / numpy.linalg.norm(t_i_vec)
-        # Unit vector along strike
-        u_i_vec = [p1x - p0x, p1y - p0y, 0.0]
-        u_i_hat = u_i_vec / numpy.linalg.norm(u_i_vec)
+        p0x, p0y, u_hat, t_hat, length, s_ij = segments
+        length, s_ij = length[:, None], s_ij[:, None]
         # Vectors from P0 to sites
-        rsite = numpy.column_stack([sx - p0x, sy - p0y])
-        return numpy.sum(u_i_hat[:-1] * rsite, axis=1),\
-            numpy.sum(t_i_hat[:-1] * rsite, axis=1)
+        dx, dy = sx - p0x[:, None], sy - p0y[:, None]
+        u_i = u_hat[:, 0:1] * dx + u_hat[:, 1:2] * dy
+        t_i = t_hat[:, 0:1] * dx + t_hat[:, 1:2] * dy
+        # If t_i is 0 and u_i is within the section length then site is
+        # directly on the edge - therefore general_t is 0
+        ti0_check = numpy.fabs(t_i) < 1.0E-3  # < 1 m precision
+        on_segment_range = (u_i >= 0.0) & (u_i <= length)
+        # Deal with the case in which t_i is 0 and the site is inside
+        # of the segment; in this null case w_i is ignored
+        idx0 = ti0_check & on_segment_range
+        # In the first case, ti = 0, u_i is outside of the segment
+        # (equation 5); in the last case the site is not on the edge, t != 0
+        # (equation 4)
+        idx1 = ti0_check & ~on_segment_range
+        with numpy.errstate(divide='ignore', invalid='ignore'):
+            w_i = numpy.where(
+                idx1, (1.0 / (u_i - length)) - (1.0 / u_i),
+                numpy.where(ti0_check, 0., (1. / t_i) * (
+                    numpy.arctan((length - u_i) / t_i) -
+                    numpy.arctan(-u_i / t_i))))
+        # the cumulative sums add the segments in order, as in a loop
+        idx = ~idx0
+        sum_w_i = numpy.where(idx, w_i, 0.).cumsum(axis=0)[-1]  # Equation 3
+        sum_w_i_t_i = numpy.where(idx, w_i * t_i, 0.).cumsum(axis=0)[-1]
+        sum_wi_ui_si = numpy.where(
+            idx, w_i * (u_i + s_ij), 0.).cumsum(axis=0)[-1]
+
+        general_t = numpy.zeros_like(sx)
+        general_u = numpy.zeros_like(sx)
+        # Take care of the U case for the sites on a segment using
+        # equation 12 of Spudich and Chiou; the last segment wins
+        on_segment = idx0.any(axis=0)
+        last = len(idx0) - 1 - idx0[::-1].argmax(axis=0)
+        sites = numpy.arange(len(sx))
+        general_u[on_segment] = (u_i[last, sites] + s_ij[last, 0])[on_segment]
+        # For those sites not on the segment edge itself
+        idx_t = ~on_segment
+        general_t[idx_t] = (1.0 / sum_w_i[idx_t]) * sum_w_i_t_i[idx_t]
+        general_u[idx_t] = (1.0 / sum_w_i[idx_t]) * sum_wi_ui_si[idx_t]
+        return general_t, general_u
 
     def get_generalised_coordinates(self, lons, lats):
         """
         Transforms the site positions into the generalised coordinate form
         described by Spudich and Chiou (2015) for the multi-rupture and/or
-        discordant case
+        discordant case. All the segments are processed together, with
+        the sites split in chunks of MAX_ARRAY_SIZE // num_segments.
 
         Spudich, Paul and Chiou, Brian (2015) Strike-parallel and strike-normal
         coordinate system around geometrically complicated rupture traces —
@@ -513,70 +565,17 @@ class MultiSurface(BaseSurface):
         # If the GC2 configuration has not been setup already - do it!
         if not self.gc2_config:
             self._setup_gc2_framework()
-        # Initially the weights are set to zero
         sx, sy = self.proj(lons, lats)
-        sum_w_i = numpy.zeros_like(lons)
-        sum_w_i_t_i = numpy.zeros_like(lons)
-        sum_wi_ui_si = numpy.zeros_like(lons)
-        # Find the cumulative length of the fault up until the given segment
-        # Essentially calculating s_i
-        general_t = numpy.zeros_like(lons)
-        general_u = numpy.zeros_like(lons)
-        on_segment = numpy.zeros_like(lons, dtype=bool)
-        # Loop over the traces
-        for j, edges in enumerate(self.cartesian_edges):
-            # Loop over segments in trace
-            # s_ij_total = 0.0
-            for i in range(edges.shape[0] - 1):
-                # Get u_i and t_i
-                u_i, t_i = self._get_ut_i(edges[i:(i + 2), :], sx, sy)
-                # If t_i is 0 and u_i is within the section length then site is
-                # directly on the edge - therefore general_t is 0
-                w_i = numpy.zeros_like(lons)
-                ti0_check = numpy.fabs(t_i) < 1.0E-3  # < 1 m precision
-                on_segment_range = numpy.logical_and(
-                    u_i >= 0.0,
-                    u_i <= self.length_set[j][i])
-                # Deal with the case in which t_i is 0 and the site is inside
-                # of the segment
-                idx0 = numpy.logical_and(ti0_check, on_segment_range)
-                # In this null case w_i is ignored - however, null sites on
-                # previous segments would not be null sites on this segment,
-                # so we update the list of null sites
-                on_segment[numpy.logical_or(on_segment, idx0)] = True
-                # Also take care of the U case this time using
-                # equation 12 of Spudich and Chiou
-                s_ij = self.cum_length_set[j][i] + numpy.dot(
-                    (edges[0, :2] - self.p0), self.gc2_config["b_hat"])
-                general_u[idx0] = u_i[idx0] + s_ij
-
-                # In the first case, ti = 0, u_i is outside of the segment
-                # this implements equation 5
-                idx1 = numpy.logical_and(ti0_check,
-                                         numpy.logical_not(on_segment_range))
-                w_i[idx1] = ((1.0 / (u_i[idx1] - self.length_set[j][i])) -
-                             (1.0 / u_i[idx1]))
-
-                # In the last case the site is not on the edge (t != 0)
-                # implements equation 4
-                idx2 = numpy.logical_not(ti0_check)
-                w_i[idx2] = ((1. / t_i[idx2]) * (numpy.arctan(
-                             (self.length_set[j][i] - u_i[idx2]) / t_i[idx2]) -
-                             numpy.arctan(-u_i[idx2] / t_i[idx2])))
-
-                idx = numpy.logical_or(idx1, idx2)
-                # Equation 3
-                sum_w_i[idx] += w_i[idx]
-                # Part of equation 2
-                sum_w_i_t_i[idx] += (w_i[idx] * t_i[idx])
-                # Part of equation 9
-                sum_wi_ui_si[idx] += (w_i[idx] * (u_i[idx] + s_ij))
-
-        # For those sites not on the segment edge itself
-        idx_t = numpy.logical_not(on_segment)
-        general_t[idx_t] = (1.0 / sum_w_i[idx_t]) * sum_w_i_t_i[idx_t]
-        general_u[idx_t] = (1.0 / sum_w_i[idx_t]) * sum_wi_ui_si[idx_t]
-        return general_t, general_u
+        sx, sy = sx.flatten(), sy.flatten()
+        segments = self._get_gc2_segments()
+        general_t = numpy.zeros_like(sx)
+        general_u = numpy.zeros_like(sx)
+        chunksize = max(MAX_ARRAY_SIZE // len(segments[0]), 1)
+        for start in range(0, len(sx), chunksize):
+            slc = slice(start, start + chunksize)
+            general_t[slc], general_u[slc] = self._get_gc2_chunk(
+                segments, sx[slc], sy[slc])
+        return general_t.reshape(lons.shape), general_u.reshape(lons.shape)
 
     def get_rx_distance(self, mesh):
         """
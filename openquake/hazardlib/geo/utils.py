@@ -22,7 +22,6 @@ to several geographical primitives and some other low-level spatial operations.
 """
 import math
 import logging
-import operator
 import collections
 
 import numpy
@@ -30,10 +29,13 @@ from scipy.spatial import cKDTree
 import shapely.geometry
 
 from openquake.baselib.hdf5 import vstr
+from openquake.baselib.general import gen_slices
+from openquake.baselib.python3compat import decode
 from openquake.hazardlib.geo import geodetic
 
 U32 = numpy.uint32
 F32 = numpy.float32
+QUERY_CHUNK = 100000  # number of points in a single KD-tree query
 KM_TO_DEGREES = 0.0089932  # 1 degree == 111 km
 DEGREES_TO_RAD = 0.01745329252  # 1 radians = 57.295779513 degrees
 EARTH_RADIUS = geodetic.EARTH_RADIUS
@@ -136,45 +138,72 @@ class _GeographicObjects(object):
         return (sitecol.filtered(sids), numpy.array([dic[s] for s in sids]),
                 discarded)
 
-    def assoc2(self, assets_by_site, assoc_dist, mode):
+    def query(self, lons, lats, max_distance=numpy.inf, n_jobs=-1):
         """
-        Associated a list of assets by site to the site collection used
-        to instantiate GeographicObjects.
+        Find the closest objects to many points at once. The points are
+        managed in chunks of QUERY_CHUNK, using `n_jobs` threads.
+
+        :param lons: longitudes in degrees
+        :param lats: latitudes in degrees
+        :param max_distance: distance upper bound in km
+        :returns: (distances, indices); the points farther than
+                  `max_distance` get distance inf and index len(objects)
+        """
+        dists = numpy.zeros(len(lons))
+        idxs = numpy.zeros(len(lons), int)
+        # cKDTree excludes the points exactly at the distance upper bound
+        dub = numpy.nextafter(max_distance, numpy.inf)
+        for slc in gen_slices(0, len(lons), QUERY_CHUNK):
+            xyz = spherical_to_cartesian(lons[slc], lats[slc], 0)
+            dists[slc], idxs[slc] = self.kdtree.query(
+                xyz, distance_upper_bound=dub, n_jobs=n_jobs)
+        return dists, idxs
+
+    def assoc2(self, assets, assoc_dist, mode, n_jobs=-1):
+        """
+        Associate an array of assets to the site collection used
+        to instantiate GeographicObjects, by setting the field site_id.
 
-        :param assets_by_sites: a list of lists of assets
+        :param assets: an array of assets sorted by location
         :param assoc_dist: the maximum distance for association
-        :param mode: 'strict', 'warn' or 'filter'
-        :returns: filtered site collection, filtered assets by site, discarded
+        :param mode: 'strict' or 'filter'
+        :param n_jobs: number of threads used in the KD-tree queries
+        :returns: filtered site collection, associated assets, discarded
         """
         assert mode in 'strict filter', mode
         self.objects.filtered  # self.objects must be a SiteCollection
         asset_dt = numpy.dtype(
             [('asset_ref', vstr), ('lon', F32), ('lat', F32)])
-        assets_by_sid = collections.defaultdict(list)
-        discarded = []
-        for assets in assets_by_site:
-            lon, lat = assets[0].location
-            obj, distance = self.get_closest(lon, lat)
-            if distance <= assoc_dist:
-                # keep the assets, otherwise discard them
-                assets_by_sid[obj['sids']].extend(assets)
-            elif mode == 'strict':
-                raise SiteAssociationError(
-                    'There is nothing closer than %s km '
-                    'to site (%s %s)' % (assoc_dist, lon, lat))
-            else:
-                discarded.extend(assets)
-        sids = sorted(assets_by_sid)
-        if not sids:
+        # the association is performed on the distinct locations
+        lonlats = numpy.zeros(len(assets), [('lon', float), ('lat', float)])
+        lonlats['lon'] = assets['lon']
+        lonlats['lat'] = assets['lat']
+        locs, inv = numpy.unique(lonlats, return_inverse=True)
+        dists, idxs = self.query(locs['lon'], locs['lat'], assoc_dist, n_jobs)
+        close = dists <= assoc_dist
+        if mode == 'strict' and not close.all():
+            lon, lat = locs[~close][0]
+            raise SiteAssociationError(
+                'There is nothing closer than %s km '
+                'to site (%s %s)' % (assoc_dist, lon, lat))
+        ok = close[inv]
+        if not ok.any():
             raise SiteAssociationError(
                 'Could not associate any site to any assets within the '
                 'asset_hazard_distance of %s km' % assoc_dist)
-        assets_by_site = [
-            sorted(assets_by_sid[sid], key=operator.attrgetter('ordinal'))
-            for sid in sids]
-        data = [(asset.asset_id,) + asset.location for asset in discarded]
-        discarded = numpy.array(data, asset_dt)
-        return self.objects.filtered(sids), assets_by_site, discarded
+        site_ids = numpy.zeros(len(locs), U32)
+        site_ids[close] = self.objects.sids[idxs[close]]
+        assoc = assets[ok]
+        assoc['site_id'] = site_ids[inv[ok]]
+        # keep the assets of each site in the order of the exposure file
+        assoc = assoc[numpy.lexsort((assoc['idx'], assoc['site_id']))]
+        disc = assets[~ok]
+        discarded = numpy.zeros(len(disc), asset_dt)
+        discarded['asset_ref'] = [decode(aid) for aid in disc['id']]
+        discarded['lon'] = disc['lon']
+        discarded['lat'] = disc['lat']
+        sids = numpy.unique(assoc['site_id'])
+        return self.objects.filtered(sids), assoc, discarded
 
 
 def assoc(objects, sitecol, assoc_dist, mode):
@@ -182,8 +211,7 @@ def assoc(objects, sitecol, assoc_dist, mode):
     Associate geographic objects to a site collection.
 
     :param objects:
-        something with .lons, .lats or ['lon'] ['lat'], or a list of lists
-        of objects with a .location attribute (i.e. assets_by_site)
+        something with .lons, .lats or ['lon'] ['lat']
     :param assoc_dist:
         the maximum distance for association
     :param mode:
@@ -191,12 +219,29 @@ def assoc(objects, sitecol, assoc_dist, mode):
         if 'error' fail if all sites are not associated
     :returns: (filtered site collection, filtered objects)
     """
-    if isinstance(objects, numpy.ndarray) or hasattr(objects, 'lons'):
-        # objects is a geo array with lon, lat fields; used for ShakeMaps
-        return _GeographicObjects(objects).assoc(sitecol, assoc_dist, mode)
-    else:  # objects is the list assets_by_site
-        return _GeographicObjects(sitecol).assoc2(
-            objects, assoc_dist, mode)
+    # objects is a geo array with lon, lat fields; used for ShakeMaps
+    return _GeographicObjects(objects).assoc(sitecol, assoc_dist, mode)
+
+
+def assoc_assets(assets, sitecol, assoc_dist, mode, n_jobs=-1):
+    """
+    Associate assets to a site collection, by setting the field site_id.
+
+    :param assets:
+        an array of assets sorted by location, with fields lon, lat, site_id
+    :param sitecol:
+        a (filtered) site collection
+    :param assoc_dist:
+        the maximum distance for association
+    :param mode:
+        if 'strict' fail if at least one asset is not associated
+        if 'filter' discard the assets which are not associated
+    :param n_jobs:
+        number of threads used in the KD-tree queries (-1 means all cores)
+    :returns: (filtered site collection, associated assets, discarded)
+    """
+    return _GeographicObjects(sitecol).assoc2(
+        assets, assoc_dist, mode, n_jobs)
 
 
 def clean_points(points):
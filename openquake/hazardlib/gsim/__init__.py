@@ -19,12 +19,29 @@
 """
 Package :mod:`openquake.hazardlib.gsim` contains base and specific
 implementations of ground shaking intensity models. See
-:mod:`openquake.hazardlib.gsim.base`.
+:mod:`openquake.hazardlib.gsim.base`. The GSIM modules are imported
+lazily, the first time a GSIM is looked up in the registry or accessed
+as an attribute of the package.
 """
+import sys
+import importlib
 from openquake.baselib.general import import_all
 from openquake.hazardlib.gsim.base import registry
 
-import_all('openquake.hazardlib.gsim')
+
+def __getattr__(name):
+    # used in Python 3.7+, for instance gsim.ameri_2017 imports the module
+    try:
+        return importlib.import_module('%s.%s' % (__name__, name))
+    except ModuleNotFoundError as exc:
+        if exc.name != '%s.%s' % (__name__, name):
+            raise
+        raise AttributeError('module %r has no attribute %r' %
+                             (__name__, name))
+
+
+if sys.version_info < (3, 7):  # module __getattr__ is not supported
+    import_all('openquake.hazardlib.gsim')
 
 
 def get_available_gsims():
@@ -29,7 +29,7 @@ import numpy
 from scipy.special import ndtr
 
 from openquake.hazardlib.stats import norm_cdf
-from openquake.baselib.general import DeprecationWarning
+from openquake.baselib.general import DeprecationWarning, LazyRegistry
 from openquake.hazardlib import imt as imt_module
 from openquake.hazardlib import const
 from openquake.hazardlib.contexts import KNOWN_DISTANCES
@@ -47,8 +47,10 @@ ADMITTED_SET_PARAMETERS = ['DEFINED_FOR_INTENSITY_MEASURE_TYPES',
                            'REQUIRES_SITES_PARAMETERS',
                            'REQUIRES_RUPTURE_PARAMETERS']
 
-registry = {}  # GSIM name -> GSIM class
-gsim_aliases = {}  # populated for instance in nbcc2015_AA13.py
+# GSIM name -> GSIM class, the GSIM modules are imported on first lookup
+registry = LazyRegistry('openquake.hazardlib.gsim')
+# populated for instance in nbcc2015_AA13.py
+gsim_aliases = LazyRegistry('openquake.hazardlib.gsim')
 
 
 class NotVerifiedWarning(UserWarning):
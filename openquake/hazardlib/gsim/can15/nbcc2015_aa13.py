@@ -99,7 +99,8 @@ class NBCC2015_AA13(GMPETable):
         idx = np.searchsorted(self.m_w, rctx.mag)
         dists = self.distances[:, 0, idx - 1]
         # Get mean and standard deviations
-        mean = np.log(self._get_mean(imls, dctx, dists))
+        dst = getattr(dctx, self.distance_type)
+        mean = np.log(self._get_mean(imls, dst, dists))
         stddevs = self._get_stddevs(dists, rctx.mag, dctx, imt, stddev_types)
         amplification = self.site_term(sctx, rctx, dctx, dists, imt,
                                        stddev_types)
@@ -123,9 +124,10 @@ class NBCC2015_AA13(GMPETable):
         """
 
         imls_pga = self._return_tables(rctx.mag, PGA(), "IMLs")
-        PGA450 = self._get_mean(imls_pga, dctx, dists)
+        dst = getattr(dctx, self.distance_type)
+        PGA450 = self._get_mean(imls_pga, dst, dists)
         imls_SA02 = self._return_tables(rctx.mag, SA(0.2), "IMLs")
-        SA02 = self._get_mean(imls_SA02, dctx, dists)
+        SA02 = self._get_mean(imls_SA02, dst, dists)
 
         PGA450[SA02 / PGA450 < 2.0] = PGA450[SA02 / PGA450 < 2.0] * 0.8
 
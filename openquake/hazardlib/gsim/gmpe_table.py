@@ -26,7 +26,6 @@ the corresponding amplification of the IMLs
 from copy import deepcopy
 
 import h5py
-from scipy.interpolate import interp1d
 import numpy
 
 from openquake.baselib.python3compat import decode
@@ -51,6 +50,35 @@ def hdf_arrays_to_dict(hdfgroup):
     return {key: hdfgroup[key][:] for key in hdfgroup}
 
 
+def _interp(xs, ys, x):
+    """
+    Linear interpolation along the first axis of an array, with the same
+    conventions of :class:`scipy.interpolate.interp1d`, but without
+    building an interpolator object at each call.
+
+    :param xs:
+        Increasing array of N abscissae
+    :param ys:
+        Array of shape (N, ...)
+    :param x:
+        A scalar or an array of shape S of points inside the range of xs
+    :returns:
+        An array of shape S + ys.shape[1:]
+    """
+    xs = numpy.asarray(xs, float)
+    x = numpy.asarray(x, float)
+    if (x < xs[0]).any():
+        raise ValueError("A value in x_new is below the interpolation range.")
+    elif (x > xs[-1]).any():
+        raise ValueError("A value in x_new is above the interpolation range.")
+    idx = numpy.searchsorted(xs, x).clip(1, len(xs) - 1)
+    x_lo = xs[idx - 1]
+    y_lo = ys[idx - 1]
+    shp = x.shape + (1,) * (ys.ndim - 1)
+    slope = (ys[idx] - y_lo) / (xs[idx] - x_lo).reshape(shp)
+    return slope * (x - x_lo).reshape(shp) + y_lo
+
+
 class AmplificationTable(object):
     """
     Class to apply amplification from the GMPE tables.
@@ -95,6 +123,7 @@ class AmplificationTable(object):
         self.sigma = None
         self.magnitudes = magnitudes
         self.distances = distances
+        self._tables = {}  # (stddev_type, imt) -> table
         self.parameter = decode(amplification_group.attrs["apply_to"])
         self.values = numpy.array([float(key) for key in amplification_group])
         self.argrp_id = numpy.argsort(self.values)
@@ -176,30 +205,51 @@ class AmplificationTable(object):
             * sigma_amps - List of modification factors applied to the
                          standard deviations of ground motion
         """
-        dist_level_table = self.get_mean_table(imt, rctx)
-        sigma_tables = self.get_sigma_tables(imt, rctx, stddev_types)
-        mean_interpolator = interp1d(self.values,
-                                     numpy.log10(dist_level_table),
-                                     axis=1)
-        sigma_interpolators = [interp1d(self.values, sigma_table, axis=1)
-                               for sigma_table in sigma_tables]
         if self.element == "Rupture":
-            mean_amp = 10.0 ** mean_interpolator(
-                getattr(rctx, self.parameter))[0] * numpy.ones_like(dists)
-            sigma_amps = []
-            for sig_interpolator in sigma_interpolators:
-                sigma_amps.append(sig_interpolator(
-                    getattr(rctx, self.parameter))[0] * numpy.ones_like(dists))
+            value = getattr(rctx, self.parameter)
         else:
-            mean_amp = 10.0 ** mean_interpolator(
-                getattr(sctx, self.parameter))[0, :]
-            sigma_amps = []
-            for sig_interpolator in sigma_interpolators:
-                sigma_amps.append(sig_interpolator(
-                    getattr(sctx, self.parameter))[0, :] *
-                    numpy.ones_like(dists))
+            value = getattr(sctx, self.parameter)
+        # the amplification factors are taken at the first distance
+        mean_table = self.get_mean_table(imt, rctx)
+        mean_amp = 10.0 ** _interp(
+            self.values, numpy.log10(mean_table[0]), value)
+        sigma_amps = [_interp(self.values, sigma_table[0], value) *
+                      numpy.ones_like(dists) for sigma_table in
+                      self.get_sigma_tables(imt, rctx, stddev_types)]
+        if self.element == "Rupture":
+            mean_amp = mean_amp * numpy.ones_like(dists)
         return mean_amp, sigma_amps
 
+    def _get_table(self, imt, stddev_type=None):
+        """
+        :returns:
+            The log10 of the mean amplification factors (if stddev_type is
+            None) or the modification factors for the given standard
+            deviation type, interpolated at the period of the IMT, as an
+            array of [Number Distances, Number Magnitudes, Number Levels].
+            The tables are computed only once per IMT.
+        """
+        key = (stddev_type, str(imt))
+        try:
+            return self._tables[key]
+        except KeyError:
+            pass
+        if stddev_type is None:
+            # For the mean, interpolate period in log-log space
+            tables = {name: numpy.log10(table)
+                      for name, table in self.mean.items()}
+        else:
+            tables = self.sigma[stddev_type]
+        if imt.name in 'PGA PGV':
+            table = tables[imt.name][:, 0]
+        else:
+            # interpolate the period over the second axis
+            table = _interp(numpy.log10(self.periods),
+                            tables["SA"].transpose(1, 0, 2, 3),
+                            numpy.log10(imt.period))
+        self._tables[key] = table
+        return table
+
     def get_mean_table(self, imt, rctx):
         """
         Returns amplification factors for the mean, given the rupture and
@@ -209,23 +259,10 @@ class AmplificationTable(object):
             amplification table as an array of [Number Distances,
             Number Levels]
         """
-        # Levels by Distances
-        if imt.name in 'PGA PGV':
-            interpolator = interp1d(self.magnitudes,
-                                    numpy.log10(self.mean[imt.name]), axis=2)
-            output_table = 10.0 ** (
-                interpolator(rctx.mag).reshape(self.shape[0], self.shape[3]))
-        else:
-            # For spectral accelerations - need two step process
-            # Interpolate period - log-log space
-            interpolator = interp1d(numpy.log10(self.periods),
-                                    numpy.log10(self.mean["SA"]),
-                                    axis=1)
-            period_table = interpolator(numpy.log10(imt.period))
-            # Interpolate magnitude - linear-log space
-            mag_interpolator = interp1d(self.magnitudes, period_table, axis=1)
-            output_table = 10.0 ** mag_interpolator(rctx.mag)
-        return output_table
+        # Interpolate magnitude - linear-log space
+        table = self._get_table(imt)
+        return 10.0 ** _interp(self.magnitudes, table.transpose(1, 0, 2),
+                               rctx.mag)
 
     def get_sigma_tables(self, imt, rctx, stddev_types):
         """
@@ -237,29 +274,9 @@ class AmplificationTable(object):
             of [Number Distances, Number Levels]
 
         """
-        output_tables = []
-        for stddev_type in stddev_types:
-            # For PGA and PGV only needs to apply magnitude interpolation
-            if imt.name in 'PGA PGV':
-                interpolator = interp1d(self.magnitudes,
-                                        self.sigma[stddev_type][imt.name],
-                                        axis=2)
-                output_tables.append(
-                    interpolator(rctx.mag).reshape(self.shape[0],
-                                                   self.shape[3]))
-
-            else:
-                # For spectral accelerations - need two step process
-                # Interpolate period
-                interpolator = interp1d(numpy.log10(self.periods),
-                                        self.sigma[stddev_type]["SA"],
-                                        axis=1)
-                period_table = interpolator(numpy.log10(imt.period))
-                mag_interpolator = interp1d(self.magnitudes,
-                                            period_table,
-                                            axis=1)
-                output_tables.append(mag_interpolator(rctx.mag))
-        return output_tables
+        return [_interp(self.magnitudes,
+                        self._get_table(imt, stddev_type).transpose(1, 0, 2),
+                        rctx.mag) for stddev_type in stddev_types]
 
 
 class GMPETable(GMPE):
@@ -327,6 +344,7 @@ class GMPETable(GMPE):
             self._setup_standard_deviations(fle)
             if "Amplification" in fle:
                 self._setup_amplification(fle)
+        self._log_tables = {}  # (val_type, imt) -> log10 table
 
     def _setup_standard_deviations(self, fle):
         """
@@ -388,22 +406,19 @@ class GMPETable(GMPE):
         """
         Returns the mean and standard deviations
         """
-        # Return Distance Tables
-        imls = self._return_tables(rctx.mag, imt, "IMLs")
-        # Get distance vector for the given magnitude
-        idx = numpy.searchsorted(self.m_w, rctx.mag)
-        dists = self.distances[:, 0, idx - 1]
-        # Get mean and standard deviations
-        mean = self._get_mean(imls, dctx, dists)
-        stddevs = self._get_stddevs(dists, rctx.mag, dctx, imt, stddev_types)
+        dst = getattr(dctx, self.distance_type)
+        mags = numpy.broadcast_to(rctx.mag, dst.shape)
+        mean = self.interpolate(mags, dst, imt)
+        stddevs = []
+        for stddev_type in stddev_types:
+            if stddev_type not in self.DEFINED_FOR_STANDARD_DEVIATION_TYPES:
+                raise ValueError("Standard Deviation type %s not supported"
+                                 % stddev_type)
+            stddevs.append(self.interpolate(mags, dst, imt, stddev_type))
         if self.amplification:
             # Apply amplification
             mean_amp, sigma_amp = self.amplification.get_amplification_factors(
-                imt,
-                sctx,
-                rctx,
-                getattr(dctx, self.distance_type),
-                stddev_types)
+                imt, sctx, rctx, dst, stddev_types)
             mean = numpy.log(mean) + numpy.log(mean_amp)
             for iloc in range(len(stddev_types)):
                 stddevs[iloc] *= sigma_amp[iloc]
@@ -411,31 +426,56 @@ class GMPETable(GMPE):
         else:
             return numpy.log(mean), stddevs
 
-    def _get_mean(self, data, dctx, dists):
+    def interpolate(self, mags, dsts, imt, val_type="IMLs"):
+        """
+        Interpolates the tables to the given magnitudes and distances, first
+        in linear-M|log-IML space and then in linear-D|linear-IML space.
+        The magnitudes and distances can come from many ruptures at once.
+
+        :param mags:
+            Array of N magnitudes
+        :param dsts:
+            Array of N distances
+        :param imt:
+            Intensity measure type
+        :param val_type:
+            String indicating the type of data {"IMLs", "Total", "Inter" etc}
+        :returns:
+            Array of N intensity measure levels or standard deviations
+        """
+        umags, inv = numpy.unique(mags, return_inverse=True)
+        tables = self._return_tables(umags, imt, val_type)
+        out = numpy.zeros(len(dsts))
+        for u, idx in enumerate(numpy.searchsorted(self.m_w, umags)):
+            ok = inv == u
+            # Get distance vector for the given magnitude
+            dists = self.distances[:, 0, idx - 1]
+            if val_type == "IMLs":
+                out[ok] = self._get_mean(tables[:, u], dsts[ok], dists)
+            else:
+                # values outside of the distances are taken at the edges
+                out[ok] = numpy.interp(dsts[ok], dists, tables[:, u])
+        return out
+
+    def _get_mean(self, data, dst, dists):
         """
         Returns the mean intensity measure level from the tables
         :param data:
             The intensity measure level vector for the given magnitude and IMT
-        :param key:
-            The distance type
-        :param distances:
+        :param dst:
+            The distances of the sites
+        :param dists:
             The distance vector for the given magnitude and IMT
         """
-        # For values outside of the interpolation range use -999. to ensure
-        # value is identifiable and outside of potential real values
-        interpolator_mean = interp1d(dists, data,
-                                     bounds_error=False,
-                                     fill_value=-999.)
-        mean = interpolator_mean(getattr(dctx, self.distance_type))
+        # For distances within a margin of 0.001 km from the furthest
+        # distance numpy.interp returns the value at the furthest distance
+        mean = numpy.interp(dst, dists, data)
         # For those distances less than or equal to the shortest distance
         # extrapolate the shortest distance value
-        mean[getattr(dctx, self.distance_type) < (dists[0] + 1.0E-3)] = data[0]
+        mean[dst < (dists[0] + 1.0E-3)] = data[0]
         # For those distances significantly greater than the furthest distance
         # set to 1E-20.
-        mean[getattr(dctx, self.distance_type) > (dists[-1] + 1.0E-3)] = 1E-20
-        # If any distance is between the final distance and a margin of 0.001
-        # km then assign to smallest distance
-        mean[mean < -1.] = data[-1]
+        mean[dst > (dists[-1] + 1.0E-3)] = 1E-20
         return mean
 
     def _get_stddevs(self, dists, mag, dctx, imt, stddev_types):
@@ -443,14 +483,12 @@ class GMPETable(GMPE):
         Returns the total standard deviation of the intensity measure level
         from the tables.
 
-        :param fle:
-            HDF5 data stream as instance of :class:`h5py.File`
         :param distances:
             The distance vector for the given magnitude and IMT
-        :param key:
-            The distance type
         :param mag:
             The rupture magnitude
+        :param dctx:
+            The distance context
         """
         stddevs = []
         for stddev_type in stddev_types:
@@ -458,38 +496,34 @@ class GMPETable(GMPE):
                 raise ValueError("Standard Deviation type %s not supported"
                                  % stddev_type)
             sigma = self._return_tables(mag, imt, stddev_type)
-            interpolator_std = interp1d(dists, sigma,
-                                        bounds_error=False)
-            stddev = interpolator_std(getattr(dctx, self.distance_type))
-            stddev[getattr(dctx, self.distance_type) < dists[0]] = sigma[0]
-            stddev[getattr(dctx, self.distance_type) > dists[-1]] = sigma[-1]
-            stddevs.append(stddev)
+            stddevs.append(numpy.interp(
+                getattr(dctx, self.distance_type), dists, sigma))
         return stddevs
 
-    def _return_tables(self, mag, imt, val_type):
+    def _get_log_table(self, imt, val_type):
         """
-        Returns the vector of ground motions or standard deviations
-        corresponding to the specific magnitude and intensity measure type.
+        Returns the log10 of the table of ground motions or standard
+        deviations for the given intensity measure type, as an array of shape
+        (Number Distances, Number Magnitudes). The tables are computed only
+        once per IMT and stored in the instance.
 
         :param val_type:
             String indicating the type of data {"IMLs", "Total", "Inter" etc}
         """
+        key = (val_type, str(imt))
+        try:
+            return self._log_tables[key]
+        except KeyError:
+            pass
+        if val_type == "IMLs":
+            tables = self.imls
+        else:
+            tables = self.stddevs[val_type]
         if imt.name in 'PGA PGV':
             # Get scalar imt
-            if val_type == "IMLs":
-                iml_table = self.imls[imt.name][:]
-            else:
-                iml_table = self.stddevs[val_type][imt.name][:]
-            n_d, n_s, n_m = iml_table.shape
-            iml_table = iml_table.reshape([n_d, n_m])
+            log_table = numpy.log10(tables[imt.name][:, 0].astype(float))
         else:
-            if val_type == "IMLs":
-                periods = self.imls["T"][:]
-                iml_table = self.imls["SA"][:]
-            else:
-                periods = self.stddevs[val_type]["T"][:]
-                iml_table = self.stddevs[val_type]["SA"][:]
-
+            periods = tables["T"]
             low_period = round(periods[0], 7)
             high_period = round(periods[-1], 7)
             if (round(imt.period, 7) < low_period) or (
@@ -498,11 +532,27 @@ class GMPETable(GMPE):
                                  "(%.3f to %.3f)" % (imt.period, periods[0],
                                                      periods[-1]))
             # Apply log-log interpolation for spectral period
-            interpolator = interp1d(numpy.log10(periods),
-                                    numpy.log10(iml_table),
-                                    axis=1)
-            iml_table = 10. ** interpolator(numpy.log10(imt.period))
-        return self.apply_magnitude_interpolation(mag, iml_table)
+            log_periods = numpy.log10(periods.astype(float))
+            log_table = _interp(
+                log_periods,
+                numpy.log10(tables["SA"].astype(float)).transpose(1, 0, 2),
+                numpy.clip(numpy.log10(imt.period),
+                           log_periods[0], log_periods[-1]))
+        self._log_tables[key] = log_table
+        return log_table
+
+    def _return_tables(self, mag, imt, val_type):
+        """
+        Returns the vector of ground motions or standard deviations
+        corresponding to the specific magnitude and intensity measure type.
+        If an array of magnitudes is passed, returns an array of shape
+        (Number Distances, Number Magnitudes).
+
+        :param val_type:
+            String indicating the type of data {"IMLs", "Total", "Inter" etc}
+        """
+        return 10.0 ** self._interp_mag(
+            mag, self._get_log_table(imt, val_type))
 
     def apply_magnitude_interpolation(self, mag, iml_table):
         """
@@ -513,17 +563,20 @@ class GMPETable(GMPE):
         :param iml_table:
             Intensity measure level table
         """
-        # do not allow "mag" to exceed maximum table magnitude
-        if mag > self.m_w[-1]:
-            mag = self.m_w[-1]
+        return 10.0 ** self._interp_mag(mag, numpy.log10(iml_table))
 
-        # Get magnitude values
-        if mag < self.m_w[0] or mag > self.m_w[-1]:
+    def _interp_mag(self, mag, log_table):
+        """
+        Interpolates the log10 of a table to the magnitude (or to the array
+        of magnitudes) in input
+        """
+        # do not allow "mag" to exceed maximum table magnitude
+        mag = numpy.minimum(mag, self.m_w[-1])
+        if (mag < self.m_w[0]).any():
             raise ValueError("Magnitude %.2f outside of supported range "
-                             "(%.2f to %.2f)" % (mag,
+                             "(%.2f to %.2f)" % (mag.min(),
                                                  self.m_w[0],
                                                  self.m_w[-1]))
         # It is assumed that log10 of the spectral acceleration scales
         # linearly (or approximately linearly) with magnitude
-        m_interpolator = interp1d(self.m_w, numpy.log10(iml_table), axis=1)
-        return 10.0 ** m_interpolator(mag)
+        return _interp(self.m_w, log_table.T, mag).T
@@ -521,14 +521,9 @@ class NGAEastGMPE(GMPETable):
         Returns the mean and standard deviations for the reference very hard
         rock condition (Vs30 = 3000 m/s)
         """
-        # Return Distance Tables
-        imls = self._return_tables(rctx.mag, imt, "IMLs")
-        # Get distance vector for the given magnitude
-        idx = np.searchsorted(self.m_w, rctx.mag)
-        dists = self.distances[:, 0, idx - 1]
-        # Get mean and standard deviations
-        mean = self._get_mean(imls, dctx, dists)
-        return np.log(mean)
+        dst = getattr(dctx, self.distance_type)
+        mags = np.broadcast_to(rctx.mag, dst.shape)
+        return np.log(self.interpolate(mags, dst, imt))
 
     def get_site_amplification(self, imt, pga_r, sites):
         """
@@ -369,15 +369,31 @@ def sample(weighted_objects, probabilities, sampling_method):
     :return:
         A list of S objects extracted randomly
     """
-    if sampling_method.startswith('early'):  # consider the weights
-        idxs = numpy.searchsorted(_cdf(weighted_objects), probabilities)
-    elif sampling_method.startswith('late'):
-        n = len(weighted_objects)  # consider all weights equal
-        idxs = numpy.searchsorted(numpy.arange(1/n, 1, 1/n), probabilities)
+    idxs = sample_idxs(_cdf(weighted_objects), probabilities,
+                       sampling_method)
     # NB: returning an array would break things
     return [weighted_objects[idx] for idx in idxs]
 
 
+def sample_idxs(cdf, probabilities, sampling_method):
+    """
+    Take random indices of a sequence of weighted objects
+
+    :param cdf:
+        The cumulative weights of N objects (the last one must be 1)
+    :param probabilities:
+        An array of S random numbers in the range 0..1
+    :return:
+        An array of S indices in the range 0..N-1
+    """
+    if sampling_method.startswith('early'):  # consider the weights
+        return numpy.searchsorted(cdf, probabilities)
+    elif sampling_method.startswith('late'):
+        n = len(cdf)  # consider all weights equal
+        return numpy.searchsorted(numpy.arange(1/n, 1, 1/n), probabilities)
+    raise ValueError('Unknown sampling_method %s' % sampling_method)
+
+
 Weighted = collections.namedtuple('Weighted', 'object weight')
 
 
@@ -183,11 +183,11 @@ class ProbabilityMap(dict):
         """The ordered keys of the map as a numpy.uint32 array"""
         return numpy.array(sorted(self), numpy.uint32)
 
-    def array(self, N):
+    def array(self, N, dtype=F64):
         """
         An array of shape (N, L, I)
         """
-        arr = numpy.zeros((N, self.shape_y, self.shape_z))
+        arr = numpy.zeros((N, self.shape_y, self.shape_z), dtype)
         for sid in self:
             arr[sid] = self[sid].array
         return arr
@@ -199,7 +199,8 @@ class ProbabilityMap(dict):
             N, L, I = get_shape([self])
         except AllEmptyProbabilityMaps:
             return 0
-        return BYTES_PER_FLOAT * N * L * I
+        itemsize = next(iter(self.values())).array.itemsize
+        return itemsize * N * L * I
 
     # used when exporting to HDF5
     def convert(self, imtls, nsites, idx=0):
@@ -285,7 +286,7 @@ class ProbabilityMap(dict):
     def __iadd__(self, other):
         # this is used when composing mutually exclusive probabilities
         for sid in other:
-            pcurve = self.setdefault(sid, 0)
+            pcurve = self.setdefault(sid, 0, other[sid].array.dtype)
             pcurve += other[sid]
         return self
 
@@ -325,6 +326,33 @@ class ProbabilityMap(dict):
     def __getstate__(self):
         return dict(shape_y=self.shape_y, shape_z=self.shape_z)
 
+    # used in float32 mode, where the probabilities of no exceedance
+    # are stored in log-space and composed by addition instead of product
+    def add_logpnes(self, other):
+        """
+        Add to self the logarithm of the probabilities of no exceedance
+        of the given map of PoEs, i.e. self += log(1 - other), in float32.
+        This is the log-space equivalent of `self |= other`.
+        """
+        for sid in other:
+            pcurve = self.setdefault(sid, 0., F32)
+            with numpy.errstate(divide='ignore'):
+                pcurve.array += numpy.log1p(-other[sid].array)
+        return self
+
+    def logpnes2poes(self):
+        """
+        Convert a map of log(1 - PoE) into a map of PoEs with the same
+        dtype, by using expm1 to preserve the small probabilities.
+        Curves with all zeros are discarded.
+        """
+        new = self.__class__(self.shape_y, self.shape_z)
+        for sid in self:
+            array = self[sid].array
+            if array.any():
+                new[sid] = ProbabilityCurve(-numpy.expm1(array))
+        return new
+
 
 def get_shape(pmaps):
     """
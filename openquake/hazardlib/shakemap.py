@@ -33,6 +33,12 @@ SHAKEMAP_URL = US_GOV + '/fdsnws/event/1/query?eventid={}&format=geojson'
 F32 = numpy.float32
 PCTG = 100  # percent of g, the gravity acceleration
 MAX_GMV = 5.  # 5 g
+MAX_BATCH_SIZE = 10_000_000  # max number of GMVs generated in a batch
+JITTERS = [1E-12, 1E-10, 1E-8, 1E-6]  # relative jitters for the covariance
+# parameters of the site amplification function
+AMPL_GMVS = numpy.array([0, 0.1, 0.2, 0.3, 0.4, 5])
+AMPL_EXPS = numpy.array([[0.35, 0.35, 0.25, 0.10, -0.05, -0.05],
+                         [0.65, 0.65, 0.60, 0.53, 0.45, 0.45]])
 
 
 class DownloadFailed(Exception):
@@ -178,15 +184,8 @@ def spatial_covariance_array(stddev, corrmatrices):
     :returns: an array of shape (M, N, N)
     """
     # this depends on sPGA, sSa03, sSa10, sSa30
-    M, N = corrmatrices.shape[:2]
-    matrices = []
-    for i, std in enumerate(stddev):
-        covmatrix = numpy.zeros((N, N))
-        for j in range(N):
-            for k in range(N):
-                covmatrix[j, k] = corrmatrices[i, j, k] * std[j] * std[k]
-        matrices.append(covmatrix)
-    return numpy.array(matrices)
+    stddev = numpy.array(stddev)  # shape (M, N)
+    return corrmatrices * stddev[:, :, None] * stddev[:, None, :]
 
 
 def cross_correlation_matrix(imts, corr='yes'):
@@ -223,11 +222,29 @@ def cross_correlation_matrix(imts, corr='yes'):
 def amplify_gmfs(imts, vs30s, gmfs):
     """
     Amplify the ground shaking depending on the vs30s
+
+    :param imts: M intensity measure types
+    :param vs30s: N velocities
+    :param gmfs: ground motion values of shape (M * N, E) in units of g
+    :returns: an array of shape (M * N, E)
     """
-    n = len(vs30s)
-    out = [amplify_ground_shaking(im.period, vs30s[i], gmfs[m * n + i])
-           for m, im in enumerate(imts) for i in range(n)]
-    return numpy.array(out)
+    N = len(vs30s)
+    gmvs = numpy.minimum(gmfs.reshape(len(imts), N, -1), MAX_GMV)
+    # the same piecewise linear interpolation of amplify_ground_shaking,
+    # performed for all sites and events at once
+    idx = numpy.searchsorted(AMPL_GMVS, gmvs).clip(1, len(AMPL_GMVS) - 1)
+    x_lo = AMPL_GMVS[idx - 1]
+    x_hi = AMPL_GMVS[idx]
+    out = numpy.zeros_like(gmvs)
+    ratio = 760 / numpy.array(vs30s)
+    for m, im in enumerate(imts):
+        exps = AMPL_EXPS[0] if im.period <= 0.3 else AMPL_EXPS[1]
+        ys = ratio[:, None] ** exps  # shape (N, 6)
+        y_lo = numpy.take_along_axis(ys, idx[m] - 1, 1)
+        y_hi = numpy.take_along_axis(ys, idx[m], 1)
+        slope = (y_hi - y_lo) / (x_hi[m] - x_lo[m])
+        out[m] = (slope * (gmvs[m] - x_lo[m]) + y_lo) * gmvs[m]
+    return out.reshape(gmfs.shape)
 
 
 def amplify_ground_shaking(T, vs30, gmvs):
@@ -237,26 +254,57 @@ def amplify_ground_shaking(T, vs30, gmvs):
     :param gmvs: ground motion values for the current site in units of g
     """
     gmvs[gmvs > MAX_GMV] = MAX_GMV  # accelerations > 5g are absurd
+    exps = AMPL_EXPS[0] if T <= 0.3 else AMPL_EXPS[1]
     interpolator = interpolate.interp1d(
-        [0, 0.1, 0.2, 0.3, 0.4, 5],
-        [(760 / vs30)**0.35,
-         (760 / vs30)**0.35,
-         (760 / vs30)**0.25,
-         (760 / vs30)**0.10,
-         (760 / vs30)**-0.05,
-         (760 / vs30)**-0.05],
-    ) if T <= 0.3 else interpolate.interp1d(
-        [0, 0.1, 0.2, 0.3, 0.4, 5],
-        [(760 / vs30)**0.65,
-         (760 / vs30)**0.65,
-         (760 / vs30)**0.60,
-         (760 / vs30)**0.53,
-         (760 / vs30)**0.45,
-         (760 / vs30)**0.45],
-    )
+        AMPL_GMVS, [(760 / vs30)**exp for exp in exps])
     return interpolator(gmvs) * gmvs
 
 
+def robust_cholesky(cov):
+    """
+    Cholesky decomposition of a stack of covariance matrices which can be
+    numerically singular, for instance when there are nearly coincident
+    stations. In that case an increasing jitter, relative to the mean
+    variance, is added to the diagonal; if even that is not enough the
+    factor is computed from the eigen-decomposition, clipping the
+    negative eigenvalues.
+
+    :param cov: array of shape (..., N, N)
+    :returns: an array L of shape (..., N, N) with L @ L.T == cov
+    """
+    try:
+        return numpy.linalg.cholesky(cov)
+    except numpy.linalg.LinAlgError:
+        pass
+    var = numpy.diagonal(cov, axis1=-2, axis2=-1).mean(axis=-1)
+    eye = numpy.eye(cov.shape[-1])
+    for jitter in JITTERS:
+        try:
+            return numpy.linalg.cholesky(
+                cov + jitter * var[..., None, None] * eye)
+        except numpy.linalg.LinAlgError:
+            pass
+    logging.warning('The covariance matrix is singular, using its '
+                    'eigen-decomposition')
+    vals, vecs = numpy.linalg.eigh(cov)
+    return vecs * numpy.sqrt(vals.clip(0))[..., None, :]
+
+
+def cholesky_factors(spatial_cov, cross_corr):
+    """
+    Decompose the spatial covariance and cross correlation matrices
+    separately. The full covariance matrix has blocks
+    C_ij = cross_corr[i, j] * L_i @ L_j.T, with L_i the Cholesky factor of
+    spatial_cov[i], so its Cholesky factor has blocks Lc[i, j] * L_i, where
+    Lc is the Cholesky factor of cross_corr.
+
+    :param spatial_cov: array of shape (M, N, N)
+    :param cross_corr: array of shape (M, M)
+    :returns: an array of shape (M, N, N) and an array of shape (M, M)
+    """
+    return robust_cholesky(spatial_cov), numpy.linalg.cholesky(cross_corr)
+
+
 def cholesky(spatial_cov, cross_corr):
     """
     Decompose the spatial covariance and cross correlation matrices.
@@ -265,23 +313,54 @@ def cholesky(spatial_cov, cross_corr):
     :param cross_corr: array of shape (M, M)
     :returns: a triangular matrix of shape (M * N, M * N)
     """
-    M, N = spatial_cov.shape[:2]
-    L = numpy.array([numpy.linalg.cholesky(spatial_cov[i]) for i in range(M)])
-    LLT = []
-    for i in range(M):
-        row = [L[i] @ L[j].T * cross_corr[i, j] for j in range(M)]
-        for j in range(N):
-            singlerow = numpy.zeros(M * N)
-            for i in range(M):
-                singlerow[i * N:(i + 1) * N] = row[i][j]
-            LLT.append(singlerow)
-    return numpy.linalg.cholesky(numpy.array(LLT))
+    L, Lc = cholesky_factors(spatial_cov, cross_corr)
+    M = len(L)
+    return numpy.block([[L[i] * Lc[i, j] for j in range(M)]
+                        for i in range(M)])
+
+
+def correlate(L, Lc, Z):
+    """
+    :param L: spatial Cholesky factors of shape (M, N, N)
+    :param Lc: cross correlation Cholesky factor of shape (M, M)
+    :param Z: uncorrelated normal variates of shape (M, N, E)
+    :returns: the product cholesky(...) @ Z as an array of shape (M, N, E)
+    """
+    W = Lc @ Z.reshape(len(Lc), -1)  # shape (M, N * E)
+    return L @ W.reshape(Z.shape)
+
+
+def split_sites(lons, lats, tile_size):
+    """
+    Split the sites in spatially compact tiles with at most `tile_size`
+    sites each, by bisecting recursively along the widest dimension.
+
+    :returns: a list of arrays of site indices
+    """
+    coslat = numpy.cos(numpy.radians(numpy.mean(lats)))
+
+    def bisect(idx):
+        if len(idx) <= tile_size:
+            return [idx]
+        xs = lons[idx] * coslat
+        ys = lats[idx]
+        coords = xs if numpy.ptp(xs) >= numpy.ptp(ys) else ys
+        idx = idx[numpy.argsort(coords, kind='stable')]
+        half = len(idx) // 2
+        return bisect(idx[:half]) + bisect(idx[half:])
+    return bisect(numpy.arange(len(lons)))
 
 
 def to_gmfs(shakemap, spatialcorr, crosscorr, site_effects, trunclevel,
-            num_gmfs, seed, imts=None):
+            num_gmfs, seed, imts=None, tile_size=0):
     """
-    :returns: (IMT-strings, array of GMFs of shape (R, N, E, M)
+    Generate the GMFs conditioned on the shakemap. If `tile_size` is
+    positive and smaller than the number of sites, the sites are split in
+    tiles and the spatial correlation between sites in different tiles is
+    neglected; the GMFs are generated in batches of events, so that the
+    memory occupation is bounded by the size of the output.
+
+    :returns: (IMT-strings, array of GMFs of shape (N, E, M))
     """
     N = len(shakemap)  # number of sites
     std = shakemap['std']
@@ -289,32 +368,42 @@ def to_gmfs(shakemap, spatialcorr, crosscorr, site_effects, trunclevel,
         imts = std.dtype.names
     else:
         imts = [imt for imt in imts if imt in std.dtype.names]
-    val = {imt: numpy.log(shakemap['val'][imt]) for imt in imts}
     imts_ = [imt.from_string(name) for name in imts]
     M = len(imts_)
+    mu = numpy.array([numpy.log(shakemap['val'][imt]) for imt in imts])
     cross_corr = cross_correlation_matrix(imts_, crosscorr)
-    mu = numpy.array([numpy.ones(num_gmfs) * val[str(imt)][j]
-                      for imt in imts_ for j in range(N)])
-    dmatrix = geo.geodetic.distance_matrix(
-        shakemap['lon'], shakemap['lat'])
-    spatial_corr = spatial_correlation_array(dmatrix, imts_, spatialcorr)
-    stddev = [std[str(imt)] for imt in imts_]
+    stddev = numpy.array([std[str(imt)] for imt in imts_])  # shape (M, N)
     for im, std in zip(imts_, stddev):
         if std.sum() == 0:
             raise ValueError('Cannot decompose the spatial covariance '
                              'because stddev==0 for IMT=%s' % im)
-    spatial_cov = spatial_covariance_array(stddev, spatial_corr)
-    L = cholesky(spatial_cov, cross_corr)  # shape (M * N, M * N)
+    if tile_size and N > tile_size:
+        tiles = split_sites(shakemap['lon'], shakemap['lat'], tile_size)
+    else:
+        tiles = [slice(None)]
     if trunclevel:
         Z = truncnorm.rvs(-trunclevel, trunclevel, loc=0, scale=1,
                           size=(M * N, num_gmfs), random_state=seed)
     else:
         Z = norm.rvs(loc=0, scale=1, size=(M * N, num_gmfs), random_state=seed)
-    # Z has shape (M * N, E)
-    gmfs = numpy.exp(L @ Z + mu) / PCTG
-    if site_effects:
-        gmfs = amplify_gmfs(imts_, shakemap['vs30'], gmfs)
+    gmfs = Z.reshape((M, N, num_gmfs))  # the GMFs are computed in place
+    for idx in tiles:
+        dmatrix = geo.geodetic.distance_matrix(
+            shakemap['lon'][idx], shakemap['lat'][idx])
+        spatial_corr = spatial_correlation_array(dmatrix, imts_, spatialcorr)
+        spatial_cov = spatial_covariance_array(stddev[:, idx], spatial_corr)
+        L, Lc = cholesky_factors(spatial_cov, cross_corr)
+        n = len(dmatrix)
+        esize = max(int(MAX_BATCH_SIZE // (M * n)), 1)
+        for e0 in range(0, num_gmfs, esize):
+            sl = slice(e0, e0 + esize)
+            block = numpy.exp(
+                correlate(L, Lc, gmfs[:, idx, sl]) + mu[:, idx, None]) / PCTG
+            if site_effects:
+                block = amplify_gmfs(
+                    imts_, shakemap['vs30'][idx], block.reshape(M * n, -1))
+            gmfs[:, idx, sl] = block.reshape((M, n, -1))
     if gmfs.max() > MAX_GMV:
         logging.warning('There are suspiciously large GMVs of %.2fg',
                         gmfs.max())
-    return imts, gmfs.reshape((M, N, num_gmfs)).transpose(1, 2, 0)
+    return imts, gmfs.transpose(1, 2, 0)
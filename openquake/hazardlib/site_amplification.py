@@ -21,6 +21,7 @@ import copy
 import numpy
 import pandas as pd
 
+from openquake.baselib.general import AccumDict
 from openquake.hazardlib.stats import norm_cdf
 from openquake.hazardlib.site import ampcode_dt
 from openquake.hazardlib.imt import from_string
@@ -227,6 +228,7 @@ class Amplifier(object):
         self.midlevels = numpy.diff(levels) / 2 + levels[:-1]  # shape I-1
         self.ialphas = {}  # code -> array of length I-1
         self.isigmas = {}  # code -> array of length I-1
+        self.matrices = {}  # (code, imt) -> array of shape (A, I-1)
         for code in self.coeff:
             df = self.coeff[code]
             if mag is not None:
@@ -259,6 +261,49 @@ class Amplifier(object):
                              'from vs30_ref=%d over the tolerance of %d' %
                              (self.vs30_ref, vs30_tolerance))
 
+    def _get_code(self, ampl_code):
+        # manage the case of a site collection with empty ampcode
+        if ampl_code == b'' and len(self.ampcodes) == 1:
+            return self.ampcodes[0]
+        return ampl_code
+
+    def get_matrix(self, ampl_code, imt):
+        """
+        :param ampl_code: code for the amplification function
+        :param imt: an intensity measure type
+        :returns:
+            the convolution matrix of shape (A, I-1) for the given code and
+            IMT, computed once and cached
+        """
+        key = self._get_code(ampl_code), imt
+        try:
+            return self.matrices[key]
+        except KeyError:
+            pass
+        ialphas = self.ialphas[key]
+        isigmas = self.isigmas[key]
+        matrix = numpy.zeros((len(self.amplevels), len(self.midlevels)))
+        for i, (mid, a, s) in enumerate(
+                zip(self.midlevels, ialphas, isigmas)):
+            #
+            # This computes the conditional probabilities of exceeding
+            # defined values of shaking on soil given a value of shaking
+            # on rock. 'mid' is the value of ground motion on rock to
+            # which we associate the probability of occurrence. 'a'
+            # is the median amplification factor and 's' is the standard
+            # deviation of the logarithm of amplification.
+            #
+            # In the case of an amplification function without uncertainty
+            # (i.e. sigma is zero) this will return values corresponding
+            # to 1 (if the value of shaking on rock will be larger than the
+            # value of shaking on soil) or 0 (if the value of shaking on
+            # rock will be smaller than the value of shaking on soil)
+            #
+            logaf = numpy.log(self.amplevels / mid)
+            matrix[:, i] = 1.0 - norm_cdf(logaf, numpy.log(a), s)
+        self.matrices[key] = matrix
+        return matrix
+
     def amplify_one(self, ampl_code, imt, poes):
         """
         :param ampl_code: code for the amplification function
@@ -268,42 +313,19 @@ class Amplifier(object):
         """
         if isinstance(poes, list):  # in the tests
             poes = numpy.array(poes).reshape(-1, 1)
-        # Manage the case of a site collection with empty ampcode
-        if ampl_code == b'' and len(self.ampcodes) == 1:
-            ampl_code = self.ampcodes[0]
-
-        ialphas = self.ialphas[ampl_code, imt]
-        isigmas = self.isigmas[ampl_code, imt]
-
-        A, G = len(self.amplevels), poes.shape[1]
-        ampl_poes = numpy.zeros((A, G))
-
-        # Amplify, for each site i.e. distance
-        for g in range(G):
-
-            # Compute the probability of occurrence of GM within a number of
-            # intervals
-            p_occ = -numpy.diff(poes[:, g])
-
-            for mid, p, a, s in zip(self.midlevels, p_occ, ialphas, isigmas):
-                #
-                # This computes the conditional probabilities of exceeding
-                # defined values of shaking on soil given a value of shaking
-                # on rock. 'mid' is the value of ground motion on rock to
-                # which we associate the probability of occurrence 'p'. 'a'
-                # is the median amplification factor and 's' is the standard
-                # deviation of the logarithm of amplification.
-                #
-                # In the case of an amplification function without uncertainty
-                # (i.e. sigma is zero) this will return values corresponding
-                # to 'p' times 1 (if the value of shaking on rock will be
-                # larger than the value of shaking on soil) or 0 (if the
-                # value of shaking on rock will be smaller than the value of
-                # shaking on soil)
-                #
-                logaf = numpy.log(self.amplevels/mid)
-                ampl_poes[:, g] += (1.0-norm_cdf(logaf, numpy.log(a), s)) * p
-        return ampl_poes
+        # Compute the probability of occurrence of GM within a number of
+        # intervals and convolve it with the amplification function
+        return self.get_matrix(ampl_code, imt) @ -numpy.diff(poes, axis=0)
+
+    def _amplify_arrays(self, ampl_code, arrays):
+        # amplify a list of arrays of shape (L, G) with the same code,
+        # with a single matrix product per IMT
+        G = [arr.shape[1] for arr in arrays]
+        poes = numpy.concatenate(arrays, axis=1)
+        new = numpy.concatenate(
+            [self.amplify_one(ampl_code, imt, poes[self.imtls(imt)])
+             for imt in self.imtls])
+        return numpy.split(new, numpy.cumsum(G)[:-1], axis=1)
 
     def amplify(self, ampl_code, pcurves):
         """
@@ -311,14 +333,31 @@ class Amplifier(object):
         :param pcurves: a list of ProbabilityCurves containing PoEs
         :returns: amplified ProbabilityCurves
         """
-        out = []
-        for pcurve in pcurves:
-            lst = []
-            for imt in self.imtls:
-                slc = self.imtls(imt)
-                new = self.amplify_one(ampl_code, imt, pcurve.array[slc])
-                lst.append(new)
-            out.append(ProbabilityCurve(numpy.concatenate(lst)))
+        arrays = self._amplify_arrays(
+            ampl_code, [pcurve.array for pcurve in pcurves])
+        return [ProbabilityCurve(arr) for arr in arrays]
+
+    def amplify_pcurves(self, ampcodes, pcurves_by_sid):
+        """
+        Amplify the curves of many sites, with a single matrix product for
+        all the sites with the same code
+
+        :param ampcodes: an array of codes for the amplification functions,
+                         indexed by site ID
+        :param pcurves_by_sid: a dictionary sid -> list of ProbabilityCurves
+        :returns: a dictionary sid -> list of amplified ProbabilityCurves
+        """
+        sids_by_code = AccumDict(accum=[])
+        for sid in pcurves_by_sid:
+            sids_by_code[ampcodes[sid]].append(sid)
+        out = {}
+        for code, sids in sids_by_code.items():
+            arrays = iter(self._amplify_arrays(
+                code, [pc.array for sid in sids
+                       for pc in pcurves_by_sid[sid]]))
+            for sid in sids:
+                out[sid] = [ProbabilityCurve(next(arrays))
+                            for pc in pcurves_by_sid[sid]]
         return out
 
     def _interp(self, ampl_code, imt_str, imls, coeff=None):
@@ -360,6 +399,17 @@ class Amplifier(object):
         :param seed: seed used when adding the uncertainty
         """
         numpy.random.seed(seed)
+        ampcodes = numpy.array(ampcodes)
+        idx_by_code = {code: ampcodes == code
+                       for code in numpy.unique(ampcodes)}
         for m, imt in enumerate(imts):
-            for i, (ampcode, arr) in enumerate(zip(ampcodes, gmvs[m])):
-                gmvs[m, i] = self._amplify_gmvs(ampcode, arr, str(imt))
+            logs = numpy.zeros(gmvs.shape[1:])
+            isigma = numpy.zeros(gmvs.shape[1:])
+            for code, idx in idx_by_code.items():
+                ialpha, isigma[idx] = self._interp(
+                    code, str(imt), gmvs[m, idx])
+                logs[idx] = numpy.log(ialpha * gmvs[m, idx])
+            # the normals are drawn in the same order as site by site,
+            # so that the results are the same for the same seed
+            uncert = numpy.random.normal(numpy.zeros_like(gmvs[m]), isigma)
+            gmvs[m] = numpy.exp(logs + uncert)
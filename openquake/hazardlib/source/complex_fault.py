@@ -24,6 +24,7 @@ from openquake.hazardlib import mfd
 from openquake.hazardlib.source.base import ParametricSeismicSource
 from openquake.hazardlib.source.rupture_collection import split
 from openquake.hazardlib.geo.surface.complex_fault import ComplexFaultSurface
+from openquake.hazardlib.geo.surface.base import FaultGrid
 from openquake.hazardlib.geo.nodalplane import NodalPlane
 from openquake.hazardlib.source.rupture import ParametricProbabilisticRupture
 
@@ -176,6 +177,8 @@ class ComplexFaultSource(ParametricSeismicSource):
         whole_fault_mesh = whole_fault_surface.mesh
         cell_center, cell_length, cell_width, cell_area = (
             whole_fault_mesh.get_cell_dimensions())
+        grid = FaultGrid(whole_fault_mesh)
+        nrows, ncols = whole_fault_mesh.shape
         for mag, mag_occ_rate in self.get_annual_occurrence_rates():
             # min_mag is inside get_annual_occurrence_rates
             if mag_occ_rate == 0:
@@ -197,6 +200,13 @@ class ComplexFaultSource(ParametricSeismicSource):
                 except ValueError as e:
                     raise ValueError("Invalid source with id=%s. %s" % (
                         self.source_id, str(e)))
+                if rupture_slice == slice(None):
+                    surface.window = (0, nrows, 0, ncols)
+                else:
+                    rows, cols = rupture_slice
+                    surface.window = rows.indices(nrows)[:2] + cols.indices(
+                        ncols)[:2]
+                surface.grid = grid
                 rup = ParametricProbabilisticRupture(
                     mag, self.rake, self.tectonic_region_type, hypocenter,
                     surface, occurrence_rate, self.temporal_occurrence_model)
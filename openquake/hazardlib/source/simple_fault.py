@@ -23,6 +23,7 @@ from openquake.baselib.python3compat import round
 from openquake.hazardlib import mfd
 from openquake.hazardlib.source.base import ParametricSeismicSource
 from openquake.hazardlib.geo.surface.simple_fault import SimpleFaultSurface
+from openquake.hazardlib.geo.surface.base import FaultGrid
 from openquake.hazardlib.geo.nodalplane import NodalPlane
 from openquake.hazardlib.source.rupture import ParametricProbabilisticRupture
 
@@ -140,6 +141,8 @@ class SimpleFaultSource(ParametricSeismicSource):
         mesh_rows, mesh_cols = whole_fault_mesh.shape
         fault_length = float((mesh_cols - 1) * self.rupture_mesh_spacing)
         fault_width = float((mesh_rows - 1) * self.rupture_mesh_spacing)
+        # the ruptures float on all the positions of the mesh
+        grid = FaultGrid(whole_fault_mesh, regular=True)
 
         for mag, mag_occ_rate in self.get_annual_occurrence_rates():
             rup_cols, rup_rows = self._get_rupture_dimensions(
@@ -152,12 +155,15 @@ class SimpleFaultSource(ParametricSeismicSource):
                 for first_col in range(num_rup_along_length):
                     mesh = whole_fault_mesh[first_row: first_row + rup_rows,
                                             first_col: first_col + rup_cols]
+                    window = (first_row, first_row + rup_rows,
+                              first_col, first_col + rup_cols)
 
                     if not len(self.hypo_list) and not len(self.slip_list):
 
                         hypocenter = mesh.get_middle_point()
                         occurrence_rate_hypo = occurrence_rate
                         surface = SimpleFaultSurface(mesh)
+                        surface.grid, surface.window = grid, window
 
                         yield ParametricProbabilisticRupture(
                             mag, self.rake, self.tectonic_region_type,
@@ -167,6 +173,8 @@ class SimpleFaultSource(ParametricSeismicSource):
                         for hypo in self.hypo_list:
                             for slip in self.slip_list:
                                 surface = SimpleFaultSurface(mesh)
+                                surface.grid = grid
+                                surface.window = window
                                 hypocenter = surface.get_hypo_location(
                                     self.rupture_mesh_spacing, hypo[:2])
                                 occurrence_rate_hypo = occurrence_rate * \
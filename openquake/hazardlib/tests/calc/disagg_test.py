@@ -14,6 +14,7 @@
 # You should have received a copy of the GNU Affero General Public License
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 import unittest
+from unittest import mock
 import os.path
 import numpy
 
@@ -116,6 +117,36 @@ class DisaggregateTestCase(unittest.TestCase):
         aaae(matrix.shape, (2, 27, 2, 2, 3, 1))
         aaae(matrix.sum(), 6.14179818e-11)
 
+    def test_chunks(self):
+        # managing the ruptures one by one gives exactly the same matrix
+        args = (self.sources, self.site, self.imt, self.iml, self.gsims,
+                self.truncation_level)
+        kw = dict(n_epsilons=3, mag_bin_width=3, dist_bin_width=4,
+                  coord_bin_width=2.4)
+        _, matrix = disagg.disaggregation(*args, **kw)
+        with mock.patch.object(disagg, 'MAX_BYTES', 1):
+            _, matrix1 = disagg.disaggregation(*args, **kw)
+        numpy.testing.assert_array_equal(matrix, matrix1)
+
+        # nonzero cells (mag, dist, lon, lat, eps) computed with the
+        # kernel looping on the ruptures, before the vectorization
+        expected = {
+            (1, 0, 0, 0, 0): 7.2017947e-12, (1, 0, 0, 0, 1): 8.9214192e-12,
+            (1, 0, 0, 0, 2): 7.2017947e-12, (1, 1, 0, 0, 0): 1.0442758e-12,
+            (1, 1, 0, 0, 1): 1.2935208e-12, (1, 1, 0, 0, 2): 1.0442758e-12,
+            (1, 4, 0, 1, 0): 2.9429792e-12, (1, 4, 0, 1, 1): 3.6457504e-12,
+            (1, 4, 0, 1, 2): 2.9429792e-12, (1, 9, 0, 1, 0): 3.6206593e-12,
+            (1, 9, 0, 1, 1): 4.4853010e-12, (1, 9, 0, 1, 2): 3.6206593e-12,
+            (1, 12, 0, 1, 1): 2.8627101e-12, (1, 12, 0, 1, 2): 4.4544368e-12,
+            (1, 15, 0, 1, 2): 1.1973755e-12, (1, 26, 1, 1, 1): 3.8513637e-13,
+            (1, 26, 1, 1, 2): 4.5530246e-12}
+        cells = sorted(expected)
+        self.assertEqual(
+            sorted(zip(*numpy.nonzero(matrix[..., 0]))), cells)
+        numpy.testing.assert_allclose(
+            [matrix[cell + (0,)] for cell in cells],
+            [expected[cell] for cell in cells], rtol=1E-6)
+
 
 class PMFExtractorsTestCase(unittest.TestCase):
     def setUp(self):
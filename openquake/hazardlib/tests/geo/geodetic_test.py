@@ -221,6 +221,36 @@ class DistanceToSemiArcTest(unittest.TestCase):
         self.assertAlmostEqual(dist, -79.3093368)
 
 
+class ArrayDistancesTest(unittest.TestCase):
+    # the array versions must give exactly the same values of the
+    # functions working on a single segment/semiarc
+    def setUp(self):
+        rng = numpy.random.RandomState(42)
+        self.lons = rng.uniform(-2, 2, 1000)
+        self.lats = rng.uniform(-2, 2, 1000)
+        self.seglons = numpy.array([[-1.2, 1.4], [1.4, 1.6], [0., -.3]])
+        self.seglats = numpy.array([[-0.3, 0.5], [0.5, 1.], [0., 0.2]])
+
+    def test_min_distances_to_segments(self):
+        dists = geodetic.min_distances_to_segments(
+            self.seglons, self.seglats, self.lons, self.lats)
+        for slons, slats, dist in zip(self.seglons, self.seglats, dists):
+            numpy.testing.assert_array_equal(
+                dist, geodetic.min_distance_to_segment(
+                    slons, slats, self.lons, self.lats))
+
+    def test_distances_to_semi_arcs(self):
+        azims = numpy.array([39.4, 219.4, 0.])
+        dists = geodetic.distances_to_semi_arcs(
+            self.seglons[:, 0], self.seglats[:, 0], azims,
+            self.lons, self.lats)
+        for alon, alat, azim, dist in zip(
+                self.seglons[:, 0], self.seglats[:, 0], azims, dists):
+            numpy.testing.assert_array_equal(
+                dist, geodetic.distance_to_semi_arc(
+                    alon, alat, azim, self.lons, self.lats))
+
+
 class DistanceToArcTest(unittest.TestCase):
     # values in this test have not been checked by hand
     def test_one_point(self):
@@ -21,7 +21,7 @@ from openquake.hazardlib.geo.point import Point
 from openquake.hazardlib.geo.line import Line
 from openquake.hazardlib.geo.mesh import Mesh, RectangularMesh
 from openquake.hazardlib.geo.surface.simple_fault import SimpleFaultSurface
-from openquake.hazardlib.geo.surface.base import BaseSurface
+from openquake.hazardlib.geo.surface.base import BaseSurface, FaultGrid
 
 from openquake.hazardlib.tests.geo.surface import _planar_test_data
 
@@ -415,3 +415,40 @@ class GetAzimuthClosestPointTestCase(unittest.TestCase):
         expected = numpy.array([180, -90, 0])
         azimuths[azimuths > 180] = azimuths[azimuths > 180] - 360
         numpy.testing.assert_almost_equal(expected, azimuths, 1)
+
+
+class FaultGridTestCase(unittest.TestCase):
+    # the shared distances must be identical to the ones of the surfaces
+    def check(self, regular):
+        trace = Line([Point(-.3, -.1), Point(0., .05), Point(.3, .1)])
+        mesh = SimpleFaultSurface.from_fault_data(trace, 2, 15, 60, 2).mesh
+        lons, lats = numpy.meshgrid(numpy.linspace(-.5, .5, 7),
+                                    numpy.linspace(-.4, .4, 7))
+        sites = Mesh(lons.flatten(), lats.flatten())
+        grid = FaultGrid(mesh, regular)
+        R, C = mesh.shape
+        for rows, cols in [(2, 2), (3, 5), (R, C)]:
+            for r0 in range(R - rows + 1):
+                for c0 in range(0, C - cols + 1, 3):
+                    window = (r0, r0 + rows, c0, c0 + cols)
+                    surface = SimpleFaultSurface(
+                        mesh[r0:r0 + rows, c0:c0 + cols])
+                    surface.grid, surface.window = grid, window
+                    mask = numpy.arange(len(sites)) % 2 == 0
+                    for param, meth in [
+                            ('rrup', surface.get_min_distance),
+                            ('rjb', surface.get_joyner_boore_distance),
+                            ('rx', surface.get_rx_distance),
+                            ('ry0', surface.get_ry0_distance)]:
+                        numpy.testing.assert_equal(
+                            grid.get_distances(surface, sites, param),
+                            meth(sites))
+                        numpy.testing.assert_equal(
+                            grid.get_distances(surface, sites, param, mask),
+                            meth(Mesh(sites.lons[mask], sites.lats[mask])))
+
+    def test_regular(self):
+        self.check(regular=True)
+
+    def test_irregular(self):
+        self.check(regular=False)
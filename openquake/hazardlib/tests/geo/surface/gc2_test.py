@@ -23,6 +23,7 @@ fault surface testing modules
 
 import os
 import unittest
+from unittest import mock
 import numpy
 
 from openquake.hazardlib.geo.surface.multi import MultiSurface
@@ -296,6 +297,19 @@ class ConcordantSurfaceTestCase(unittest.TestCase):
         numpy.testing.assert_array_almost_equal(expected_t, gc2t)
         numpy.testing.assert_array_almost_equal(expected_u, gc2u)
 
+    def test_gc2_coords_chunks(self):
+        """
+        Verifies that splitting the sites in chunks gives the same coords
+        """
+        gc2t, gc2u = self.model.get_generalised_coordinates(self.mesh.lons,
+                                                            self.mesh.lats)
+        with mock.patch(
+                'openquake.hazardlib.geo.surface.multi.MAX_ARRAY_SIZE', 10):
+            t, u = self.model.get_generalised_coordinates(self.mesh.lons,
+                                                          self.mesh.lats)
+        numpy.testing.assert_array_equal(gc2t, t)
+        numpy.testing.assert_array_equal(gc2u, u)
+
     def test_gc2_rx(self):
         """
         Verifies Rx for the concordant case
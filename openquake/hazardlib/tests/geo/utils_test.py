@@ -14,12 +14,13 @@
 # You should have received a copy of the GNU Affero General Public License
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 import unittest
+import unittest.mock as mock
 import collections
 
 import numpy
 import shapely.geometry
 
-from openquake.hazardlib import geo
+from openquake.hazardlib import geo, site
 from openquake.hazardlib.geo import utils
 
 Point = collections.namedtuple("Point",  'lon lat')
@@ -439,3 +440,29 @@ class PlaneFit(unittest.TestCase):
 
 
 # NB: utils.assoc is tested in the engine
+
+
+class AssocAssetsTestCase(unittest.TestCase):
+    def setUp(self):
+        self.sitecol = site.SiteCollection.from_points(
+            numpy.array([0., 1., 2.]), numpy.array([0., 0., 0.]))
+        dt = [('id', 'S3'), ('idx', numpy.uint32), ('lon', float),
+              ('lat', float), ('site_id', numpy.uint32)]
+        # assets sorted by location
+        self.assets = numpy.array([(b'a2', 2, 0., 0.01, 0),
+                                   (b'a1', 1, 0.01, 0., 0),
+                                   (b'a0', 0, 1.01, 0., 0),
+                                   (b'a3', 3, 5., 0., 0)], dt)
+
+    def test_filter(self):
+        with mock.patch.object(utils, 'QUERY_CHUNK', 1):
+            sitecol, assets, discarded = utils.assoc_assets(
+                self.assets, self.sitecol, 10, 'filter')
+        numpy.testing.assert_equal(sitecol.sids, [0, 1])
+        self.assertEqual(list(assets['id']), [b'a1', b'a2', b'a0'])
+        self.assertEqual(list(assets['site_id']), [0, 0, 1])
+        self.assertEqual(list(discarded['asset_ref']), ['a3'])
+
+    def test_strict(self):
+        with self.assertRaises(utils.SiteAssociationError):
+            utils.assoc_assets(self.assets, self.sitecol, 10, 'strict')
@@ -481,6 +481,25 @@ class GSIMTableGoodTestCase(unittest.TestCase):
             str(ve.exception),
             "Spectral period 2.500 outside of valid range (0.100 to 2.000)")
 
+    def test_interpolate_many_ruptures(self):
+        """
+        Tests that interpolating the magnitudes and distances of several
+        ruptures at once gives the same results as one rupture at the time
+        """
+        gsim = GMPETable(gmpe_table=self.TABLE_FILE)
+        mags = np.array([5.0, 6.5, 5.0, 7.0, 6.5, 6.2])
+        dsts = np.array([0.5, 10.0, 50.0, 100.0, 500.0, 12.0])
+        for imt in [imt_module.PGA(), imt_module.SA(0.3)]:
+            for val_type in ["IMLs", "Total"]:
+                aac = np.testing.assert_array_almost_equal
+                aac(gsim.interpolate(mags, dsts, imt, val_type),
+                    [gsim.interpolate(mags[i:i+1], dsts[i:i+1], imt,
+                                      val_type)[0] for i in range(6)])
+        # the log tables are computed once per IMT
+        self.assertEqual(sorted(gsim._log_tables),
+                         [('IMLs', 'PGA'), ('IMLs', 'SA(0.3)'),
+                          ('Total', 'PGA'), ('Total', 'SA(0.3)')])
+
     def test_get_mean_and_stddevs_good(self):
         """
         Tests the full execution of the GMPE tables for valid data
@@ -40,3 +40,29 @@ class ProbabilityMapTestCase(unittest.TestCase):
         # test pmap power
         pmap = pmap1 ** 2
         numpy.testing.assert_almost_equal(pmap[0].array, [[.16], [0], [0]])
+
+    def test_float32(self):
+        # composing many small PoEs in log-space with float32 must give
+        # the same results as the float64 composition, with half memory
+        rng = numpy.random.RandomState(42)
+        L, G, N = 20, 3, 10
+        poes = 10 ** rng.uniform(-12, -4, (100, N, L, G))
+        pmap64 = ProbabilityMap(L, G)
+        logpmap32 = ProbabilityMap(L, G)
+        for arr in poes:
+            pmap = ProbabilityMap.from_array(arr, range(N))
+            pmap64 |= pmap
+            logpmap32.add_logpnes(pmap)
+        pmap32 = logpmap32.logpnes2poes()
+        self.assertEqual(pmap32[0].array.dtype, numpy.float32)
+        self.assertEqual(pmap32.nbytes * 2, pmap64.nbytes)
+        numpy.testing.assert_allclose(
+            pmap32.array(N, numpy.float32), pmap64.array(N), rtol=1E-5)
+
+        # the naive float32 composition loses the small probabilities
+        naive = ProbabilityMap.build(L, G, range(N), dtype=numpy.float32)
+        for arr in poes:
+            naive |= ProbabilityMap.from_array(arr.astype(numpy.float32),
+                                               range(N))
+        err = numpy.abs(naive.array(N) / pmap64.array(N) - 1).max()
+        self.assertGreater(err, 1E-3)
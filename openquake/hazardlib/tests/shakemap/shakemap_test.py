@@ -1,11 +1,12 @@
 import os.path
 import unittest
+from unittest import mock
 import numpy
 from openquake.hazardlib import geo, imt
 from openquake.hazardlib.shakemap import (
     get_shakemap_array, get_sitecol_shakemap, to_gmfs, amplify_ground_shaking,
     spatial_correlation_array, spatial_covariance_array,
-    cross_correlation_matrix, cholesky)
+    cross_correlation_matrix, cholesky, split_sites)
 
 aae = numpy.testing.assert_almost_equal
 F64 = numpy.float64
@@ -71,6 +72,13 @@ class ShakemapTestCase(unittest.TestCase):
         L = cholesky(scov, ccor)
         self.assertEqual(L.shape, (36, 36))
         aae(L.sum(), 30.5121263)
+        # the factor reproduces the full covariance matrix
+        LLT = L @ L.T
+        for i in range(4):
+            for j in range(4):
+                aae(LLT[i * 9:(i + 1) * 9, j * 9:(j + 1) * 9],
+                    numpy.linalg.cholesky(scov[i]) @
+                    numpy.linalg.cholesky(scov[j]).T * ccor[i, j])
 
         # intensity
         val = numpy.array(
@@ -114,6 +122,51 @@ class ShakemapTestCase(unittest.TestCase):
                     trunclevel=3, num_gmfs=2, seed=42)
         self.assertIn('stddev==0 for IMT=PGA', str(ctx.exception))
 
+    def test_tiles_and_batches(self):
+        shakemap = numpy.zeros(100, shakemap_dt)  # 10 x 10 grid of sites
+        lons, lats = numpy.meshgrid(numpy.arange(10), numpy.arange(10))
+        shakemap['lon'] = 84 + lons.flatten() * .1
+        shakemap['lat'] = 26 + lats.flatten() * .1
+        shakemap['vs30'] = 301.17
+        for name in imt_dt.names:
+            shakemap['val'][name] = 10
+            shakemap['std'][name] = 0.5
+        tiles = split_sites(shakemap['lon'], shakemap['lat'], 30)
+        self.assertEqual([len(tile) for tile in tiles], [25, 25, 25, 25])
+        self.assertEqual(sorted(numpy.concatenate(tiles)), list(range(100)))
+
+        _, gmfs = to_gmfs(shakemap, 'yes', 'yes', site_effects=True,
+                          trunclevel=3, num_gmfs=20, seed=42)
+        self.assertEqual(gmfs.shape, (100, 20, 4))
+        # generating the GMFs in small batches of events does not change them
+        with mock.patch('openquake.hazardlib.shakemap.MAX_BATCH_SIZE', 1000):
+            _, gmfs2 = to_gmfs(shakemap, 'yes', 'yes', site_effects=True,
+                               trunclevel=3, num_gmfs=20, seed=42)
+        aae(gmfs2, gmfs)
+
+        # in tiled mode the marginal distributions are the same
+        _, gmfs = to_gmfs(shakemap, 'yes', 'yes', site_effects=False,
+                          trunclevel=0, num_gmfs=1000, seed=42)
+        _, gmfs3 = to_gmfs(shakemap, 'yes', 'yes', site_effects=False,
+                           trunclevel=0, num_gmfs=1000, seed=42, tile_size=30)
+        aae(numpy.log(gmfs).std(axis=1).mean(axis=0),
+            numpy.log(gmfs3).std(axis=1).mean(axis=0), decimal=2)
+
+    def test_coincident_sites(self):
+        # the spatial covariance is singular for coincident stations
+        shakemap = numpy.zeros(4, shakemap_dt)
+        shakemap['lon'] = [84, 84, 84.1, 84.1]
+        shakemap['lat'] = [26, 26, 26.1, 26.1]
+        shakemap['vs30'] = 301.17
+        for name in imt_dt.names:
+            shakemap['val'][name] = 10
+            shakemap['std'][name] = 0.5
+        _, gmfs = to_gmfs(shakemap, 'yes', 'yes', site_effects=False,
+                          trunclevel=3, num_gmfs=10, seed=42)
+        self.assertEqual(gmfs.shape, (4, 10, 4))
+        aae(gmfs[0], gmfs[1], decimal=4)
+        aae(gmfs[2], gmfs[3], decimal=4)
+
     def test_from_files(self):
         # files provided by Vitor Silva, without site amplification
         f1 = os.path.join(CDIR, 'test_shaking.xml')
@@ -24,6 +24,7 @@ from openquake.baselib.hdf5 import read_csv
 from openquake.baselib.general import gettemp, DictArray
 from openquake.hazardlib.site import ampcode_dt
 from openquake.hazardlib.site_amplification import Amplifier
+from openquake.hazardlib.probability_map import ProbabilityCurve
 from openquake.hazardlib.gsim.boore_atkinson_2008 import BooreAtkinson2008
 
 aac = numpy.testing.assert_allclose
@@ -233,3 +234,36 @@ class AmplifierTestCase(unittest.TestCase):
         aac(gmvs1, [0.197304, 0.293422, 0.399669], atol=1E-5)
         gmvs2 = a._amplify_gmvs(b'z2', numpy.array([.1, .2, .3]), 'PGA')
         aac(gmvs2, [0.117069, 0.517284, 0.475571], atol=1E-5)
+
+    def test_gmf_cata_vectorized(self):
+        # amplifying all the sites together gives the same numbers
+        # as amplifying them one at the time with the same seed
+        fname = gettemp(cata_ampl_func)
+        df = read_csv(fname, {'ampcode': ampcode_dt, None: numpy.float64},
+                      index='ampcode')
+        imtls = DictArray({'PGA': [numpy.nan]})
+        a = Amplifier(imtls, df)
+        ampcodes = numpy.array([b'z1', b'z2', b'z1'], ampcode_dt)
+        gmvs = numpy.array([[[.1, .2, .3], [.1, .2, .3], [.2, .3, .4]]])
+        numpy.random.seed(42)
+        expected = [a._amplify_gmvs(code, arr, 'PGA')
+                    for code, arr in zip(ampcodes, gmvs[0])]
+        a.amplify_gmfs(ampcodes, gmvs, ['PGA'], seed=42)
+        numpy.testing.assert_array_equal(gmvs[0], expected)
+
+    def test_amplify_pcurves(self):
+        fname = gettemp(simple_ampl_func)
+        df = read_csv(fname, {'ampcode': ampcode_dt, None: numpy.float64},
+                      index='ampcode')
+        a = Amplifier(self.imtls, df, self.soil_levels)
+        pcurves = [ProbabilityCurve(numpy.array(self.hcurve).reshape(-1, 1)),
+                   ProbabilityCurve(numpy.array(self.hcurve).reshape(-1, 1)
+                                    / 2)]
+        ampcodes = numpy.array([b'A', b'A'], ampcode_dt)
+        dic = a.amplify_pcurves(ampcodes, {0: pcurves[:1], 1: pcurves})
+        for sid, pcs in [(0, pcurves[:1]), (1, pcurves)]:
+            for pc, expected in zip(dic[sid], pcs):
+                poes = numpy.concatenate(
+                    [a.amplify_one(b'A', imt, expected.array[
+                        self.imtls(imt)]) for imt in self.imtls])
+                aac(pc.array, poes)
@@ -16,6 +16,8 @@
 # You should have received a copy of the GNU Affero General Public License
 # along with OpenQuake. If not, see <http://www.gnu.org/licenses/>.
 
+import sys
+import subprocess
 import unittest
 from openquake.hazardlib import imt, valid
 from openquake.hazardlib.gsim import registry
@@ -152,3 +154,20 @@ class ValidationTestCase(unittest.TestCase):
             self.assertEqual(gsim.minimum_distance, 0)
         finally:
             del registry['FakeGsim']
+
+    def test_lazy_gsim_registry(self):
+        # only the module defining the GSIM is imported, in a new process
+        code = '''import sys
+from openquake.hazardlib import valid
+valid.gsim('BooreAtkinson2008')
+print(' '.join(m for m in sys.modules if m.startswith('openquake.haz')))'''
+        out = subprocess.run(
+            [sys.executable, '-c', code], stdout=subprocess.PIPE,
+            check=True, universal_newlines=True).stdout
+        modules = out.splitlines()[-1].split()
+        self.assertIn('openquake.hazardlib.gsim.boore_atkinson_2008', modules)
+        self.assertNotIn('openquake.hazardlib.gsim.zhao_2006', modules)
+
+        # the aliases are found by importing all the GSIMs
+        gsim = valid.gsim('NBCC2015_AA13_activecrustFRjb_low')
+        self.assertEqual(gsim.__class__.__name__, 'NBCC2015_AA13')
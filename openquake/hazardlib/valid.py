@@ -30,7 +30,7 @@ import numpy
 
 from openquake.baselib.general import distinct
 from openquake.baselib import hdf5
-from openquake.hazardlib import imt, scalerel, gsim, pmf, site
+from openquake.hazardlib import imt, scalerel, pmf, site
 from openquake.hazardlib.gsim.base import registry, gsim_aliases
 from openquake.hazardlib.calc import disagg
 from openquake.hazardlib.calc.filters import MagDepDistance, floatdict  # needed
@@ -39,8 +39,6 @@ PRECISION = pmf.PRECISION
 
 SCALEREL = scalerel.get_available_magnitude_scalerel()
 
-GSIM = gsim.get_available_gsims()
-
 
 def disagg_outputs(value):
     """
@@ -86,9 +84,11 @@ def to_toml(uncertainty):
     else:  # is a string
         text = uncertainty.strip()
         kvs = []
-    text = gsim_aliases.get(text, text)  # use the gsim alias if any
-    if not text.startswith('['):  # a bare GSIM name was passed
-        text = '[%s]' % text
+    if not text.startswith('['):  # a bare GSIM name or alias was passed
+        if text not in registry:
+            text = gsim_aliases.get(text, text)  # use the gsim alias if any
+        if not text.startswith('['):
+            text = '[%s]' % text
     for k, v in kvs:
         try:
             v = ast.literal_eval(v)
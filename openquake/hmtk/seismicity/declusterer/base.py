@@ -50,8 +50,13 @@ Module :mod:`openquake.hmtk.parsers.catalogue.base` defines an abstract base cla
 for :class:`CatalogueParser <BaseCatalogueDecluster>`.
 """
 import abc
+import logging
+import numpy as np
+from openquake.baselib import parallel
 from openquake.hmtk.registry import CatalogueFunctionRegistry
 
+TIME_EPS = 1E-6  # tolerance in decimal years when comparing times
+
 
 class BaseCatalogueDecluster(object):
     """
@@ -75,3 +80,89 @@ class BaseCatalogueDecluster(object):
 
 
 DECLUSTERER_METHODS = CatalogueFunctionRegistry()
+
+
+def get_time_blocks(year_dec, back, forth, min_size):
+    """
+    Split the events in blocks of consecutive events in time, such that
+    no event of a block is inside the time window of an event of another
+    block; then the blocks can be declustered independently.
+
+    :param year_dec: times of the events in decimal years
+    :param back: lengths of the time windows before the events
+    :param forth: lengths of the time windows after the events
+    :param min_size: minimum number of events in a block (except the last)
+    :returns: a list of sorted arrays of event indices
+    """
+    order = np.argsort(year_dec, kind='stable')
+    time = year_dec[order]
+    # latest time reached by the windows of the events up to k
+    reach = np.maximum.accumulate(time + forth[order])
+    # earliest time reached by the windows of the events from k on
+    start = np.minimum.accumulate((time - back[order])[::-1])[::-1]
+    cuts = np.where((reach[:-1] + TIME_EPS < time[1:]) &
+                    (time[:-1] + TIME_EPS < start[1:]))[0] + 1
+    blocks = []
+    prev = 0
+    for cut in cuts:
+        if cut - prev >= min_size:
+            blocks.append(np.sort(order[prev:cut]))
+            prev = cut
+    blocks.append(np.sort(order[prev:]))
+    return blocks
+
+
+def decluster_block(func, block_id, args, monitor):
+    """
+    Task declustering a block of events with the given function
+    """
+    return {block_id: func(*args)}
+
+
+def decluster_blocks(func, arrays, extra, todo, blocks):
+    """
+    Decluster independent blocks of events in parallel and merge the
+    results, numbering the clusters as in a sequential run.
+
+    :param func:
+        a function (*arrays, *extra, todo) -> (vcl, flagvector, mainshocks)
+        where todo are the indices of the events to consider as mainshocks,
+        in order of processing, and mainshocks are the indices of the
+        mainshocks of the clusters 1, 2, ...
+    :param arrays: arrays with an element per event
+    :param extra: extra arguments of the function
+    :param todo: the indices of the events to consider as mainshocks
+    :param blocks: a list of sorted arrays of event indices
+    :returns: vcl and flagvector for all the events
+    """
+    neq = len(arrays[0])
+    rank = np.full(neq, len(todo))
+    rank[todo] = np.arange(len(todo))
+    allargs = []
+    for block_id, block in enumerate(blocks):
+        local = np.full(neq, -1)
+        local[block] = np.arange(len(block))
+        btodo = local[todo]
+        allargs.append((func, block_id,
+                        [arr[block] for arr in arrays] + list(extra) +
+                        [btodo[btodo >= 0]]))
+    dic = parallel.Starmap(decluster_block, allargs, progress=logging.debug
+                           ).reduce()
+    # renumber the clusters in order of processing of their mainshocks
+    clusters = []
+    for block_id, block in enumerate(blocks):
+        mainshocks = dic[block_id][2]
+        clusters.extend((rank[block[ms]], block_id, clu)
+                        for clu, ms in enumerate(mainshocks, 1))
+    newid = {(block_id, clu): i for i, (_, block_id, clu) in enumerate(
+        sorted(clusters), 1)}
+    vcl = np.zeros(neq, int)
+    flagvector = np.zeros(neq, int)
+    for block_id, block in enumerate(blocks):
+        bvcl, bflag, mainshocks = dic[block_id]
+        ids = np.zeros(len(mainshocks) + 1, int)
+        for clu in range(1, len(mainshocks) + 1):
+            ids[clu] = newid[block_id, clu]
+        vcl[block] = ids[bvcl]
+        flagvector[block] = bflag
+    return vcl, flagvector
@@ -47,17 +47,82 @@
 
 import numpy as np
 
+from openquake.baselib import parallel
 from openquake.hmtk.seismicity.declusterer.base import (
-    BaseCatalogueDecluster, DECLUSTERER_METHODS)
-from openquake.hmtk.seismicity.utils import decimal_year, haversine
+    BaseCatalogueDecluster, DECLUSTERER_METHODS, get_time_blocks,
+    decluster_blocks)
+from openquake.hmtk.seismicity.utils import (
+    decimal_year, haversine, spherical_tree, chord)
 from openquake.hmtk.seismicity.declusterer.distance_time_windows import (
     TIME_DISTANCE_WINDOW_FUNCTIONS)
 
 
+def _aftershocks(vsel, year_dec, time_window, imarker):
+    # the aftershocks are the events before the first time gap larger
+    # than the time window
+    delta_time = np.diff(np.hstack([year_dec[imarker], year_dec[vsel]]))
+    gaps = np.where(~(delta_time < time_window))[0]
+    return vsel[:gaps[0]] if len(gaps) else vsel
+
+
+def _foreshocks(vsel, year_dec, time_window, imarker):
+    # the foreshocks are the events after the last time gap larger
+    # than the time window
+    delta_time = np.diff(np.hstack([year_dec[vsel], year_dec[imarker]]))
+    gaps = np.where(~(delta_time < time_window))[0]
+    return vsel[gaps[-1] + 1:] if len(gaps) else vsel
+
+
+def afteran(longitude, latitude, year_dec, sw_space, time_window, todo):
+    """
+    Identify the clusters by considering for each mainshock only the events
+    inside its distance window, found with a spatial index.
+
+    :param longitude: longitudes of the events
+    :param latitude: latitudes of the events
+    :param year_dec: times of the events in decimal years
+    :param sw_space: distance windows of the events
+    :param time_window: moving time window in decimal years
+    :param todo: indices of the possible mainshocks in order of processing
+    :returns: vcl, flagvector and the indices of the mainshocks
+    """
+    neq = len(year_dec)
+    vcl = np.zeros(neq, dtype=int)
+    flagvector = np.zeros(neq, dtype=int)
+    tree = spherical_tree(longitude, latitude)
+    mainshocks = []
+    for imarker in todo:
+        # Earthquake not allocated to cluster - perform calculation
+        if vcl[imarker]:
+            continue
+        idx = np.sort(np.array(tree.query_ball_point(
+            tree.data[imarker], chord(sw_space[imarker])), dtype=int))
+        idx = idx[vcl[idx] == 0]
+        # Select earthquakes inside distance window and not already
+        # assigned to a cluster
+        mdist = haversine(longitude[idx], latitude[idx],
+                          longitude[imarker], latitude[imarker])[:, 0]
+        idx = idx[mdist <= sw_space[imarker]]
+        # Earthquakes after event inside distance window
+        after = _aftershocks(idx[year_dec[idx] > year_dec[imarker]],
+                             year_dec, time_window, imarker)
+        # Earthquakes before event inside distance window
+        before = _foreshocks(idx[year_dec[idx] < year_dec[imarker]],
+                             year_dec, time_window, imarker)
+        if len(after) or len(before):
+            # Assign mainshock to cluster
+            mainshocks.append(imarker)
+            flagvector[after] = 1
+            flagvector[before] = -1
+            vcl[after] = vcl[before] = vcl[imarker] = len(mainshocks)
+    return vcl, flagvector, mainshocks
+
+
 @DECLUSTERER_METHODS.add(
     "decluster",
     time_distance_window=TIME_DISTANCE_WINDOW_FUNCTIONS,
-    time_window=np.float)
+    time_window=np.float,
+    parallel=False)
 class Afteran(BaseCatalogueDecluster):
     """
     This implements the Afteran algorithm as described in this paper:
@@ -77,6 +142,10 @@ class Afteran(BaseCatalogueDecluster):
         :type window_opt: string
         :keyword time_window: Length (in days) of moving time window
         :type time_window: positive float
+        :keyword parallel: if True, decluster in parallel the blocks of
+            events separated by time gaps larger than the time window
+            (only for catalogues sorted by time)
+        :type parallel: bool
         :returns: **vcl vector** indicating cluster number,
                   **flagvector** indicating which earthquakes belong to a
                   cluster
@@ -95,69 +164,22 @@ class Afteran(BaseCatalogueDecluster):
         # Get space windows corresponding to each event
         sw_space, _ = (
             config['time_distance_window'].calc(catalogue.data['magnitude']))
-
-        # Pre-allocate cluster index vectors
-        vcl = np.zeros(neq, dtype=int)
-        flagvector = np.zeros(neq, dtype=int)
         # Rank magnitudes into descending order
         id0 = np.flipud(np.argsort(mag, kind='heapsort'))
-
-        clust_index = 0
-        for imarker in id0:
-            # Earthquake not allocated to cluster - perform calculation
-            if vcl[imarker] == 0:
-                # Perform distance calculation
-                mdist = haversine(
-                    catalogue.data['longitude'],
-                    catalogue.data['latitude'],
-                    catalogue.data['longitude'][imarker],
-                    catalogue.data['latitude'][imarker]).flatten()
-
-                # Select earthquakes inside distance window, later than
-                # mainshock and not already assigned to a cluster
-                vsel1 = np.where(
-                    np.logical_and(vcl == 0,
-                                   np.logical_and(
-                                       mdist <= sw_space[imarker],
-                                       year_dec > year_dec[imarker])))[0]
-                has_aftershocks = False
-                if len(vsel1) > 0:
-                    # Earthquakes after event inside distance window
-                    temp_vsel1, has_aftershocks = self._find_aftershocks(
-                        vsel1,
-                        year_dec,
-                        time_window,
-                        imarker,
-                        neq)
-                    if has_aftershocks:
-                        flagvector[temp_vsel1] = 1
-                        vcl[temp_vsel1] = clust_index + 1
-
-                # Select earthquakes inside distance window, earlier than
-                # mainshock and not already assigned to a cluster
-                has_foreshocks = False
-                vsel2 = np.where(
-                    np.logical_and(
-                        vcl == 0,
-                        np.logical_and(mdist <= sw_space[imarker],
-                                       year_dec < year_dec[imarker])))[0]
-                if len(vsel2) > 0:
-                    # Earthquakes before event inside distance window
-                    temp_vsel2, has_foreshocks = self._find_foreshocks(
-                        vsel2,
-                        year_dec,
-                        time_window,
-                        imarker,
-                        neq)
-                    if has_foreshocks:
-                        flagvector[temp_vsel2] = -1
-                        vcl[temp_vsel2] = clust_index + 1
-
-                if has_aftershocks or has_foreshocks:
-                    # Assign mainshock to cluster
-                    vcl[imarker] = clust_index + 1
-                    clust_index += 1
-
+        arrays = [catalogue.data['longitude'], catalogue.data['latitude'],
+                  year_dec, sw_space]
+        # the sequences of events are chained in the order of the catalogue,
+        # so the blocks are independent only if the catalogue is sorted
+        if config['parallel'] and (np.diff(year_dec) >= 0).all():
+            windows = np.full(neq, time_window)
+            blocks = get_time_blocks(
+                year_dec, windows, windows, neq // parallel.CT)
+        else:
+            blocks = []
+        if len(blocks) > 1:
+            return decluster_blocks(afteran, arrays, [time_window], id0,
+                                    blocks)
+        vcl, flagvector, _ = afteran(*arrays, time_window, id0)
         return vcl, flagvector
 
     def _find_aftershocks(self, vsel, year_dec, time_window, imarker, neq):
@@ -177,24 +199,8 @@ class Afteran(BaseCatalogueDecluster):
         :type neq: Integer
         '''
         temp_vsel1 = np.zeros(neq, dtype=bool)
-        has_aftershocks = False
-
-        # Finds the time difference between events
-        delta_time = np.diff(
-            np.hstack([year_dec[imarker], year_dec[vsel]]))
-        for iloc in range(0, len(vsel)):
-            # If time difference between event is smaller than
-            # time window - is an aftershock -> continue
-
-            if delta_time[iloc] < time_window:
-                temp_vsel1[vsel[iloc]] = True
-                has_aftershocks = True
-            else:
-                # Time difference between events is larger than
-                # window -> no more aftershocks -> return
-                return temp_vsel1, has_aftershocks
-
-        return temp_vsel1, has_aftershocks
+        temp_vsel1[_aftershocks(vsel, year_dec, time_window, imarker)] = True
+        return temp_vsel1, temp_vsel1.any()
 
     def _find_foreshocks(self, vsel, year_dec, time_window, imarker, neq):
         '''
@@ -212,27 +218,6 @@ class Afteran(BaseCatalogueDecluster):
         :param neq: Number of events in distance window of mainshock
         :type neq: Integer
         '''
-
         temp_vsel2 = np.zeros(neq, dtype=bool)
-        has_foreshocks = False
-
-        # The initial time is the time of the mainshock
-        initial_time = year_dec[imarker]
-        year_dec = year_dec[vsel]
-        for jloc in range(len(vsel) - 1, -1, -1):
-            # If the time between the mainshock and the preceeding
-            # event is smaller than the time_window then event
-            # is a foreshock
-
-            if (initial_time - year_dec[jloc]) < time_window:
-                temp_vsel2[vsel[jloc]] = True
-                has_foreshocks = True
-                # Update target time to consider current foreshock
-                # Then continue
-                initial_time = year_dec[jloc]
-            else:
-                # No events inside time window
-                # end of foreshock sequence - return
-                return temp_vsel2, has_foreshocks
-
-        return temp_vsel2, has_foreshocks
+        temp_vsel2[_foreshocks(vsel, year_dec, time_window, imarker)] = True
+        return temp_vsel2, temp_vsel2.any()
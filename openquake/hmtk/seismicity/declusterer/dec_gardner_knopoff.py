@@ -52,17 +52,84 @@ defines the Gardner and Knopoff declustering algorithm
 
 import numpy as np
 
+from openquake.baselib import parallel
 from openquake.hmtk.seismicity.declusterer.base import (
-    BaseCatalogueDecluster, DECLUSTERER_METHODS)
-from openquake.hmtk.seismicity.utils import decimal_year, haversine
+    BaseCatalogueDecluster, DECLUSTERER_METHODS, TIME_EPS, get_time_blocks,
+    decluster_blocks)
+from openquake.hmtk.seismicity.utils import (
+    decimal_year, haversine, spherical_tree, chord)
 from openquake.hmtk.seismicity.declusterer.distance_time_windows import (
     TIME_DISTANCE_WINDOW_FUNCTIONS)
 
+# above this number of events in the time window of a mainshock the
+# candidate events are found with the spatial index
+MAX_WINDOW = 1000
+
+
+def gardner_knopoff(longitude, latitude, year_dec, sw_space, sw_time,
+                    fs_time_prop, todo):
+    """
+    Identify the clusters by sweeping the events sorted by time: for each
+    mainshock only the events in its time window (or, for large time
+    windows, the events found with a spatial index) are considered.
+
+    :param longitude: longitudes of the events
+    :param latitude: latitudes of the events
+    :param year_dec: times of the events in decimal years
+    :param sw_space: distance windows of the events
+    :param sw_time: time windows of the events
+    :param fs_time_prop: fraction of the time window used for foreshocks
+    :param todo: indices of the possible mainshocks in order of processing
+    :returns: vcl, flagvector and the indices of the mainshocks
+    """
+    neq = len(year_dec)
+    vcl = np.zeros(neq, dtype=int)
+    flagvector = np.zeros(neq, dtype=int)
+    order = np.argsort(year_dec, kind='stable')
+    times = year_dec[order]
+    tree = None
+    mainshocks = []
+    for i in todo:
+        if vcl[i]:
+            continue
+        # Find the candidates inside both fore- and aftershock time windows
+        lo = np.searchsorted(
+            times, year_dec[i] - sw_time[i] * fs_time_prop - TIME_EPS)
+        hi = np.searchsorted(
+            times, year_dec[i] + sw_time[i] + TIME_EPS, 'right')
+        if hi - lo > MAX_WINDOW:
+            if tree is None:
+                tree = spherical_tree(longitude, latitude)
+            idx = np.array(tree.query_ball_point(
+                tree.data[i], chord(sw_space[i])), dtype=int)
+        else:
+            idx = order[lo:hi]
+        idx = idx[vcl[idx] == 0]
+        dt = year_dec[idx] - year_dec[i]
+        ok = np.logical_and(dt >= (-sw_time[i] * fs_time_prop),
+                            dt <= sw_time[i])
+        idx, dt = idx[ok], dt[ok]
+        # Of those events inside time window,
+        # find those inside distance window
+        ok = haversine(longitude[idx], latitude[idx],
+                       longitude[i], latitude[i])[:, 0] <= sw_space[i]
+        idx, dt = idx[ok], dt[ok]
+        if (idx != i).any():
+            # Allocate a cluster number
+            mainshocks.append(i)
+            vcl[idx] = len(mainshocks)
+            # For those events in the cluster before the main event,
+            # flagvector is equal to -1
+            flagvector[idx] = np.where(dt >= 0.0, 1, -1)
+            flagvector[i] = 0
+    return vcl, flagvector, mainshocks
+
 
 @DECLUSTERER_METHODS.add(
     "decluster",
     time_distance_window=TIME_DISTANCE_WINDOW_FUNCTIONS,
-    fs_time_prop=np.float)
+    fs_time_prop=np.float,
+    parallel=False)
 class GardnerKnopoffType1(BaseCatalogueDecluster):
     """
     This class implements the Gardner Knopoff algorithm as described in
@@ -79,6 +146,8 @@ class GardnerKnopoffType1(BaseCatalogueDecluster):
         - A time-distance window object (key is 'time_distance_window')
         - A value in the interval [0,1] expressing the fraction of the
         time window used for aftershocks (key is 'fs_time_prop')
+        If the optional key 'parallel' is True, the blocks of events which
+        are independent in time are declustered in parallel.
 
         :param catalogue:
             Catalogue of earthquakes
@@ -99,58 +168,24 @@ class GardnerKnopoffType1(BaseCatalogueDecluster):
             catalogue.data['year'], catalogue.data['month'],
             catalogue.data['day'])
         # Get space and time windows corresponding to each event
-        # Initial Position Identifier
         sw_space, sw_time = (
            config['time_distance_window'].calc(
             catalogue.data['magnitude'], config.get('time_cutoff')))
-        eqid = np.arange(0, neq, 1)
-        # Pre-allocate cluster index vectors
-        vcl = np.zeros(neq, dtype=int)
-        # Sort magnitudes into descending order
+        # Sort magnitudes into descending order; the last event is never
+        # considered as a mainshock
         id0 = np.flipud(np.argsort(catalogue.data['magnitude'],
-                                   kind='heapsort'))
-        longitude = catalogue.data['longitude'][id0]
-        latitude = catalogue.data['latitude'][id0]
-        sw_space = sw_space[id0]
-        sw_time = sw_time[id0]
-        year_dec = year_dec[id0]
-        eqid = eqid[id0]
-        flagvector = np.zeros(neq, dtype=int)
-        # Begin cluster identification
-        clust_index = 0
-        for i in range(0, neq - 1):
-            if vcl[i] == 0:
-                # Find Events inside both fore- and aftershock time windows
-                dt = year_dec - year_dec[i]
-                vsel = np.logical_and(
-                    vcl == 0,
-                    np.logical_and(
-                        dt >= (-sw_time[i] * config['fs_time_prop']),
-                        dt <= sw_time[i]))
-                # Of those events inside time window,
-                # find those inside distance window
-                vsel1 = haversine(longitude[vsel],
-                                  latitude[vsel],
-                                  longitude[i],
-                                  latitude[i]) <= sw_space[i]
-                vsel[vsel] = vsel1[:, 0]
-                temp_vsel = np.copy(vsel)
-                temp_vsel[i] = False
-                if any(temp_vsel):
-                    # Allocate a cluster number
-                    vcl[vsel] = clust_index + 1
-                    flagvector[vsel] = 1
-                    # For those events in the cluster before the main event,
-                    # flagvector is equal to -1
-                    temp_vsel[dt >= 0.0] = False
-                    flagvector[temp_vsel] = -1
-                    flagvector[i] = 0
-                    clust_index += 1
-
-        # Re-sort the catalog_matrix into original order
-        id1 = np.argsort(eqid, kind='heapsort')
-        eqid = eqid[id1]
-        vcl = vcl[id1]
-        flagvector = flagvector[id1]
-
+                                   kind='heapsort'))[:-1]
+        arrays = [catalogue.data['longitude'], catalogue.data['latitude'],
+                  year_dec, sw_space, sw_time]
+        if config['parallel']:
+            blocks = get_time_blocks(
+                year_dec, sw_time * config['fs_time_prop'], sw_time,
+                neq // parallel.CT)
+        else:
+            blocks = []
+        if len(blocks) > 1:
+            return decluster_blocks(gardner_knopoff, arrays,
+                                    [config['fs_time_prop']], id0, blocks)
+        vcl, flagvector, _ = gardner_knopoff(
+            *arrays, config['fs_time_prop'], id0)
         return vcl, flagvector
@@ -54,11 +54,59 @@ Frankel, A. (1995) Mapping Seismic Hazard in the Central and Eastern United
 States. Seismological Research Letters. 66(4) 8 - 21
 '''
 
+import logging
 import numpy as np
-from openquake.hmtk.seismicity.utils import haversine
+from openquake.baselib import parallel
+from openquake.hmtk.seismicity.utils import haversine, spherical_tree, chord
 from openquake.hmtk.seismicity.smoothing.kernels.base import (
     BaseSmoothingKernel)
 
+# maximum number of pairs of cells considered at once
+MAX_PAIRS = 10 ** 7
+
+
+def smooth_cells(data, cells, bandwidth, max_dist, is_3d, monitor=None):
+    """
+    Computes the smoothed values for the given cells by considering only
+    the cells within the maximum distance, found with a spatial index.
+    The cells are processed in tiles to keep the memory bounded.
+
+    :param data: array [Longitude, Latitude, Depth, Count]
+    :param cells: indices of the cells to smooth
+    :param bandwidth: bandwidth of the kernel (in km)
+    :param max_dist: maximum distance of the kernel (in km)
+    :param is_3d: if True, use the hypocentral distance
+    :returns: a dictionary {cells[0]: smoothed values}
+    """
+    smoothed_value = np.zeros(len(cells))
+    if len(cells) == 0:
+        return {0: smoothed_value}
+    lons, lats, depths, counts = data.T[:4]
+    tree = spherical_tree(lons, lats)
+    radius = chord(max_dist)
+    # determine the tile size from the number of neighbours of a few cells
+    sample = cells[np.linspace(0, len(cells) - 1, 100).astype(int)]
+    num_nbrs = max(len(nbrs) for nbrs in tree.query_ball_point(
+        tree.data[sample], radius))
+    tile_size = max(MAX_PAIRS // num_nbrs, 1)
+    for start in range(0, len(cells), tile_size):
+        tile = cells[start:start + tile_size]
+        nbrs = tree.query_ball_point(tree.data[tile], radius)
+        src = np.repeat(np.arange(len(tile)), [len(nbr) for nbr in nbrs])
+        dst = np.concatenate(nbrs).astype(int)
+        src_cells = tile[src]
+        dist_val = haversine(lons[src_cells], lats[src_cells],
+                             lons[dst], lats[dst], pairwise=True)
+        if is_3d:
+            dist_val = np.sqrt(dist_val ** 2.0 +
+                               (depths[dst] - depths[src_cells]) ** 2.0)
+        ok = dist_val <= max_dist
+        w_val = np.exp(-(dist_val[ok] ** 2.0) / (bandwidth ** 2.))
+        smoothed_value[start:start + len(tile)] = (
+            np.bincount(src[ok], w_val * counts[dst[ok]], len(tile)) /
+            np.bincount(src[ok], w_val, len(tile)))
+    return {cells[0]: smoothed_value}
+
 
 class IsotropicGaussian(BaseSmoothingKernel):
     '''
@@ -77,6 +125,8 @@ class IsotropicGaussian(BaseSmoothingKernel):
             Configuration parameters must contain:
             * BandWidth: The bandwidth of the kernel (in km) (float)
             * Length_Limit: Maximum number of standard deviations
+            and optionally:
+            * parallel: If True, smooth the cells in parallel (bool)
 
         :returns:
             * smoothed_value: np.ndarray vector of smoothed values
@@ -85,15 +135,25 @@ class IsotropicGaussian(BaseSmoothingKernel):
         '''
         max_dist = config['Length_Limit'] * config['BandWidth']
         smoothed_value = np.zeros(len(data), dtype=float)
-        for iloc in range(0, len(data)):
-            dist_val = haversine(data[:, 0], data[:, 1],
-                                 data[iloc, 0], data[iloc, 1])
-
-            if is_3d:
-                dist_val = np.sqrt(dist_val.flatten() ** 2.0 +
-                                   (data[:, 2] - data[iloc, 2]) ** 2.0)
-            id0 = np.where(dist_val <= max_dist)[0]
-            w_val = (np.exp(-(dist_val[id0] ** 2.0) /
-                            (config['BandWidth'] ** 2.))).flatten()
-            smoothed_value[iloc] = np.sum(w_val * data[id0, 3]) / np.sum(w_val)
+        # only the cells close to a cell with a non-zero count can have
+        # a non-zero smoothed value
+        nonzero = data[:, 3] != 0
+        if not nonzero.any():
+            return smoothed_value, np.sum(data[:, -1]), 0.
+        tree = spherical_tree(data[nonzero, 0], data[nonzero, 1])
+        dist, _ = tree.query(spherical_tree(data[:, 0], data[:, 1]).data,
+                             distance_upper_bound=chord(max_dist))
+        cells = np.where(np.isfinite(dist))[0]
+        if config.get('parallel'):
+            chunks = np.array_split(cells, parallel.CT)
+            allargs = [(data, chunk, config['BandWidth'], max_dist, is_3d)
+                       for chunk in chunks if len(chunk)]
+            dic = parallel.Starmap(smooth_cells, allargs,
+                                   progress=logging.debug).reduce()
+            for chunk in chunks:
+                if len(chunk):
+                    smoothed_value[chunk] = dic[chunk[0]]
+        else:
+            smoothed_value[cells] = smooth_cells(
+                data, cells, config['BandWidth'], max_dist, is_3d)[cells[0]]
         return smoothed_value, np.sum(data[:, -1]), np.sum(smoothed_value)
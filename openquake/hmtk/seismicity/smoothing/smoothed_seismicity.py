@@ -52,7 +52,7 @@ a general class for implementing seismicity smoothing algorithms
 '''
 import csv
 
-from math import fabs, log
+from math import log
 import numpy as np
 from openquake.hazardlib.geo.point import Point
 from openquake.hazardlib.geo.polygon import Polygon
@@ -167,6 +167,23 @@ def _get_adjustment(mag, year, mmin, completeness_year, t_f, mag_inc=0.1):
         return False
 
 
+def _get_adjustments(mag, year, mmin, completeness_year, t_f, mag_inc=0.1):
+    '''
+    Vectorized version of :func:`_get_adjustment`
+
+    :returns:
+        Array with the Weichert factor for the events in the complete part
+        of the catalogue and zero for the other events
+    '''
+    if len(completeness_year) == 1:
+        return np.where((mag >= mmin) & (year >= completeness_year[0]),
+                        1.0, 0.0)
+    kval = np.trunc((mag - mmin) / mag_inc).astype(int) + 1
+    ok = kval >= 1
+    ok[ok] = year[ok] >= completeness_year[kval[ok] - 1]
+    return np.where(ok, t_f, 0.0)
+
+
 def get_catalogue_bounding_polygon(catalogue):
     '''
     Returns a polygon containing the bounding box of the catalogue
@@ -358,36 +375,22 @@ class SmoothedSeismicity(object):
             self.grid_limits['yspc'])
         ncolx = int(xlim)
         ncoly = int(ylim)
-        grid_count = np.zeros(ncolx * ncoly, dtype=float)
-        for iloc in range(0, len(longitude)):
-            dlon = (longitude[iloc] - self.grid_limits['xmin']) /\
-                self.grid_limits['xspc']
-            if (dlon < 0.) or (dlon > xlim):
-                # Earthquake outside longitude limits
-                continue
-            xcol = int(dlon)
-            if xcol == ncolx:
-                # If longitude is directly on upper grid line then retain
-                xcol = ncolx - 1
-            dlat = fabs(self.grid_limits['ymax'] - latitude[iloc]) /\
-                self.grid_limits['yspc']
-            if (dlat < 0.) or (dlat > ylim):
-                # Earthquake outside latitude limits
-                continue
-            ycol = int(dlat)  # Correct for floating precision
-            if ycol == ncoly:
-                # If latitude is directly on upper grid line then retain
-                ycol = ncoly - 1
-            kmarker = (ycol * int(xlim)) + xcol
-            adjust = _get_adjustment(magnitude[iloc],
-                                     year[iloc],
-                                     completeness_table[0, 1],
-                                     completeness_table[:, 0],
-                                     t_f,
-                                     mag_inc)
-            if adjust:
-                grid_count[kmarker] = grid_count[kmarker] + adjust
-        return grid_count
+        dlon = (longitude - self.grid_limits['xmin']) / \
+            self.grid_limits['xspc']
+        dlat = np.fabs(self.grid_limits['ymax'] - latitude) / \
+            self.grid_limits['yspc']
+        # Discard the earthquakes outside the longitude and latitude limits
+        ok = (dlon >= 0.) & (dlon <= xlim) & (dlat <= ylim)
+        # If an earthquake is directly on an upper grid line then retain
+        xcol = np.minimum(dlon[ok].astype(int), ncolx - 1)
+        ycol = np.minimum(dlat[ok].astype(int), ncoly - 1)
+        adjust = _get_adjustments(np.asarray(magnitude)[ok],
+                                  np.asarray(year)[ok],
+                                  completeness_table[0, 1],
+                                  completeness_table[:, 0],
+                                  t_f,
+                                  mag_inc)
+        return np.bincount(ycol * ncolx + xcol, adjust, ncolx * ncoly)
 
     def create_3D_grid(self, catalogue, completeness_table, t_f=1.0,
                        mag_inc=0.1):
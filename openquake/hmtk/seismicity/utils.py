@@ -49,6 +49,7 @@
 Utility functions for seismicity calculations
 '''
 import numpy as np
+from scipy.spatial import cKDTree
 from shapely import geometry
 from openquake.hazardlib.pmf import PRECISION
 try:
@@ -101,6 +102,8 @@ MARKER_LEAP = np.array([0, 31, 60, 91, 121, 152, 182,
 
 SECONDS_PER_DAY = 86400.0
 
+EARTH_RADIUS = 6371.227  # km
+
 
 def decimal_year(year, month, day):
     """
@@ -197,7 +200,15 @@ def decimal_time(year, month, day, hour, minute, second):
     return dtime
 
 
-def haversine(lon1, lat1, lon2, lat2, radians=False, earth_rad=6371.227):
+def _haversine(lon1, lat1, lon2, lat2, earth_rad):
+    # distances between the points (lon1, lat1) and (lon2, lat2) in radians
+    aval = (np.sin((lat1 - lat2) / 2.) ** 2. + np.cos(lat1) * np.cos(lat2) *
+            np.sin((lon1 - lon2) / 2.) ** 2.)
+    return 2. * earth_rad * np.arctan2(np.sqrt(aval), np.sqrt(1 - aval))
+
+
+def haversine(lon1, lat1, lon2, lat2, radians=False,
+              earth_rad=EARTH_RADIUS, pairwise=False):
     """
     Allows to calculate geographical distance
     using the haversine formula.
@@ -214,6 +225,10 @@ def haversine(lon1, lat1, lon2, lat2, radians=False, earth_rad=6371.227):
     :type radians: bool
     :keyword earth_rad: radius of the earth in km
     :type earth_rad: float
+    :keyword pairwise:
+        if True, compute only the distances between the corresponding
+        locations of the two sets, which must have the same length
+    :type pairwise: bool
     :returns: geographical distance in km
     :rtype: numpy.ndarray
     """
@@ -223,6 +238,8 @@ def haversine(lon1, lat1, lon2, lat2, radians=False, earth_rad=6371.227):
         lat1 = cfact * lat1
         lon2 = cfact * lon2
         lat2 = cfact * lat2
+    if pairwise:
+        return _haversine(lon1, lat1, lon2, lat2, earth_rad)
 
     # Number of locations in each set of points
     if not np.shape(lon1):
@@ -242,16 +259,35 @@ def haversine(lon1, lat1, lon2, lat2, radians=False, earth_rad=6371.227):
     i = 0
     while i < nlocs2:
         # Perform distance calculation
-        dlat = lat1 - lat2[i]
-        dlon = lon1 - lon2[i]
-        aval = (np.sin(dlat / 2.) ** 2.) + (np.cos(lat1) * np.cos(lat2[i]) *
-                                            (np.sin(dlon / 2.) ** 2.))
-        distance[:, i] = (2. * earth_rad * np.arctan2(np.sqrt(aval),
-                                                      np.sqrt(1 - aval))).T
+        distance[:, i] = _haversine(lon1, lat1, lon2[i], lat2[i], earth_rad)
         i += 1
     return distance
 
 
+def spherical_tree(lons, lats, earth_rad=EARTH_RADIUS):
+    """
+    :param lons: longitudes in degrees
+    :param lats: latitudes in degrees
+    :returns: a KD-tree on the Cartesian coordinates of the points in km
+    """
+    lam, phi = np.radians(lons), np.radians(lats)
+    cosphi = np.cos(phi)
+    return cKDTree(earth_rad * np.column_stack(
+        [cosphi * np.cos(lam), cosphi * np.sin(lam), np.sin(phi)]))
+
+
+def chord(distance, earth_rad=EARTH_RADIUS):
+    """
+    :param distance: a great circle distance in km
+    :returns:
+        the length of the corresponding chord, enlarged a bit so that the
+        points of the tree within the chord are a superset of the points
+        within the great circle distance, even with rounding errors
+    """
+    angle = np.minimum(distance / earth_rad, np.pi)
+    return 2. * earth_rad * np.sin(angle / 2.) * (1. + 1E-6) + 1E-6
+
+
 def greg2julian(year, month, day, hour, minute, second):
     """
     Function to convert a date from Gregorian to Julian format
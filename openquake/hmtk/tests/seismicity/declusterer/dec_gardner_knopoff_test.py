@@ -102,3 +102,29 @@ class GardnerKnopoffType1TestCase(unittest.TestCase):
         catalog_flag[4] = 0 # event becomes mainshock when time_cutoff = 100
         print('flagvector:', catalog_flag)
         np.testing.assert_allclose(flagvector,self.cat.data['flag'])
+
+    def test_dec_gardner_knopoff_parallel(self):
+        """
+        Testing that declustering in parallel independent blocks of events
+        gives the same clusters as the sequential declustering
+        """
+        # copies of the catalogue shifted by 50 years, with the magnitudes
+        # of the later copies slightly increased
+        data = self.cat.data
+        for key in ['year', 'month', 'day', 'longitude', 'latitude',
+                    'magnitude', 'flag']:
+            arrays = [data[key]] * 3
+            if key == 'year':
+                arrays = [data[key] + 50 * i for i in range(3)]
+            elif key == 'magnitude':
+                arrays = [data[key] + 0.1 * i for i in range(3)]
+            data[key] = np.concatenate(arrays)
+        config = {'time_distance_window': GardnerKnopoffWindow(),
+                  'fs_time_prop': 1.0}
+        dec = GardnerKnopoffType1()
+        vcl, flagvector = dec.decluster(self.cat, config)
+        np.testing.assert_allclose(flagvector, data['flag'])
+        config['parallel'] = True
+        pvcl, pflagvector = dec.decluster(self.cat, config)
+        np.testing.assert_equal(pvcl, vcl)
+        np.testing.assert_equal(pflagvector, flagvector)
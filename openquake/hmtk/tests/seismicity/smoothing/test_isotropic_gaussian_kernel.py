@@ -52,6 +52,7 @@ import os
 import unittest
 import numpy as np
 
+from openquake.hmtk.seismicity.utils import haversine
 from openquake.hmtk.seismicity.smoothing.kernels.isotropic_gaussian import \
     IsotropicGaussian
 
@@ -126,3 +127,27 @@ class TestIsotropicGaussian(unittest.TestCase):
         # Assert that sum of the smoothing is equal to the sum of the
         # data values to 2 dp
         self.assertAlmostEqual(sum_data, sum_smooth, 2)
+
+    def test_kernel_neighbourhood(self):
+        # the smoothing restricted to the neighbouring cells must agree
+        # with the smoothing over all the cells, also in parallel
+        self.data[[5, 30, 65], 3] = [1., 2., 3.]
+        self.data[:, 2] = np.linspace(0., 30., len(self.data))
+        config = {'Length_Limit': 2.0, 'BandWidth': 30.0}
+        max_dist = 60.
+        for is_3d in (False, True):
+            expected = np.zeros(len(self.data))
+            for iloc, (lon, lat, depth, _) in enumerate(self.data):
+                dist = haversine(self.data[:, 0], self.data[:, 1],
+                                 lon, lat).flatten()
+                if is_3d:
+                    dist = np.sqrt(dist ** 2 + (self.data[:, 2] - depth) ** 2)
+                ok = dist <= max_dist
+                weight = np.exp(-dist[ok] ** 2 / 900.)
+                expected[iloc] = (np.sum(weight * self.data[ok, 3]) /
+                                  np.sum(weight))
+            smoothed, _, _ = self.model.smooth_data(self.data, config, is_3d)
+            np.testing.assert_allclose(smoothed, expected, atol=1E-12)
+            smoothed, _, _ = self.model.smooth_data(
+                self.data, dict(config, parallel=True), is_3d)
+            np.testing.assert_allclose(smoothed, expected, atol=1E-12)
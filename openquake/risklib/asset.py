@@ -21,9 +21,11 @@ import logging
 import csv
 import os
 import numpy
-from shapely import wkt, geometry
+from scipy import sparse
+from shapely import wkt, vectorized
 
 from openquake.baselib import hdf5, general
+from openquake.baselib.parallel import Starmap
 from openquake.baselib.node import Node, context
 from openquake.baselib.python3compat import encode, decode
 from openquake.hazardlib import valid, nrml, geo, InvalidFile
@@ -252,6 +254,24 @@ class TagCollection(object):
                 raise InvalidFile('contains more then %d tags' % TWO32)
             return idx
 
+    def add_tagvalues(self, tagname, tagvalues):
+        """
+        :param tagname: a tag name
+        :param tagvalues: an array of tag values
+        :returns: an array of tag indices, one per tag value
+        """
+        # the new tags are added in order of first appearance, as in .add
+        uniq, first, inv = numpy.unique(
+            tagvalues, return_index=True, return_inverse=True)
+        idxs = numpy.zeros(len(uniq), U32)
+        for i in numpy.argsort(first):
+            tagvalue = uniq[i]
+            # "?" means missing tag, except for the taxonomy
+            if tagvalue in '?*' and (tagvalue != '?' or tagname == 'taxonomy'):
+                raise ValueError('Invalid tagvalue="%s"' % tagvalue)
+            idxs[i] = self.add(tagname, tagvalue)
+        return idxs[inv]
+
     def add_tags(self, dic, prefix):
         """
         :param dic: a dictionary tagname -> tagvalue
@@ -348,13 +368,14 @@ class TagCollection(object):
 
 
 class AssetCollection(object):
-    def __init__(self, exposure, assets_by_site, time_event):
+    def __init__(self, exposure, assets, tot_sites, time_event):
         self.tagcol = exposure.tagcol
-        self.tagcol.site_id = ['?'] + list(range(len(assets_by_site)))
+        self.tagcol.site_id = ['?'] + list(range(tot_sites))
         self.time_event = time_event
-        self.tot_sites = len(assets_by_site)
+        self.tot_sites = tot_sites
         self.array, self.occupancy_periods = build_asset_array(
-            assets_by_site, exposure.tagcol.tagnames, time_event)
+            assets, exposure.tagcol.tagnames, time_event,
+            exposure.cost_calculator)
         exp_periods = exposure.occupancy_periods
         if self.occupancy_periods and not exp_periods:
             logging.warning('Missing <occupancyPeriods>%s</occupancyPeriods> '
@@ -400,6 +421,26 @@ class AssetCollection(object):
                 aids_by_tag[tag].add(aid)
         return aids_by_tag
 
+    def get_tag_matrix(self, tagname):
+        """
+        :param tagname: a valid tag name
+        :returns:
+            a sparse matrix of shape (T, A) with T the number of tag values
+            (including "?") and A the number of assets, with a 1 in the
+            position (tag index, asset ordinal); it is computed only once
+        """
+        try:
+            cache = self._tag_matrix
+        except AttributeError:
+            cache = self._tag_matrix = {}
+        if tagname not in cache:
+            A = len(self)
+            T = len(getattr(self.tagcol, tagname))
+            cache[tagname] = sparse.csr_matrix(
+                (numpy.ones(A), (self.array[tagname], numpy.arange(A))),
+                shape=(T, A))
+        return cache[tagname]
+
     @property
     def taxonomies(self):
         """
@@ -485,6 +526,7 @@ class AssetCollection(object):
             axis=0, dtype=bool)
         new = object.__new__(self.__class__)
         vars(new).update(vars(self))
+        vars(new).pop('_tag_matrix', None)  # built on the original assets
         new.array = self.array[ok_indices]
         new.array['ordinal'] = numpy.arange(len(new.array))
         return new
@@ -507,6 +549,7 @@ class AssetCollection(object):
                 arrays.append(arr)
             self.array = numpy.concatenate(arrays)
             self.array['ordinal'] = numpy.arange(len(self.array))
+            vars(self).pop('_tag_matrix', None)
             self.tot_sites = len(sitecol)
         sitecol.make_complete()
 
@@ -545,21 +588,23 @@ class AssetCollection(object):
         return '<%s with %d asset(s)>' % (self.__class__.__name__, len(self))
 
 
-def build_asset_array(assets_by_site, tagnames=(), time_event=None):
+def build_asset_array(array, tagnames=(), time_event=None,
+                      cc=costcalculator):
     """
-    :param assets_by_site: a list of lists of assets
+    :param array: an array of assets ordered by site_id, as in Exposure.array
     :param tagnames: a list of tag names
+    :param time_event: the time event, used for the occupants
+    :param cc: a CostCalculator instance
     :returns: an array `assetcol`
     """
-    for assets in assets_by_site:
-        if len(assets):
-            first_asset = assets[0]
-            break
-    else:  # no break
+    if len(array) == 0:
         raise ValueError('There are no assets!')
+    names = array.dtype.names
     loss_types = []
     occupancy_periods = []
-    for name in sorted(first_asset.values):
+    valfields = [n for n in names if n.startswith(('value-', 'occupants_'))]
+    for name in sorted(n[6:] if n.startswith('value-') else n
+                       for n in valfields):
         if name.startswith('occupants_'):
             period = name.split('_', 1)[1]
             if period != 'None':
@@ -572,49 +617,35 @@ def build_asset_array(assets_by_site, tagnames=(), time_event=None):
     # loss_types can be ['value-business_interruption', 'value-contents',
     # 'value-nonstructural', 'occupants_None', 'occupants_day',
     # 'occupants_night', 'occupants_transit']
-    retro = ['retrofitted'] if first_asset._retrofitted else []
+    retro = ['retrofitted'] if 'retrofitted' in names and array[
+        'retrofitted'][0] else []
     float_fields = loss_types + retro
     int_fields = [(str(name), U32) for name in tagnames]
-    tagi = {str(name): i for i, name in enumerate(tagnames)}
     asset_dt = numpy.dtype(
         [('id', (numpy.string_, valid.ASSET_ID_LENGTH)),
          ('ordinal', U32), ('lon', F32), ('lat', F32),
          ('site_id', U32), ('number', F32), ('area', F32)] + [
              (str(name), float) for name in float_fields] + int_fields)
-    num_assets = sum(len(assets) for assets in assets_by_site)
-    assetcol = numpy.zeros(num_assets, asset_dt)
-    asset_ordinal = 0
-    fields = set(asset_dt.fields)
-    for sid, assets_ in enumerate(assets_by_site):
-        for asset in assets_:
-            asset.ordinal = asset_ordinal
-            record = assetcol[asset_ordinal]
-            asset_ordinal += 1
-            for field in fields:
-                if field == 'id':
-                    value = asset.asset_id
-                elif field == 'ordinal':
-                    value = asset.ordinal
-                elif field == 'number':
-                    value = asset.number
-                elif field == 'area':
-                    value = asset.area
-                elif field == 'site_id':
-                    value = sid
-                elif field == 'lon':
-                    value = asset.location[0]
-                elif field == 'lat':
-                    value = asset.location[1]
-                elif field.startswith('occupants_'):
-                    value = asset.values[field]
-                elif field == 'retrofitted':
-                    value = asset.retrofitted()
-                elif field in tagnames:
-                    value = asset.tagidxs[tagi[field]]
-                else:
-                    name, lt = field.split('-')
-                    value = asset.value(lt, time_event)
-                record[field] = value
+    assetcol = numpy.zeros(len(array), asset_dt)
+    assetcol['ordinal'] = numpy.arange(len(array))
+    for field in ['id', 'lon', 'lat', 'site_id', 'number', 'area'] + list(
+            tagnames):
+        assetcol[field] = array[field]
+    values = {n[6:]: array[n] for n in names if n.startswith('value-')}
+    for field in float_fields:
+        if field.startswith('occupants_'):
+            assetcol[field] = array[field]
+        elif field == 'retrofitted':
+            assetcol[field] = cc('structural',
+                                 {'structural': array['retrofitted']},
+                                 array['area'], array['number'])
+        else:
+            lt = field[6:]
+            if lt == 'occupants':
+                assetcol[field] = array['occupants_' + str(time_event)]
+            else:
+                assetcol[field] = cc(lt, values, array['area'],
+                                     array['number'])
     return assetcol, ' '.join(occupancy_periods)
 
 
@@ -697,7 +728,7 @@ def _get_exposure(fname, stop=None):
     exp = Exposure(
         exposure['id'], exposure['category'],
         description.text, cost_types, occupancy_periods, retrofitted,
-        area.attrib, [], cc, TagCollection(tagnames))
+        area.attrib, cc, TagCollection(tagnames))
     assets_text = exposure.assets.text.strip()
     if assets_text:
         # the <assets> tag contains a list of file names
@@ -769,31 +800,102 @@ def assets2array(asset_nodes, fields, retrofitted, ignore_missing_costs):
     return array
 
 
+CHUNKSIZE = 100000  # number of assets converted at once
+
+
+def _asset_array(array, tagcol, prefix='', region=None, start=0):
+    """
+    :param array: a structured array with the fields of the exposure
+    :param tagcol: a TagCollection, populated with the new tags
+    :param prefix: a prefix for the asset IDs
+    :param region: a shapely geometry or None
+    :param start: the index of the first asset in the exposure file
+    :returns: a compact array with the assets inside the region
+    """
+    idx = numpy.arange(start, start + len(array))
+    lons = numpy.array(array['lon'], float)
+    lats = numpy.array(array['lat'], float)
+    if region:
+        ok = vectorized.contains(region, lons, lats)
+        array, idx, lons, lats = array[ok], idx[ok], lons[ok], lats[ok]
+    names = array.dtype.names
+    occfields = [n for n in names if n.startswith('occupants_')]
+    valfields = [n for n in names if n.startswith('value-')] + occfields
+    if occfields and 'occupants_None' not in occfields:
+        valfields.append('occupants_None')
+    retrofitted = ['retrofitted'] if 'retrofitted' in names else []
+    dt = numpy.dtype(
+        [('id', (numpy.string_, valid.ASSET_ID_LENGTH)), ('idx', U32),
+         ('lon', float), ('lat', float), ('site_id', U32),
+         ('number', float), ('area', float)] +
+        [(name, float) for name in valfields + retrofitted] +
+        [(tagname, U32) for tagname in tagcol.tagnames])
+    res = numpy.zeros(len(array), dt)
+    res['id'] = [prefix + asset_id for asset_id in array['id']]
+    res['idx'] = idx
+    res['lon'] = lons
+    res['lat'] = lats
+    res['number'] = array['number']
+    res['area'] = array['area'] if 'area' in names else 1
+    for name in valfields + retrofitted:
+        if name != 'occupants_None':
+            res[name] = array[name]
+    if occfields:  # store average occupants
+        tot_occupants = 0
+        for name in occfields:
+            tot_occupants += res[name]
+        res['occupants_None'] = tot_occupants / len(occfields)
+    for tagname in tagcol.tagnames:
+        if tagname in ('exposure', 'country'):
+            res[tagname] = tagcol.add(tagname, prefix)
+        else:
+            res[tagname] = tagcol.add_tagvalues(tagname, array[tagname])
+    return res
+
+
+def read_assets(fname, conv, rename, prefix, tagnames, region,
+                monitor=None):
+    """
+    Read a CSV file of assets and convert it in chunks of CHUNKSIZE rows.
+
+    :returns: {fname: (asset array, local TagCollection, number of rows)}
+    """
+    tagcol = TagCollection(tagnames)
+    arrays = []
+    start = 0
+    for array in hdf5.iter_csv(fname, conv, rename, chunksize=CHUNKSIZE):
+        array['lon'] = numpy.round(array['lon'], 5)
+        array['lat'] = numpy.round(array['lat'], 5)
+        arrays.append(_asset_array(array, tagcol, prefix, region, start))
+        start += len(array)
+    return {fname: (numpy.concatenate(arrays), tagcol, start)}
+
+
 class Exposure(object):
     """
     A class to read the exposure from XML/CSV files
     """
     fields = ['id', 'category', 'description', 'cost_types',
               'occupancy_periods', 'retrofitted',
-              'area', 'assets', 'cost_calculator', 'tagcol']
+              'area', 'cost_calculator', 'tagcol']
 
     @staticmethod
     def check(fname):
         exp = Exposure.read([fname])
         err = []
-        for asset in exp.assets:
-            if asset.number > 65535:
-                err.append('Asset %s has number %s > 65535' %
-                           (asset.asset_id, asset.number))
+        for rec in exp.array[exp.array['number'] > 65535]:
+            err.append('Asset %s has number %s > 65535' %
+                       (decode(rec['id']), rec['number']))
         return '\n'.join(err)
 
     @staticmethod
     def read(fnames, calculation_mode='', region_constraint='',
              ignore_missing_costs=(), check_dupl=True,
-             tagcol=None, by_country=False):
+             tagcol=None, by_country=False, parallel=False):
         """
         Call `Exposure.read(fnames)` to get an :class:`Exposure` instance
-        keeping all the assets in memory.
+        keeping all the assets in memory. If `parallel` is true, the CSV
+        files are read in parallel.
         """
         if by_country:  # E??_ -> countrycode
             prefix2cc = countries.from_exposures(
@@ -810,8 +912,10 @@ class Exposure(object):
             else:
                 prefix = ''
             allargs.append((fname, calculation_mode, region_constraint,
-                            ignore_missing_costs, check_dupl, prefix, tagcol))
+                            ignore_missing_costs, check_dupl, prefix, tagcol,
+                            parallel))
         exp = None
+        arrays = []
         for exposure in itertools.starmap(Exposure.read_exp, allargs):
             if exp is None:  # first time
                 exp = exposure
@@ -821,19 +925,17 @@ class Exposure(object):
                 assert exposure.occupancy_periods == exp.occupancy_periods
                 assert exposure.retrofitted == exp.retrofitted
                 assert exposure.area == exp.area
-                exp.assets.extend(exposure.assets)
                 exp.tagcol.extend(exposure.tagcol)
+            arrays.append(exposure.array)
+        exp.array = numpy.concatenate(arrays)
         exp.exposures = [os.path.splitext(os.path.basename(f))[0]
                          for f in fnames]
-        for i, ass in enumerate(exp.assets):
-            # used by the GED4ALL importer
-            ass.tags = exp.tagcol.get_tagdict(ass.tagidxs)
         return exp
 
     @staticmethod
     def read_exp(fname, calculation_mode='', region_constraint='',
                  ignore_missing_costs=(), check_dupl=True,
-                 asset_prefix='', tagcol=None, monitor=None):
+                 asset_prefix='', tagcol=None, parallel=False, monitor=None):
         logging.info('Reading %s', fname)
         param = {'calculation_mode': calculation_mode}
         param['asset_prefix'] = asset_prefix
@@ -852,19 +954,19 @@ class Exposure(object):
                 assetnodes, exposure._csv_header(),
                 exposure.retrofitted or calculation_mode == 'classical_bcr',
                 ignore_missing_costs)
+            exposure.array = _asset_array(
+                array, exposure.tagcol, asset_prefix, param['region'])
+            param['out_of_region'] = len(array) - len(exposure.array)
         else:
-            array = exposure._read_csv()
+            exposure.array = exposure._read_csv(param, parallel)
         param['relevant_cost_types'] = set(exposure.cost_types['name']) - set(
             ['occupants'])
-        exposure._populate_from(array, param, check_dupl)
+        exposure._check(param, check_dupl)
         if param['region'] and param['out_of_region']:
             logging.info('Discarded %d assets outside the region',
                          param['out_of_region'])
-        if len(exposure.assets) == 0:
+        if len(exposure.array) == 0:
             raise RuntimeError('Could not find any asset within the region!')
-        # sanity checks
-        values = any(len(ass.values) + ass.number for ass in exposure.assets)
-        assert values, 'Could not find any value??'
         exposure.param = param
         return exposure
 
@@ -899,14 +1001,16 @@ class Exposure(object):
                               (wrong, self.datafiles))
         return sorted(set(fields))
 
-    def _read_csv(self):
+    def _read_csv(self, param, parallel=False):
         """
-        :yields: asset nodes
+        :returns: an asset array with the assets in the CSV files
         """
         expected_header = set(self._csv_header('', ''))
         for fname in self.datafiles:
             with open(fname, encoding='utf-8-sig') as f:
-                fields = next(csv.reader(f))
+                # skip the comment and blank lines, as in hdf5.read_csv
+                fields = next(row for row in csv.reader(f)
+                              if row and not row[0].startswith('#'))
                 header = set(fields)
                 missing = expected_header - header - {'exposure', 'country'}
                 if len(header) < len(fields):
@@ -927,92 +1031,110 @@ class Exposure(object):
         for field in self.occupancy_periods.split():
             conv[field] = float
             rename[field] = 'occupants_' + field
+        allargs = [(fname, conv, rename, param['asset_prefix'],
+                    self.tagcol.tagnames, param['region'])
+                   for fname in self.datafiles]
+        if parallel and len(allargs) > 1:
+            dic = Starmap(read_assets, allargs, progress=logging.debug
+                          ).reduce()
+        else:
+            dic = {}
+            for args in allargs:
+                dic.update(read_assets(*args))
+        arrays = []
+        start = 0
         for fname in self.datafiles:
-            array = hdf5.read_csv(fname, conv, rename).array
-            array['lon'] = numpy.round(array['lon'], 5)
-            array['lat'] = numpy.round(array['lat'], 5)
-            yield from array
-
-    def _populate_from(self, asset_array, param, check_dupl):
-        asset_refs = set()
-        for idx, asset in enumerate(asset_array):
-            asset_id = asset['id']
-            # check_dupl is False only in oq prepare_site_model since
-            # in that case we are only interested in the asset locations
-            if check_dupl and asset_id in asset_refs:
-                raise nrml.DuplicatedID(asset_id)
-            asset_refs.add(param['asset_prefix'] + asset_id)
-            self._add_asset(idx, asset, param)
-
-    def _add_asset(self, idx, asset, param):
-        values = {}
-        try:
-            retrofitted = asset['retrofitted']
-        except ValueError:
-            retrofitted = None
-        asset_id = asset['id']
-        prefix = param['asset_prefix']
-        # FIXME: in case of an exposure split in CSV files the line number
-        # is None because param['fname'] points to the .xml file :-(
-        taxonomy = asset['taxonomy']
-        number = asset['number']
-        location = asset['lon'], asset['lat']
-        if param['region'] and not geometry.Point(*location).within(
-                param['region']):
-            param['out_of_region'] += 1
-            return
-        dic = {tagname: asset[tagname] for tagname in self.tagcol.tagnames
-               if tagname not in ('country', 'exposure') and
-               asset[tagname] != '?'}
-        dic['taxonomy'] = taxonomy
-        idxs = self.tagcol.add_tags(dic, prefix)
-        tot_occupants = 0
-        num_occupancies = 0
-        for name in asset.dtype.names:
-            if name.startswith('value-'):
-                values[name[6:]] = asset[name]
-            elif name.startswith('occupants_'):
-                values[name] = occ = float(asset[name])
-                tot_occupants += occ
-                num_occupancies += 1
-        if num_occupancies:
-            # store average occupants
-            values['occupants_None'] = tot_occupants / num_occupancies
+            array, tagcol, nrows = dic[fname]
+            # convert the local tag indices into global tag indices
+            for tagname in tagcol.tagnames:
+                idxs = numpy.array([self.tagcol.add(tagname, tagvalue)
+                                    for tagvalue in getattr(tagcol, tagname)],
+                                   U32)
+                array[tagname] = idxs[array[tagname]]
+            array['idx'] += start
+            start += nrows
+            param['out_of_region'] += nrows - len(array)
+            arrays.append(array)
+        return numpy.concatenate(arrays)
+
+    def _check(self, param, check_dupl):
+        # check_dupl is False only in oq prepare_site_model since
+        # in that case we are only interested in the asset locations
+        if check_dupl and len(self.array):
+            ids, idxs = numpy.unique(self.array['id'], return_index=True)
+            if len(ids) < len(self.array):
+                dupl = numpy.ones(len(self.array), bool)
+                dupl[idxs] = False
+                aid = self.array['id'][dupl][0]
+                raise nrml.DuplicatedID(decode(aid))
 
         # check we are not missing a cost type
-        missing = param['relevant_cost_types'] - set(values)
+        names = self.array.dtype.names
+        values = {n[6:] for n in names if n.startswith('value-')}
+        missing = param['relevant_cost_types'] - values
         if missing and missing <= param['ignore_missing_costs']:
-            logging.warning(
-                'Ignoring asset %s, missing cost type(s): %s',
-                asset_id, ', '.join(missing))
+            logging.warning('Ignoring the missing cost type(s) %s in %s',
+                            ', '.join(missing), param['fname'])
+            # the missing costs are stored as NaNs
+            dt = numpy.dtype(self.array.dtype.descr + [
+                ('value-' + ct, float) for ct in sorted(missing)])
+            array = numpy.zeros(len(self.array), dt)
+            for name in names:
+                array[name] = self.array[name]
             for cost_type in missing:
-                values[cost_type] = None
+                array['value-' + cost_type] = numpy.nan
+            self.array = array
         elif missing and 'damage' not in param['calculation_mode']:
             # missing the costs is okay for damage calculators
             raise ValueError("Invalid Exposure. "
-                             "Missing cost %s for asset %s" % (
-                                 missing, asset_id))
-        try:
-            area = asset['area']
-        except ValueError:
-            area = 1
-        ass = Asset(prefix + asset_id, idx, idxs, number, location, values,
-                    area, retrofitted, self.cost_calculator)
-        self.assets.append(ass)
+                             "Missing cost %s in %s" % (
+                                 missing, param['fname']))
+
+        # sanity check
+        assert (values or self.array['number'].any() or
+                len(self.array) == 0), 'Could not find any value??'
+
+    @property
+    def assets(self):
+        """
+        :returns: a list of :class:`Asset` instances, built from .array
+        """
+        names = self.array.dtype.names
+        valfields = [n for n in names
+                     if n.startswith(('value-', 'occupants_'))]
+        assets = []
+        for rec in self.array:
+            values = {n[6:] if n.startswith('value-') else n: rec[n]
+                      for n in valfields}
+            retrofitted = (rec['retrofitted'] if 'retrofitted' in names
+                           else None)
+            tagidxs = [rec[tagname] for tagname in self.tagcol.tagnames]
+            asset = Asset(decode(rec['id']), rec['idx'], tagidxs,
+                          rec['number'], (rec['lon'], rec['lat']), values,
+                          rec['area'], retrofitted, self.cost_calculator)
+            # used by the GED4ALL importer
+            asset.tags = self.tagcol.get_tagdict(tagidxs)
+            assets.append(asset)
+        return assets
 
-    def get_mesh_assets_by_site(self):
+    def get_mesh_assets(self):
         """
-        :returns: (Mesh instance, assets_by_site list)
+        :returns: (Mesh instance, assets sorted by location), where the
+                  site_id of the assets is the index of the location
         """
-        assets_by_loc = general.groupby(self, key=lambda a: a.location)
-        mesh = geo.Mesh.from_coords(list(assets_by_loc))
-        assets_by_site = [
-            assets_by_loc[lonlat] for lonlat in zip(mesh.lons, mesh.lats)]
-        return mesh, assets_by_site
+        # stable sort by location, keeping the order of the assets
+        array = self.array[numpy.lexsort((self.array['lat'],
+                                          self.array['lon']))]
+        lons, lats = array['lon'], array['lat']
+        new = numpy.concatenate(
+            [[True], (numpy.diff(lons) != 0) | (numpy.diff(lats) != 0)])
+        array['site_id'] = numpy.cumsum(new) - 1
+        mesh = geo.Mesh(lons[new], lats[new])
+        return mesh, array
 
     def __iter__(self):
         return iter(self.assets)
 
     def __repr__(self):
         return '<%s with %s assets>' % (self.__class__.__name__,
-                                        len(self.assets))
+                                        len(self.array))
@@ -203,7 +203,7 @@ def rescale(curves, values):
     A, _, C = curves.shape
     assert A == len(values), (A, len(values))
     array = numpy.zeros((A, C), loss_poe_dt)
-    array['loss'] = [c * v for c, v in zip(curves[:, 0], values)]
+    array['loss'] = curves[:, 0] * values[:, None]
     array['poe'] = curves[:, 1]
     return array
 
@@ -285,9 +285,10 @@ class RiskModel(object):
         lratios = self.loss_ratios[loss_type]
         imls = self.hazard_imtls[vf.imt]
         values = get_values(loss_type, assets)
-        lrcurves = numpy.array(
-            [scientific.classical(vf, imls, hazard_curve, lratios)] * n)
-        return rescale(lrcurves, values)
+        # the assets of the same taxonomy on the same site share the curve
+        lrcurve = scientific.classical(vf, imls, hazard_curve, lratios)
+        return rescale(numpy.broadcast_to(lrcurve, (n,) + lrcurve.shape),
+                       values)
 
     def event_based_risk(self, loss_type, assets, gmvs, eids, epsilons):
         """
@@ -330,7 +331,8 @@ class RiskModel(object):
         :param hazard: an hazard curve
         :param _eps: dummy parameter, unused
         :param _eids: dummy parameter, unused
-        :returns: a list of triples (eal_orig, eal_retro, bcr_result)
+        :returns: an array of shape (N, 3) with the triples
+                  (eal_orig, eal_retro, bcr_result)
         """
         if loss_type != 'structural':
             raise NotImplementedError(
@@ -346,22 +348,18 @@ class RiskModel(object):
         curves_retro = functools.partial(
             scientific.classical, vf_retro, imls,
             loss_ratios=self.loss_ratios_retro[loss_type])
-        original_loss_curves = numpy.array([curves_orig(hazard)] * n)
-        retrofitted_loss_curves = numpy.array([curves_retro(hazard)] * n)
-
-        eal_original = numpy.array([scientific.average_loss(lc)
-                                    for lc in original_loss_curves])
-
-        eal_retrofitted = numpy.array([scientific.average_loss(lc)
-                                       for lc in retrofitted_loss_curves])
-
-        bcr_results = [
-            scientific.bcr(
-                eal_original[i], eal_retrofitted[i],
-                self.interest_rate, self.asset_life_expectancy,
-                asset['value-' + loss_type], asset['retrofitted'])
-            for i, asset in enumerate(assets)]
-        return list(zip(eal_original, eal_retrofitted, bcr_results))
+        # the assets of the same taxonomy on the same site share the curves
+        eal_original = scientific.average_loss(curves_orig(hazard))
+        eal_retrofitted = scientific.average_loss(curves_retro(hazard))
+        bcr_results = scientific.bcr(
+            eal_original, eal_retrofitted,
+            self.interest_rate, self.asset_life_expectancy,
+            assets['value-' + loss_type], assets['retrofitted'])
+        res = numpy.zeros((n, 3))
+        res[:, 0] = eal_original
+        res[:, 1] = eal_retrofitted
+        res[:, 2] = bcr_results
+        return res
 
     def scenario_risk(self, loss_type, assets, gmvs, eids, epsilons):
         """
@@ -435,8 +433,7 @@ class RiskModel(object):
             investigation_time=self.investigation_time,
             risk_investigation_time=self.risk_investigation_time,
             steps_per_interval=self.steps_per_interval, debug=debug)
-        res = numpy.array([a['number'] * damage for a in assets])
-        return res
+        return assets['number'][:, None] * damage
 
 
 # NB: the approach used here relies on the convention of having the
@@ -1201,8 +1201,14 @@ def average_loss(lc):
            is a result of a linear interpolation, we compute an exact
            integral by using the trapeizodal rule with the width given by the
            loss bin width.
+
+    If `lc` is an array of curves of shape (..., C) an array of average
+    losses of shape (...) is returned.
     """
     losses, poes = (lc['loss'], lc['poe']) if lc.dtype.names else lc
+    if losses.ndim > 1:  # array of curves
+        return ((losses[..., 1:] - losses[..., :-1]) *
+                (poes[..., :-1] + poes[..., 1:]) / 2).sum(axis=-1)
     return -pairwise_diff(losses) @ pairwise_mean(poes)
 
 
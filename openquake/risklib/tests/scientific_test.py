@@ -336,6 +336,20 @@ class MeanLossTestCase(unittest.TestCase):
         aaae(mean3, mean)
 
 
+class AverageLossTestCase(unittest.TestCase):
+    def test_many_curves(self):
+        # the average losses of an array of curves are the same as the
+        # average losses of the single curves
+        dt = numpy.dtype([('loss', float), ('poe', float)])
+        curves = numpy.zeros((3, 4), dt)
+        curves['loss'] = [[0, 1, 2, 3], [0, 2, 4, 6], [0, .5, 1, 3]]
+        curves['poe'] = [[1, .5, .1, 0], [1, .5, .1, 0], [.9, .3, .2, .1]]
+        avgs = scientific.average_loss(curves)
+        self.assertEqual(avgs.shape, (3,))
+        for curve, avg in zip(curves, avgs):
+            aaae(avg, scientific.average_loss(curve))
+
+
 class LogNormalDistributionTestCase(unittest.TestCase):
 
     def test_init(self):
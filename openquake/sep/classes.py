@@ -17,6 +17,7 @@
 # along with OpenQuake.  If not, see <http://www.gnu.org/licenses/>.
 import abc
 import inspect
+import numpy
 from openquake.sep.landslide.common import static_factor_of_safety
 from openquake.sep.landslide.newmark import (
     newmark_critical_accel, newmark_displ_from_pga_M,
@@ -43,8 +44,13 @@ class SecondaryPeril(metaclass=abc.ABCMeta):
     added to the gmf_data array generated by the ground motion calculator
 
     The ``compute`` method will return a tuple with ``O`` arrays where ``O``
-    is the number of outputs.
+    is the number of outputs. If the subclass is ``vectorized`` the
+    ``compute`` method must accept also gmf arrays of shape (E, N1), i.e.
+    the ground motion values for E events, and then ``compute_all``
+    processes all the events of a rupture with a single call.
     """
+    vectorized = False
+
     @classmethod
     def instantiate(cls, secondary_perils, sec_peril_params):
         inst = []
@@ -71,6 +77,26 @@ class SecondaryPeril(metaclass=abc.ABCMeta):
         :param sites: a filtered site collection
         """
 
+    def compute_all(self, mag, imts, gmfs, sites):
+        """
+        :param mag: magnitude
+        :param imts: a list of M intensity measure types
+        :param gmfs: an array of shape (N, E, M)
+        :param sites: a filtered site collection of length N
+        :returns: an array of shape (O, N, E)
+        """
+        N, E, M = gmfs.shape
+        if self.vectorized:  # a single call for all events
+            outs = self.compute(
+                mag, zip(imts, gmfs.transpose(2, 1, 0).copy()), sites)
+            return numpy.array([numpy.broadcast_to(out, (E, N))
+                                for out in outs]).transpose(0, 2, 1)
+        out = numpy.zeros((len(self.outputs), N, E))
+        for e in range(E):
+            out[:, :, e] = self.compute(
+                mag, zip(imts, gmfs[:, e].T.copy()), sites)
+        return out
+
     def __repr__(self):
         return '<%s %s>' % self.__class__.__name__
 
@@ -78,17 +104,19 @@ class SecondaryPeril(metaclass=abc.ABCMeta):
 class _FakePeril(SecondaryPeril):
     # useful to test the framework
     outputs = ['fake']
+    vectorized = True
 
     def prepare(self, sites):
         pass
 
     def compute(self, mag, imt_gmf, sites):
-        # gmv is an array with (N, M) elements
-        return [imt_gmf[0][1] * .1]  # fake formula
+        # the gmf of the first IMT is an array of shape (N,) or (E, N)
+        return [list(imt_gmf)[0][1] * .1]  # fake formula
 
 
 class NewmarkDisplacement(SecondaryPeril):
     outputs = ['newmark_disp', 'prob_disp']
+    vectorized = True
 
     def __init__(self, c1=-2.71, c2=2.335, c3=-1.478, c4=0.424,
                  crit_accel_threshold=0.05):
@@ -99,6 +127,8 @@ class NewmarkDisplacement(SecondaryPeril):
         self.crit_accel_threshold = crit_accel_threshold
 
     def prepare(self, sites):
+        if 'crit_accel' in sites.array.dtype.names:  # already prepared
+            return
         sites.add_col('Fs', float, static_factor_of_safety(
             slope=sites.slope,
             cohesion=sites.cohesion_mid,
@@ -116,13 +146,14 @@ class NewmarkDisplacement(SecondaryPeril):
                     gmf, sites.crit_accel, mag,
                     self.c1, self.c2, self.c3, self.c4,
                     self.crit_accel_threshold)
-            out.append(nd)
-            out.append(prob_failure_given_displacement(nd))
+                out.append(nd)
+                out.append(prob_failure_given_displacement(nd))
         return out
 
 
 class HazusLiquefaction(SecondaryPeril):
     outputs = ['liq_prob']
+    vectorized = True
 
     def __init__(self, map_proportion_flag=True):
         self.map_proportion_flag = map_proportion_flag
@@ -143,6 +174,7 @@ class HazusLiquefaction(SecondaryPeril):
 
 class HazusLateralSpreading(SecondaryPeril):
     outputs = ['lat_spread']
+    vectorized = True
 
     def __init__(self, return_unit='m'):
         self.return_unit = return_unit
@@ -162,6 +194,7 @@ class HazusLateralSpreading(SecondaryPeril):
 
 class HazusVerticalSettlement(SecondaryPeril):
     outputs = ['vert_settlement']
+    vectorized = True
 
     def __init__(self, return_unit='m'):
         self.return_unit = return_unit
@@ -176,6 +209,7 @@ class HazusVerticalSettlement(SecondaryPeril):
 
 class ZhuLiquefactionGeneral(SecondaryPeril):
     outputs = ['liq_prob']
+    vectorized = True
 
     def __init__(self, intercept=24.1, cti_coeff=0.355, vs30_coeff=-4.784):
         self.intercept = intercept
@@ -193,4 +227,5 @@ class ZhuLiquefactionGeneral(SecondaryPeril):
                     pga=gmf, mag=mag, cti=sites.cti, vs30=sites.vs30))
         return out
 
+
 supported = [cls.__name__ for cls in SecondaryPeril.__subclasses__()]
@@ -25,7 +25,7 @@ def newmark_critical_accel(
     if np.isscalar(crit_accel):
         return max([0., crit_accel])
     else:
-        return np.array([max([0., ca]) for ca in crit_accel])
+        return np.maximum(crit_accel, 0.)
 
 
 def newmark_displ_from_pga_M(
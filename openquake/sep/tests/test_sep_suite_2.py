@@ -20,6 +20,8 @@ from openquake.sep.liquefaction import (
 from openquake.sep.liquefaction.lateral_spreading import (
     hazus_lateral_spreading_displacement
 )
+from openquake.sep.classes import SecondaryPeril
+from openquake.hazardlib.imt import PGA, SA
 
 BASE_DATA_PATH = os.path.join(os.path.dirname(__file__), "data")
 site_data_file = os.path.join(BASE_DATA_PATH, "test_site_params.csv")
@@ -125,3 +127,36 @@ class test_liquefaction_cali_small(unittest.TestCase):
             3.84597609, 0.36615681, 0., 0., 1.15887168, 1.3722039 ])
 
         np.testing.assert_array_almost_equal(self.sites.hazus_lat_disp, disps)
+
+
+class test_compute_all(unittest.TestCase):
+    """
+    The vectorized computation of the secondary perils for all the events
+    must give the same results as the computation event by event
+    """
+    def test_vectorized(self):
+        df = pd.read_csv(site_data_file)
+        sites = type('Sites', (), {})()  # a fake filtered site collection
+        for col in ['gwd', 'cti', 'vs30', 'slope']:
+            setattr(sites, col, df[col].to_numpy())
+        sites.liq_susc_cat = df['liq_susc_cat'].to_numpy(str)
+        sites.crit_accel = newmark_critical_accel(static_factor_of_safety(
+            slope=sites.slope, cohesion=df.cohesion_mid.to_numpy(),
+            friction_angle=df.friction_mid.to_numpy(),
+            saturation_coeff=df.saturation.to_numpy(),
+            soil_dry_density=df.dry_density.to_numpy()), sites.slope)
+        imts = [PGA(), SA(1.0)]
+        gmfs = np.random.RandomState(42).random_sample((len(df), 20, 2))
+        gmfs[:, :3] = 0  # events below the minimum intensity
+        perils = SecondaryPeril.instantiate(
+            ['NewmarkDisplacement', 'HazusLiquefaction',
+             'HazusLateralSpreading', 'HazusVerticalSettlement',
+             'ZhuLiquefactionGeneral'], {})
+        for peril in perils:
+            out = peril.compute_all(7.5, imts, gmfs, sites)
+            self.assertEqual(out.shape, (len(peril.outputs), len(df), 20))
+            peril.vectorized = False  # compute event by event
+            expected = peril.compute_all(7.5, imts, gmfs, sites)
+            np.testing.assert_array_almost_equal(out, expected)
+        # the gmfs are not modified by the secondary perils
+        self.assertEqual((gmfs[:, :3] == 0).all(), True)
@@ -21,9 +21,7 @@ import getpass
 import operator
 from datetime import datetime
 
-from openquake.hazardlib import valid
-from openquake.baselib import datastore, general
-from openquake.calculators.export import export
+from openquake.baselib import datastore
 from openquake.server import __file__ as server_path
 from openquake.server.db.schema.upgrades import upgrader
 from openquake.server.db import upgrade_manager
@@ -291,11 +289,8 @@ DISPLAY_NAME = {
     'fullreport': 'Full Report',
     'input': 'Input Files'
 }
-
-# sanity check, all display name keys must be exportable
-dic = general.groupby(export, operator.itemgetter(0))
-for key in DISPLAY_NAME:
-    assert key in dic, key
+# NB: all display name keys must be exportable, this is checked in
+# commands_test, not here, to avoid importing the calculators
 
 
 def create_outputs(db, job_id, keysize, ds_size):
@@ -529,6 +524,7 @@ def get_calcs(db, request_get_dict, allowed_users, user_acl_on=False, id=None):
             'calculation_mode')
 
     if 'is_running' in request_get_dict:
+        from openquake.hazardlib import valid
         is_running = request_get_dict.get('is_running')
         filterdict['is_running'] = valid.boolean(is_running)
 
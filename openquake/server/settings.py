@@ -166,6 +166,13 @@ LOGGING = {
 
 FILE_UPLOAD_MAX_MEMORY_SIZE = 1
 
+# The results of the extract API are cached in this directory, keyed by
+# calculation ID, query string and modification time of the datastore;
+# the least recently used files are removed when the total size exceeds
+# EXTRACT_CACHE_SIZE bytes; set EXTRACT_CACHE_SIZE = 0 to disable the cache
+EXTRACT_CACHE_DIR = os.path.join(datastore.get_datadir(), 'extract-cache')
+EXTRACT_CACHE_SIZE = 1024 ** 3  # 1 GB
+
 # A server name can be specified to customize the WebUI in case of
 # multiple installations of the Engine are available. This helps avoiding
 # confusion between different installations when the WebUI is used
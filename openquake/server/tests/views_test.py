@@ -33,6 +33,7 @@ import gzip
 import tempfile
 import string
 import random
+from django.conf import settings
 from django.test import Client
 from openquake.baselib import config
 from openquake.baselib.general import gettemp
@@ -201,6 +202,17 @@ class EngineServerTestCase(unittest.TestCase):
         self.assertEqual(len(got['array']), 6)  # expected 6 aggregates
         self.assertEqual(resp.status_code, 200)
 
+        # the second identical query is served by the extract cache
+        resp2 = self.c.get(
+            extract_url + 'agg_losses/structural?taxonomy=*')
+        self.assertEqual(resp2['Content-Disposition'],
+                         resp['Content-Disposition'])
+        got2 = loadnpz(resp2.streaming_content)
+        numpy.testing.assert_equal(got2['array'], got['array'])
+        # the cache is readable only by the user running the server
+        mode = os.stat(settings.EXTRACT_CACHE_DIR).st_mode
+        self.assertEqual(mode & 0o777, 0o700)
+
         # there is some logic in `core.export_from_db` that it is only
         # exercised when the export fails
         datadir, dskeys = actions.get_results(db, job_id)
@@ -18,6 +18,7 @@
 
 import shutil
 import json
+import hashlib
 import time
 import logging
 import os
@@ -724,13 +725,7 @@ def extract(request, calc_id, what):
     n = len(request.path_info)
     query_string = unquote_plus(path[n:])
     try:
-        # read the data and save them on a temporary .npz file
-        with datastore.read(job.ds_calc_dir + '.hdf5') as ds:
-            fd, fname = tempfile.mkstemp(
-                prefix=what.replace('/', '-'), suffix='.npz')
-            os.close(fd)
-            obj = _extract(ds, what + query_string)
-            hdf5.save_npz(obj, fname)
+        f, fname, tmp = _open_extract_file(job, what, query_string)
     except Exception as exc:
         tb = ''.join(traceback.format_tb(exc.__traceback__))
         return HttpResponse(
@@ -739,15 +734,94 @@ def extract(request, calc_id, what):
             content_type='text/plain', status=500)
 
     # stream the data back
-    stream = FileWrapper(open(fname, 'rb'))
-    stream.close = lambda: (FileWrapper.close(stream), os.remove(fname))
+    stream = FileWrapper(f)
+    if tmp:
+        stream.close = lambda: (FileWrapper.close(stream), os.remove(fname))
     response = FileResponse(stream, content_type='application/octet-stream')
     response['Content-Disposition'] = (
         'attachment; filename=%s' % os.path.basename(fname))
-    response['Content-Length'] = str(os.path.getsize(fname))
+    response['Content-Length'] = str(os.fstat(f.fileno()).st_size)
     return response
 
 
+def _open_extract_file(job, what, query_string):
+    """
+    Extract the data and save them on a .npz file. If the extract cache is
+    enabled the file is kept in the cache directory and reused by the
+    identical queries on the same calculation, as long as the datastore
+    is not modified. The file is opened before pruning the cache, so
+    the data can be returned even if the file is removed afterwards.
+
+    :returns:
+        (.npz file open for reading, its path, True if it is temporary)
+    """
+    ds_path = job.ds_calc_dir + '.hdf5'
+    prefix = what.replace('/', '-')
+    if not settings.EXTRACT_CACHE_SIZE:  # cache disabled
+        fd, fname = tempfile.mkstemp(prefix=prefix, suffix='.npz')
+        os.close(fd)
+        with datastore.read(ds_path) as ds:
+            hdf5.save_npz(_extract(ds, what + query_string), fname)
+        return open(fname, 'rb'), fname, True
+    cache_dir = settings.EXTRACT_CACHE_DIR
+    key = '%s %s%s %s' % (job.id, what, query_string,
+                          os.path.getmtime(ds_path))
+    fname = os.path.join(cache_dir, '%s-%s.npz' % (
+        prefix, hashlib.md5(key.encode('utf8')).hexdigest()))
+    try:
+        f = open(fname, 'rb')
+    except FileNotFoundError:  # not cached or removed by a concurrent prune
+        pass
+    else:
+        try:
+            os.utime(fname)  # mark the file as recently used
+        except FileNotFoundError:  # removed by a concurrent prune
+            pass
+        return f, fname, False
+    os.makedirs(cache_dir, mode=0o700, exist_ok=True)
+    # save on a hidden file first, so that concurrent requests never
+    # see a partially written file
+    fd, tmpname = tempfile.mkstemp(prefix='.', suffix='.npz', dir=cache_dir)
+    os.close(fd)
+    try:
+        with datastore.read(ds_path) as ds:
+            hdf5.save_npz(_extract(ds, what + query_string), tmpname)
+        f = open(tmpname, 'rb')
+        os.replace(tmpname, fname)
+    finally:
+        if os.path.exists(tmpname):
+            os.remove(tmpname)
+    _prune_extract_cache(cache_dir, settings.EXTRACT_CACHE_SIZE, fname)
+    return f, fname, False
+
+
+def _prune_extract_cache(cache_dir, maxsize, keep=None):
+    """
+    Remove the least recently used files until the size of the extract
+    cache is below `maxsize` bytes; the file `keep` is never removed
+    """
+    files = []
+    size = 0
+    for name in os.listdir(cache_dir):
+        if name.endswith('.npz') and not name.startswith('.'):
+            path = os.path.join(cache_dir, name)
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:  # removed by a concurrent request
+                continue
+            size += stat.st_size
+            if path != keep:
+                files.append((stat.st_mtime, stat.st_size, path))
+    for mtime, fsize, path in sorted(files):
+        if size <= maxsize:
+            break
+        try:
+            os.remove(path)
+        except FileNotFoundError:  # removed by a concurrent request
+            pass
+        size -= fsize
+
+
 @cross_domain_ajax
 @require_http_methods(['GET'])
 def calc_datastore(request, job_id):